@@ -0,0 +1,25 @@
+"""
+Add progress checkpoints to ocr_jobs for resumable long-running jobs
+
+Revision ID: 20261016_add_ocr_job_progress
+Revises: 20261016_add_patient_search_index
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261016_add_ocr_job_progress'
+down_revision = '20261016_add_patient_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ocr_jobs') as batch_op:
+        batch_op.add_column(sa.Column('progress', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ocr_jobs') as batch_op:
+        batch_op.drop_column('progress')
@@ -0,0 +1,39 @@
+"""
+Add ocr_jobs table backing the asynchronous OCR job queue
+
+Revision ID: 20261016_add_ocr_jobs_table
+Revises: 6f9446f20706
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261016_add_ocr_jobs_table'
+down_revision = '6f9446f20706'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ocr_jobs',
+        sa.Column('id', sa.String(length=50), primary_key=True),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('worker_id', sa.String(length=100), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True)
+    )
+    op.create_index('ix_ocr_jobs_status', 'ocr_jobs', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_ocr_jobs_status', table_name='ocr_jobs')
+    op.drop_table('ocr_jobs')
@@ -0,0 +1,92 @@
+"""
+Add the patient search index (FTS5 on SQLite, pg_trgm on PostgreSQL)
+
+Revision ID: 20261016_add_patient_search_index
+Revises: 20261016_add_sgk_documents_table
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261016_add_patient_search_index'
+down_revision = '20261016_add_sgk_documents_table'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# Search documents as services/patient_search.py builds them at this revision
+# (kept here so the migration does not import application code)
+_FOLD = str.maketrans({
+    'ç': 'c', 'Ç': 'c', 'ğ': 'g', 'Ğ': 'g', 'ı': 'i', 'I': 'i', 'İ': 'i',
+    'ö': 'o', 'Ö': 'o', 'ş': 's', 'Ş': 's', 'ü': 'u', 'Ü': 'u',
+    'â': 'a', 'Â': 'a', 'î': 'i', 'Î': 'i', 'û': 'u', 'Û': 'u'
+})
+
+
+def _fold(value):
+    return (value or '').translate(_FOLD).lower()
+
+
+def _digits(value):
+    return ''.join(c for c in str(value or '') if c.isdigit())
+
+
+def _phone_variants(phone):
+    digits = _digits(phone)
+    if not digits:
+        return []
+    national = digits[2:] if digits.startswith('90') and len(digits) > 10 else digits.lstrip('0')
+    variants = [digits, national]
+    if len(national) > 7:
+        variants.append(national[-7:])
+    return list(dict.fromkeys(v for v in variants if v))
+
+
+def _search_document(row):
+    name = ' '.join(_fold(f'{row.first_name or ""} {row.last_name or ""}').split())
+    contact = [_fold(row.tc_number), _digits(row.tc_number)] + _phone_variants(row.phone) + [_fold(row.email)]
+    return name, ' '.join(dict.fromkeys(c for c in contact if c))
+
+
+def _backfill(bind, fts):
+    last_id = ''
+    while True:
+        rows = bind.execute(sa.text('SELECT id, first_name, last_name, tc_number, phone, email '
+                                    'FROM patients WHERE id > :last ORDER BY id LIMIT :n'),
+                            {'last': last_id, 'n': BATCH_SIZE}).fetchall()
+        if not rows:
+            return
+        if fts:
+            bind.execute(sa.text('INSERT INTO patients_fts (patient_id, name, contact) VALUES (:id, :name, :contact)'),
+                         [dict(zip(('id', 'name', 'contact'), (row.id,) + _search_document(row))) for row in rows])
+        else:
+            bind.execute(sa.text('UPDATE patients SET search_document = :doc WHERE id = :id'),
+                         [{'doc': ' '.join(_search_document(row)), 'id': row.id} for row in rows])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    # Kept current afterwards by services/patient_search.py
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        # Keyed on patients.id: the rowid of a table with a string primary key changes when it is rebuilt
+        op.execute("CREATE VIRTUAL TABLE patients_fts USING fts5(patient_id UNINDEXED, name, contact, "
+                   "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+        _backfill(bind, fts=True)
+    elif dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('ALTER TABLE patients ADD COLUMN search_document text')
+        op.execute('CREATE INDEX ix_patients_search_document ON patients USING GIN (search_document gin_trgm_ops)')
+        _backfill(bind, fts=False)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS patients_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_patients_search_document')
+        op.execute('ALTER TABLE patients DROP COLUMN IF EXISTS search_document')
@@ -0,0 +1,22 @@
+"""
+Index patients.updated_at for the patient identity index catch-up sync
+
+Revision ID: 20261016_add_patients_updated_at_index
+Revises: 20261016_add_ocr_job_progress
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261016_add_patients_updated_at_index'
+down_revision = '20261016_add_ocr_job_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_patients_updated_at', 'patients', ['updated_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_patients_updated_at', table_name='patients', if_exists=True)
@@ -0,0 +1,57 @@
+"""
+Add sgk_documents table with a full-text index over the OCR text
+
+Revision ID: 20261016_add_sgk_documents_table
+Revises: 20261016_add_ocr_jobs_table
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261016_add_sgk_documents_table'
+down_revision = '20261016_add_ocr_jobs_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sgk_documents',
+        sa.Column('id', sa.String(length=50), primary_key=True),
+        sa.Column('patient_id', sa.String(length=50), sa.ForeignKey('patients.id'), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('document_type', sa.String(length=50), nullable=True),
+        sa.Column('page', sa.Integer(), nullable=True),
+        sa.Column('file_path', sa.String(length=500), nullable=True),
+        sa.Column('ocr_text', sa.Text(), nullable=True),
+        sa.Column('entities', sa.Text(), nullable=True),
+        sa.Column('ocr_confidence', sa.Float(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('region_only', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True)
+    )
+    op.create_index('ix_sgk_documents_patient_id', 'sgk_documents', ['patient_id'])
+    op.create_index('ix_sgk_documents_document_type', 'sgk_documents', ['document_type'])
+
+    # Full-text index, kept current by services/document_search.py
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # Keyed on sgk_documents.id: the rowid of a table with a string primary key changes when it is rebuilt
+        op.execute("CREATE VIRTUAL TABLE sgk_documents_fts USING fts5(document_id UNINDEXED, body, "
+                   "tokenize = 'unicode61 remove_diacritics 2')")
+    elif dialect == 'postgresql':
+        op.execute('ALTER TABLE sgk_documents ADD COLUMN search_vector tsvector')
+        op.execute('CREATE INDEX ix_sgk_documents_search ON sgk_documents USING GIN (search_vector)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS sgk_documents_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_sgk_documents_search')
+    op.drop_index('ix_sgk_documents_document_type', table_name='sgk_documents')
+    op.drop_index('ix_sgk_documents_patient_id', table_name='sgk_documents')
+    op.drop_table('sgk_documents')
@@ -189,6 +189,10 @@ def log_activity(user_id, action, entity_type, entity_id=None, details=None, req
 from extensions import init_extensions
 init_extensions(app)
 
+# Faster JSON for jsonify and the envelope below (orjson when installed)
+from utils.json_provider import init_json_provider
+init_json_provider(app)
+
 # Register unified response envelope middleware
 try:
     from utils.response_envelope import register_response_envelope
@@ -284,6 +288,10 @@ app.register_blueprint(reports_bp, url_prefix='/api')
 from routes.sgk import sgk_bp
 app.register_blueprint(sgk_bp, url_prefix='/api')
 
+# Asynchronous OCR jobs (status / long-poll endpoint)
+from routes.ocr_jobs import ocr_jobs_bp
+app.register_blueprint(ocr_jobs_bp, url_prefix='/api')
+
 # ===== DEVICE SALES ENDPOINTS =====
 # Sales routes migrated to a blueprint in backend/routes/sales.py
 from routes.sales import sales_bp
@@ -357,26 +365,38 @@ app.register_blueprint(audit_bp, url_prefix='/api')
 from routes.config import config_bp
 app.register_blueprint(config_bp, url_prefix='/api')
 
-# Pre-warm OCR/NLP service in development or when explicitly requested to reduce first-request latency
+# Models load on first use; OCR_PREWARM lists components to load at startup instead
 try:
-    PREWARM = os.getenv('PREWARM_OCR', '0') == '1' or FLASK_ENV != 'production'
-    if PREWARM:
-        try:
-            from services.ocr_service import initialize_nlp_service
-            import threading
-            logger.info('Scheduling OCR/NLP service pre-warm in background')
-            def _do_prewarm():
-                try:
-                    initialize_nlp_service()
-                    logger.info('OCR/NLP service pre-warm complete')
-                except Exception as e:
-                    logger.warning(f'Pre-warming OCR/NLP service failed: {e}')
-            t = threading.Thread(target=_do_prewarm, daemon=True)
-            t.start()
-        except Exception as e:
-            logger.warning(f'Pre-warming OCR/NLP service failed to start: {e}')
-except Exception:
-    pass
+    from services.ocr_service import initialize_nlp_service, prewarm_components
+    _prewarm = prewarm_components()
+    if _prewarm:
+        import threading
+        logger.info(f'Scheduling OCR/NLP pre-warm in background: {_prewarm}')
+        def _do_prewarm():
+            try:
+                svc = initialize_nlp_service(_prewarm)
+                logger.info(f'OCR/NLP pre-warm complete: {svc.component_status()}')
+            except Exception as e:
+                logger.warning(f'Pre-warming OCR/NLP service failed: {e}')
+        t = threading.Thread(target=_do_prewarm, daemon=True)
+        t.start()
+except Exception as e:
+    logger.warning(f'Pre-warming OCR/NLP service failed to start: {e}')
+
+# Start the OCR job consumer so jobs queued before a restart are picked up
+if os.getenv('OCR_JOBS_CONSUMER', '1') != '0':
+    try:
+        from services.ocr_jobs import start_consumer
+        start_consumer(app)
+    except Exception as e:
+        logger.warning(f'OCR job consumer failed to start: {e}')
+
+# Build the in-memory patient identity index used by SGK OCR matching
+try:
+    from services.patient_index import start_patient_index
+    start_patient_index(app)
+except Exception as e:
+    logger.warning(f'Patient identity index failed to start: {e}')
 
 # Do not run startup checks here; they run later once the app context is available.
 # Note: Only require JWT secret in production environments
@@ -395,19 +415,17 @@ def health_check():
         if not write_ok:
             return jsonify({'success': False, 'db_read_ok': True, 'db_write_ok': False, 'error': 'Database is read-only'}), 503
 
-        # NLP service availability (non-blocking check)
-        spacy_available = False
-        hf_ner_available = False
+        # NLP model state (reported without triggering a load)
+        models = None
         try:
-            from services.ocr_service import get_nlp_service
-            svc = get_nlp_service(init_if_missing=False)
-            if svc:
-                spacy_available = bool(getattr(svc, 'nlp', None))
-                hf_ner_available = bool(getattr(svc, 'hf_ner', None))
+            from services.ocr_service import model_status
+            models = model_status()
         except Exception:
             pass
+        spacy_available = bool(models) and models['spacy']['state'] == 'ready'
+        hf_ner_available = bool(models) and models['hf_ner']['state'] == 'ready'
 
-        return jsonify({'success': True, 'db_read_ok': True, 'db_write_ok': True, 'database_connected': True, 'spacy_available': spacy_available, 'hf_ner_available': hf_ner_available}), 200
+        return jsonify({'success': True, 'db_read_ok': True, 'db_write_ok': True, 'database_connected': True, 'spacy_available': spacy_available, 'hf_ner_available': hf_ner_available, 'models': models}), 200
     except Exception as e:
         logger.exception('Health check failed: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -889,6 +907,11 @@ if os.getenv('FORCE_CREATE_TABLES', '0') == '1' or os.getenv('FLASK_ENV', 'produ
         with app.app_context():
             logger.info('Ensuring database tables exist (create_all)')
             db.create_all()
+            # Full-text indexes are not models; the migrations create them elsewhere
+            from services.document_search import create_search_index as create_document_search_index
+            from services.patient_search import create_search_index as create_patient_search_index
+            create_document_search_index()
+            create_patient_search_index()
     except Exception as e:
         logger.exception('Failed to run create_all on startup: %s', e)
 
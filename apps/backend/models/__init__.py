@@ -22,6 +22,8 @@ from .inventory import Inventory
 from .suppliers import Supplier, ProductSupplier
 from .device_replacement import DeviceReplacement, ReturnInvoice
 from .invoice import Invoice, Proforma
+from .ocr_job import OCRJob
+from .sgk import SGKDocument
 
 # Maintain backward compatibility - all existing imports should work
 __all__ = [
@@ -35,5 +37,6 @@ __all__ = [
     'Inventory', 'Supplier', 'ProductSupplier',
     'DeviceReplacement', 'ReturnInvoice',
     'Invoice', 'Proforma',
+    'OCRJob', 'SGKDocument',
     'App', 'Role', 'Permission', 'UserAppRole', 'role_permissions'
 ]
\ No newline at end of file
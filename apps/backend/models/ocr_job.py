@@ -0,0 +1,65 @@
+# OCR Job Model: durable queue for asynchronous OCR processing
+from .base import db, BaseModel, JSONMixin, gen_id
+
+class OCRJob(BaseModel, JSONMixin):
+    __tablename__ = 'ocr_jobs'
+
+    id = db.Column(db.String(50), primary_key=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if not self.id:
+            self.id = gen_id("ocrjob")
+
+    # Handler name: 'process', 'extract_patient', 'sgk_upload' or 'patient_import'
+    kind = db.Column(db.String(30), nullable=False)
+    # queued -> running -> succeeded | failed
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker_id = db.Column(db.String(100))
+
+    # JSON fields (stored as Text, accessed via properties)
+    payload = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    # Last checkpoint of a long-running job; a re-queued job resumes from it
+    progress = db.Column(db.Text)
+
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def payload_json(self):
+        return self.json_load(self.payload)
+
+    @payload_json.setter
+    def payload_json(self, value):
+        self.payload = self.json_dump(value)
+
+    @property
+    def result_json(self):
+        return self.json_load(self.result) if self.result else None
+
+    @property
+    def progress_json(self):
+        return self.json_load(self.progress) if self.progress else None
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self):
+        base_dict = self.to_dict_base()
+        job_dict = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result_json,
+            'error': self.error,
+            'progress': self.progress_json,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+        job_dict.update(base_dict)
+        return job_dict
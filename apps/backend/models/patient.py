@@ -54,6 +54,11 @@ class Patient(BaseModel, JSONMixin):
     hearing_tests = db.relationship('HearingTest', backref='patient', lazy=True, cascade='all, delete-orphan')
     proformas = db.relationship('Proforma', back_populates='patient', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # Catch-up sync of the in-memory identity index (services/patient_index.py)
+        db.Index('ix_patients_updated_at', 'updated_at'),
+    )
+
     # JSON properties for safe access
     @property
     def tags_json(self):
@@ -111,54 +116,58 @@ class Patient(BaseModel, JSONMixin):
         return patient_dict
 
     @staticmethod
-    def from_dict(data):
-        """Create Patient instance from dictionary data"""
-        patient = Patient()
-        patient.id = data.get('id') or gen_id("pat")
+    def column_values(data):
+        """Column values of a new patient from dictionary data (the defaults from_dict applies)"""
         # Handle TC number - convert empty string to None to avoid UNIQUE constraint issues
         tc_number = data.get('tcNumber')
-        patient.tc_number = tc_number if tc_number and tc_number.strip() else None
         identity_number = data.get('identityNumber')
-        patient.identity_number = identity_number if identity_number and identity_number.strip() else None
-        patient.first_name = data.get('firstName')
-        patient.last_name = data.get('lastName')
-        patient.phone = data.get('phone')
-        patient.email = data.get('email')
-        
+
         # Handle birth date
+        birth_date = None
         if data.get('birthDate'):
-            patient.birth_date = datetime.fromisoformat(data['birthDate'])
+            birth_date = datetime.fromisoformat(data['birthDate'])
         elif data.get('dob'):
-            patient.birth_date = datetime.fromisoformat(data['dob'])
-            
-        patient.gender = data.get('gender')
-        
-        # Handle address
-        address = data.get('address') or {}
-        patient.address_city = address.get('city')
-        patient.address_district = address.get('district')
-        patient.address_full = address.get('fullAddress')
-        
+            birth_date = datetime.fromisoformat(data['dob'])
+
         # CRM fields
         status_value = data.get('status', 'active')
         if isinstance(status_value, str):
             # Convert string to enum using from_legacy method
-            patient.status = PatientStatus.from_legacy(status_value)
+            status = PatientStatus.from_legacy(status_value)
         else:
-            patient.status = status_value or PatientStatus.ACTIVE
-        patient.segment = data.get('segment', 'lead')
-        patient.acquisition_type = data.get('acquisitionType') or data.get('acquisition_type') or 'walk-in'
-        patient.conversion_step = data.get('conversionStep') or data.get('conversion_step')
-        patient.referred_by = data.get('referredBy')
-        patient.priority_score = data.get('priorityScore', 0)
-        
-        # JSON fields
-        patient.tags_json = data.get('tags', [])
-        patient.sgk_info_json = data.get('sgkInfo', {
-            'rightEarDevice': 'available',
-            'leftEarDevice': 'available',
-            'rightEarBattery': 'available',
-            'leftEarBattery': 'available'
-        })
-        
-        return patient
\ No newline at end of file
+            status = status_value or PatientStatus.ACTIVE
+
+        address = data.get('address') or {}
+        return {
+            'id': data.get('id') or gen_id("pat"),
+            'tc_number': tc_number if tc_number and tc_number.strip() else None,
+            'identity_number': identity_number if identity_number and identity_number.strip() else None,
+            'first_name': data.get('firstName'),
+            'last_name': data.get('lastName'),
+            'phone': data.get('phone'),
+            'email': data.get('email'),
+            'birth_date': birth_date,
+            'gender': data.get('gender'),
+            'address_city': address.get('city'),
+            'address_district': address.get('district'),
+            'address_full': address.get('fullAddress'),
+            'status': status,
+            'segment': data.get('segment', 'lead'),
+            'acquisition_type': data.get('acquisitionType') or data.get('acquisition_type') or 'walk-in',
+            'conversion_step': data.get('conversionStep') or data.get('conversion_step'),
+            'referred_by': data.get('referredBy'),
+            'priority_score': data.get('priorityScore', 0),
+            # JSON fields
+            'tags': Patient.json_dump(data.get('tags', [])),
+            'sgk_info': Patient.json_dump(data.get('sgkInfo', {
+                'rightEarDevice': 'available',
+                'leftEarDevice': 'available',
+                'rightEarBattery': 'available',
+                'leftEarBattery': 'available'
+            })),
+        }
+
+    @staticmethod
+    def from_dict(data):
+        """Create Patient instance from dictionary data"""
+        return Patient(**Patient.column_values(data))
\ No newline at end of file
@@ -0,0 +1,140 @@
+# Serializer plans for list endpoints (see utils/serialization.py).
+# Each plan mirrors its model's to_dict() key for key; tests/test_serialization.py
+# checks them against each other, so change both together.
+from utils.serialization import (Serializer, attr, computed, date_iso, either, enum, iso, json_column, money,
+                                 nested)
+
+TIMESTAMPS = {
+    'createdAt': iso('created_at'),
+    'updatedAt': iso('updated_at'),
+}
+
+PATIENT = Serializer({
+    'id': attr('id'),
+    'tcNumber': attr('tc_number'),
+    'identityNumber': either('identity_number', 'tc_number'),
+    'firstName': attr('first_name'),
+    'lastName': attr('last_name'),
+    'fullName': computed(lambda row: f"{row['first_name']} {row['last_name']}", 'first_name', 'last_name'),
+    'phone': attr('phone'),
+    'email': attr('email'),
+    'birthDate': iso('birth_date'),
+    'dob': date_iso('birth_date'),
+    'gender': attr('gender'),
+    'address': nested({
+        'city': attr('address_city'),
+        'district': attr('address_district'),
+        'fullAddress': attr('address_full'),
+    }),
+    'status': enum('status'),
+    'segment': attr('segment'),
+    'acquisitionType': attr('acquisition_type'),
+    'conversionStep': attr('conversion_step'),
+    'referredBy': attr('referred_by'),
+    'priorityScore': attr('priority_score'),
+    'tags': json_column('tags', {}),
+    'sgkInfo': json_column('sgk_info', {}),
+    **TIMESTAMPS,
+})
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def _trial_period(row):
+    if not (row['trial_start_date'] or row['trial_end_date']):
+        return None
+    return {
+        'startDate': _date(row['trial_start_date']),
+        'endDate': _date(row['trial_end_date']),
+        'extendedUntil': _date(row['trial_extended_until'])
+    }
+
+
+def _warranty(row):
+    if not (row['warranty_start_date'] or row['warranty_end_date']):
+        return None
+    return {
+        'startDate': _date(row['warranty_start_date']),
+        'endDate': _date(row['warranty_end_date']),
+        'terms': row['warranty_terms']
+    }
+
+
+DEVICE = Serializer({
+    'id': attr('id'),
+    'patientId': attr('patient_id'),
+    'inventoryId': attr('inventory_id'),
+    'serialNumber': attr('serial_number'),
+    'brand': attr('brand'),
+    'model': attr('model'),
+    'type': attr('device_type'),
+    'category': enum('category'),
+    'ear': enum('ear'),
+    'status': enum('status'),
+    'trialPeriod': computed(_trial_period, 'trial_start_date', 'trial_end_date', 'trial_extended_until'),
+    'warranty': computed(_warranty, 'warranty_start_date', 'warranty_end_date', 'warranty_terms'),
+    'price': money('price'),
+    'notes': attr('notes'),
+    **TIMESTAMPS,
+})
+
+SALE = Serializer({
+    'id': attr('id'),
+    'patientId': attr('patient_id'),
+    'productId': attr('product_id'),
+    'saleDate': iso('sale_date'),
+    'listPriceTotal': money('list_price_total'),
+    'totalAmount': money('total_amount'),
+    'discountAmount': money('discount_amount', 0.0),
+    'finalAmount': money('final_amount'),
+    'paidAmount': money('paid_amount', 0.0),
+    'rightEarAssignmentId': attr('right_ear_assignment_id'),
+    'leftEarAssignmentId': attr('left_ear_assignment_id'),
+    'status': attr('status'),
+    'paymentMethod': attr('payment_method'),
+    'sgkCoverage': money('sgk_coverage', 0.0),
+    'patientPayment': money('patient_payment'),
+    'notes': attr('notes'),
+    **TIMESTAMPS,
+})
+
+INVENTORY = Serializer({
+    'id': attr('id'),
+    'name': attr('name'),
+    'brand': attr('brand'),
+    'model': attr('model'),
+    'category': attr('category'),
+    'barcode': attr('barcode'),
+    'supplier': attr('supplier'),
+    'description': attr('description'),
+    'availableInventory': attr('available_inventory'),
+    'totalInventory': attr('total_inventory'),
+    'usedInventory': attr('used_inventory'),
+    'inventory': attr('available_inventory'),  # Legacy field
+    'onTrial': attr('on_trial'),
+    'reorderLevel': attr('reorder_level'),
+    'minInventory': attr('reorder_level'),  # Legacy field
+    'availableSerials': json_column('available_serials', []),
+    'features': json_column('features', []),
+    'price': attr('price'),
+    'direction': either('direction', 'ear'),
+    'ear': either('ear', 'direction'),
+    'warranty': attr('warranty'),
+    **TIMESTAMPS,
+})
+
+APPOINTMENT = Serializer({
+    'id': attr('id'),
+    'patientId': attr('patient_id'),
+    'clinicianId': attr('clinician_id'),
+    'branchId': attr('branch_id'),
+    'date': computed(lambda row: row['date'].strftime('%Y-%m-%d') if row['date'] else None, 'date'),
+    'time': attr('time'),
+    'duration': attr('duration'),
+    'type': attr('appointment_type'),
+    'status': enum('status'),
+    'notes': attr('notes'),
+    **TIMESTAMPS,
+})
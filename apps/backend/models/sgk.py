@@ -0,0 +1,107 @@
+# SGK Document Model: uploaded SGK reports with their OCR text for full-text search
+from datetime import datetime
+from .base import db, BaseModel, JSONMixin, gen_id
+
+class SGKDocument(BaseModel, JSONMixin):
+    __tablename__ = 'sgk_documents'
+
+    id = db.Column(db.String(50), primary_key=True, default=lambda: gen_id("sgkdoc"))
+
+    # Unmatched uploads are stored without a patient
+    patient_id = db.Column(db.String(50), db.ForeignKey('patients.id'), index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    document_type = db.Column(db.String(50), index=True)
+    page = db.Column(db.Integer)
+    file_path = db.Column(db.String(500))
+
+    # OCR output; searched through the full-text index (services/document_search.py)
+    ocr_text = db.Column(db.Text)
+    entities = db.Column(db.Text)
+    ocr_confidence = db.Column(db.Float)
+    processed_at = db.Column(db.DateTime)
+    # Text comes from the field regions of an accepted layout template (title, name, TC,
+    # date, device); the rest of the page (diagnosis, body text) was never OCR'd
+    region_only = db.Column(db.Boolean, default=False)
+
+    @property
+    def entities_json(self):
+        return self.json_load(self.entities) if self.entities else []
+
+    @entities_json.setter
+    def entities_json(self, value):
+        self.entities = self.json_dump(value) if value else None
+
+    def search_text(self):
+        """Text indexed for full-text search: OCR lines plus entity values not already in them."""
+        parts = [self.ocr_text or '']
+        for ent in self.entities_json:
+            value = ent.get('text') if isinstance(ent, dict) else ent
+            if value and str(value) not in parts[0]:
+                parts.append(str(value))
+        parts.append(self.filename or '')
+        return '\n'.join(p for p in parts if p)
+
+    def to_dict(self, include_text=False):
+        base_dict = self.to_dict_base()
+        doc_dict = {
+            'id': self.id,
+            'patientId': self.patient_id,
+            'filename': self.filename,
+            'documentType': self.document_type,
+            'page': self.page,
+            'filePath': self.file_path,
+            'ocrConfidence': self.ocr_confidence,
+            'regionOnly': bool(self.region_only),
+            'processedAt': self.processed_at.isoformat() if self.processed_at else None
+        }
+        if include_text:
+            doc_dict['ocrText'] = self.ocr_text
+            doc_dict['entities'] = self.entities_json
+        doc_dict.update(base_dict)
+        return doc_dict
+
+    @staticmethod
+    def from_dict(data):
+        """Create SGKDocument instance from dictionary data"""
+        doc = SGKDocument()
+        doc.id = data.get('id') or gen_id("sgkdoc")
+        doc.patient_id = data.get('patientId')
+        doc.filename = data.get('filename')
+        doc.document_type = data.get('documentType')
+        doc.page = data.get('page')
+        doc.file_path = data.get('filePath')
+        doc.ocr_text = data.get('ocrText')
+        doc.entities_json = data.get('entities')
+        doc.ocr_confidence = data.get('ocrConfidence')
+        doc.region_only = bool(data.get('regionOnly'))
+        if data.get('processedAt'):
+            doc.processed_at = datetime.fromisoformat(data['processedAt'])
+        return doc
+
+    @staticmethod
+    def from_ocr_result(result, filename, patient_id=None, page=None, file_path=None):
+        """Create SGKDocument instance from a process_document result
+
+        Pages read through an accepted layout template only have the text of
+        the template's regions; they are flagged region_only.
+        """
+        entities = result.get('entities') or []
+        texts = [e.get('text') for e in entities if isinstance(e, dict) and e.get('text')]
+        confidences = [e['confidence'] for e in entities if isinstance(e, dict) and e.get('confidence') is not None]
+        doc = SGKDocument()
+        doc.id = gen_id("sgkdoc")
+        doc.patient_id = patient_id
+        doc.filename = filename or 'unknown'
+        doc.document_type = (result.get('classification') or {}).get('type')
+        doc.page = page
+        doc.file_path = file_path
+        doc.ocr_text = '\n'.join(texts)
+        # Extracted entities as {'text', 'label'}: NER spans, medical terms and template fields
+        found = [{'text': e.get('text'), 'label': e.get('label')} for e in result.get('custom_entities') or []]
+        found += [{'text': t.get('term'), 'label': t.get('category')} for t in result.get('medical_terms') or []]
+        found += [{'text': f.get('value'), 'label': name} for name, f in (result.get('fields') or {}).items()]
+        doc.entities_json = [e for e in found if e['text']]
+        doc.ocr_confidence = round(sum(confidences) / len(confidences), 3) if confidences else None
+        doc.region_only = bool((result.get('template') or {}).get('accepted'))
+        doc.processed_at = datetime.now()
+        return doc
@@ -1,88 +1,167 @@
 #!/usr/bin/env python3
 """
-Simple command-line PaddleOCR worker script.
-Usage: python paddle_worker.py /path/to/image [--use-gpu]
-Prints JSON array of entities: [{"text":..., "confidence":...}, ...]
+Command-line PaddleOCR worker script.
+
+One-shot usage: python paddle_worker.py /path/to/image [--use-gpu]
+Prints JSON object with entities: {"entities": [{"text":..., "confidence":...}, ...]}
+
+Persistent usage: python paddle_worker.py --serve [--use-gpu]
+Loads the model once, prints {"ready": true} and then answers one JSON request
+per stdin line until stdin is closed:
+  {"id": "...", "op": "ocr", "path": "/path/to/image"} -> {"id": "...", "entities": [...]}
+  {"id": "...", "op": "ocr_regions", "path": "...", "regions": [{"name": "...", "box": [x0, y0, x1, y1]}]}
+                                                       -> {"id": "...", "regions": {"name": [...]}}
+  (region boxes are fractions of the image size; only those crops are OCR'd)
+  {"id": "...", "op": "ping"}                          -> {"id": "...", "pong": true}
+Errors are reported per request as {"id": "...", "error": "..."}.
 """
 import sys
 import json
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print(json.dumps({'error': 'no path provided'}))
-        sys.exit(1)
-    path = sys.argv[1]
-    # Allow explicit GPU usage via flag, but default to CPU on macOS M-series to avoid native crashes
-    use_gpu = False
-    if len(sys.argv) > 2 and sys.argv[2] == '--use-gpu':
-        use_gpu = True
-    try:
-        import paddle
-        # Force Paddle to use CPU unless explicitly overridden by --use-gpu
-        if not use_gpu:
+
+def _load_ocr(use_gpu=False):
+    import paddle
+    # Force Paddle to use CPU unless explicitly overridden by --use-gpu
+    if not use_gpu:
+        try:
+            paddle.set_device('cpu')
+        except Exception:
+            # If set_device fails, continue and let Paddle decide
+            pass
+    from paddleocr import PaddleOCR
+    # Prefer CPU by default on Apple Silicon (M-series);
+    # we already attempted to set paddle device above; leave PaddleOCR instantiation minimal.
+    return PaddleOCR(lang='tr')
+
+
+def _rec_entities(rec_texts, rec_scores):
+    entities = []
+    for idx, t in enumerate(rec_texts):
+        score = 1.0
+        if rec_scores and idx < len(rec_scores):
             try:
-                paddle.set_device('cpu')
+                score = float(rec_scores[idx])
             except Exception:
-                # If set_device fails, continue and let Paddle decide
                 pass
-        from paddleocr import PaddleOCR
-        # Prefer CPU by default on Apple Silicon (M-series);
-        # we already attempted to set paddle device above; leave PaddleOCR instantiation minimal.
-        ocr = PaddleOCR(lang='tr')
-        # Try standard ocr call without extra kwargs
-        raw = ocr.ocr(path) if hasattr(ocr, 'ocr') else ocr.predict(path)
-        entities = []
-        # If PaddleOCR returned a dict-like object at index 0 (list) or directly a dict, handle both
-        if isinstance(raw, dict):
-            rec_texts = raw.get('rec_texts') or raw.get('rec_res') or raw.get('texts')
-            rec_scores = raw.get('rec_scores') or raw.get('rec_res_scores') or raw.get('scores')
-            if rec_texts:
-                for idx, t in enumerate(rec_texts):
-                    score = 1.0
-                    if rec_scores and idx < len(rec_scores):
-                        try:
-                            score = float(rec_scores[idx])
-                        except Exception:
-                            pass
-                    entities.append({'text': str(t), 'confidence': float(score)})
-            elif 'text' in raw:
-                entities.append({'text': str(raw.get('text')), 'confidence': float(raw.get('confidence', 1.0))})
+        entities.append({'text': str(t), 'confidence': float(score)})
+    return entities
+
+
+def _normalize_result(raw):
+    """Convert the various PaddleOCR return shapes into a list of entity dicts."""
+    entities = []
+    # If PaddleOCR returned a dict-like object at index 0 (list) or directly a dict, handle both
+    if isinstance(raw, dict):
+        rec_texts = raw.get('rec_texts') or raw.get('rec_res') or raw.get('texts')
+        rec_scores = raw.get('rec_scores') or raw.get('rec_res_scores') or raw.get('scores')
+        if rec_texts:
+            entities.extend(_rec_entities(rec_texts, rec_scores))
+        elif 'text' in raw:
+            entities.append({'text': str(raw.get('text')), 'confidence': float(raw.get('confidence', 1.0))})
+        else:
+            entities.append({'text': str(raw), 'confidence': 1.0})
+    elif isinstance(raw, (list, tuple)) and len(raw) > 0 and isinstance(raw[0], dict):
+        # Common: raw is a list where first element is a dict with rec_texts
+        first = raw[0]
+        rec_texts = first.get('rec_texts') or first.get('rec_res') or first.get('texts')
+        rec_scores = first.get('rec_scores') or first.get('rec_res_scores') or first.get('scores')
+        if rec_texts:
+            entities.extend(_rec_entities(rec_texts, rec_scores))
+        else:
+            # fall back to stringifying the first element
+            entities.append({'text': str(first), 'confidence': 1.0})
+    else:
+        # previous handling for list/tuple structures
+        for line in raw or []:
+            if isinstance(line, (list, tuple)):
+                for res in line:
+                    try:
+                        txt = res[1][0]
+                        conf = res[1][1] if len(res[1]) > 1 else 1.0
+                    except Exception:
+                        txt = res[1] if isinstance(res[1], str) else str(res[1])
+                        conf = 1.0
+                    entities.append({'text': str(txt), 'confidence': float(conf)})
+            elif isinstance(line, dict) and 'text' in line:
+                entities.append({'text': str(line.get('text')), 'confidence': float(line.get('confidence', 1.0))})
             else:
-                entities.append({'text': str(raw), 'confidence': 1.0})
-        elif isinstance(raw, (list, tuple)) and len(raw) > 0 and isinstance(raw[0], dict):
-            # Common: raw is a list where first element is a dict with rec_texts
-            first = raw[0]
-            rec_texts = first.get('rec_texts') or first.get('rec_res') or first.get('texts')
-            rec_scores = first.get('rec_scores') or first.get('rec_res_scores') or first.get('scores')
-            if rec_texts:
-                for idx, t in enumerate(rec_texts):
-                    score = 1.0
-                    if rec_scores and idx < len(rec_scores):
-                        try:
-                            score = float(rec_scores[idx])
-                        except Exception:
-                            pass
-                    entities.append({'text': str(t), 'confidence': float(score)})
+                entities.append({'text': str(line), 'confidence': 1.0})
+    return entities
+
+
+def _run_ocr(ocr, path):
+    # Try standard ocr call without extra kwargs
+    raw = ocr.ocr(path) if hasattr(ocr, 'ocr') else ocr.predict(path)
+    return _normalize_result(raw)
+
+
+def _run_ocr_regions(ocr, path, regions, pad=0.01):
+    import cv2
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f'cannot read image: {path}')
+    height, width = image.shape[:2]
+    out = {}
+    for region in regions:
+        x0, y0, x1, y1 = region['box']
+        crop = image[max(0, int((y0 - pad) * height)):min(height, int((y1 + pad) * height)),
+                     max(0, int((x0 - pad) * width)):min(width, int((x1 + pad) * width))]
+        out[region['name']] = _run_ocr(ocr, crop) if crop.size else []
+    return out
+
+
+def serve(use_gpu=False):
+    """Answer OCR requests from stdin until EOF, loading the model only once."""
+    # Keep the protocol channel private: paddle and its dependencies print
+    # progress/log lines to stdout which would corrupt the JSON stream.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def _reply(obj):
+        out.write(json.dumps(obj, ensure_ascii=False) + '\n')
+        out.flush()
+
+    try:
+        ocr = _load_ocr(use_gpu)
+    except Exception as e:
+        _reply({'ready': False, 'error': str(e)})
+        return 1
+    _reply({'ready': True})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        req_id = None
+        try:
+            req = json.loads(line)
+            req_id = req.get('id')
+            op = req.get('op', 'ocr')
+            if op == 'ping':
+                _reply({'id': req_id, 'pong': True})
+            elif op == 'ocr':
+                _reply({'id': req_id, 'entities': _run_ocr(ocr, req['path'])})
+            elif op == 'ocr_regions':
+                _reply({'id': req_id, 'regions': _run_ocr_regions(ocr, req['path'], req.get('regions') or [])})
             else:
-                # fall back to stringifying the first element
-                entities.append({'text': str(first), 'confidence': 1.0})
-        else:
-            # previous handling for list/tuple structures
-            for line in raw:
-                if isinstance(line, (list, tuple)):
-                    for res in line:
-                        try:
-                            txt = res[1][0]
-                            conf = res[1][1] if len(res[1]) > 1 else 1.0
-                        except Exception:
-                            txt = res[1] if isinstance(res[1], str) else str(res[1])
-                            conf = 1.0
-                        entities.append({'text': str(txt), 'confidence': float(conf)})
-                elif isinstance(line, dict) and 'text' in line:
-                    entities.append({'text': str(line.get('text')), 'confidence': float(line.get('confidence', 1.0))})
-                else:
-                    entities.append({'text': str(line), 'confidence': 1.0})
+                _reply({'id': req_id, 'error': f'unknown op: {op}'})
+        except Exception as e:
+            _reply({'id': req_id, 'error': str(e)})
+    return 0
+
 
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(json.dumps({'error': 'no path provided'}))
+        sys.exit(1)
+    # Allow explicit GPU usage via flag, but default to CPU on macOS M-series to avoid native crashes
+    use_gpu = '--use-gpu' in sys.argv[2:]
+    if sys.argv[1] == '--serve':
+        sys.exit(serve(use_gpu))
+    path = sys.argv[1]
+    try:
+        ocr = _load_ocr(use_gpu)
+        entities = _run_ocr(ocr, path)
         print(json.dumps({'entities': entities}, ensure_ascii=False))
         sys.exit(0)
     except Exception as e:
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, make_response
 from models.base import db
 from models.appointment import Appointment
+from models.serializers import APPOINTMENT
 from models.device import Device
 from datetime import datetime
 from sqlalchemy.orm import load_only
@@ -50,7 +51,7 @@ def get_appointments():
 
         return jsonify({
             "success": True,
-            "data": [apt.to_dict() for apt in appointments.items],
+            "data": APPOINTMENT.many(appointments.items),
             "meta": {
                 "total": appointments.total,
                 "page": page,
@@ -348,7 +349,7 @@ def list_appointments():
 
         return jsonify({
             "success": True,
-            "data": [apt.to_dict() for apt in appointments.items],
+            "data": APPOINTMENT.many(appointments.items),
             "meta": {
                 "total": appointments.total,
                 "page": page,
@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify, make_response
 from models.base import db
 from models.device import Device
+from models.serializers import DEVICE
+from utils.serialization import parse_fields
 from models.inventory import Inventory
 from models.enums import DeviceSide, DeviceStatus, DeviceCategory
 from constants import CANONICAL_CATEGORY_HEARING_AID
 from datetime import datetime
-from sqlalchemy.orm import load_only
 import logging
 from utils.idempotency import idempotent
 from utils.optimistic_locking import optimistic_lock, with_transaction
@@ -26,6 +27,12 @@ def get_devices():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
 
+        try:
+            # ?fields=brand,model,serialNumber loads and returns only those fields (plus id)
+            serializer = DEVICE.only(parse_fields(request.args.get('fields')))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 400
+
         query = Device.query
 
         # Filter for inventory devices only if requested
@@ -61,18 +68,20 @@ def get_devices():
             )
 
         try:
-            query = query.options(load_only(Device.id, Device.patient_id, Device.inventory_id, Device.serial_number, Device.brand, Device.model, Device.device_type, Device.ear, Device.status, Device.price, Device.notes, Device.created_at, Device.updated_at))
+            # Every column the serializer reads, so no row lazy-loads the rest
+            query = query.options(serializer.load_only(Device))
         except Exception:
             pass
 
         query = query.order_by(Device.created_at.desc())
 
         devices = query.paginate(page=page, per_page=per_page, error_out=False)
+        device_rows = serializer.many(devices.items)
 
         return jsonify({
             "success": True,
-            "data": [device.to_dict() for device in devices.items],
-            "devices": [device.to_dict() for device in devices.items],
+            "data": device_rows,
+            "devices": device_rows,
             "meta": {
                 "total": devices.total,
                 "page": page,
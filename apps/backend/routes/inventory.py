@@ -14,6 +14,8 @@ def now_utc():
 
 # Add models directory to path to import inventory
 from models.inventory import Inventory
+from models.serializers import INVENTORY
+from utils.serialization import parse_fields
 from uuid import uuid4
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/api/inventory')
@@ -38,8 +40,14 @@ def get_all_inventory():
         if per_page < 1 or per_page > 100:
             per_page = 20
         
+        try:
+            # ?fields=name,brand,availableInventory loads and returns only those fields (plus id)
+            serializer = INVENTORY.only(parse_fields(request.args.get('fields')))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
         # Build query
-        query = Inventory.query
+        query = Inventory.query.options(serializer.load_only(Inventory))
         
         if category:
             query = query.filter_by(category=category)
@@ -69,7 +77,7 @@ def get_all_inventory():
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in items],
+            'data': serializer.many(items),
             'meta': {
                 'page': page,
                 'perPage': per_page,
@@ -556,7 +564,7 @@ def get_low_stock_items():
         
         return jsonify({
             'success': True,
-            'data': [item.to_dict() for item in items],
+            'data': INVENTORY.many(items),
             'count': len(items)
         }), 200
         
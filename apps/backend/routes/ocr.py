@@ -5,7 +5,12 @@ import os
 
 from models.base import db
 from models.patient import Patient
-from services.ocr_service import get_nlp_service, initialize_nlp_service
+from services.ocr_service import get_nlp_service, initialize_nlp_service, model_status
+from services.ocr_worker_pool import get_worker_pool
+from services.ocr_cache import get_ocr_cache
+from services.ocr_jobs import register_handler, submit_job, job_response, wants_async
+from utils.document_scanner import auto_crop_mode
+from utils.image_preprocess import parse_steps
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +20,17 @@ ocr_bp = Blueprint('ocr', __name__)
 def health_check():
     """Health check endpoint (moved from app.py)"""
     try:
+        # Model state is read without loading anything (models load on first use)
         svc = get_nlp_service(init_if_missing=False)
-        ocr_available = svc.paddleocr_available if svc and hasattr(svc, 'paddleocr_available') else False
-        spacy_available = bool(getattr(svc, 'nlp', None)) if svc else False
-        hf_ner_available = bool(getattr(svc, 'hf_ner', None)) if svc else False
+        models = model_status()
+        ocr_available = svc.paddleocr_available if svc else False
+        spacy_available = models['spacy']['state'] == 'ready'
+        hf_ner_available = models['hf_ner']['state'] == 'ready'
+        # Persistent PaddleOCR worker pool (only reported once it has been created)
+        pool = get_worker_pool(create=False)
+        worker_pool = pool.stats() if pool else None
+        cache = get_ocr_cache()
+        ocr_cache = cache.stats() if cache else None
         # Redis / OTP store availability
         otp_store = current_app.extensions.get('otp_store')
         try:
@@ -30,6 +42,9 @@ def health_check():
             "ocr_available": ocr_available,
             "spacy_available": spacy_available,
             "hf_ner_available": hf_ner_available,
+            "models": models,
+            "worker_pool": worker_pool,
+            "ocr_cache": ocr_cache,
             "redis_available": redis_available,
             "database_connected": True,
             "timestamp": datetime.now().isoformat()
@@ -61,12 +76,15 @@ def initialize_nlp_endpoint():
 
     Starts model initialization in a background thread so the HTTP request
     can return quickly and heavy imports/downloads happen asynchronously.
+    An optional JSON body {"components": ["paddleocr", "spacy", "hf_ner"]}
+    limits which models are loaded; progress is visible in /health.
     """
     try:
         import threading
+        components = (request.get_json(silent=True) or {}).get('components')
         def _init_background():
             try:
-                svc = initialize_nlp_service()
+                svc = initialize_nlp_service(components)
                 # Pre-warm external OCR worker in background to reduce first-request latency
                 try:
                     import tempfile
@@ -101,6 +119,38 @@ def initialize_nlp_endpoint():
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+def _auto_crop_option(data, default):
+    """auto_crop from a request payload: a bool or a mode name ('fast', 'balanced', 'quality')."""
+    value = data.get('auto_crop', default)
+    return value if isinstance(value, str) else bool(value)
+
+
+def _initialized_service():
+    svc = get_nlp_service()
+    if not svc.initialized:
+        svc.initialize()
+    return svc
+
+
+def _run_process(data):
+    """OCR + NLP for a /process payload; shared by the sync route and the job handler."""
+    svc = _initialized_service()
+    image_path = data.get('image_path', '')
+    text = data.get('text') or data.get('ocr_text')
+    doc_type = data.get('type', 'medical')
+    # default to auto_crop for local SGK documents to improve accuracy
+    auto_crop = _auto_crop_option(data, True)
+    result = svc.process_document(image_path=image_path or None, doc_type=doc_type, text=text, auto_crop=auto_crop,
+                                  preprocess=data.get('preprocess'))
+    # Attempt to extract patient name as part of the processing result for convenience
+    try:
+        patient_info = svc.extract_patient_name(image_path=image_path or None, text=text)
+        result['patient_info'] = patient_info
+    except Exception:
+        result['patient_info'] = None
+    return result
+
+
 @ocr_bp.route('/process', methods=['POST'])
 def process_document():
     """Process document with OCR
@@ -108,31 +158,34 @@ def process_document():
     Accepts either JSON with {'image_path': '/abs/path/to/file'} or
     {'text': 'raw extracted text'} so frontend clients can send text-only
     NLP requests without uploading images to the backend.
+
+    {'preprocess': 'deskew,binarize'} overrides the image clean-up steps
+    configured for the document type ('none' disables them).
+
+    With {'async': true}, ?async=1 or 'Prefer: respond-async' the request is
+    queued as an OCR job and 202 is returned with the job id.
     """
     try:
-        svc = get_nlp_service()
-        if not svc.initialized:
-            try:
-                svc.initialize()
-            except Exception as e:
-                return jsonify({"success": False, "error": f"OCR service not available: {e}", "timestamp": datetime.now().isoformat()}), 503
-
         data = request.get_json() or {}
         image_path = data.get('image_path', '')
         text = data.get('text') or data.get('ocr_text')
-        doc_type = data.get('type', 'medical')
-        # default to auto_crop for local SGK documents to improve accuracy
-        auto_crop = bool(data.get('auto_crop', True))
         if not image_path and not text:
             return jsonify({"error": "No image path or text provided"}), 400
+        try:
+            auto_crop_mode(_auto_crop_option(data, True))
+            parse_steps(data.get('preprocess'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 400
+
+        if wants_async(request, data):
+            return job_response(submit_job('process', data))
 
-        result = svc.process_document(image_path=image_path or None, doc_type=doc_type, text=text, auto_crop=auto_crop)
-        # Attempt to extract patient name as part of the processing result for convenience
         try:
-            patient_info = svc.extract_patient_name(image_path=image_path or None, text=text)
-            result['patient_info'] = patient_info
-        except Exception:
-            result['patient_info'] = None
+            _initialized_service()
+        except Exception as e:
+            return jsonify({"success": False, "error": f"OCR service not available: {e}", "timestamp": datetime.now().isoformat()}), 503
+
+        result = _run_process(data)
         return jsonify({"success": True, "result": result, "timestamp": datetime.now().isoformat()})
     except Exception as e:
         logger.error(f"OCR processing error: {e}")
@@ -184,7 +237,7 @@ def extract_entities():
         data = request.get_json() or {}
         image_path = data.get('image_path', '')
         text = data.get('text') or data.get('ocr_text')
-        auto_crop = bool(data.get('auto_crop', False))
+        auto_crop = _auto_crop_option(data, False)
         if not image_path and not text:
             return jsonify({"error": "No image path or text provided"}), 400
         result = svc.process_document(image_path=image_path or None, text=text, auto_crop=auto_crop)
@@ -194,45 +247,59 @@ def extract_entities():
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+def _run_extract_patient(data):
+    """Patient name extraction for an /extract_patient payload."""
+    svc = _initialized_service()
+    image_path = data.get('image_path', '')
+    text = data.get('text')
+    auto_crop = _auto_crop_option(data, False)
+    # If text provided, let the service attempt extraction from text; otherwise run OCR
+    if text:
+        # Try to extract name heuristically from text
+        # Reuse process_document to get custom entities
+        res = svc.process_document(text=text, auto_crop=auto_crop)
+        # Attempt to find patient name in custom entities first
+        custom = res.get('custom_entities') or []
+        patient_matches = [e for e in custom if e.get('label') == 'PATIENT_NAME']
+        patient_info = None
+        if patient_matches:
+            patient_info = {"name": patient_matches[0]['text'], "confidence": patient_matches[0].get('confidence', 0.9)}
+        else:
+            patient_info = svc.extract_patient_name(image_path) if hasattr(svc, 'extract_patient_name') else None
+    else:
+        patient_info = svc.extract_patient_name(image_path) if hasattr(svc, 'extract_patient_name') else None
+    return {"patient_info": patient_info}
+
+
 @ocr_bp.route('/extract_patient', methods=['POST'])
 def extract_patient_name():
-    """Extract patient name from image using OCR"""
+    """Extract patient name from image using OCR (job mode as for /process)"""
     try:
-        svc = get_nlp_service()
-        if not svc.initialized:
-            try:
-                svc.initialize()
-            except Exception as e:
-                return jsonify({"success": False, "error": f"OCR service not available: {e}", "timestamp": datetime.now().isoformat()}), 503
-
         data = request.get_json() or {}
         image_path = data.get('image_path', '')
         text = data.get('text')
-        auto_crop = bool(data.get('auto_crop', False))
         if not image_path and not text:
             return jsonify({"error": "No image path or text provided"}), 400
-        # If text provided, let the service attempt extraction from text; otherwise run OCR
-        if text:
-            # Try to extract name heuristically from text
-            # Reuse process_document to get custom entities
-            res = svc.process_document(text=text, auto_crop=auto_crop)
-            # Attempt to find patient name in custom entities first
-            custom = res.get('custom_entities') or []
-            patient_matches = [e for e in custom if e.get('label') == 'PATIENT_NAME']
-            patient_info = None
-            if patient_matches:
-                patient_info = {"name": patient_matches[0]['text'], "confidence": patient_matches[0].get('confidence', 0.9)}
-            else:
-                patient_info = svc.extract_patient_name(image_path) if hasattr(svc, 'extract_patient_name') else None
-        else:
-            patient_info = svc.extract_patient_name(image_path) if hasattr(svc, 'extract_patient_name') else None
 
+        if wants_async(request, data):
+            return job_response(submit_job('extract_patient', data))
+
+        try:
+            _initialized_service()
+        except Exception as e:
+            return jsonify({"success": False, "error": f"OCR service not available: {e}", "timestamp": datetime.now().isoformat()}), 503
+
+        patient_info = _run_extract_patient(data)['patient_info']
         return jsonify({"success": True, "patient_info": patient_info, "timestamp": datetime.now().isoformat()})
     except Exception as e:
         logger.error(f"Patient extraction error: {e}")
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+register_handler('process', _run_process)
+register_handler('extract_patient', _run_extract_patient)
+
+
 @ocr_bp.route('/debug_ner', methods=['POST'])
 def debug_ner():
     """Debug endpoint to run HF NER and spaCy on provided text and return detailed outputs.
@@ -259,7 +326,7 @@ def debug_ner():
         # HF NER
         try:
             if getattr(svc, 'hf_ner', None):
-                hf_out = svc.hf_ner(text)
+                hf_out = svc.hf_entities(text)
                 response['hf_ner'] = hf_out
         except Exception as e:
             response['hf_ner_error'] = str(e)
@@ -267,7 +334,7 @@ def debug_ner():
         # spaCy
         try:
             if getattr(svc, 'nlp', None):
-                doc = svc.nlp(text)
+                doc = svc.parse(text)
                 sp_entities = []
                 for ent in getattr(doc, 'ents', []):
                     sp_entities.append({"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char})
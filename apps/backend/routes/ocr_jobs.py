@@ -0,0 +1,32 @@
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+import logging
+
+from services.ocr_jobs import wait_for_job
+
+logger = logging.getLogger(__name__)
+
+ocr_jobs_bp = Blueprint('ocr_jobs', __name__)
+
+# Upper bound for ?wait= so a long-poll never pins a WSGI worker for long
+MAX_WAIT_SECONDS = 60
+
+
+@ocr_jobs_bp.route('/ocr/jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    """Return the state of an asynchronous OCR job.
+
+    `?wait=N` long-polls up to N seconds (max 60) for the job to finish.
+    """
+    try:
+        try:
+            wait = min(float(request.args.get('wait', 0) or 0), MAX_WAIT_SECONDS)
+        except ValueError:
+            return jsonify({"success": False, "error": "wait must be a number of seconds"}), 400
+        job = wait_for_job(job_id, wait)
+        if not job:
+            return jsonify({"success": False, "error": "Job not found"}), 404
+        return jsonify({"success": True, "job": job.to_dict(), "timestamp": datetime.now().isoformat()})
+    except Exception as e:
+        logger.error(f"Get OCR job error: {e}")
+        return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
@@ -1,16 +1,21 @@
 from flask import Blueprint, request, jsonify, make_response
-from models.base import db
+from models.base import db, gen_id
 from models.patient import Patient
+from models.serializers import PATIENT
 from datetime import datetime
 import json
 import logging
 import sqlite3
 import csv
-import io
 import os
-from flask import Response
+from flask import Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user import User
+from services.patient_counts import count_mode, count_total
+from services.ocr_jobs import job_response, job_storage_dir, register_handler, submit_job, wait_for_job, wants_async
+from services.patient_import import PatientImport, import_progress, run_import_job
+from services.patient_search import filter_patients, query_terms
+from utils.serialization import parse_fields
 from utils.idempotency import idempotent
 from utils.optimistic_locking import optimistic_lock, with_transaction
 
@@ -36,9 +41,18 @@ def _is_admin_user(user_id):
 def bulk_upload_patients():
     """Accept a multipart/form-data CSV file containing patients and upsert them into the DB.
     This endpoint is intentionally forgiving: it returns a summary of created/updated rows
-    and reports per-row errors without aborting the entire batch.
+    (plus rows, seconds and rowsPerSecond) and reports per-row errors without aborting the
+    entire batch.
+    The file is committed chunk by chunk, so the import is not all-or-nothing: when it fails
+    outright the error response carries `committedRows`, the leading CSV rows already
+    written (they stay committed); re-upload only the rows after them.
     Authentication is optional for uploads in many workflows; we still log the actor when present.
+
+    With ?async=1 (or 'Prefer: respond-async') the file is stored and imported by
+    a background job instead; 202 is returned with a job id and progress is polled
+    at /api/patients/bulk_upload/jobs/<job_id>.
     """
+    importer = None
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file part named "file" in request'}), 400
@@ -47,101 +61,6 @@ def bulk_upload_patients():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No selected file'}), 400
 
-        # Read CSV content (support UTF-8 BOM)
-        raw = file.read()
-        try:
-            text = raw.decode('utf-8-sig')
-        except Exception:
-            text = raw.decode('utf-8', errors='replace')
-
-        reader = csv.DictReader(io.StringIO(text))
-        created = 0
-        updated = 0
-        errors = []
-        row_num = 0
-
-        for row in reader:
-            row_num += 1
-            try:
-                # Normalize row to expected API-style keys
-                payload = {
-                    'tcNumber': row.get('tcNumber') or row.get('tc_number') or row.get('tc'),
-                    'identityNumber': row.get('identityNumber') or row.get('identity_number'),
-                    'firstName': row.get('firstName') or row.get('first_name') or row.get('first'),
-                    'lastName': row.get('lastName') or row.get('last_name') or row.get('last'),
-                    'phone': row.get('phone') or row.get('phone_number') or row.get('tel'),
-                    'email': row.get('email'),
-                    'birthDate': row.get('birthDate') or row.get('dob'),
-                    'gender': row.get('gender'),
-                    'status': row.get('status'),
-                    'segment': row.get('segment')
-                }
-
-                # Address fields support flat CSV columns
-                address = {}
-                if row.get('address_city'):
-                    address['city'] = row.get('address_city')
-                if row.get('address_district'):
-                    address['district'] = row.get('address_district')
-                if row.get('address_full'):
-                    address['fullAddress'] = row.get('address_full')
-                if address:
-                    payload['address'] = address
-
-                # Tags may be provided as a comma/semicolon separated string
-                tags_value = row.get('tags')
-                if tags_value:
-                    # split on comma or semicolon and strip
-                    split_tags = [t.strip() for t in csv.reader([tags_value]).__next__() if t.strip()]
-                    payload['tags'] = split_tags
-
-                # Attempt to find existing patient by tc_number (strong identifier)
-                existing = None
-                if payload.get('tcNumber'):
-                    existing = Patient.query.filter_by(tc_number=payload['tcNumber']).one_or_none()
-
-                if existing:
-                    # apply updatable fields similar to update endpoint
-                    updatable = ['firstName','lastName','phone','email','birthDate','gender','status','segment','tags']
-                    for k in updatable:
-                        if payload.get(k) is not None:
-                            if k == 'tags':
-                                existing.tags = json.dumps(payload['tags'])
-                            elif k == 'birthDate':
-                                try:
-                                    existing.birth_date = datetime.fromisoformat(payload['birthDate'])
-                                except Exception:
-                                    pass
-                            else:
-                                setattr(existing, {'firstName':'first_name','lastName':'last_name','phone':'phone','email':'email','gender':'gender','status':'status','segment':'segment'}[k], payload[k])
-                    db.session.add(existing)
-                    updated += 1
-                else:
-                    # create new patient
-                    patient = Patient.from_dict(payload)
-                    db.session.add(patient)
-                    created += 1
-
-                # Flush per-row to capture integrity errors early without losing context
-                try:
-                    db.session.flush()
-                except Exception as e:
-                    # Capture rollback cause and continue
-                    db.session.rollback()
-                    errors.append({'row': row_num, 'error': str(e)})
-                    continue
-
-            except Exception as e:
-                errors.append({'row': row_num, 'error': str(e)})
-                continue
-
-        # Commit everything that successfully flushed
-        try:
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({'success': False, 'error': 'Commit failed: ' + str(e)}), 500
-
         # Log activity with the calling user if available
         user_id = None
         try:
@@ -150,22 +69,126 @@ def bulk_upload_patients():
             user_id = None
         from app import log_activity
         actor = user_id or 'anonymous'
+
+        if wants_async(request):
+            job_id = gen_id('ocrjob')
+            path = os.path.join(job_storage_dir(job_id), 'patients.csv')
+            file.save(path)
+            job = submit_job('patient_import', {'jobId': job_id, 'path': path, 'fileName': file.filename},
+                             job_id=job_id)
+            log_activity(actor, 'bulk_upload', 'patient', None, {'jobId': job_id, 'fileName': file.filename}, request)
+            return job_response(job, location=f'/api/patients/bulk_upload/jobs/{job_id}')
+
+        # Parsed as a stream and written in chunks (see services/patient_import.py);
+        # chunks already written stay committed if a later one fails outright
+        importer = PatientImport()
+        summary = importer.run(file.stream)
+        created, updated, errors = summary['created'], summary['updated'], summary['errors']
         log_activity(actor, 'bulk_upload', 'patient', None, {'created': created, 'updated': updated, 'errors': errors}, request)
 
-        return jsonify({'success': True, 'created': created, 'updated': updated, 'errors': errors}), 200
+        return jsonify(dict(summary, success=True)), 200
     except sqlite3.OperationalError as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': 'Database write failed: ' + str(e)}), 503
+        return jsonify(_import_failure('Database write failed: ' + str(e), importer)), 503
     except Exception as e:
         db.session.rollback()
+        return jsonify(_import_failure(str(e), importer)), 500
+
+
+def _import_failure(error, importer):
+    """Error body of a failed synchronous import, with the rows that stayed committed."""
+    body = {'success': False, 'error': error}
+    if importer is not None:
+        body['committedRows'] = importer.committed_rows
+        if importer.committed_rows:
+            body['note'] = (f'The first {importer.committed_rows} CSV rows were imported and stay committed; '
+                            'upload only the rows after them to finish.')
+    return body
+
+
+# Upper bound for ?wait= on the import job endpoint, as for OCR jobs
+IMPORT_JOB_MAX_WAIT_SECONDS = 60
+
+
+@patients_bp.route('/patients/bulk_upload/jobs/<job_id>', methods=['GET'])
+@jwt_required(optional=True)
+def get_bulk_upload_job(job_id):
+    """Progress of a background CSV import: rows done, errors and an ETA.
+
+    `?wait=N` long-polls up to N seconds (max 60) for the job to finish.
+    """
+    try:
+        try:
+            wait = min(float(request.args.get('wait', 0) or 0), IMPORT_JOB_MAX_WAIT_SECONDS)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'wait must be a number of seconds'}), 400
+        job = wait_for_job(job_id, wait)
+        if not job or job.kind != 'patient_import':
+            return jsonify({'success': False, 'error': 'Import job not found'}), 404
+        return jsonify({'success': True, 'job': import_progress(job), 'timestamp': datetime.now().isoformat()})
+    except Exception as e:
+        logger.error(f"Get import job error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Own lane: an import runs for minutes and must not hold up OCR jobs
+register_handler('patient_import', run_import_job, lane='import')
+
+
+# Rows fetched from the database (and written as one CSV chunk) per batch
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = [
+    ('id', Patient.id), ('tcNumber', Patient.tc_number), ('firstName', Patient.first_name),
+    ('lastName', Patient.last_name), ('phone', Patient.phone), ('email', Patient.email),
+    ('birthDate', Patient.birth_date), ('gender', Patient.gender), ('status', Patient.status),
+    ('segment', Patient.segment), ('tags', Patient.tags), ('createdAt', Patient.created_at),
+]
+
+
+class _CsvLine:
+    """File-like sink for csv.writer that hands back each formatted line."""
+
+    def write(self, value):
+        return value
+
+
+def _export_csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return getattr(value, 'value', value)  # enums as their value
+
+
+def _iter_export_csv(query):
+    """CSV chunks (bytes) for the rows of a column `query`; the generator returns the row count."""
+    writer = csv.writer(_CsvLine())
+    tags_at = [name for name, _ in EXPORT_COLUMNS].index('tags')
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS]).encode('utf-8')
+    count = 0
+    chunk = []
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        values = [_export_csv_value(v) for v in row]
+        values[tags_at] = json.dumps(json.loads(values[tags_at]) if values[tags_at] else [])
+        chunk.append(writer.writerow(values))
+        count += 1
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+    return count
+
+
 @patients_bp.route('/patients/export', methods=['GET'])
 @jwt_required()
 def export_patients_csv():
     """Export patients as CSV. Only admin users are allowed to perform exports.
     Supports optional query params: status, segment, q (search term).
+
+    The file is streamed: only the exported columns are read, in batches of
+    EXPORT_BATCH_SIZE rows, so memory use does not grow with the patient count.
+    The 'export' audit record is written before the first byte is sent, so an
+    aborted or failed download is still audited; an 'export_completed' record
+    with the row count follows once the last row was written.
     """
     try:
         user_id = get_jwt_identity()
@@ -176,52 +199,30 @@ def export_patients_csv():
         segment = request.args.get('segment')
         q = request.args.get('q')
 
-        query = Patient.query
+        query = db.session.query(*[column for _, column in EXPORT_COLUMNS])
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter(Patient.status == status)
         if segment:
-            query = query.filter_by(segment=segment)
+            query = query.filter(Patient.segment == segment)
         if q:
-            search_filter = f"%{q}%"
-            query = query.filter(db.or_(
-                Patient.first_name.ilike(search_filter),
-                Patient.last_name.ilike(search_filter),
-                Patient.tc_number.ilike(search_filter),
-                Patient.phone.ilike(search_filter),
-                Patient.email.ilike(search_filter),
-            ))
-
-        patients = query.order_by(Patient.created_at.desc()).all()
-
-        # Build CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        # Header
-        writer.writerow(['id','tcNumber','firstName','lastName','phone','email','birthDate','gender','status','segment','tags','createdAt'])
-        for p in patients:
-            writer.writerow([
-                p.id,
-                p.tc_number,
-                p.first_name,
-                p.last_name,
-                p.phone,
-                p.email,
-                p.created_at.isoformat() if hasattr(p, 'created_at') and p.created_at else '',
-                p.gender,
-                p.status,
-                p.segment,
-                json.dumps(json.loads(p.tags) if p.tags else []),
-                p.created_at.isoformat() if hasattr(p, 'created_at') and p.created_at else ''
-            ])
-
-        csv_bytes = output.getvalue().encode('utf-8')
-        output.close()
-
-        # Log export
+            query, _ = filter_patients(query, q)
+        query = query.order_by(Patient.created_at.desc())
+
         from app import log_activity
-        log_activity(user_id or 'unknown', 'export', 'patient', None, {'count': len(patients)}, request)
+        filters = {'status': status, 'segment': segment, 'q': q}
+        log_activity(user_id or 'unknown', 'export', 'patient', None, {'filters': filters}, request)
 
-        response = make_response(csv_bytes)
+        def generate():
+            try:
+                count = yield from _iter_export_csv(query)
+                log_activity(user_id or 'unknown', 'export_completed', 'patient', None,
+                             {'filters': filters, 'count': count}, request)
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated file
+                logger.exception('Export failed while streaming: %s', e)
+                raise
+
+        response = Response(stream_with_context(generate()), mimetype='text/csv')
         response.headers.set('Content-Type', 'text/csv; charset=utf-8')
         response.headers.set('Content-Disposition', 'attachment', filename=f'patients_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
         return response
@@ -238,20 +239,24 @@ def list_patients():
         per_page = int(request.args.get('per_page', 20))
         cursor = request.args.get('cursor')  # For cursor-based pagination
         search = request.args.get('search', '')
+        try:
+            # How the total is computed: exact, cached or estimate (see services/patient_counts.py)
+            total_mode = count_mode(request.args.get('count'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()}), 400
+        try:
+            # ?fields=firstName,lastName,phone loads and returns only those fields (plus id)
+            serializer = PATIENT.only(parse_fields(request.args.get('fields')))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()}), 400
         
-        query = Patient.query
+        query = Patient.query.options(serializer.load_only(Patient))
+        score = None
         
-        # Apply search filter if provided
+        # Apply search filter if provided (search index, see services/patient_search.py)
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Patient.first_name.ilike(search_term),
-                    Patient.last_name.ilike(search_term),
-                    Patient.phone.ilike(search_term),
-                    Patient.email.ilike(search_term)
-                )
-            )
+            query, score = filter_patients(query, search)
+        total_query = query
         
         # Cursor-based pagination for better performance with large datasets
         if cursor:
@@ -264,11 +269,16 @@ def list_patients():
                 # Invalid cursor, fall back to first page
                 pass
         
-        # Order by ID for consistent pagination
-        query = query.order_by(Patient.id)
+        per_page = min(per_page, 200)  # Cap at 200 for performance
+        ranked = score is not None and not cursor
+        if ranked:
+            # Search results are ranked by relevance and paged by page number
+            query = query.order_by(score.desc(), Patient.id).offset((max(page, 1) - 1) * per_page)
+        else:
+            # Order by ID for consistent pagination
+            query = query.order_by(Patient.id)
         
         # Limit results (add 1 to check if there are more pages)
-        per_page = min(per_page, 200)  # Cap at 200 for performance
         patients_list = query.limit(per_page + 1).all()
         
         # Check if there are more results
@@ -278,28 +288,18 @@ def list_patients():
         
         # Generate next cursor if there are more results
         next_cursor = None
-        if has_next and patients_list:
+        if has_next and patients_list and not ranked:
             import base64
             last_id = patients_list[-1].id
             next_cursor = base64.b64encode(str(last_id).encode()).decode()
         
-        results = [p.to_dict() for p in patients_list]
+        results = serializer.many(patients_list)
         
         # For backward compatibility, also support offset-based pagination
         if not cursor:
-            # Traditional pagination for UI compatibility
-            total_query = Patient.query
-            if search:
-                search_term = f"%{search}%"
-                total_query = total_query.filter(
-                    db.or_(
-                        Patient.first_name.ilike(search_term),
-                        Patient.last_name.ilike(search_term),
-                        Patient.phone.ilike(search_term),
-                        Patient.email.ilike(search_term)
-                    )
-                )
-            total_count = total_query.count()
+            # Traditional pagination for UI compatibility; cursor pages are never counted
+            signature = ('search', tuple(query_terms(search))) if search else ()
+            total_count, total_mode = count_total(total_query, signature, total_mode)
             total_pages = (total_count + per_page - 1) // per_page
             
             return jsonify({
@@ -310,6 +310,7 @@ def list_patients():
                     'perPage': per_page,
                     'total': total_count,
                     'totalPages': total_pages,
+                    'totalMode': total_mode,
                     'hasNext': has_next,
                     'nextCursor': next_cursor
                 }
@@ -511,6 +512,23 @@ def delete_patient(patient_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _fuzzy_patient_candidates(search_term):
+    """Candidate patients for a typo-tolerant name search."""
+    from services.patient_index import get_patient_index
+    index = get_patient_index()
+    if index is not None:
+        ids = [pid for pid, _ in index.find_by_name(search_term, limit=200, min_score=0.2)]
+        return Patient.query.filter(Patient.id.in_(ids)) if ids else None
+    tokens = [t for t in search_term.split() if len(t) > 1]
+    if not tokens:
+        return None
+    clauses = []
+    for t in tokens:
+        clauses.append(Patient.first_name.ilike(f"%{t}%"))
+        clauses.append(Patient.last_name.ilike(f"%{t}%"))
+    return Patient.query.filter(db.or_(*clauses))
+
+
 @patients_bp.route('/patients/search', methods=['GET'])
 def search_patients():
     try:
@@ -520,25 +538,49 @@ def search_patients():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
 
+        if search_term and request.args.get('fuzzy', '').lower() in ('1', 'true', 'yes'):
+            # Typo-tolerant name search: rank candidates by edit-distance similarity
+            from utils import fuzzy
+            query = _fuzzy_patient_candidates(search_term)
+            candidates = []
+            if query is not None:
+                if status:
+                    query = query.filter_by(status=status)
+                if segment:
+                    query = query.filter_by(segment=segment)
+                candidates = query.limit(500).all()
+            ranked = fuzzy.rank(search_term, candidates, key=lambda p: f"{p.first_name} {p.last_name}", min_score=0.5)
+            total = len(ranked)
+            results = []
+            for patient, score in ranked[(page - 1) * per_page:page * per_page]:
+                item = PATIENT(patient)
+                item['matchScore'] = round(score, 3)
+                results.append(item)
+            return jsonify({
+                'success': True,
+                'data': results,
+                'results': results,  # backward compat
+                'meta': {
+                    'total': total,
+                    'page': page,
+                    'perPage': per_page,
+                    'totalPages': (total + per_page - 1) // per_page if per_page else 0,
+                    'fuzzy': True
+                }
+            }), 200
+
         query = Patient.query
-        if search_term:
-            search_filter = f"%{search_term}%"
-            query = query.filter(
-                db.or_(
-                    Patient.first_name.ilike(search_filter),
-                    Patient.last_name.ilike(search_filter),
-                    Patient.tc_number.ilike(search_filter),
-                    Patient.phone.ilike(search_filter),
-                    Patient.email.ilike(search_filter)
-                )
-            )
+        order = [Patient.created_at.desc()]
         if status:
             query = query.filter_by(status=status)
         if segment:
             query = query.filter_by(segment=segment)
+        if search_term:
+            query, score = filter_patients(query, search_term)
+            order.insert(0, score.desc())
 
-        patients_paginated = query.order_by(Patient.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
-        results = [p.to_dict() for p in patients_paginated.items]
+        patients_paginated = query.order_by(*order).paginate(page=page, per_page=per_page, error_out=False)
+        results = PATIENT.many(patients_paginated.items)
 
         return jsonify({
             'success': True,
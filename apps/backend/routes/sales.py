@@ -4,6 +4,8 @@ from models.base import db, gen_sale_id
 from models.patient import Patient
 from models.device import Device
 from models.sales import Sale, DeviceAssignment, PaymentPlan, PaymentInstallment, PaymentRecord
+from models.serializers import SALE
+from utils.serialization import parse_fields
 from models.user import ActivityLog
 from services.pricing import (
     calculate_device_pricing,
@@ -14,6 +16,7 @@ from utils.idempotency import idempotent
 from datetime import datetime
 import logging
 from sqlalchemy import text
+from sqlalchemy.orm import load_only, selectinload
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +29,18 @@ def get_sales():
         page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 50)), 100)
         search = request.args.get('search', '').strip()
+
+        # ?fields=saleDate,finalAmount,patient loads and returns only those fields (plus id);
+        # 'patient' is the patient's name block below
+        fields = parse_fields(request.args.get('fields'))
+        with_patient = fields is None or 'patient' in fields
+        try:
+            serializer = SALE.only([f for f in fields if f != 'patient'] or ['id']) if fields else SALE
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()}), 400
+        columns = set(serializer.columns) | ({'patient_id'} if with_patient else set())
         
-        query = Sale.query
+        query = Sale.query.options(load_only(*[getattr(Sale, column) for column in columns]))
         
         # Search functionality
         if search:
@@ -39,8 +52,10 @@ def get_sales():
                 )
             )
         
-        # Order by sale date descending
+        # Order by sale date descending; the page's patients come in one extra query
         query = query.order_by(Sale.sale_date.desc())
+        if with_patient:
+            query = query.options(selectinload(Sale.patient).load_only(Patient.id, Patient.first_name, Patient.last_name))
         
         # Paginate
         paginated = query.paginate(
@@ -51,9 +66,9 @@ def get_sales():
         
         sales_data = []
         for sale in paginated.items:
-            sale_dict = sale.to_dict()
+            sale_dict = serializer(sale)
             # Add patient info
-            if sale.patient:
+            if with_patient and sale.patient:
                 sale_dict['patient'] = {
                     'id': sale.patient.id,
                     'first_name': sale.patient.first_name,
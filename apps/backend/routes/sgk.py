@@ -1,7 +1,7 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from datetime import datetime
 import logging
-from models.base import db
+from models.base import db, gen_id
 from models.patient import Patient
 
 # SGKDocument is optional - some deployments may not have a dedicated model.
@@ -10,14 +10,26 @@ try:
 except Exception:
     SGKDocument = None
 
-from services.ocr_service import get_nlp_service
+from services.ocr_service import get_nlp_service, stage
+from services.ocr_batch import PdfPage, iter_process_files
+from services.ocr_dedupe import fingerprint, get_duplicate_index
+from services.patient_index import get_patient_index
+from services.document_search import search_documents
+from utils import fuzzy
+from utils.metrics import record_ocr_cache
+from utils.pdf_pages import PdfError, is_pdf, open_pdf
+from services.ocr_jobs import register_handler, submit_job, job_response, wants_async, job_storage_dir
 from sqlalchemy import or_, func
 
 logger = logging.getLogger(__name__)
 
 sgk_bp = Blueprint('sgk', __name__)
 
+import collections
+import copy
+import json
 import os
+import shutil
 import tempfile
 from werkzeug.utils import secure_filename
 
@@ -36,6 +48,12 @@ def _is_allowed_image(filename, file_stream):
 def list_sgk_documents():
     try:
         docs = []
+        if SGKDocument:
+            query = SGKDocument.query
+            if request.args.get('patientId'):
+                query = query.filter_by(patient_id=request.args['patientId'])
+            limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+            docs = [d.to_dict() for d in query.order_by(SGKDocument.created_at.desc()).limit(limit).all()]
         return jsonify({"success": True, "documents": docs, "count": len(docs), "timestamp": datetime.now().isoformat()})
     except Exception as e:
         logger.error(f"List SGK docs error: {str(e)}")
@@ -72,6 +90,55 @@ def upload_sgk_document():
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+@sgk_bp.route('/sgk/documents/search', methods=['GET'])
+def search_sgk_documents():
+    """Full-text search over stored OCR text (services.document_search).
+
+    ?q= terms are all required, the last one matches as a prefix; optional
+    patientId / documentType filters; page / per_page paginate the ranked
+    results. Each document carries its 'score' and a 'snippet' with the
+    matches wrapped in <mark>.
+
+    Pages read through an accepted layout template are stored with the text
+    of the template regions only (title, patient, TC, date, device), so
+    words elsewhere on such a page - diagnosis, body text - do not find it.
+    Those documents have 'regionOnly': true, and meta.regionOnly counts them
+    among the hits of the page.
+    """
+    try:
+        search_term = (request.args.get('q') or '').strip()
+        if not search_term:
+            return jsonify({"success": False, "error": "Missing search query (q)", "timestamp": datetime.now().isoformat()}), 400
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+        total, hits = search_documents(search_term, limit=per_page, offset=(page - 1) * per_page,
+                                       patient_id=request.args.get('patientId'),
+                                       document_type=request.args.get('documentType'))
+        documents = []
+        for doc, score, snippet in hits:
+            item = doc.to_dict()
+            item['score'] = round(score, 4)
+            item['snippet'] = snippet
+            documents.append(item)
+        return jsonify({
+            "success": True,
+            "documents": documents,
+            "meta": {
+                "total": total,
+                "page": page,
+                "perPage": per_page,
+                "totalPages": (total + per_page - 1) // per_page,
+                "regionOnly": sum(1 for item in documents if item['regionOnly'])
+            },
+            "timestamp": datetime.now().isoformat()
+        })
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid pagination: {e}", "timestamp": datetime.now().isoformat()}), 400
+    except Exception as e:
+        logger.error(f"Search SGK docs error: {str(e)}")
+        return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
+
+
 @sgk_bp.route('/sgk/documents/<document_id>', methods=['GET'])
 def get_sgk_document(document_id):
     try:
@@ -79,7 +146,8 @@ def get_sgk_document(document_id):
             doc = db.session.get(SGKDocument, document_id)
             if not doc:
                 return jsonify({"success": False, "error": "Document not found"}), 404
-            return jsonify({"success": True, "document": doc.to_dict(), "timestamp": datetime.now().isoformat()})
+            include_text = request.args.get('includeText', '').lower() in ('1', 'true', 'yes')
+            return jsonify({"success": True, "document": doc.to_dict(include_text=include_text), "timestamp": datetime.now().isoformat()})
         else:
             return jsonify({"success": False, "error": "SGK document model not available"}), 404
     except Exception as e:
@@ -105,6 +173,35 @@ def delete_sgk_document(document_id):
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+def _process_deduplicated(svc, image_path):
+    """process_document(image_path), reusing the result of an earlier near-duplicate scan.
+
+    The result carries 'documentId' and, when it was reused, 'duplicateOf'.
+    """
+    index = get_duplicate_index()
+    fp = None
+    if index is not None:
+        with stage('dedupe'):
+            fp = fingerprint(image_path)
+            hit = index.find(fp, 'ocr_process')
+        if hit:
+            ref, result = hit
+            record_ocr_cache('duplicate_hit')
+            result['duplicateOf'] = ref
+            return result
+    result = svc.process_document(image_path)
+    if index is not None and result.get('entities'):
+        index.add(fp, 'ocr_process', result, os.path.basename(image_path))
+    return result
+
+
+def _run_ocr_process(data):
+    svc = get_nlp_service()
+    if not svc.initialized:
+        svc.initialize()
+    return _process_deduplicated(svc, data.get('image_path'))
+
+
 @sgk_bp.route('/ocr/process', methods=['POST'])
 def process_ocr():
     try:
@@ -112,6 +209,8 @@ def process_ocr():
         image_path = data.get('image_path')
         if not image_path:
             return jsonify({"success": False, "error": "No image path provided"}), 400
+        if wants_async(request, data):
+            return job_response(submit_job('ocr_process', data))
         svc = get_nlp_service()
         if svc is None:
             svc = get_nlp_service()
@@ -119,18 +218,445 @@ def process_ocr():
                 svc.initialize()
             except Exception as e:
                 return jsonify({"success": False, "error": f"OCR init failed: {e}"}), 503
-        result = svc.process_document(image_path)
+        result = _process_deduplicated(svc, image_path)
         return jsonify({"success": True, "result": result, "timestamp": datetime.now().isoformat()})
     except Exception as e:
         logger.error(f"OCR process error: {str(e)}")
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+def _apply_digit_ocr_corrections(s):
+    """Conservative character-to-digit replacements for OCR numeric fixes.
+    Only applied when we're extracting numeric substrings to avoid corrupting names.
+    """
+    if not s:
+        return s
+    try:
+        # conservative mapping to avoid over-correction
+        mapping = {
+            'O': '0', 'o': '0',
+            'I': '1', 'l': '1', 'İ': '1',
+            'S': '5', 's': '5',
+            'B': '8'
+        }
+        out = s
+        for a, b in mapping.items():
+            out = out.replace(a, b)
+        return out
+    except Exception:
+        return s
+
+
+def _extract_tc_partial(entities, joined_text=None):
+    import re
+    # Collect texts for windowed merging
+    texts = [ (e.get('text') if isinstance(e, dict) else str(e) or '') for e in (entities or []) ]
+
+    # 1) Direct patterns inside each entity
+    for t in texts:
+        if not t:
+            continue
+        # full 11-digit
+        m = re.search(r"(\d{11})", t) or re.search(r"(\d{11})", _apply_digit_ocr_corrections(t))
+        if m:
+            return m.group(1)
+        # masked like 3390159***** or 3390159**** (try corrected form too)
+        m2 = re.search(r"(\d{5,11})\*+", t) or re.search(r"(\d{5,11})\*+", _apply_digit_ocr_corrections(t))
+        if m2:
+            return m2.group(1)
+
+    # 2) Merge adjacent entity texts (window) to handle OCR-split numbers
+    max_window = 4
+    for i in range(len(texts)):
+        merged = ''.join(texts[i:i+max_window])
+        # also try a corrected merged string
+        merged_corr = _apply_digit_ocr_corrections(merged)
+        merged_clean = re.sub(r'[^0-9*]', '', merged_corr)
+        if not merged_clean:
+            continue
+        m3 = re.search(r"(\d{5,11})\*+", merged_clean)
+        if m3:
+            return m3.group(1)
+        m4 = re.search(r"(\d{6,11})", merged_clean)
+        if m4:
+            return m4.group(1)
+
+    # 3) fallback: remove non-digits from joined_text and search
+    if joined_text:
+        # apply digit corrections to the full joined text as a last resort
+        joined_corr = _apply_digit_ocr_corrections(joined_text or '')
+        jt_clean = re.sub(r'[^0-9*]', '', joined_corr)
+        if jt_clean:
+            m5 = re.search(r"(\d{5,11})\*+", jt_clean) or re.search(r"(\d{6,11})", jt_clean)
+            if m5:
+                return m5.group(1)
+
+    return None
+
+
+def _load_patients(ids):
+    """Fetch patients by id, preserving the order of `ids` (deleted ids are skipped)."""
+    if not ids:
+        return []
+    by_id = {p.id: p for p in db.session.query(Patient).filter(Patient.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def _match_patient(svc, proc_result):
+    with stage('patient_match'):
+        return _attach_patient_match(svc, proc_result)
+
+
+def _attach_patient_match(svc, proc_result):
+    """Server-side patient DB lookup using both TC partial (preferred) and name (fallback).
+
+    Sets 'tc_partial' and 'matched_patient' on proc_result. Runs in the request
+    thread because it needs the app's DB session.
+    """
+    patient_info = proc_result.get('patient_info')
+    try:
+        joined_text_for_tc = '\n'.join([e.get('text') if isinstance(e, dict) and 'text' in e else str(e) for e in proc_result.get('entities') or []])
+        tc_partial = _extract_tc_partial(proc_result.get('entities', []) or [], joined_text_for_tc)
+        proc_result['tc_partial'] = tc_partial
+
+        matched_patient = None
+        match_details = None
+
+        # If we have a TC partial, try to find patients whose tc_number contains it
+        if tc_partial:
+            try:
+                # Normalize tc_partial to digits only (handle masked forms like 3390159*****)
+                tc_partial_digits = ''.join([c for c in str(tc_partial or '') if c.isdigit()])
+                if not tc_partial_digits:
+                    # fallback to original if cleaning removed everything
+                    tc_partial_digits = tc_partial
+                index = get_patient_index()
+                if index is not None:
+                    # In-memory TC suffix index (checksum-aware), no table scan
+                    candidates = _load_patients(index.find_by_tc(tc_partial_digits, limit=10))
+                else:
+                    # strip non-digits from stored tc_number and compare using digits-only substring
+                    q = db.session.query(Patient).filter(func.replace(func.coalesce(Patient.tc_number, ''), ' ', '').like(f"%{tc_partial_digits}%"))
+                    candidates = q.limit(10).all()
+
+                if len(candidates) == 1:
+                    matched_patient = candidates[0]
+                    match_details = {"method": "tc_partial", "reason": "unique tc substring match", "candidate_count": 1, "confidence": 0.99}
+                elif len(candidates) > 1:
+                    # If multiple, try to disambiguate using name (if available)
+                    if patient_info and patient_info.get('name'):
+                        ranked = fuzzy.rank(patient_info.get('name'), candidates,
+                                            key=lambda c: f"{c.first_name} {c.last_name}", limit=1)
+                        best, best_score = ranked[0] if ranked else (None, 0.0)
+                        if best and best_score >= 0.75:
+                            matched_patient = best
+                            match_details = {"method": "tc_partial+name_disambiguation", "candidate_count": len(candidates), "similarity": float(best_score), "confidence": 0.95}
+                        else:
+                            match_details = {"method": "tc_partial", "candidate_count": len(candidates), "confidence": 0.5}
+                    else:
+                        match_details = {"method": "tc_partial", "candidate_count": len(candidates), "confidence": 0.5}
+            except Exception:
+                matched_patient = None
+
+        # If no TC match, try name lookup
+        if not matched_patient and patient_info and patient_info.get('name'):
+            try:
+                name_raw = patient_info.get('name')
+                # Normalize name (Turkish characters folded to ASCII, lowercase) and split
+                name_clean = fuzzy.normalize(name_raw)
+                parts = [p for p in name_clean.split() if p]
+                candidates = []
+                index = get_patient_index()
+                if index is not None:
+                    # Trigram index over Turkish-folded names replaces the diacritic-replace scans below
+                    candidates = _load_patients([pid for pid, _ in index.find_by_name(name_clean, limit=20, min_score=0.5)])
+                elif len(parts) >= 2:
+                    first_token = parts[0]
+                    last_token = parts[-1]
+                    # Build normalized SQL expressions for name fields (replace common Turkish diacritics)
+                    def _sql_normalized(col):
+                        # apply lower() and replace common Turkish characters with ascii equivalents
+                        expr = func.lower(col)
+                        for a,b in [("ç","c"),("ğ","g"),("ı","i"),("ö","o"),("ş","s"),("ü","u"),("İ","i")]:
+                            expr = func.replace(expr, a, b)
+                        return expr
+
+                    candidates = db.session.query(Patient).filter(
+                        _sql_normalized(Patient.first_name).ilike(f"{first_token.lower()}%"),
+                        _sql_normalized(Patient.last_name).ilike(f"%{last_token.lower()}%")
+                    ).limit(20).all()
+                if not candidates and index is None:
+                    # looser search: any token in first_name or last_name
+                    token_filters = []
+                    for t in parts:
+                        token_filters.append(_sql_normalized(Patient.first_name).ilike(f"%{t}%"))
+                        token_filters.append(_sql_normalized(Patient.last_name).ilike(f"%{t}%"))
+                    if token_filters:
+                        candidates = db.session.query(Patient).filter(or_(*token_filters)).limit(50).all()
+
+                # Log candidate ids for debugging
+                try:
+                    logger.info('Name lookup candidates for "%s": %s', name_clean, [c.id for c in candidates])
+                except Exception:
+                    pass
+
+                if candidates:
+                    # If only one candidate returned by DB filters, auto-match immediately
+                    if len(candidates) == 1:
+                        matched_patient = candidates[0]
+                        match_details = {"method": "name_match_single_candidate", "candidate_count": 1, "confidence": 0.90}
+                        # attach and skip further similarity ranking
+                    else:
+                        # rank all candidates by fuzzy name similarity in one vectorized call
+                        ranked = fuzzy.rank(name_clean, candidates, key=lambda c: f"{c.first_name} {c.last_name}", limit=1)
+                        best, best_score = ranked[0] if ranked else (None, 0.0)
+                        try:
+                            logger.info('Best name match score=%s for name=%s best=%s', best_score, name_clean, getattr(best,'id', None))
+                        except Exception:
+                            pass
+                        # Lowered similarity threshold from 0.7 to 0.6 for higher recall in noisy OCR
+                        if best and best_score >= 0.6:
+                            matched_patient = best
+                            match_details = {"method": "name_match", "similarity": float(best_score), "candidate_count": len(candidates), "confidence": float(0.8 + (best_score-0.6))}
+                        else:
+                            match_details = {"method": "name_match", "candidate_count": len(candidates), "confidence": 0.4}
+                else:
+                    match_details = {"method": "name_match", "candidate_count": 0, "confidence": 0.0}
+            except Exception:
+                match_details = {"method": "name_match", "candidate_count": 0, "confidence": 0.0}
+
+        # Attach matched patient info (if any) to proc_result
+        if matched_patient:
+            try:
+                proc_result['matched_patient'] = {
+                    'patient': matched_patient.to_dict(),
+                    'match_details': match_details
+                }
+            except Exception:
+                # best-effort: expose id and name
+                proc_result['matched_patient'] = {
+                    'patient': {'id': getattr(matched_patient, 'id', None), 'fullName': f"{getattr(matched_patient,'first_name',None)} {getattr(matched_patient,'last_name',None)}"},
+                    'match_details': match_details
+                }
+        else:
+            proc_result['matched_patient'] = None
+    except Exception:
+        # If anything goes wrong, don't break the upload flow — return processing result without DB match
+        proc_result['matched_patient'] = None
+    return proc_result
+
+
+def _first_copy(index, fingerprints, fp):
+    """(upload index, similarity) of an earlier page in this upload showing the same scan, or None."""
+    for idx, other in fingerprints.items():
+        score = index.same_page(other, fp)
+        if score is not None:
+            return idx, score
+    return None
+
+
+def _expand_pdfs(entries):
+    """One work item per page to OCR: images as they are, PDFs one item per page.
+
+    PDF pages carry a PdfPage (the PDF's path or bytes plus the page number):
+    the pool task that OCRs the page also rasterizes it, so pages render in
+    parallel. A PDF that cannot be opened becomes an error item.
+    """
+    items = []
+    for entry in entries:
+        source = entry.get('path') or entry.get('data')
+        if entry.get('error') or not is_pdf(entry.get('fileName'), entry.get('data')):
+            items.append(entry)
+            continue
+        try:
+            doc = open_pdf(source)
+        except PdfError as e:
+            items.append({"fileName": entry.get('fileName'), "error": str(e)})
+            continue
+        page_count = doc.page_count
+        doc.close()
+        for page_no in range(page_count):
+            items.append({
+                "fileName": entry.get('fileName'),
+                "path": entry.get('path'),
+                "page": page_no + 1,
+                "pageCount": page_count,
+                "pdfPage": PdfPage(source, page_no)
+            })
+    return items
+
+
+def _store_document(result, item):
+    """Keep the OCR text of a processed page as an SGKDocument so it can be searched later.
+
+    Sets result['sgkDocumentId']; a failure to store never fails the upload.
+    """
+    if not SGKDocument or not result.get('entities') or os.getenv('SGK_STORE_OCR_TEXT', '1') == '0':
+        return
+    try:
+        patient_id = ((result.get('matched_patient') or {}).get('patient') or {}).get('id')
+        doc = SGKDocument.from_ocr_result(result, item.get('fileName'), patient_id=patient_id, page=item.get('page'))
+        db.session.add(doc)
+        db.session.commit()
+        result['sgkDocumentId'] = doc.id
+    except Exception as e:
+        db.session.rollback()
+        logger.warning('Failed to store OCR text for %s: %s', item.get('fileName'), e)
+
+
+def _upload_result(item, **fields):
+    result = {"fileName": item.get('fileName'), "savedPath": item.get('path')}
+    if item.get('page'):
+        result.update(page=item['page'], pageCount=item['pageCount'])
+    result.update(fields)
+    return result
+
+
+def _iter_upload_results(svc, entries):
+    """OCR + patient matching for uploaded files; yields (position, file result) as pages finish.
+
+    `entries` are {'fileName', 'data'} (in-memory upload) or {'fileName', 'path'}
+    (saved file) dicts for accepted files, or {'fileName', 'error'} for
+    rejected ones. PDFs are expanded into one result per page; positions
+    number the results in upload (and page) order.
+
+    Pages that are near-duplicates of a recently processed scan (or of an
+    earlier page in the same upload) are not OCR'd again; they get the earlier
+    result with a 'duplicateOf' reference (see services.ocr_dedupe).
+    """
+    return _iter_item_results(svc, _expand_pdfs(entries))
+
+
+def _iter_item_results(svc, items):
+    index = get_duplicate_index()
+    ready = collections.deque()  # (position, file result) settled without OCR
+    queued = []  # positions handed to OCR, in submission order
+    fingerprints = {}
+    copies = {}  # position of a page repeated within this upload -> (position of its first copy, similarity)
+    finished = {}
+
+    def sources():
+        for pos, item in enumerate(items):
+            if item.get('error'):
+                ready.append((pos, _upload_result(item, status="error", error=item['error'])))
+                continue
+            source = item.get('pdfPage') or item.get('path') or item.get('data')
+            # PDF pages are only rasterized in the pool, so there is no image to fingerprint here;
+            # a re-uploaded PDF is still answered from the OCR result cache
+            if index is not None and not item.get('pdfPage'):
+                with stage('dedupe'):
+                    fp = fingerprint(source)
+                    hit = index.find(fp, 'sgk_upload')
+                    first = None if hit else _first_copy(index, fingerprints, fp)
+                if hit:
+                    ref, result = hit
+                    record_ocr_cache('duplicate_hit')
+                    result['duplicateOf'] = ref
+                    ready.append((pos, _upload_result(item, status="processed", result=result)))
+                    continue
+                if first:
+                    copies[pos] = first
+                    continue
+                fingerprints[pos] = fp
+            queued.append(pos)
+            yield source
+
+    # Run OCR and NLP processing (auto_crop True for SGK docs) for all pages at once
+    for qpos, outcome in iter_process_files(list(sources())):
+        while ready:
+            yield ready.popleft()
+        pos = queued[qpos]
+        item = items[pos]
+        if isinstance(outcome, Exception):
+            finished[pos] = _upload_result(item, status="error", error=str(outcome))
+        else:
+            result = _match_patient(svc, outcome)
+            _store_document(result, item)
+            if index is not None and result.get('entities'):
+                index.add(fingerprints.get(pos), 'sgk_upload', result, item.get('fileName'))
+            finished[pos] = _upload_result(item, status="processed", result=result)
+        yield pos, finished[pos]
+    while ready:
+        yield ready.popleft()
+
+    retry = []
+    for pos, (first, score) in copies.items():
+        original = finished.get(first) or {}
+        doc_id = (original.get('result') or {}).get('documentId')
+        if not doc_id:
+            # The first copy failed or was not indexed; OCR this one on its own
+            retry.append(pos)
+            continue
+        result = copy.deepcopy(original['result'])
+        result['duplicateOf'] = {
+            "documentId": doc_id,
+            "fileName": original['fileName'],
+            "processedAt": datetime.now().isoformat(),
+            "similarity": round(score, 3)
+        }
+        record_ocr_cache('duplicate_hit')
+        yield pos, _upload_result(items[pos], status="processed", result=result)
+    if retry:
+        for rpos, result in _iter_item_results(svc, [items[pos] for pos in retry]):
+            yield retry[rpos], result
+
+
+def _process_upload_entries(svc, entries):
+    """_iter_upload_results collected into a list in upload (and page) order."""
+    results = {}
+    for pos, result in _iter_upload_results(svc, entries):
+        results[pos] = result
+    return [results[pos] for pos in sorted(results)]
+
+
+def _wants_stream(req):
+    if (req.args.get('stream') or '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'application/x-ndjson' in (req.headers.get('Accept') or '')
+
+
+def _stream_upload_results(svc, entries):
+    """NDJSON lines: each page's result as soon as it is done, then a summary line."""
+    count = 0
+    try:
+        for pos, result in _iter_upload_results(svc, entries):
+            count += 1
+            yield json.dumps(dict(result, index=pos), ensure_ascii=False, default=str) + '\n'
+        yield json.dumps({"done": True, "count": count, "timestamp": datetime.now().isoformat()}) + '\n'
+    except Exception as e:
+        logger.exception('Streaming upload error')
+        yield json.dumps({"done": True, "count": count, "error": str(e),
+                          "timestamp": datetime.now().isoformat()}) + '\n'
+
+
+def _run_sgk_upload(data):
+    """Job handler for asynchronous uploads; files live in the job storage dir."""
+    return {"files": _process_upload_entries(get_nlp_service(), data.get('files') or [])}
+
+
 @sgk_bp.route('/sgk/upload', methods=['POST'])
 def upload_and_process_files():
     """Accept multipart/form-data uploads under the 'files' field (multiple allowed).
-    Saves files to a secure temporary path, runs OCR (worker-first) with auto_crop=True
+    Reads each file into memory, runs OCR (worker-first) with auto_crop=True
     and returns per-file OCR results including patient_info.
+
+    The OCR + NLP stage of all files runs in parallel on a bounded process pool
+    (services.ocr_batch); patient DB matching stays in this request thread.
+    Results are returned in upload order and each file has its own timeout.
+    Images are decoded, cropped and resized in memory; a file is only written
+    when the out-of-process OCR worker needs a path.
+
+    PDFs are rasterized page by page at the OCR resolution (utils.pdf_pages)
+    inside the pool tasks, so pages render in parallel; each page gets its
+    own entry in 'files' with 'page' and 'pageCount'.
+
+    With ?stream=1 (or 'Accept: application/x-ndjson') the response is
+    newline-delimited JSON: one line per page as soon as it is done, with its
+    'index' in upload order, then a final {"done": true} line.
+
+    With ?async=1 (or an 'async' form field / 'Prefer: respond-async') the
+    files are kept in the job storage dir and 202 is returned with a job id;
+    the job result carries the same 'files' list.
     """
     try:
         # Basic file list validation
@@ -144,356 +670,47 @@ def upload_and_process_files():
         if len(files) > MAX_UPLOAD_FILES:
             return jsonify({"success": False, "error": f"Too many files. Max allowed is {MAX_UPLOAD_FILES}."}), 400
 
-        svc = get_nlp_service()
-        if svc is None:
-            svc = get_nlp_service()
-            try:
-                svc.initialize()
-            except Exception as e:
-                return jsonify({"success": False, "error": f"OCR init failed: {e}"}), 503
+        job_id = gen_id('ocrjob') if wants_async(request) else None
+        storage = job_storage_dir(job_id) if job_id else None
 
-        results = []
-        for f in files:
-            original_name = f.filename or 'unknown'
-
-            # Validate image-like file
-            if not _is_allowed_image(original_name, f.stream):
-                results.append({
-                    "fileName": original_name,
-                    "status": "error",
-                    "error": "Unsupported file type or not an image. Convert PDFs to images first."}
-                )
-                continue
+        entries = []
+        try:
+            for idx, f in enumerate(files):
+                original_name = f.filename or 'unknown'
 
-            # Save to temp file
-            suffix = os.path.splitext(original_name)[1] or '.jpg'
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix='sgk_upload_')
-            try:
                 f.stream.seek(0)
-                tmp.write(f.stream.read())
-                tmp.flush()
-                tmp.close()
+                data = f.stream.read()
 
-                # Run OCR and NLP processing (auto_crop True for SGK docs)
-                try:
-                    proc_result = svc.process_document(image_path=tmp.name, auto_crop=True)
+                # Validate image-like file or PDF
+                if not (_is_allowed_image(original_name, f.stream) or is_pdf(original_name, data)):
+                    entries.append({
+                        "fileName": original_name,
+                        "error": "Unsupported file type. Upload images or PDF documents."})
+                    continue
+                if not job_id:
+                    entries.append({"fileName": original_name, "data": data})
+                    continue
 
-                    # Fast route-level heuristic: look for 'Hasta Ad Soyad' label followed by a name entity
-                    patient_info = None
-                    try:
-                        ents = proc_result.get('entities') or []
-                        texts = [ (e.get('text') if isinstance(e, dict) else str(e)) for e in ents ]
-                        for idx, txt in enumerate(texts):
-                            low = (txt or '').lower()
-                            if 'hasta' in low and ('ad' in low or 'adı' in low or 'soyad' in low):
-                                # check following lines/entities for candidate name
-                                for j in range(idx+1, min(idx+4, len(texts))):
-                                    cand = (texts[j] or '').strip()
-                                    # clean candidate
-                                    cand_clean = ''.join([c for c in cand if c.isalpha() or c.isspace() or c == '-']).strip()
-                                    if len(cand_clean.split()) >= 2:
-                                        patient_info = {"name": cand_clean, "confidence": 0.9, "source": "label-adjacent"}
-                                        break
-                            if patient_info:
-                                break
-                    except Exception:
-                        patient_info = None
+                # Job mode: the file must outlive this request, keep it in the job's storage dir
+                suffix = '.pdf' if is_pdf(original_name, data) else (os.path.splitext(original_name)[1] or '.jpg')
+                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix='sgk_upload_', dir=storage)
+                entries.append({"fileName": original_name, "path": tmp.name})
+                tmp.write(data)
+                tmp.close()
 
-                    # If fast heuristic didn't find patient name, try service-level NER (HF/spaCy) using OCR text
-                    try:
-                        if not patient_info:
-                            ocr_text_lines = []
-                            for ent in proc_result.get('entities', []) or []:
-                                if isinstance(ent, dict) and 'text' in ent:
-                                    ocr_text_lines.append(str(ent['text']))
-                            ocr_text = '\n'.join(ocr_text_lines).strip() if ocr_text_lines else None
-                            if ocr_text:
-                                patient_info = svc.extract_patient_name(image_path=None, text=ocr_text)
-                            else:
-                                patient_info = svc.extract_patient_name(image_path=tmp.name, text=None)
-                        proc_result['patient_info'] = patient_info
-                    except Exception:
-                        proc_result['patient_info'] = None
+            if job_id:
+                job = submit_job('sgk_upload', {"files": entries}, job_id=job_id)
+                storage = None  # the job owns the files now
+                return job_response(job)
 
-                    # ----- NEW: server-side patient DB lookup using both TC partial (preferred) and name (fallback) -----
-                    try:
-                        # Extract TC partial from OCR entities/text
-                        def _apply_digit_ocr_corrections(s):
-                            """Conservative character-to-digit replacements for OCR numeric fixes.
-                            Only applied when we're extracting numeric substrings to avoid corrupting names.
-                            """
-                            if not s:
-                                return s
-                            try:
-                                # conservative mapping to avoid over-correction
-                                mapping = {
-                                    'O': '0', 'o': '0',
-                                    'I': '1', 'l': '1', 'İ': '1',
-                                    'S': '5', 's': '5',
-                                    'B': '8'
-                                }
-                                out = s
-                                for a, b in mapping.items():
-                                    out = out.replace(a, b)
-                                return out
-                            except Exception:
-                                return s
-
-                        def _extract_tc_partial(entities, joined_text=None):
-                            import re
-                            # Collect texts for windowed merging
-                            texts = [ (e.get('text') if isinstance(e, dict) else str(e) or '') for e in (entities or []) ]
-
-                            # 1) Direct patterns inside each entity
-                            for t in texts:
-                                if not t:
-                                    continue
-                                # full 11-digit
-                                m = re.search(r"(\d{11})", t) or re.search(r"(\d{11})", _apply_digit_ocr_corrections(t))
-                                if m:
-                                    return m.group(1)
-                                # masked like 3390159***** or 3390159**** (try corrected form too)
-                                m2 = re.search(r"(\d{5,11})\*+", t) or re.search(r"(\d{5,11})\*+", _apply_digit_ocr_corrections(t))
-                                if m2:
-                                    return m2.group(1)
-
-                            # 2) Merge adjacent entity texts (window) to handle OCR-split numbers
-                            max_window = 4
-                            for i in range(len(texts)):
-                                merged = ''.join(texts[i:i+max_window])
-                                # also try a corrected merged string
-                                merged_corr = _apply_digit_ocr_corrections(merged)
-                                merged_clean = re.sub(r'[^0-9*]', '', merged_corr)
-                                if not merged_clean:
-                                    continue
-                                m3 = re.search(r"(\d{5,11})\*+", merged_clean)
-                                if m3:
-                                    return m3.group(1)
-                                m4 = re.search(r"(\d{6,11})", merged_clean)
-                                if m4:
-                                    return m4.group(1)
-
-                            # 3) fallback: remove non-digits from joined_text and search
-                            if joined_text:
-                                # apply digit corrections to the full joined text as a last resort
-                                joined_corr = _apply_digit_ocr_corrections(joined_text or '')
-                                jt_clean = re.sub(r'[^0-9*]', '', joined_corr)
-                                if jt_clean:
-                                    m5 = re.search(r"(\d{5,11})\*+", jt_clean) or re.search(r"(\d{6,11})", jt_clean)
-                                    if m5:
-                                        return m5.group(1)
-
-                            return None
-
-                        joined_text_for_tc = '\n'.join([e.get('text') if isinstance(e, dict) and 'text' in e else str(e) for e in proc_result.get('entities') or []])
-                        tc_partial = _extract_tc_partial(proc_result.get('entities', []) or [], joined_text_for_tc)
-                        proc_result['tc_partial'] = tc_partial
-
-                        matched_patient = None
-                        match_details = None
-
-                        # If we have a TC partial, try to find patients whose tc_number contains it
-                        if tc_partial:
-                            try:
-                                # Normalize tc_partial to digits only (handle masked forms like 3390159*****)
-                                tc_partial_digits = ''.join([c for c in str(tc_partial or '') if c.isdigit()])
-                                if not tc_partial_digits:
-                                    # fallback to original if cleaning removed everything
-                                    tc_partial_digits = tc_partial
-                                # strip non-digits from stored tc_number and compare using digits-only substring
-                                q = db.session.query(Patient).filter(func.replace(func.coalesce(Patient.tc_number, ''), ' ', '').like(f"%{tc_partial_digits}%"))
-                                candidates = q.limit(10).all()
-                                # Normalize the extracted TC partial (remove masking asterisks) before comparing
-                                try:
-                                    tc_partial_clean = ''.join([c for c in str(tc_partial or '') if c.isdigit()])
-                                except Exception:
-                                    tc_partial_clean = tc_partial
-
-                                if len(candidates) == 1:
-                                    matched_patient = candidates[0]
-                                    match_details = {"method": "tc_partial", "reason": "unique tc substring match", "candidate_count": 1, "confidence": 0.99}
-                                elif len(candidates) > 1:
-                                    # If multiple, try to disambiguate using name (if available)
-                                    if patient_info and patient_info.get('name'):
-                                        name_text = patient_info.get('name')
-                                        # Prepare normalized name for comparisons
-                                        def _strip_diacritics_local(s):
-                                            import unicodedata
-                                            if not s:
-                                                return ''
-                                            nk = unicodedata.normalize('NFKD', s)
-                                            return ''.join([c for c in nk if not unicodedata.combining(c)])
-
-                                        # Clean and normalize the OCR-derived name
-                                        name_clean = ''.join([c for c in (name_text or '') if c.isalpha() or c.isspace() or c == '-']).strip()
-                                        name_clean = _strip_diacritics_local(name_clean).lower()
-
-                                        # compute similarity scores
-                                        best = None
-                                        best_score = 0.0
-                                        def _norm_str(s):
-                                            import unicodedata
-                                            if not s:
-                                                return ''
-                                            nk = unicodedata.normalize('NFKD', s)
-                                            return ''.join([c for c in nk if not unicodedata.combining(c)]).lower()
-
-                                        for cand in candidates:
-                                            cand_full = f"{cand.first_name} {cand.last_name}".strip()
-                                            # If normalized strings are identical, accept immediately (high-confidence exact match)
-                                            if _norm_str(cand_full) == name_clean:
-                                                best_score = 1.0
-                                                best = cand
-                                                break
-                                            sim = svc.calculate_similarity(text1=name_clean, text2=cand_full).get('similarity', 0.0)
-                                            if sim > best_score:
-                                                best_score = sim
-                                                best = cand
-                                        if best and best_score >= 0.75:
-                                            matched_patient = best
-                                            match_details = {"method": "tc_partial+name_disambiguation", "candidate_count": len(candidates), "similarity": float(best_score), "confidence": 0.95}
-                                        else:
-                                            match_details = {"method": "tc_partial", "candidate_count": len(candidates), "confidence": 0.5}
-                                    else:
-                                        match_details = {"method": "tc_partial", "candidate_count": len(candidates), "confidence": 0.5}
-                            except Exception:
-                                matched_patient = None
-
-                        # If no TC match, try name lookup
-                        if not matched_patient and patient_info and patient_info.get('name'):
-                            try:
-                                name_raw = patient_info.get('name')
-                                # Normalize name and split
-                                # Normalize and remove diacritics for robust matching
-                                def _strip_diacritics(s):
-                                    import unicodedata
-                                    if not s:
-                                        return ''
-                                    nkfd = unicodedata.normalize('NFKD', s)
-                                    return ''.join([c for c in nkfd if not unicodedata.combining(c)])
-
-                                name_clean_raw = ''.join([c for c in (name_raw or '') if c.isalpha() or c.isspace() or c=='-']).strip()
-                                name_clean = _strip_diacritics(name_clean_raw)
-                                parts = [p for p in name_clean.split() if p]
-                                candidates = []
-                                if len(parts) >= 2:
-                                    first_token = parts[0]
-                                    last_token = parts[-1]
-                                    # Build normalized SQL expressions for name fields (replace common Turkish diacritics)
-                                    def _sql_normalized(col):
-                                        # apply lower() and replace common Turkish characters with ascii equivalents
-                                        expr = func.lower(col)
-                                        for a,b in [("ç","c"),("ğ","g"),("ı","i"),("ö","o"),("ş","s"),("ü","u"),("İ","i")]:
-                                            expr = func.replace(expr, a, b)
-                                        return expr
-
-                                    candidates = db.session.query(Patient).filter(
-                                        _sql_normalized(Patient.first_name).ilike(f"{first_token.lower()}%"),
-                                        _sql_normalized(Patient.last_name).ilike(f"%{last_token.lower()}%")
-                                    ).limit(20).all()
-                                if not candidates:
-                                    # looser search: any token in first_name or last_name
-                                    token_filters = []
-                                    for t in parts:
-                                        nt = _strip_diacritics(t.lower())
-                                        token_filters.append(_sql_normalized(Patient.first_name).ilike(f"%{nt}%"))
-                                        token_filters.append(_sql_normalized(Patient.last_name).ilike(f"%{nt}%"))
-                                    if token_filters:
-                                        candidates = db.session.query(Patient).filter(or_(*token_filters)).limit(50).all()
-
-                                # Log candidate ids for debugging
-                                try:
-                                    logger.info('Name lookup candidates for "%s": %s', name_clean, [c.id for c in candidates])
-                                except Exception:
-                                    pass
-
-                                if candidates:
-                                    # If only one candidate returned by DB filters, auto-match immediately
-                                    if len(candidates) == 1:
-                                        matched_patient = candidates[0]
-                                        match_details = {"method": "name_match_single_candidate", "candidate_count": 1, "confidence": 0.90}
-                                        # attach and skip further similarity ranking
-                                    else:
-                                        # rank by similarity
-                                        best = None
-                                        best_score = 0.0
-                                        for cand in candidates:
-                                            cand_full = f"{cand.first_name} {cand.last_name}".strip()
-                                            # If normalized strings are identical, accept immediately (high-confidence exact match)
-                                            def _norm_str(s):
-                                                import unicodedata
-                                                if not s:
-                                                    return ''
-                                                nk = unicodedata.normalize('NFKD', s)
-                                                return ''.join([c for c in nk if not unicodedata.combining(c)]).lower()
-                                            if _norm_str(cand_full) == name_clean.lower():
-                                                best_score = 1.0
-                                                best = cand
-                                                try:
-                                                    logger.info('Exact normalized name match: %s == %s (patient id %s)', _norm_str(cand_full), name_clean.lower(), cand.id)
-                                                except Exception:
-                                                    pass
-                                                break
-                                            sim = svc.calculate_similarity(text1=name_clean, text2=cand_full).get('similarity', 0.0)
-                                            if sim > best_score:
-                                                best_score = sim
-                                                best = cand
-                                        try:
-                                            logger.info('Best name match score=%s for name=%s best=%s', best_score, name_clean, getattr(best,'id', None))
-                                        except Exception:
-                                            pass
-                                        # Lowered similarity threshold from 0.7 to 0.6 for higher recall in noisy OCR
-                                        if best and best_score >= 0.6:
-                                            matched_patient = best
-                                            match_details = {"method": "name_match", "similarity": float(best_score), "candidate_count": len(candidates), "confidence": float(0.8 + (best_score-0.6))}
-                                        else:
-                                            match_details = {"method": "name_match", "candidate_count": len(candidates), "confidence": 0.4}
-                                else:
-                                    match_details = {"method": "name_match", "candidate_count": 0, "confidence": 0.0}
-                            except Exception:
-                                match_details = {"method": "name_match", "candidate_count": 0, "confidence": 0.0}
-
-                        # Attach matched patient info (if any) to proc_result
-                        if matched_patient:
-                            try:
-                                proc_result['matched_patient'] = {
-                                    'patient': matched_patient.to_dict(),
-                                    'match_details': match_details
-                                }
-                            except Exception:
-                                # best-effort: expose id and name
-                                proc_result['matched_patient'] = {
-                                    'patient': {'id': getattr(matched_patient, 'id', None), 'fullName': f"{getattr(matched_patient,'first_name',None)} {getattr(matched_patient,'last_name',None)}"},
-                                    'match_details': match_details
-                                }
-                        else:
-                            proc_result['matched_patient'] = None
-                    except Exception:
-                        # If anything goes wrong, don't break the upload flow — return processing result without DB match
-                        proc_result['matched_patient'] = None
-                    # ----- END DB lookup block -----
+            if _wants_stream(request):
+                return Response(stream_with_context(_stream_upload_results(get_nlp_service(), entries)),
+                                mimetype='application/x-ndjson')
 
-                    results.append({
-                        "fileName": original_name,
-                        "savedPath": tmp.name,
-                        "status": "processed",
-                        "result": proc_result
-                    })
-                except Exception as e:
-                    logger.exception('OCR processing failed for %s', original_name)
-                    results.append({
-                        "fileName": original_name,
-                        "savedPath": tmp.name,
-                        "status": "error",
-                        "error": str(e)
-                    })
-            finally:
-                # Cleanup saved temp file - keep if you want audit, but remove to avoid disk growth
-                try:
-                    if os.path.exists(tmp.name):
-                        os.unlink(tmp.name)
-                except Exception:
-                    pass
+            results = _process_upload_entries(get_nlp_service(), entries)
+        finally:
+            if storage:
+                shutil.rmtree(storage, ignore_errors=True)
 
         return jsonify({"success": True, "files": results, "timestamp": datetime.now().isoformat()})
     except Exception as e:
@@ -501,13 +718,21 @@ def upload_and_process_files():
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
 
+register_handler('ocr_process', _run_ocr_process)
+register_handler('sgk_upload', _run_sgk_upload)
+
+
 @sgk_bp.route('/patients/<patient_id>/sgk-documents', methods=['GET'])
 def get_patient_sgk_documents(patient_id):
     try:
         patient = db.session.get(Patient, patient_id)
         if not patient:
             return jsonify({"success": False, "error": "Patient not found"}), 404
-        return jsonify({"success": True, "documents": [], "timestamp": datetime.now().isoformat()})
+        docs = []
+        if SGKDocument:
+            docs = [d.to_dict() for d in SGKDocument.query.filter_by(patient_id=patient_id)
+                    .order_by(SGKDocument.created_at.desc()).all()]
+        return jsonify({"success": True, "documents": docs, "timestamp": datetime.now().isoformat()})
     except Exception as e:
         logger.error(f"Get patient SGK docs error: {str(e)}")
         return jsonify({"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}), 500
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark the OCR pipeline over a directory of SGK document images.
+
+Runs `TurkishMedicalOCR.process_document` (auto-crop on, result cache off) on
+every image and reports p50/p95 latency per stage: decode, auto_crop, resize,
+preprocess, ocr, matcher, classification, patient_name and - with --match -
+patient_match against the configured database. Models are loaded before
+timing starts. Recognized lines and their mean confidence are reported too,
+so --preprocess selections (utils/image_preprocess.py) can be compared on
+accuracy as well as speed.
+
+Usage:
+  python scripts/benchmark_ocr.py ../../images --repeat 3 --output benchmarks/ocr_baseline.json
+  python scripts/benchmark_ocr.py ../../images --compare benchmarks/ocr_baseline.json
+  python scripts/benchmark_ocr.py ../../images --preprocess deskew,binarize --compare benchmarks/ocr_baseline.json
+
+--output writes a machine-readable baseline; --compare exits with status 1
+when any stage's p95 is more than --tolerance slower than the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# Every run must do the full work
+os.environ.setdefault('OCR_CACHE_ENABLED', '0')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.webp')
+STAGE_ORDER = ['decode', 'auto_crop', 'resize', 'preprocess', 'ocr', 'matcher', 'classification',
+               'process_document', 'patient_name', 'patient_match', 'total']
+# Stages faster than this are too noisy to flag as regressions
+MIN_COMPARE_MS = 5.0
+
+
+def find_images(directory):
+    return sorted(str(p) for p in Path(directory).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile (pct in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    pos = (len(ordered) - 1) * pct / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def summarize(samples):
+    """{stage: [seconds, ...]} -> {stage: {count, mean_ms, p50_ms, p95_ms}} in pipeline order."""
+    stages = sorted(samples, key=lambda s: (STAGE_ORDER.index(s) if s in STAGE_ORDER else len(STAGE_ORDER), s))
+    summary = {}
+    for name in stages:
+        ms = [v * 1000.0 for v in samples[name]]
+        if not ms:
+            continue
+        summary[name] = {
+            'count': len(ms),
+            'mean_ms': round(sum(ms) / len(ms), 2),
+            'p50_ms': round(percentile(ms, 50), 2),
+            'p95_ms': round(percentile(ms, 95), 2),
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """Return [(stage, baseline_p95, current_p95)] for stages slower than baseline by more than tolerance."""
+    regressions = []
+    for name, base in (baseline.get('stages') or {}).items():
+        current = summary.get(name)
+        if not current or base['p95_ms'] < MIN_COMPARE_MS:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1.0 + tolerance):
+            regressions.append((name, base['p95_ms'], current['p95_ms']))
+    return regressions
+
+
+def quality(results):
+    """Recognized lines per image and their mean confidence over a list of process_document results."""
+    confidences = [e['confidence'] for r in results for e in r.get('entities') or []
+                   if e.get('confidence') is not None]
+    return {
+        'lines_per_image': round(len(confidences) / len(results), 2) if results else 0.0,
+        'mean_confidence': round(sum(confidences) / len(confidences), 4) if confidences else None,
+    }
+
+
+def run(images, repeat, warmup, auto_crop, match, preprocess=None):
+    from services.ocr_service import TurkishMedicalOCR, collect_stage_timings, stage
+    from services.ocr_batch import extract_upload_patient_info
+
+    svc = TurkishMedicalOCR()
+    svc.initialize()
+    status = svc.prewarm()
+    print('Models:', {name: s['state'] for name, s in status.items()})
+
+    attach = None
+    if match:
+        from app import app
+        from routes.sgk import _match_patient
+        ctx = app.app_context()
+        ctx.push()
+        attach = _match_patient
+
+    def one(path):
+        with stage('total'):
+            result = svc.process_document(image_path=path, auto_crop=auto_crop, preprocess=preprocess)
+            with stage('patient_name'):
+                result['patient_info'] = extract_upload_patient_info(svc, result, path)
+            if attach:
+                attach(svc, result)
+        return result
+
+    for path in images[:warmup]:
+        one(path)
+
+    samples = {}
+    results = []
+    for _ in range(repeat):
+        for path in images:
+            with collect_stage_timings() as timings:
+                results.append(one(path))
+            for name, seconds in timings.items():
+                samples.setdefault(name, []).append(seconds)
+    return svc, samples, quality(results)
+
+
+def print_table(summary):
+    print(f"{'stage':<16}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}")
+    for name, row in summary.items():
+        print(f"{name:<16}{row['count']:>7}{row['mean_ms']:>11.1f}{row['p50_ms']:>11.1f}{row['p95_ms']:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the OCR pipeline per stage.')
+    parser.add_argument('images', help='Directory of fixture SGK images (searched recursively)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the image set')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed images processed first')
+    parser.add_argument('--no-auto-crop', action='store_true', help='Skip document auto-crop')
+    parser.add_argument('--preprocess', help="Clean-up steps before OCR, e.g. 'deskew,binarize' or 'none' "
+                                             "(default: the configured OCR_PREPROCESS* steps)")
+    parser.add_argument('--match', action='store_true', help='Also time patient matching against the database')
+    parser.add_argument('--output', help='Write the results as a JSON baseline file')
+    parser.add_argument('--compare', help='Baseline JSON to check for p95 regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    images = find_images(args.images)
+    if not images:
+        parser.error(f'No images found under {args.images}')
+    from utils.image_preprocess import parse_steps, preprocess_steps
+    try:
+        # process_document's default doc_type
+        steps = preprocess_steps('medical') if args.preprocess is None else parse_steps(args.preprocess)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.monotonic()
+    svc, samples, accuracy = run(images, max(1, args.repeat), max(0, args.warmup), not args.no_auto_crop,
+                                 args.match, preprocess=steps)
+    summary = summarize(samples)
+    print_table(summary)
+    print(f"preprocess: {','.join(steps) or 'none'}; {accuracy['lines_per_image']} lines/image, "
+          f"mean confidence {accuracy['mean_confidence']}")
+    print(f'{len(images)} images x {args.repeat} passes in {time.monotonic() - started:.1f}s')
+
+    report = {
+        'generatedAt': datetime.now().isoformat(),
+        'images': len(images),
+        'repeat': args.repeat,
+        'autoCrop': not args.no_auto_crop,
+        'preprocess': list(steps),
+        'quality': accuracy,
+        'pipeline': svc.pipeline_signature(),
+        'models': svc.component_status(),
+        'host': {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'stages': summary,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f'Baseline written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        regressions = compare(summary, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f'REGRESSION {name}: p95 {before:.1f} ms -> {after:.1f} ms')
+        before = (baseline.get('quality') or {}).get('mean_confidence')
+        if before is not None and accuracy['mean_confidence'] is not None:
+            print(f"mean confidence {before:.4f} -> {accuracy['mean_confidence']:.4f} "
+                  f"(baseline preprocess: {','.join(baseline.get('preprocess') or []) or 'none'})")
+        if regressions:
+            sys.exit(1)
+        print('No p95 regressions against', args.compare)
+
+
+if __name__ == '__main__':
+    main()
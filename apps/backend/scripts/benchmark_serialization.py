@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark list-endpoint serialization: to_dict() + the stdlib JSON provider
+against the serializer plans (models/serializers.py) + the orjson provider
+(utils/json_provider.py).
+
+For each of patients, devices, sales, inventory and appointments a page of
+--rows rows is written to an in-memory SQLite database and loaded back, then
+both paths time the three steps a list response goes through: building the
+row dicts, jsonify, and the response envelope pass (parse + re-serialize).
+
+Usage:
+  python scripts/benchmark_serialization.py --rows 200 --repeat 200
+  python scripts/benchmark_serialization.py --output benchmarks/serialization.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from models.appointment import Appointment
+from models.base import db
+from models.device import Device
+from models.enums import AppointmentStatus, DeviceCategory, DeviceSide, DeviceStatus, PatientStatus
+from models.inventory import Inventory
+from models.patient import Patient
+from models.sales import Sale
+from models import serializers
+from utils.json_provider import OrjsonProvider, orjson
+
+STEPS = ['serialize', 'jsonify', 'envelope', 'total']
+
+
+def make_rows(n):
+    """{model: [unsaved rows]} with every field the list endpoints return filled in."""
+    now = datetime(2026, 1, 1, 9, 0)
+    rows = {'patients': [], 'devices': [], 'sales': [], 'inventory': [], 'appointments': []}
+    for i in range(n):
+        rows['patients'].append(Patient(
+            id=f'pat_{i:05d}', tc_number=f'1{i:010d}', first_name='Ayşe', last_name=f'Yılmaz {i}',
+            phone=f'0532{i:07d}', email=f'hasta{i}@example.com', birth_date=now - timedelta(days=20000 + i),
+            gender='F', address_city='İstanbul', address_district='Kadıköy', address_full='Moda Cd. 1',
+            status=PatientStatus.ACTIVE, segment='customer', acquisition_type='walk-in', priority_score=i % 10,
+            tags=json.dumps(['vip', 'sgk'] if i % 2 else []),
+            sgk_info=json.dumps({'rightEarDevice': 'available', 'leftEarDevice': 'available'}),
+            created_at=now, updated_at=now))
+        rows['devices'].append(Device(
+            id=f'dev_{i:05d}', patient_id=f'pat_{i:05d}', serial_number=f'SN{i:08d}', brand='Phonak',
+            model='Audeo P90', device_type='RIC', category=DeviceCategory.HEARING_AID, ear=DeviceSide.LEFT,
+            status=DeviceStatus.ASSIGNED, trial_start_date=now, trial_end_date=now + timedelta(days=14),
+            warranty_start_date=now, warranty_end_date=now + timedelta(days=730), warranty_terms='2 yıl',
+            price=Decimal('45000.00'), notes='Deneme', created_at=now, updated_at=now))
+        rows['sales'].append(Sale(
+            id=f'sale_{i:05d}', patient_id=f'pat_{i:05d}', sale_date=now, list_price_total=Decimal('50000.00'),
+            total_amount=Decimal('45000.00'), discount_amount=Decimal('5000.00'), final_amount=Decimal('45000.00'),
+            paid_amount=Decimal('10000.00'), status='pending', payment_method='installment',
+            sgk_coverage=Decimal('3000.00'), patient_payment=Decimal('42000.00'), created_at=now, updated_at=now))
+        rows['inventory'].append(Inventory(
+            id=f'item_{i:05d}', name=f'Cihaz {i}', brand='Oticon', model='More 1', category='hearing_aid',
+            barcode=f'869{i:010d}', supplier='Demant', available_inventory=5, total_inventory=8, used_inventory=3,
+            reorder_level=2, available_serials=json.dumps([f'S{i}A', f'S{i}B']), features=json.dumps(['bluetooth']),
+            price=42000.0, direction='both', warranty=24, created_at=now, updated_at=now))
+        rows['appointments'].append(Appointment(
+            id=f'apt_{i:05d}', patient_id=f'pat_{i:05d}', clinician_id='usr_1', date=now, time='10:30',
+            duration=30, appointment_type='consultation', status=AppointmentStatus.SCHEDULED, notes='Kontrol',
+            created_at=now, updated_at=now))
+    return rows
+
+
+PLANS = {
+    'patients': (Patient, serializers.PATIENT),
+    'devices': (Device, serializers.DEVICE),
+    'sales': (Sale, serializers.SALE),
+    'inventory': (Inventory, serializers.INVENTORY),
+    'appointments': (Appointment, serializers.APPOINTMENT),
+}
+
+
+def time_path(objs, serialize, provider, repeat):
+    """Median milliseconds per step for one page (garbage collection off, as timeit does)."""
+    samples = {step: [] for step in STEPS}
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            _time_once(objs, serialize, provider, samples)
+    finally:
+        gc.enable()
+    return {step: round(statistics.median(values) * 1000, 3) for step, values in samples.items()}
+
+
+def _time_once(objs, serialize, provider, samples):
+    t0 = time.perf_counter()
+    data = serialize(objs)
+    t1 = time.perf_counter()
+    body = provider.response({'success': True, 'data': data, 'meta': {'total': len(data)}}).get_data()
+    t2 = time.perf_counter()
+    payload = provider.loads(body)
+    payload.update(requestId='bench', timestamp='2026-01-01T00:00:00Z')
+    provider.dumps(payload)
+    t3 = time.perf_counter()
+    for step, seconds in zip(STEPS, (t1 - t0, t2 - t1, t3 - t2, t3 - t0)):
+        samples[step].append(seconds)
+
+
+def run(rows, repeat):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    stdlib = DefaultJSONProvider(app)
+    fast = OrjsonProvider(app) if orjson is not None else stdlib
+    report = {}
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[model.__table__ for model, _ in PLANS.values()])
+        for name, objs in make_rows(rows).items():
+            db.session.add_all(objs)
+        db.session.commit()
+        db.session.expunge_all()
+        for name, (model, plan) in PLANS.items():
+            objs = model.query.limit(rows).all()
+            before = time_path(objs, lambda page: [obj.to_dict() for obj in page], stdlib, repeat)
+            after = time_path(objs, plan.many, fast, repeat)
+            report[name] = {
+                'to_dict_stdlib_ms': before,
+                'serializer_fast_json_ms': after,
+                'speedup': round(before['total'] / after['total'], 2) if after['total'] else None,
+            }
+    return report
+
+
+def print_table(report, rows):
+    print(f"{rows} rows per page, median ms (to_dict + stdlib -> serializer + {'orjson' if orjson else 'stdlib'})")
+    print(f"{'endpoint':<14}" + ''.join(f'{step:>22}' for step in STEPS) + f"{'speedup':>10}")
+    for name, entry in report.items():
+        before, after = entry['to_dict_stdlib_ms'], entry['serializer_fast_json_ms']
+        cells = ''.join(f"{before[s]:>10.2f} -> {after[s]:>7.2f}" for s in STEPS)
+        print(f'{name:<14}{cells}{entry["speedup"]:>9.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200, help='rows per page (default 200)')
+    parser.add_argument('--repeat', type=int, default=100, help='timed runs per path (default 100)')
+    parser.add_argument('--output', help='write the report as JSON to this path')
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat)
+    print_table(report, args.rows)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'repeat': args.repeat, 'orjson': orjson is not None,
+                       'python': platform.python_version(), 'results': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Rebuild full-text search index entries from the stored rows.
+
+The search indexes are created by the database migrations and kept current
+by mapper events; rows written around the ORM (bulk inserts, raw SQL,
+restores) are not indexed until this script is run. It never creates the
+index itself: run the migrations first.
+
+Usage:
+  python scripts/reindex_search.py                  # every index
+  python scripts/reindex_search.py --only patients
+"""
+import argparse
+import os
+import sys
+
+# Ensure backend package import works
+sys.path.insert(0, os.path.dirname(__file__) + '/..')
+
+from app import app
+from services.document_search import reindex_documents
+from services.patient_search import reindex_patients
+
+INDEXES = {
+    'documents': reindex_documents,
+    'patients': reindex_patients,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild full-text search index entries')
+    parser.add_argument('--only', choices=sorted(INDEXES), action='append',
+                        help='index to rebuild (repeatable, default: all)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        for name in args.only or INDEXES:
+            try:
+                count = INDEXES[name]()
+            except RuntimeError as e:
+                print(f'{name}: {e}')
+                return 1
+            print(f'{name}: {count} rows indexed')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Full-text search over the OCR text of SGK documents.
+
+The text of every `SGKDocument` (OCR lines, extracted entities, file name) is
+indexed in the database itself, so search stays a single indexed query as
+the table grows:
+
+* SQLite: an FTS5 table `sgk_documents_fts(document_id, body)`, ranked with
+  bm25(). Entries are keyed on the document id (an UNINDEXED column), never
+  on the rowid of `sgk_documents`: that table has a string primary key, so
+  a table rebuild (batch_alter_table, VACUUM) renumbers its rowids.
+* PostgreSQL: a `search_vector` tsvector column on `sgk_documents` with a
+  GIN index, ranked with ts_rank_cd().
+* Other databases fall back to an unranked LIKE scan.
+
+The FTS table / tsvector column is created by the
+20261016_add_sgk_documents_table migration; request paths never run DDL.
+Databases built with db.create_all() instead (the development bootstrap in
+app.py) get it from `create_search_index()`. Without it documents are stored
+unindexed and search uses the LIKE scan. The readiness check is shared with
+the patient search (services/search_index.py).
+
+Indexed text and queries are Turkish-folded (utils.fuzzy.fold) so
+'işitme' finds 'ISITME'. The index is written by mapper events in the same
+transaction as the document; rows inserted with bulk operations bypass the
+events and need `reindex_documents()` (scripts/reindex_search.py). Snippets
+are cut from the original text around the first match.
+
+Pages read through an accepted layout template (services/ocr_templates.py)
+only have their template regions OCR'd, so only that text is indexed; such
+documents are flagged `region_only` and searches for the rest of the page
+do not find them.
+"""
+import logging
+import re
+
+from sqlalchemy import event, text
+
+from models.base import db
+from models.sgk import SGKDocument
+from services.search_index import SearchIndex, column_exists, table_exists
+from utils.fuzzy import fold
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'sgk_documents_fts'
+SNIPPET_CHARS = 160
+MAX_QUERY_TERMS = 12
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    return _WORD_RE.findall(fold(query))[:MAX_QUERY_TERMS]
+
+
+class DocumentSearchIndex(SearchIndex):
+    label = 'SGK document'
+    backends = {'sqlite': 'fts5', 'postgresql': 'tsvector'}
+
+    def exists(self, conn, kind):
+        if kind == 'fts5':
+            return table_exists(conn, FTS_TABLE)
+        return column_exists(conn, 'sgk_documents', 'search_vector')
+
+    def build(self, conn, kind):
+        if kind == 'fts5':
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(document_id UNINDEXED, body, "
+                f"tokenize = 'unicode61 remove_diacritics 2')")
+        else:
+            conn.exec_driver_sql('ALTER TABLE sgk_documents ADD COLUMN search_vector tsvector')
+            conn.exec_driver_sql('CREATE INDEX ix_sgk_documents_search ON sgk_documents USING GIN (search_vector)')
+        _reindex(conn, kind)
+
+
+INDEX = DocumentSearchIndex()
+
+
+def ensure_search_index(bind=None):
+    """Search backend usable on this database: 'fts5', 'tsvector', or 'like' when the index is missing."""
+    return INDEX.ensure(bind)
+
+
+def create_search_index(bind=None):
+    """Create the migration's index on a database built by db.create_all() (see SearchIndex.create)."""
+    return INDEX.create(bind)
+
+
+def _write_index(connection, doc, kind, replace=True):
+    body = fold(doc.search_text())
+    if kind == 'fts5':
+        if replace:
+            connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE document_id = :id'), {'id': doc.id})
+        connection.execute(text(f'INSERT INTO {FTS_TABLE} (document_id, body) VALUES (:id, :body)'),
+                           {'id': doc.id, 'body': body})
+    elif kind == 'tsvector':
+        connection.execute(text("UPDATE sgk_documents SET search_vector = to_tsvector('simple', :body) WHERE id = :id"),
+                           {'body': body, 'id': doc.id})
+
+
+def reindex_documents(bind=None, batch_size=500):
+    """Rebuild the index entries of every document; returns the number indexed.
+
+    Maintenance only (scripts/reindex_search.py), e.g. after bulk inserts.
+    Raises RuntimeError when the migration has not created the index.
+    """
+    bind = bind if bind is not None else db.engine
+    kind = ensure_search_index(bind)
+    if kind == 'like':
+        raise RuntimeError('SGK document search index does not exist; run the database migrations first')
+    with bind.begin() as conn:
+        return _reindex(conn, kind, batch_size)
+
+
+def _reindex(conn, kind, batch_size=500):
+    if kind == 'fts5':
+        conn.exec_driver_sql(f'DELETE FROM {FTS_TABLE}')
+    count = 0
+    last_id = ''
+    while True:
+        rows = conn.execute(text('SELECT id, filename, ocr_text, entities FROM sgk_documents '
+                                 'WHERE id > :last ORDER BY id LIMIT :n'),
+                            {'last': last_id, 'n': batch_size}).fetchall()
+        if not rows:
+            return count
+        for row in rows:
+            _write_index(conn, SGKDocument(id=row.id, filename=row.filename, ocr_text=row.ocr_text,
+                                           entities=row.entities), kind, replace=False)
+        count += len(rows)
+        last_id = rows[-1].id
+
+
+@event.listens_for(SGKDocument, 'after_insert')
+def _index_new_document(mapper, connection, target):
+    # A new id has no entry to replace (and document_id is not indexed, so looking costs a scan)
+    _index_document(connection, target, replace=False)
+
+
+@event.listens_for(SGKDocument, 'after_update')
+def _index_changed_document(mapper, connection, target):
+    _index_document(connection, target)
+
+
+def _index_document(connection, target, replace=True):
+    try:
+        kind = ensure_search_index(connection)
+        if kind != 'like':
+            _write_index(connection, target, kind, replace)
+    except Exception as e:
+        # Search may lag behind; the document itself is still saved
+        logger.warning('Failed to index SGK document %s: %s', target.id, e)
+
+
+@event.listens_for(SGKDocument, 'before_delete')
+def _unindex_document(mapper, connection, target):
+    try:
+        if ensure_search_index(connection) != 'fts5':
+            return
+        connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE document_id = :id'), {'id': target.id})
+    except Exception as e:
+        logger.warning('Failed to unindex SGK document %s: %s', target.id, e)
+
+
+def snippet(value, terms, width=SNIPPET_CHARS):
+    """Window of `value` around the first matched term, matches wrapped in <mark>."""
+    value = value or ''
+    folded = fold(value)
+    if len(folded) != len(value):
+        value = folded  # offsets would not line up; show the folded text
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(t) for t in terms) + r')\w*')
+    first = pattern.search(folded)
+    lo = max(0, first.start() - width // 3) if first else 0
+    hi = min(len(value), lo + width)
+    out = []
+    pos = lo
+    for m in pattern.finditer(folded, lo, hi):
+        out.append(value[pos:m.start()])
+        out.append('<mark>' + value[m.start():m.end()] + '</mark>')
+        pos = m.end()
+    out.append(value[pos:hi])
+    prefix = '…' if lo > 0 else ''
+    suffix = '…' if hi < len(value) else ''
+    return prefix + ' '.join(''.join(out).split()) + suffix
+
+
+def search_documents(query, limit=20, offset=0, patient_id=None, document_type=None):
+    """Ranked documents matching every term of `query` (the last one as a prefix).
+
+    Returns (total, [(SGKDocument, score, snippet)]).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return 0, []
+    kind = ensure_search_index()
+    params = {'limit': limit, 'offset': offset}
+    filters = ''
+    if patient_id:
+        filters += ' AND d.patient_id = :patient_id'
+        params['patient_id'] = patient_id
+    if document_type:
+        filters += ' AND d.document_type = :document_type'
+        params['document_type'] = document_type
+
+    if kind == 'fts5':
+        # Quoted terms, the last one as a prefix so results show up while typing
+        params['q'] = ' '.join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+        base = (f'FROM {FTS_TABLE} JOIN sgk_documents d ON d.id = {FTS_TABLE}.document_id '
+                f'WHERE {FTS_TABLE} MATCH :q{filters}')
+        rank_sql = f'SELECT d.id, -bm25({FTS_TABLE}) AS score {base} ORDER BY score DESC LIMIT :limit OFFSET :offset'
+    elif kind == 'tsvector':
+        params['q'] = ' & '.join(terms[:-1] + [terms[-1] + ':*'])
+        base = f"FROM sgk_documents d WHERE d.search_vector @@ to_tsquery('simple', :q){filters}"
+        rank_sql = (f"SELECT d.id, ts_rank_cd(d.search_vector, to_tsquery('simple', :q)) AS score {base} "
+                    f"ORDER BY score DESC LIMIT :limit OFFSET :offset")
+    else:
+        like = []
+        for i, t in enumerate(terms):
+            params[f't{i}'] = f'%{t}%'
+            like.append(f'lower(d.ocr_text) LIKE :t{i}')
+        base = f"FROM sgk_documents d WHERE {' AND '.join(like)}{filters}"
+        rank_sql = f'SELECT d.id, 0 AS score {base} ORDER BY d.created_at DESC LIMIT :limit OFFSET :offset'
+
+    total = db.session.execute(text(f'SELECT count(*) {base}'), params).scalar() or 0
+    ranked = db.session.execute(text(rank_sql), params).fetchall()
+    docs = {d.id: d for d in SGKDocument.query.filter(SGKDocument.id.in_([r.id for r in ranked])).all()}
+    return total, [(docs[r.id], float(r.score), snippet(docs[r.id].ocr_text, terms))
+                   for r in ranked if r.id in docs]
@@ -0,0 +1,478 @@
+"""Parallel per-file OCR + NLP for multi-page SGK uploads.
+
+The OCR/NLP stage of each uploaded page runs in a bounded process pool so a
+10-page batch takes roughly as long as its slowest page instead of the sum of
+all pages. Child processes are started with the 'spawn' method (never fork the
+Flask process with its DB connections and threads), load the OCR/NLP service
+once and then serve pages until the pool is shut down. The pool belongs to the
+process and is shared by every upload it serves (request threads and the
+'sgk_upload' job consumer alike): a page leases an idle child, sends it the
+work over the child's own pipe and returns it afterwards. Database work stays in
+the caller's thread. OCR metrics recorded in a child (stage latencies, cache
+lookups, fallbacks, failures) travel back with the page's outcome and are
+recorded in the parent, whose registry /metrics serves; the parent itself
+counts the pages running in children as in flight and reports the children
+as worker pool slots ('sgk_upload').
+
+Configuration (environment variables):
+
+    SGK_UPLOAD_WORKERS        pool size (default 2); 0/1 runs pages inline
+    SGK_UPLOAD_FILE_TIMEOUT   seconds a single page may take once a child (or the inline
+                              thread) has started it (default 180)
+
+Sizing: every child holds its own OCR/NLP models (roughly 1-1.5 GB resident
+with PaddleOCR and the NER models loaded) and every Flask worker process has
+its own pool, so the total is SGK_UPLOAD_WORKERS x web workers children. Start
+from (free memory / per-child memory) / web workers and keep it at or below
+the CPU count per host; more children than cores only adds contention.
+
+A page's time starts when a child picks it up, so pages waiting for a child
+behind other uploads never time out. A page that runs out of time cannot be
+cancelled, so only the child running it is killed (and replaced on the next
+lease); pages of other uploads, on other children, are not affected. Inline
+pages run in a helper thread with the same time budget; a thread cannot be
+killed, so a timed-out inline page finishes in the background and its result
+is dropped.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.env import env_int
+from utils.metrics import set_ocr_worker_pool, track_ocr_in_flight
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class FileTimeoutError(RuntimeError):
+    """Raised (as a per-file outcome) when a page exceeds its time budget."""
+
+
+def pool_size():
+    return max(0, env_int('SGK_UPLOAD_WORKERS', 2))
+
+
+def file_timeout():
+    return max(1, env_int('SGK_UPLOAD_FILE_TIMEOUT', 180))
+
+
+def _init_child():
+    # Each child keeps its own persistent PaddleOCR worker; one is enough per child.
+    # Models are loaded by the first task that needs them (see process_upload).
+    os.environ['OCR_WORKER_POOL_SIZE'] = '1'
+
+
+def _child_main(conn):
+    """Pool child: run (task, source) messages until the parent sends None or goes away."""
+    _init_child()
+    conn.send('ready')
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        task, source = message
+        reply = _run_captured(task, source)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or the exception does not pickle; report that instead
+            conn.send((None, reply[1], RuntimeError(f'Unpicklable OCR outcome: {type(e).__name__}: {e}')))
+
+
+class _Child:
+    """One pool process and the parent's end of its pipe."""
+
+    def __init__(self, startup_timeout):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_child_main, args=(child_conn,), name='ocr-batch-child')
+        self.process.start()
+        child_conn.close()
+        try:
+            ready = self.conn.poll(startup_timeout) and self.conn.recv() == 'ready'
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.kill()
+            raise RuntimeError('OCR worker process failed to start')
+
+    def run(self, task, source, timeout):
+        """Hand one page to the child; its reply, FileTimeoutError after `timeout` seconds.
+
+        EOFError / OSError mean the child died.
+        """
+        self.conn.send((task, source))
+        if not self.conn.poll(timeout):
+            raise FileTimeoutError(f'OCR processing timed out after {timeout}s')
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(1)
+        except Exception:
+            pass
+        self.kill()
+
+    def kill(self):
+        try:
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(1)
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class _PagePool:
+    """Up to `size` children, leased to one page at a time and started on demand."""
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._count = 0  # children alive, idle or leased
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """An idle child, waiting for one when all `size` are leased."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('OCR process pool is shut down')
+                if self._idle:
+                    child = self._idle.pop()
+                    self._report()
+                    return child
+                if self._count < self.size:
+                    self._count += 1
+                    self._report()
+                    break
+                self._cond.wait()
+        try:
+            return _Child(file_timeout())
+        except Exception:
+            with self._cond:
+                self._count -= 1
+                self._report()
+                self._cond.notify()
+            raise
+
+    def release(self, child, reuse=True):
+        """Return a leased child; `reuse=False` kills it (stuck on a timed-out page, or dead)."""
+        with self._cond:
+            reuse = reuse and not self._closed
+            if reuse:
+                self._idle.append(child)
+            else:
+                self._count -= 1
+            self._report()
+            self._cond.notify()
+        if not reuse:
+            child.kill()
+
+    def _report(self):
+        # Called with the lock held; children being started count as busy
+        set_ocr_worker_pool(self._count - len(self._idle), len(self._idle), pool='sgk_upload')
+
+    def close(self):
+        """Stop the idle children; leased ones are killed when they are released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._report()
+            self._cond.notify_all()
+        for child in idle:
+            child.stop()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _PagePool(pool_size())
+    return _pool
+
+
+def _reset_pool():
+    """Shut the pool down; the next batch starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def shutdown():
+    _reset_pool()
+
+
+atexit.register(shutdown)
+
+
+def extract_upload_patient_info(svc, proc_result, image_path=None):
+    """Find the patient name for an uploaded SGK page.
+
+    Uses the name field read by template region OCR when the page matched a
+    layout template, then a fast label-adjacent heuristic ('Hasta Ad Soyad'
+    followed by a name line), and falls back to the service-level NER
+    (HF/spaCy) over the OCR text.
+    """
+    name_field = (proc_result.get('fields') or {}).get('patient_name')
+    if name_field:
+        return {"name": name_field['value'], "confidence": name_field['confidence'], "source": "template"}
+
+    patient_info = None
+    try:
+        ents = proc_result.get('entities') or []
+        texts = [(e.get('text') if isinstance(e, dict) else str(e)) for e in ents]
+        for idx, txt in enumerate(texts):
+            low = (txt or '').lower()
+            if 'hasta' in low and ('ad' in low or 'adı' in low or 'soyad' in low):
+                # check following lines/entities for candidate name
+                for j in range(idx + 1, min(idx + 4, len(texts))):
+                    cand = (texts[j] or '').strip()
+                    # clean candidate
+                    cand_clean = ''.join([c for c in cand if c.isalpha() or c.isspace() or c == '-']).strip()
+                    if len(cand_clean.split()) >= 2:
+                        patient_info = {"name": cand_clean, "confidence": 0.9, "source": "label-adjacent"}
+                        break
+            if patient_info:
+                break
+    except Exception:
+        patient_info = None
+
+    if patient_info:
+        return patient_info
+
+    try:
+        ocr_text_lines = []
+        for ent in proc_result.get('entities', []) or []:
+            if isinstance(ent, dict) and 'text' in ent:
+                ocr_text_lines.append(str(ent['text']))
+        ocr_text = '\n'.join(ocr_text_lines).strip() if ocr_text_lines else None
+        if ocr_text:
+            return svc.extract_patient_name(image_path=None, text=ocr_text)
+        return svc.extract_patient_name(image_path=image_path, text=None)
+    except Exception:
+        return None
+
+
+def _run_captured(task, source):
+    """Pool-side wrapper: run `task` and return (result, metric events, exception) to the parent."""
+    from utils.metrics import capture_metrics
+    with capture_metrics() as events:
+        try:
+            return task(source), events, None
+        except Exception as e:
+            return None, events, e
+
+
+def _unwrap(reply):
+    """Parent side of _run_captured: record the child's metrics, then return its result or raise its error."""
+    from utils.metrics import replay_metrics
+    result, events, error = reply
+    replay_metrics(events)
+    if error is not None:
+        raise error
+    return result
+
+
+def _describe(source):
+    return f'<{len(source)} bytes>' if isinstance(source, (bytes, bytearray)) else source
+
+
+class PdfPage:
+    """One page of a PDF (its path or bytes) rasterized by the task that OCRs it.
+
+    Pages are rendered in the pool children, in parallel, instead of one
+    after another in the request thread; the rendered page is already flat
+    and upright, so it is not auto-cropped.
+    """
+    __slots__ = ('source', 'page_no')
+
+    def __init__(self, source, page_no):
+        self.source = source
+        self.page_no = page_no
+
+    def __getstate__(self):
+        return self.source, self.page_no
+
+    def __setstate__(self, state):
+        self.source, self.page_no = state
+
+    def __repr__(self):
+        return f'<PDF page {self.page_no + 1} of {_describe(self.source)}>'
+
+    def render(self):
+        """PNG bytes of the page at the OCR resolution (see utils.pdf_pages)."""
+        from services.ocr_service import OCR_MAX_SIDE
+        from utils.pdf_pages import open_pdf, render_page
+        doc = open_pdf(self.source)
+        try:
+            return render_page(doc, self.page_no, OCR_MAX_SIDE)
+        finally:
+            doc.close()
+
+
+def process_upload(source):
+    """OCR + NLP stage for one uploaded page (runs in a pool child or inline).
+
+    `source` is either a file path, the uploaded file's bytes or a PdfPage
+    (rendered here first); bytes are decoded in memory so no temp file is
+    needed unless the OCR worker runs out of process. Returns the
+    process_document result with 'patient_info' attached.
+    """
+    from services.ocr_service import get_nlp_service, stage
+    svc = get_nlp_service()
+    if not svc.initialized:
+        svc.initialize()
+    # SGK device reports use region OCR when the page matches the layout template
+    if isinstance(source, PdfPage):
+        with stage('pdf_render'):
+            page = source.render()
+        proc_result = svc.process_document(image_bytes=page, flat_page=True, doc_type='sgk_device_report')
+        image_path = None
+    elif isinstance(source, (bytes, bytearray)):
+        proc_result = svc.process_document(image_bytes=bytes(source), auto_crop=True, doc_type='sgk_device_report')
+        image_path = None
+    else:
+        proc_result = svc.process_document(image_path=source, auto_crop=True, doc_type='sgk_device_report')
+        image_path = source
+    proc_result['patient_info'] = extract_upload_patient_info(svc, proc_result, image_path)
+    return proc_result
+
+
+def process_files(paths, task=process_upload, timeout=None):
+    """Run `task` for every path (or bytes payload) and return outcomes in input order.
+
+    Each outcome is either the task's return value or the exception it raised
+    (FileTimeoutError when the page ran out of time), so one bad scan never
+    fails the whole batch. Every page gets `timeout` seconds from the moment
+    a child (or the inline thread) starts it; time spent waiting for a free
+    child does not count.
+    """
+    paths = list(paths)
+    outcomes = [None] * len(paths)
+    for idx, outcome in iter_process_files(paths, task=task, timeout=timeout):
+        outcomes[idx] = outcome
+    return outcomes
+
+
+def iter_process_files(sources, task=process_upload, timeout=None):
+    """Like process_files, but yield (position, outcome) as soon as each page finishes.
+
+    `sources` may be a lazy iterable: every source is handed to the pool as
+    soon as it is produced, so OCR of the first pages overlaps producing the
+    later ones. A source that is an
+    exception instance (a page that could not be produced) is yielded as its
+    own outcome.
+    """
+    timeout = timeout or file_timeout()
+    workers = pool_size()
+    if workers <= 1 or (isinstance(sources, (list, tuple)) and len(sources) <= 1):
+        for idx, source in enumerate(sources):
+            if isinstance(source, Exception):
+                yield idx, source
+                continue
+            try:
+                yield idx, _run_inline(task, source, timeout)
+            except FileTimeoutError as e:
+                logger.warning('OCR processing timed out for %s', _describe(source))
+                yield idx, e
+            except Exception as e:
+                logger.exception('OCR processing failed for %s', _describe(source))
+                yield idx, e
+        return
+
+    pool = _get_pool()
+    # One dispatch thread per page in flight, at most one page per pool child
+    dispatch = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-batch')
+    running = {}  # future -> position
+
+    def collect(block):
+        if not running:
+            return
+        if block:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        else:
+            done = [f for f in running if f.done()]
+        for future in done:
+            yield running.pop(future), future.result()
+
+    try:
+        for idx, source in enumerate(sources):
+            if isinstance(source, Exception):
+                yield idx, source
+            else:
+                running[dispatch.submit(_run_page, pool, task, source, timeout)] = idx
+            yield from collect(block=False)
+        while running:
+            yield from collect(block=True)
+    finally:
+        # Pages not started yet are dropped when the caller stops early
+        dispatch.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_page(pool, task, source, timeout):
+    """Run one page on a leased child; returns the task's result or the exception it ended with."""
+    try:
+        child = pool.acquire()
+    except Exception as e:
+        logger.error('No OCR worker process for %s: %s', _describe(source), e)
+        return e
+    reuse = False
+    # The child's own in-flight gauge is never scraped; count the page here
+    track_ocr_in_flight(1)
+    try:
+        reply = child.run(task, source, timeout)
+        reuse = True
+    except FileTimeoutError as e:
+        logger.warning('OCR processing timed out for %s', _describe(source))
+        return e
+    except (EOFError, OSError) as e:
+        logger.error('OCR worker process died while processing %s: %s', _describe(source), e)
+        return RuntimeError('OCR worker process crashed')
+    finally:
+        track_ocr_in_flight(-1)
+        pool.release(child, reuse)
+    try:
+        return _unwrap(reply)
+    except Exception as e:
+        logger.warning('OCR processing failed for %s: %s', _describe(source), e)
+        return e
+
+
+def _run_inline(task, source, timeout):
+    """`task(source)` in a helper thread; FileTimeoutError after `timeout` seconds.
+
+    A thread cannot be stopped: a page that runs out of time keeps running in
+    the background until it returns, and its result is dropped.
+    """
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = task(source)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, name='ocr-inline-page', daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise FileTimeoutError(f'OCR processing timed out after {timeout}s')
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
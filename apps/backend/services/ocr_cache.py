@@ -0,0 +1,192 @@
+"""Content-addressed cache for `TurkishMedicalOCR.process_document` results.
+
+Keys are the SHA-256 of the image bytes combined with the pipeline options
+(auto_crop, doc_type) and the pipeline signature (loaded model versions), so
+re-uploads and client retries of the same scan skip OCR and NER entirely,
+while a model change never serves stale output.
+
+Two tiers: a per-process LRU of serialized results and a shared on-disk tier
+(one JSON file per key) bounded by total size; the least recently used files
+are evicted first. Configuration (environment variables):
+
+    OCR_CACHE_ENABLED        0 disables the cache (default 1)
+    OCR_CACHE_MEMORY_ITEMS   in-memory LRU capacity (default 256)
+    OCR_CACHE_DIR            disk tier location (default instance/ocr_cache)
+    OCR_CACHE_DISK_MB        disk tier size limit, 0 disables the disk tier (default 512)
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from utils.env import env_int
+from utils.metrics import record_ocr_cache
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bytes_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(image_digest, **options):
+    """Combine an image digest with the options that influence the result."""
+    opts = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256(f'{image_digest}|{opts}'.encode('utf-8')).hexdigest()
+
+
+class OCRResultCache:
+    """Two-tier (memory LRU + size-bounded disk) cache of JSON-serializable results."""
+
+    def __init__(self, memory_items=None, disk_dir=None, disk_max_bytes=None):
+        self.memory_items = max(0, memory_items if memory_items is not None else env_int('OCR_CACHE_MEMORY_ITEMS', 256))
+        if disk_max_bytes is None:
+            disk_max_bytes = env_int('OCR_CACHE_DISK_MB', 512) * 1024 * 1024
+        self.disk_max_bytes = max(0, disk_max_bytes)
+        default_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'ocr_cache'))
+        self.disk_dir = disk_dir or os.getenv('OCR_CACHE_DIR', default_dir)
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # computed lazily on first write
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _remember(self, key, raw):
+        if not self.memory_items:
+            return
+        with self._lock:
+            self._memory[key] = raw
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return a fresh copy of the cached value, or None."""
+        with self._lock:
+            raw = self._memory.get(key)
+            if raw is not None:
+                self._memory.move_to_end(key)
+        if raw is not None:
+            self._count('memory_hits')
+            record_ocr_cache('memory_hit')
+            return json.loads(raw)
+
+        if self.disk_max_bytes:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    raw = fh.read()
+                value = json.loads(raw)
+                # Touch so size-based eviction drops least recently used entries first
+                os.utime(path, None)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self._remember(key, raw)
+                self._count('disk_hits')
+                record_ocr_cache('disk_hit')
+                return value
+
+        self._count('misses')
+        record_ocr_cache('miss')
+        return None
+
+    def put(self, key, value):
+        try:
+            raw = json.dumps(value, ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as e:
+            logger.debug('OCR result not cacheable: %s', e)
+            return
+        self._remember(key, raw)
+        self._count('stores')
+        if not self.disk_max_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers (other workers) never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                fh.write(raw)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning('Failed to write OCR cache entry: %s', e)
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(raw.encode('utf-8'))
+            over = self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop least recently used files until the disk tier is under 90% of its limit."""
+        entries = []
+        total = 0
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total > self.disk_max_bytes:
+            target = int(self.disk_max_bytes * 0.9)
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self._count('evictions')
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['memory_items'] = len(self._memory)
+            data['disk_bytes'] = self._disk_bytes
+        return data
+
+
+def get_ocr_cache():
+    """Return the process-wide cache, or None when disabled (OCR_CACHE_ENABLED=0)."""
+    global _cache
+    if os.getenv('OCR_CACHE_ENABLED', '1') == '0':
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OCRResultCache()
+    return _cache
@@ -0,0 +1,254 @@
+"""Near-duplicate detection for uploaded scans, checked before OCR.
+
+Clinics often scan the same report twice or photograph it again from a
+slightly different angle. Such copies have different bytes, so the
+content-addressed result cache (services.ocr_cache) misses them. Every
+processed page is fingerprinted here instead: the auto-cropped page is
+normalized to a small grayscale image and reduced to a 64-bit dHash and a
+64-bit pHash, kept in a bounded in-memory index together with the result.
+
+Forms that share a layout (two patients' SGK reports) hash as close as two
+photos of the same report, so a hash match is only a candidate: the pages are
+aligned (ECC homography) and compared tile by tile with normalized
+cross-correlation, and the previous result is reused only when every inked
+tile agrees. A rejected candidate just means the page is OCR'd as usual.
+
+Configuration (environment variables):
+
+    OCR_DEDUP_ENABLED        0 disables duplicate detection (default 1)
+    OCR_DEDUP_ITEMS          recently processed pages kept in the index (default 128)
+    OCR_DEDUP_MAX_AGE        seconds a processed page stays reusable (default 86400)
+    OCR_DEDUP_MAX_DISTANCE   hash distance (bits of 64) for a candidate (default 12)
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from models.base import gen_id
+from utils.env import env_int
+
+try:
+    import cv2
+except Exception:  # pragma: no cover - OpenCV is optional for API-only deployments
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+# Pages are compared as A4-shaped grayscale images of this size
+PAGE_SIZE = (384, 543)
+# Tile size / stride (pixels) and minimum tile NCC for the verification step
+TILE = 36
+MIN_TILE_CORRELATION = 0.85
+# Below this ECC correlation the pages could not be aligned
+MIN_ALIGNMENT = 0.9
+# Candidates verified per lookup, most recent first (rescans usually follow the original)
+MAX_VERIFY = 4
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _bits(values):
+    return np.packbits(values.astype(np.uint8)).view('>u8')[0].astype(np.uint64)
+
+
+def dhash(page):
+    small = cv2.resize(page, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _bits((small[:, 1:] > small[:, :-1]).ravel())
+
+
+def phash(page):
+    small = cv2.resize(page, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return _bits(low > np.median(low[1:]))
+
+
+def hamming(hashes, value):
+    """Bit distance between each uint64 in `hashes` and `value`."""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class PageFingerprint:
+    """Normalized page image plus its perceptual hashes."""
+
+    def __init__(self, page):
+        self.page = page
+        self.dhash = dhash(page)
+        self.phash = phash(page)
+
+    def similarity(self, other):
+        """Lowest tile correlation of the two pages once aligned, or None if they do not align.
+
+        ECC can settle in a poor local optimum depending on which page is the
+        reference, so the reverse alignment is tried before giving up.
+        """
+        score = _aligned_correlation(self.page, other.page)
+        if score is None or score < MIN_TILE_CORRELATION:
+            reverse = _aligned_correlation(other.page, self.page)
+            if reverse is not None and (score is None or reverse > score):
+                score = reverse
+        return score
+
+
+def _aligned_correlation(ref_page, page):
+    ref = ref_page.astype(np.float32) / 255.0
+    img = page.astype(np.float32) / 255.0
+    width, height = PAGE_SIZE
+    half = (width // 2, height // 2)
+    warp = np.eye(3, dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+    try:
+        # Estimate the alignment at half size, then scale it up
+        alignment, warp = cv2.findTransformECC(
+            cv2.GaussianBlur(cv2.resize(ref, half, interpolation=cv2.INTER_AREA), (0, 0), 2),
+            cv2.GaussianBlur(cv2.resize(img, half, interpolation=cv2.INTER_AREA), (0, 0), 2),
+            warp, cv2.MOTION_HOMOGRAPHY, criteria, None, 5)
+    except cv2.error:
+        return None
+    if alignment < MIN_ALIGNMENT:
+        return None
+    scale = np.diag([2.0, 2.0, 1.0]).astype(np.float32)
+    warp = scale @ warp @ np.linalg.inv(scale)
+    aligned = cv2.warpPerspective(img, warp, PAGE_SIZE, flags=cv2.INTER_LINEAR + cv2.WARP_INVERSE_MAP)
+
+    ref = cv2.GaussianBlur(ref, (0, 0), 1)
+    aligned = cv2.GaussianBlur(aligned, (0, 0), 1)
+    worst = 1.0
+    step = TILE // 2
+    for y in range(0, height - TILE + 1, step):
+        for x in range(0, width - TILE + 1, step):
+            a = ref[y:y + TILE, x:x + TILE]
+            b = aligned[y:y + TILE, x:x + TILE]
+            sa, sb = a.std(), b.std()
+            if sa < 0.05 and sb < 0.05:
+                continue  # blank paper on both pages
+            corr = float(((a - a.mean()) * (b - b.mean())).mean() / (sa * sb + 1e-6))
+            worst = min(worst, corr)
+    return worst
+
+
+def fingerprint(source):
+    """Fingerprint an image path or encoded image bytes; None if it cannot be decoded."""
+    if cv2 is None:
+        return None
+    from utils.document_scanner import crop_document
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            buf = np.frombuffer(bytes(source), dtype=np.uint8)
+            image = cv2.imdecode(buf, cv2.IMREAD_REDUCED_COLOR_2) if buf.size else None
+        else:
+            image = cv2.imread(source, cv2.IMREAD_REDUCED_COLOR_2)
+    except Exception:
+        image = None
+    if image is None:
+        return None
+    page = crop_document(image, max_side=PAGE_SIZE[1] * 2, mode='fast')
+    if page is None:
+        page = image
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    return PageFingerprint(cv2.resize(gray, PAGE_SIZE, interpolation=cv2.INTER_AREA))
+
+
+class DuplicateIndex:
+    """Recently processed pages per scope ('sgk_upload', 'ocr_process', ...) and their results."""
+
+    def __init__(self, max_items=None, max_age=None, max_distance=None):
+        self.max_items = max(1, max_items or env_int('OCR_DEDUP_ITEMS', 128))
+        self.max_age = max_age or env_int('OCR_DEDUP_MAX_AGE', 86400)
+        self.max_distance = max_distance if max_distance is not None else env_int('OCR_DEDUP_MAX_DISTANCE', 12)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.max_age
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest['created'] >= cutoff and len(self._entries) <= self.max_items:
+                break
+            self._entries.popitem(last=False)
+
+    def find(self, fp, scope):
+        """Return (reference, result) for a verified duplicate of `fp` in `scope`, or None.
+
+        `reference` is the duplicateOf payload; `result` a fresh copy of the
+        earlier result.
+        """
+        if fp is None:
+            return None
+        with self._lock:
+            self._expire()
+            entries = [e for e in self._entries.values() if e['scope'] == scope]
+        if not entries:
+            return None
+        d = hamming([e['fp'].dhash for e in entries], fp.dhash)
+        p = hamming([e['fp'].phash for e in entries], fp.phash)
+        close = np.flatnonzero(np.minimum(d, p) <= self.max_distance)
+        for i in close[::-1][:MAX_VERIFY]:
+            entry = entries[i]
+            score = entry['fp'].similarity(fp)
+            if score is not None and score >= MIN_TILE_CORRELATION:
+                return duplicate_ref(entry, score), json.loads(entry['result'])
+        return None
+
+    def same_page(self, a, b):
+        """Verified similarity when fingerprints `a` and `b` show the same page, else None."""
+        if a is None or b is None:
+            return None
+        if min(hamming([a.dhash], b.dhash)[0], hamming([a.phash], b.phash)[0]) > self.max_distance:
+            return None
+        score = a.similarity(b)
+        return score if score is not None and score >= MIN_TILE_CORRELATION else None
+
+    def add(self, fp, scope, result, file_name=None):
+        """Remember a processed page and set result['documentId']; returns the id (None if not indexed)."""
+        if fp is None:
+            return None
+        doc_id = gen_id('ocrdoc')
+        result['documentId'] = doc_id
+        try:
+            raw = json.dumps(result, ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as e:
+            logger.debug('OCR result not indexable for duplicate detection: %s', e)
+            return None
+        with self._lock:
+            self._entries[doc_id] = {
+                'id': doc_id, 'scope': scope, 'fp': fp, 'result': raw,
+                'fileName': file_name, 'created': time.time()
+            }
+            self._expire()
+        return doc_id
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def duplicate_ref(entry, score):
+    return {
+        'documentId': entry['id'],
+        'fileName': entry.get('fileName'),
+        'processedAt': datetime.fromtimestamp(entry['created']).isoformat(),
+        'similarity': round(score, 3)
+    }
+
+
+def get_duplicate_index():
+    """Return the process-wide index, or None when disabled (OCR_DEDUP_ENABLED=0)."""
+    global _index
+    if cv2 is None or os.getenv('OCR_DEDUP_ENABLED', '1') == '0':
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DuplicateIndex()
+    return _index
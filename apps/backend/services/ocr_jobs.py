@@ -0,0 +1,307 @@
+"""Asynchronous OCR jobs backed by the application database.
+
+Long OCR requests (`/process`, `/extract_patient`, `/api/ocr/process`,
+`/api/sgk/upload`) can be submitted in job mode: the request stores an
+`ocr_jobs` row and returns at once, a background consumer thread runs the
+registered handler and clients poll (or long-poll) `/api/ocr/jobs/<id>`.
+Because the queue is a table, queued jobs survive restarts and no external
+broker is needed; jobs left 'running' by a crashed process are re-queued.
+Long-running handlers (the patient CSV import) record checkpoints with
+`save_progress()`; each one also counts as a heartbeat, and a re-queued job
+finds its last checkpoint in `job.progress_json` to resume from.
+
+Handlers are registered per job kind by the owning blueprint module and are
+called with the job payload inside an application context. Each kind belongs
+to a lane ('ocr' unless registered otherwise) and every lane has its own
+consumer thread that only claims its own kinds, so a long job in one lane
+(a patient CSV import in 'import') never holds up the jobs of another. Uploaded files
+that must outlive the request are kept under `job_storage_dir(job_id)` and
+removed once the job finishes.
+
+Configuration (environment variables):
+
+    OCR_JOBS_CONSUMER         0 disables the in-process consumer (default 1)
+    OCR_JOBS_POLL_INTERVAL    seconds between queue polls when idle (default 2)
+    OCR_JOBS_DIR              storage for uploaded job files (default instance/ocr_jobs)
+    OCR_JOB_STALE_SECONDS     re-queue 'running' jobs without a heartbeat for this long (default 900)
+    OCR_JOB_MAX_ATTEMPTS      give up on a job after this many attempts (default 3)
+    OCR_JOB_RETENTION_HOURS   delete finished jobs after this many hours (default 24)
+"""
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from models.base import db, now_utc
+from models.ocr_job import OCRJob
+from utils.env import env_int
+from utils.metrics import record_ocr_failure, set_ocr_jobs_queued, track_ocr_jobs_running
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANE = 'ocr'
+
+_handlers = {}
+# Job kind -> lane; kinds registered without one run in DEFAULT_LANE
+_lanes = {}
+# Lane -> consumer thread / wake-up event
+_consumers = {}
+_consumer_lock = threading.Lock()
+_wakes = {}
+# Notified whenever a job finishes so long-polling requests can return early
+_finished = threading.Condition()
+
+
+def register_handler(kind, fn, lane=DEFAULT_LANE):
+    """Register `fn(payload) -> dict` as the runner for jobs of `kind`, consumed in `lane`."""
+    _handlers[kind] = fn
+    _lanes[kind] = lane
+
+
+def _lane_clause(lane):
+    """SQL filter for the jobs of `lane`; the default lane also takes kinds nobody registered (to fail them)."""
+    if lane == DEFAULT_LANE:
+        return OCRJob.kind.notin_([kind for kind, other in _lanes.items() if other != DEFAULT_LANE])
+    return OCRJob.kind.in_([kind for kind, other in _lanes.items() if other == lane])
+
+
+def _wake(lane):
+    with _consumer_lock:
+        event = _wakes.get(lane)
+        if event is None:
+            event = _wakes[lane] = threading.Event()
+    return event
+
+
+def wants_async(req, data=None):
+    """True when the client asked for job mode.
+
+    Accepts `?async=1`, `{"async": true}` in a JSON body or the standard
+    `Prefer: respond-async` header.
+    """
+    flag = (req.args.get('async') or req.form.get('async')) if req else None
+    if flag is None and isinstance(data, dict):
+        flag = data.get('async')
+    if isinstance(flag, str):
+        flag = flag.strip().lower() in ('1', 'true', 'yes')
+    if flag:
+        return True
+    return 'respond-async' in (req.headers.get('Prefer', '') if req else '').lower()
+
+
+def jobs_dir():
+    default = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'ocr_jobs'))
+    return os.getenv('OCR_JOBS_DIR', default)
+
+
+def job_storage_dir(job_id, create=True):
+    path = os.path.join(jobs_dir(), job_id)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _remove_storage(job_id):
+    path = job_storage_dir(job_id, create=False)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def submit_job(kind, payload, job_id=None):
+    """Queue a job and return it. Commits the current session."""
+    if kind not in _handlers:
+        raise ValueError(f'Unknown OCR job kind: {kind}')
+    job = OCRJob(id=job_id, kind=kind, status='queued', attempts=0)
+    job.payload_json = payload or {}
+    db.session.add(job)
+    db.session.commit()
+    if os.getenv('OCR_JOBS_CONSUMER', '1') != '0':
+        try:
+            from flask import current_app
+            start_consumer(current_app._get_current_object())
+        except RuntimeError:
+            pass
+    _wake(_lanes.get(kind, DEFAULT_LANE)).set()
+    return job
+
+
+def save_progress(job_id, progress):
+    """Store a checkpoint for a running job in the current transaction (the caller commits).
+
+    Committing it together with the work it describes keeps the checkpoint
+    and the data consistent if the process dies in between.
+    """
+    OCRJob.query.filter(OCRJob.id == job_id).update(
+        {'progress': json.dumps(progress, ensure_ascii=False, default=str)}, synchronize_session=False)
+
+
+def job_response(job, status_code=202, location=None):
+    """Standard 202 body and headers for a freshly queued job."""
+    location = location or f'/api/ocr/jobs/{job.id}'
+    body = {
+        "success": True,
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": location,
+        "timestamp": now_utc().isoformat()
+    }
+    return body, status_code, {'Location': location}
+
+
+def wait_for_job(job_id, timeout):
+    """Return the job, blocking up to `timeout` seconds for it to finish."""
+    deadline = time.monotonic() + max(0.0, timeout)
+    while True:
+        # Start every check on a fresh transaction so the consumer's commit is visible
+        db.session.rollback()
+        job = db.session.get(OCRJob, job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job.is_finished or remaining <= 0:
+            return job
+        with _finished:
+            _finished.wait(min(remaining, 1.0))
+
+
+def _worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _requeue_stale(lane):
+    """Re-queue jobs of `lane` whose consumer died mid-run; fail those out of attempts."""
+    cutoff = now_utc() - timedelta(seconds=env_int('OCR_JOB_STALE_SECONDS', 900))
+    max_attempts = env_int('OCR_JOB_MAX_ATTEMPTS', 3)
+    # updated_at moves on every claim and checkpoint, so it doubles as the heartbeat
+    stale = OCRJob.query.filter(OCRJob.status == 'running', _lane_clause(lane),
+                                OCRJob.updated_at < cutoff).all()
+    for job in stale:
+        if (job.attempts or 0) >= max_attempts:
+            job.status = 'failed'
+            job.error = f'Abandoned after {job.attempts} attempts'
+            job.finished_at = now_utc()
+            _remove_storage(job.id)
+        else:
+            logger.warning('Re-queueing stale OCR job %s (worker %s)', job.id, job.worker_id)
+            job.status = 'queued'
+            job.worker_id = None
+    if stale:
+        db.session.commit()
+
+
+def _purge_finished(lane):
+    cutoff = now_utc() - timedelta(hours=env_int('OCR_JOB_RETENTION_HOURS', 24))
+    old = OCRJob.query.filter(OCRJob.status.in_(('succeeded', 'failed')), _lane_clause(lane),
+                              OCRJob.finished_at < cutoff).all()
+    for job in old:
+        _remove_storage(job.id)
+        db.session.delete(job)
+    if old:
+        db.session.commit()
+
+
+def _claim_next(lane=None):
+    """Atomically move the oldest queued job (of `lane`, default any) to 'running' and return it."""
+    query = OCRJob.query.with_entities(OCRJob.id).filter(OCRJob.status == 'queued')
+    if lane is not None:
+        query = query.filter(_lane_clause(lane))
+    candidates = (query
+                  .order_by(OCRJob.created_at.asc())
+                  .limit(5).all())
+    for (job_id,) in candidates:
+        # Conditional update: only one consumer can win the queued -> running transition
+        claimed = (OCRJob.query.filter(OCRJob.id == job_id, OCRJob.status == 'queued')
+                   .update({'status': 'running', 'worker_id': _worker_id(), 'started_at': now_utc(),
+                            'attempts': OCRJob.attempts + 1}, synchronize_session=False))
+        db.session.commit()
+        if claimed:
+            return db.session.get(OCRJob, job_id)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job's handler and record its result."""
+    job_id = job.id
+    handler = _handlers.get(job.kind)
+    track_ocr_jobs_running(1)
+    try:
+        if handler is None:
+            raise ValueError(f'No handler registered for job kind: {job.kind}')
+        result = handler(job.payload_json)
+        job.result = json.dumps(result, ensure_ascii=False, default=str)
+        job.status = 'succeeded'
+        job.error = None
+    except Exception as e:
+        logger.exception('OCR job %s failed', job_id)
+        record_ocr_failure('job')
+        db.session.rollback()
+        job = db.session.get(OCRJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        track_ocr_jobs_running(-1)
+    job.finished_at = now_utc()
+    db.session.commit()
+    _remove_storage(job_id)
+    with _finished:
+        _finished.notify_all()
+    return job
+
+
+def run_pending(limit=None, lane=None):
+    """Process queued jobs (of `lane`, default every lane) in the calling thread; returns how many ran."""
+    done = 0
+    while limit is None or done < limit:
+        job = _claim_next(lane)
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def _consume(app, lane):
+    interval = max(0.1, float(env_int('OCR_JOBS_POLL_INTERVAL', 2)))
+    wake = _wake(lane)
+    last_maintenance = 0.0
+    while True:
+        wake.wait(interval)
+        wake.clear()
+        with app.app_context():
+            try:
+                if time.monotonic() - last_maintenance > 60:
+                    last_maintenance = time.monotonic()
+                    _requeue_stale(lane)
+                    _purge_finished(lane)
+                run_pending(lane=lane)
+                if lane == DEFAULT_LANE:
+                    set_ocr_jobs_queued(OCRJob.query.filter(OCRJob.status == 'queued').count())
+            except Exception as e:
+                db.session.rollback()
+                logger.warning('OCR job consumer (%s) iteration failed: %s', lane, e)
+            finally:
+                db.session.remove()
+
+
+def start_consumer(app):
+    """Start one background consumer thread per lane of the registered kinds, once per process.
+
+    Returns the lane -> thread mapping; lanes registered later get their
+    thread on the next call (submit_job makes one).
+    """
+    lanes = {DEFAULT_LANE} | {_lanes.get(kind, DEFAULT_LANE) for kind in _handlers}
+    if lanes <= _consumers.keys():
+        return _consumers
+    for lane in sorted(lanes - _consumers.keys()):
+        wake = _wake(lane)
+        with _consumer_lock:
+            if lane in _consumers:
+                continue
+            thread = threading.Thread(target=_consume, args=(app, lane), name=f'ocr-job-consumer-{lane}',
+                                      daemon=True)
+            _consumers[lane] = thread
+            thread.start()
+        wake.set()
+    return _consumers
@@ -1,96 +1,384 @@
 from datetime import datetime
+import collections
+import contextlib
 import logging
 import os
+import threading
+import time
+
+from services.ocr_worker_pool import get_worker_pool, python_candidates, WorkerError
+from services.ocr_cache import get_ocr_cache, file_sha256, bytes_sha256, cache_key
+from services.ocr_templates import get_template
+from utils.term_matcher import TermAutomaton
+from utils import fuzzy
+from utils.env import env_int
+from utils.metrics import (observe_ocr_stage, record_ocr_fallback, record_ocr_failure,
+                           record_ocr_worker_spawn, track_ocr_in_flight)
 
 logger = logging.getLogger(__name__)
 
+# Bump when OCR normalization or NLP post-processing changes so cached results are not reused
+PIPELINE_VERSION = '2'
+
+# Longest image side handed to OCR; larger inputs are downscaled in memory
+OCR_MAX_SIDE = 1200
+
 _nlp_service = None
 
+
+# (type, confidence, keywords) in priority order: the first rule with a keyword in the text wins
+DOCUMENT_TYPE_RULES = [
+    ("sgk_device_report", 0.95, ["sgk", "sosyal güvenlik", "cihaz raporu"]),
+    ("prescription", 0.90, ["reçete", "prescription", "ilaç"]),
+    ("audiometry_report", 0.88, ["odyometri", "audiometry", "işitme testi"]),
+    ("medical_report", 0.75, ["rapor", "muayene", "bulgular"]),
+]
+
+
+# Per-thread collector for stage timings (see collect_stage_timings)
+_stage_local = threading.local()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time one pipeline stage (decode, auto_crop, resize, ocr, matcher, classification, ...).
+
+    Durations go to the `ocr_stage_latency_seconds` histogram and to an active
+    collect_stage_timings() collector.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_ocr_stage(name, elapsed)
+        timings = getattr(_stage_local, 'timings', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextlib.contextmanager
+def collect_stage_timings():
+    """Collect seconds spent per stage by pipeline calls made in this thread into a dict."""
+    previous = getattr(_stage_local, 'timings', None)
+    timings = {}
+    _stage_local.timings = timings
+    try:
+        yield timings
+    finally:
+        _stage_local.timings = previous
+
+
+class _WorkerInput:
+    """Lazily materializes the prepared image as a file for the external OCR worker.
+
+    The original file is reused when the image was not cropped/resized; otherwise
+    a single temp file is written on first use and removed by cleanup().
+    """
+
+    def __init__(self, image, transformed, image_path=None, image_bytes=None):
+        self.image = image
+        self.transformed = transformed
+        self.image_path = image_path
+        self.image_bytes = image_bytes
+        self._tmp_path = None
+
+    def path(self):
+        if not self.transformed and self.image_path:
+            return self.image_path
+        if self._tmp_path is None:
+            import tempfile
+            fd, tmp_path = tempfile.mkstemp(prefix='ocr_input_', suffix='.jpg')
+            try:
+                if not self.transformed and self.image_bytes:
+                    os.write(fd, self.image_bytes)
+                else:
+                    import cv2
+                    ok, buf = cv2.imencode('.jpg', self.image, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+                    if not ok:
+                        raise RuntimeError('Failed to encode image for OCR worker')
+                    os.write(fd, buf.tobytes())
+            finally:
+                os.close(fd)
+            self._tmp_path = tmp_path
+        return self._tmp_path
+
+    def cleanup(self):
+        if self._tmp_path:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+            self._tmp_path = None
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB (None when unknown)."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, KiB elsewhere; peak rather than current RSS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except Exception:
+        return None
+
+
+class _ModelComponent:
+    """Load state of one model (PaddleOCR, spaCy, HF NER) loaded on first use.
+
+    States: 'not_loaded' -> 'loading' -> 'ready' | 'failed'. A failed load is
+    not retried; `status()` never triggers a load.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.RLock()
+        self.state = 'not_loaded'
+        self.error = None
+        self.load_seconds = None
+        self.memory_mb = None
+        self.loaded_at = None
+
+    def ensure(self):
+        if self.state in ('ready', 'failed'):
+            return self.state == 'ready'
+        with self._lock:
+            # Re-entrant calls from the loader itself see 'loading' and return
+            if self.state == 'not_loaded':
+                self.state = 'loading'
+                started = time.monotonic()
+                rss_before = _rss_mb()
+                try:
+                    ok = self._loader()
+                    self.state = 'ready' if ok else 'failed'
+                    if not ok:
+                        self.error = self.error or 'not available'
+                except Exception as e:
+                    logger.warning(f"Loading {self.name} failed: {e}")
+                    self.state = 'failed'
+                    self.error = str(e)
+                self.load_seconds = round(time.monotonic() - started, 3)
+                rss_after = _rss_mb()
+                if rss_before is not None and rss_after is not None:
+                    self.memory_mb = round(rss_after - rss_before, 1)
+                self.loaded_at = datetime.now().isoformat()
+                logger.info(f"Model component {self.name}: {self.state} in {self.load_seconds}s "
+                            f"(+{self.memory_mb} MB RSS)")
+        return self.state == 'ready'
+
+    def set(self, available):
+        """Record an injected model (tests, callers that construct engines themselves)."""
+        self.state = 'ready' if available else 'failed'
+        self.error = None if available else 'unset'
+
+    def status(self):
+        return {
+            'state': self.state,
+            'error': self.error,
+            'loadSeconds': self.load_seconds,
+            'memoryMb': self.memory_mb,
+            'loadedAt': self.loaded_at
+        }
+
+
 class TurkishMedicalOCR:
+    # Components in prewarm order; names accepted by prewarm() and OCR_PREWARM
+    COMPONENTS = ('paddleocr', 'spacy', 'hf_ner')
+
     def __init__(self):
-        self.ocr = None
         self.initialized = False
-        self.paddleocr_available = False
-        self.nlp = None
-        self.matcher = None
+        self._ocr = None
+        self._nlp = None
+        self._matcher = None
+        self._hf_ner = None
+        self._paddle_importable = None
+        self._components = {
+            'paddleocr': _ModelComponent('paddleocr', self._load_paddleocr),
+            'spacy': _ModelComponent('spacy', self._load_spacy),
+            'hf_ner': _ModelComponent('hf_ner', self._load_hf_ner),
+        }
         self.medical_terms = {}
+        self._automaton = None
+        # LRU of parsed spaCy Docs keyed by text (see parse/parse_many)
+        self._doc_cache = collections.OrderedDict()
+        self._doc_cache_lock = threading.Lock()
+        self.doc_cache_size = env_int('NLP_DOC_CACHE_SIZE', 128)
+        self.pipe_batch_size = max(1, env_int('NLP_PIPE_BATCH_SIZE', 32))
+        self.pipe_n_process = max(1, env_int('NLP_PIPE_N_PROCESS', 1))
+        self.hf_batch_size = max(1, env_int('HF_NER_BATCH_SIZE', 16))
+        self.use_external_worker = self._prefers_external_worker()
 
     def initialize(self):
-        """Initialize PaddleOCR and (optionally) spaCy NLP and custom matchers."""
-        # Initialize PaddleOCR (optional)
-        try:
-            from paddleocr import PaddleOCR
-            self.ocr = PaddleOCR(lang='tr')
-            self.paddleocr_available = True
-            logger.info("✅ PaddleOCR initialized successfully")
-        except Exception as e:
-            logger.warning(f"PaddleOCR not available: {e}")
-            self.ocr = None
-            self.paddleocr_available = False
+        """Mark the service ready for use.
+
+        Models are no longer loaded here: PaddleOCR, spaCy and the HF NER
+        pipeline each load on first use (see `prewarm` to load them ahead of
+        time and `component_status` for their state).
+        """
+        self.initialized = True
 
+    def prewarm(self, components=None):
+        """Load the given components (default: all) now instead of on first use.
+
+        When OCR runs in the external worker pool, 'paddleocr' starts the pool's
+        workers instead of loading the model into this process.
+        """
+        for name in components or self.COMPONENTS:
+            if name == 'paddleocr' and self.use_external_worker and self._prewarm_worker_pool():
+                continue
+            if name in self._components:
+                self._components[name].ensure()
+            else:
+                logger.warning(f"Unknown model component for prewarm: {name}")
+        self.initialized = True
+        return self.component_status()
+
+    def _prewarm_worker_pool(self):
+        pool = get_worker_pool()
+        if pool is None:
+            return False
+        started = time.monotonic()
+        count = pool.prewarm()
+        logger.info(f"PaddleOCR worker pool prewarmed: {count} worker(s) started in {time.monotonic() - started:.1f}s")
+        return True
+
+    def component_status(self):
+        """State, load time and RSS growth of each model component, without loading anything."""
+        return {name: comp.status() for name, comp in self._components.items()}
+
+    @staticmethod
+    def _prefers_external_worker():
         # Decide whether to use an external worker to isolate native crashes
         try:
             import sys, platform
             py_ver = tuple(sys.version_info[:2])
             machine = platform.machine().lower() if hasattr(platform, 'machine') else ''
             # On macOS Apple Silicon (arm64) and newer Python versions we prefer an external worker
-            self.use_external_worker = (sys.platform == 'darwin' and machine.startswith('arm')) or (py_ver >= (3, 12))
-            logger.info(f"use_external_worker={self.use_external_worker} (platform={sys.platform}, machine={machine}, py_ver={py_ver})")
+            use_external = (sys.platform == 'darwin' and machine.startswith('arm')) or (py_ver >= (3, 12))
+            logger.info(f"use_external_worker={use_external} (platform={sys.platform}, machine={machine}, py_ver={py_ver})")
+            return use_external
         except Exception:
-            self.use_external_worker = False
+            return False
 
-        # Initialize spaCy (optional) for richer entity extraction/classification
-        try:
-            import spacy
-            # Prefer a small Turkish model if available, otherwise use a multilingual model
-            try:
-                self.nlp = spacy.load('tr_core_news_sm')
-            except Exception:
-                try:
-                    self.nlp = spacy.load('xx_ent_wiki_sm')
-                except Exception:
-                    self.nlp = None
-                    logger.info('No spaCy model available; NLP features will be limited')
+    # -- lazily loaded engines ------------------------------------------------
 
-            if self.nlp:
-                # Import matcher lazily
-                from spacy.matcher import Matcher
-                self.matcher = Matcher(self.nlp.vocab)
-                # Setup medical patterns/terms
-                self._add_medical_patterns()
-                self._load_medical_terms()
-        except Exception as e:
-            logger.warning(f"spaCy not available: {e}")
-            self.nlp = None
-            self.matcher = None
-
-        # Try to load a local HuggingFace Turkish NER model for improved name extraction
-        try:
-            from transformers import pipeline
-            # Model: savasy/bert-base-turkish-ner-cased is a lightweight Turkish NER model
-            self.hf_ner = pipeline('ner', model='savasy/bert-base-turkish-ner-cased', tokenizer='savasy/bert-base-turkish-ner-cased', grouped_entities=True)
-            self.hf_ner_available = True
-            logger.info('✅ HuggingFace Turkish NER loaded (savasy/bert-base-turkish-ner-cased)')
-        except Exception as e:
-            logger.warning(f'HuggingFace NER not available: {e}')
-            self.hf_ner = None
-            self.hf_ner_available = False
+    def _load_paddleocr(self):
+        from paddleocr import PaddleOCR
+        self._ocr = PaddleOCR(lang='tr')
+        logger.info("✅ PaddleOCR initialized successfully")
+        return True
 
-        # Expose flags for diagnostics/health checks
+    def _load_spacy(self):
+        import spacy
+        # Prefer a small Turkish model if available, otherwise use a multilingual model
         try:
-            self.spaCy_available = bool(self.nlp)
+            self._nlp = spacy.load('tr_core_news_sm')
         except Exception:
-            self.spaCy_available = False
-
-        self.initialized = True
+            try:
+                self._nlp = spacy.load('xx_ent_wiki_sm')
+            except Exception:
+                self._nlp = None
+                logger.info('No spaCy model available; NLP features will be limited')
+
+        with self._doc_cache_lock:
+            self._doc_cache.clear()
+        if not self._nlp:
+            return False
+        # Import matcher lazily
+        from spacy.matcher import Matcher
+        self._matcher = Matcher(self._nlp.vocab)
+        # Setup medical patterns/terms
+        self._add_medical_patterns()
+        self._load_medical_terms()
+        return True
+
+    def _load_hf_ner(self):
+        # Local HuggingFace Turkish NER model for improved name extraction
+        from transformers import pipeline
+        # Model: savasy/bert-base-turkish-ner-cased is a lightweight Turkish NER model
+        self._hf_ner = pipeline('ner', model='savasy/bert-base-turkish-ner-cased', tokenizer='savasy/bert-base-turkish-ner-cased', grouped_entities=True)
+        logger.info('✅ HuggingFace Turkish NER loaded (savasy/bert-base-turkish-ner-cased)')
+        return True
+
+    @property
+    def ocr(self):
+        self._components['paddleocr'].ensure()
+        return self._ocr
+
+    @ocr.setter
+    def ocr(self, value):
+        self._ocr = value
+        self._components['paddleocr'].set(value is not None)
+
+    @property
+    def paddleocr_available(self):
+        """Whether in-process PaddleOCR is usable; checked without loading the model."""
+        comp = self._components['paddleocr']
+        if comp.state in ('ready', 'failed'):
+            return comp.state == 'ready'
+        if self._paddle_importable is None:
+            import importlib.util
+            try:
+                self._paddle_importable = importlib.util.find_spec('paddleocr') is not None
+            except (ImportError, ValueError):
+                self._paddle_importable = False
+        return self._paddle_importable
+
+    @paddleocr_available.setter
+    def paddleocr_available(self, value):
+        self._paddle_importable = bool(value)
+
+    @property
+    def nlp(self):
+        self._components['spacy'].ensure()
+        return self._nlp
+
+    @nlp.setter
+    def nlp(self, value):
+        self._nlp = value
+        self._components['spacy'].set(value is not None)
+
+    @property
+    def matcher(self):
+        self._components['spacy'].ensure()
+        return self._matcher
+
+    @matcher.setter
+    def matcher(self, value):
+        self._matcher = value
+
+    @property
+    def hf_ner(self):
+        self._components['hf_ner'].ensure()
+        return self._hf_ner
+
+    @hf_ner.setter
+    def hf_ner(self, value):
+        self._hf_ner = value
+        self._components['hf_ner'].set(value is not None)
+
+    @property
+    def spaCy_available(self):
+        return self._components['spacy'].state == 'ready'
+
+    @property
+    def hf_ner_available(self):
+        return self._components['hf_ner'].state == 'ready'
 
     def _add_medical_patterns(self):
         """Add custom medical patterns to the spaCy matcher."""
-        if not self.nlp:
+        if not self._nlp:
             return
         try:
             from spacy.matcher import Matcher
-            matcher = Matcher(self.nlp.vocab)
+            matcher = Matcher(self._nlp.vocab)
 
             # TC Number pattern (11 digits)
             tc_pattern = [{"TEXT": {"REGEX": r"\d{11}"}}]
@@ -130,7 +418,7 @@ class TurkishMedicalOCR:
             ]
             matcher.add("DOCTOR_STAFF", doctor_patterns)
 
-            self.matcher = matcher
+            self._matcher = matcher
         except Exception as e:
             logger.warning(f"Failed to add medical patterns: {e}")
 
@@ -152,114 +440,108 @@ class TurkishMedicalOCR:
                 "timpanometri", "ABR", "ameliyat", "surgery"
             ]
         }
+        # Recompile the term matcher for the new vocabulary
+        self._automaton = None
 
-    def process_document(self, image_path=None, doc_type="medical", text=None, auto_crop=False):
+    def process_document(self, image_path=None, doc_type="medical", text=None, auto_crop=False, image_bytes=None,
+                         flat_page=False, preprocess=None):
         """Process medical document with PaddleOCR and optional spaCy entity extraction.
 
-        Accepts either a local image path (image_path) to run OCR on, or raw extracted text (text)
-        which will be processed by NLP only. If auto_crop=True, the image will be cropped using
-        the document scanner helper before OCR to improve OCR quality.
+        Accepts either a local image path (image_path) or the encoded image itself (image_bytes,
+        e.g. an upload) to run OCR on, or raw extracted text (text) which will be processed by
+        NLP only. If auto_crop is set, the image will be cropped using the document scanner helper
+        before OCR to improve OCR quality: True uses the default mode (OCR_AUTO_CROP_MODE), or pass
+        'fast', 'balanced' or 'quality' to trade crop accuracy for speed. The image is decoded once
+        and cropped/resized in memory; a file is only written when the external OCR worker needs one.
+        flat_page marks an input that already is the whole, upright page (e.g. rasterized from a PDF):
+        it is not cropped, but layout templates apply as they do to auto-cropped scans.
+        preprocess selects clean-up steps run on the page before OCR (see utils.image_preprocess:
+        'grayscale', 'denoise', 'deskew', 'binarize', as a list or comma-separated string); None uses
+        the steps configured for doc_type, '' or 'none' disables them.
         Returns a dict including raw OCR entities and (if spaCy available) custom entities,
         classification and found medical terms.
+
+        Image results are cached by image content and options (see services.ocr_cache).
         """
+        track_ocr_in_flight(1)
+        try:
+            with stage('process_document'):
+                return self._process_document(image_path, doc_type, text, auto_crop, image_bytes, flat_page,
+                                              preprocess)
+        finally:
+            track_ocr_in_flight(-1)
+
+    def _process_document(self, image_path, doc_type, text, auto_crop, image_bytes, flat_page=False,
+                          preprocess=None):
         if not self.paddleocr_available and not self.nlp and text is None:
             raise RuntimeError("No OCR or NLP engine available")
 
+        from utils.image_preprocess import parse_steps, preprocess_steps
+        steps = preprocess_steps(doc_type) if preprocess is None else parse_steps(preprocess)
+
+        cache = None
+        key = None
+        if (image_path or image_bytes) and not text and self.paddleocr_available:
+            cache = get_ocr_cache()
+            if cache is not None:
+                from utils.document_scanner import auto_crop_mode
+                try:
+                    digest = bytes_sha256(image_bytes) if image_bytes else file_sha256(image_path)
+                    options = {'flat_page': True} if flat_page else {}
+                    if steps:
+                        options['preprocess'] = ','.join(steps)
+                    key = cache_key(digest, auto_crop=auto_crop_mode(auto_crop), doc_type=doc_type,
+                                    pipeline=self.pipeline_signature(), **options)
+                    cached = cache.get(key)
+                except OSError:
+                    key = None
+                    cached = None
+                if cached is not None:
+                    cached['processing_time'] = datetime.now().isoformat()
+                    return cached
+
         ocr_result = []
+        template_match = None
 
         # If caller supplied raw text, skip OCR and use that text for NLP processing
         if text and isinstance(text, str):
             ocr_result = [{"text": line, "confidence": 1.0} for line in text.splitlines() if line.strip()]
         else:
-            # Try OCR if PaddleOCR is available and an image_path is provided
-            if image_path and self.paddleocr_available:
-                # Optionally crop the document first
-                if auto_crop:
-                    try:
-                        from backend.utils.document_scanner import auto_crop_image
-                        cropped = auto_crop_image(image_path)
-                        if cropped:
-                            image_path_to_use = cropped
-                        else:
-                            image_path_to_use = image_path
-                    except Exception:
-                        image_path_to_use = image_path
-                else:
-                    image_path_to_use = image_path
-
-                # Ensure image dimensions are within safe bounds for PaddleOCR (smaller to increase stability)
-                try:
-                    # Use a conservative max_side for worker calls to avoid native OOMs
-                    image_path_to_use = self._ensure_safe_image(image_path_to_use, max_side=1200)
-                except Exception:
-                    pass
-
-                # Prefer external worker on platforms prone to native crashes
+            # Try OCR if PaddleOCR is available and an image (path or bytes) is provided
+            if (image_path or image_bytes) and self.paddleocr_available:
+                # Decode once, then crop and downscale in memory. Use a conservative max_side
+                # for worker calls to avoid native OOMs.
+                image, transformed = self._prepare_image(image_path, image_bytes, auto_crop=auto_crop,
+                                                         max_side=OCR_MAX_SIDE, preprocess=steps)
+                worker_input = _WorkerInput(image, transformed, image_path, image_bytes)
+
+                template = get_template(doc_type) if image is not None and (auto_crop or flat_page) else None
+                template_match = None
                 raw_result = None
-                if getattr(self, 'use_external_worker', False):
-                    try:
-                        raw_result = self._external_paddle_ocr(image_path_to_use)
-                    except Exception as e:
-                        logger.warning(f"External paddle worker failed: {e}")
-                        raw_result = None
-
-                # If external worker didn't return results, try the in-process call as fallback
-                if raw_result is None and self.ocr is not None:
+                try:
+                    if template is not None:
+                        with stage('template_ocr'):
+                            template_match = self._template_ocr(template, image, worker_input)
+                        if template_match is None or not template_match.accepted:
+                            record_ocr_fallback('full_page')
+                            logger.info(f"Template {template.name} not accepted "
+                                        f"({template_match.summary() if template_match else 'no region OCR'}); OCR'ing full page")
+                    if template_match is None or not template_match.accepted:
+                        with stage('ocr'):
+                            raw_result = self._full_page_ocr(image, image_path, worker_input)
+                finally:
+                    worker_input.cleanup()
+
+                if template_match is not None and template_match.accepted:
+                    ocr_result = template_match.entities
+                else:
                     try:
-                        raw_result = self._safe_ocr_call(image_path_to_use)
+                        if raw_result is None:
+                            record_ocr_failure('empty_result')
+                            raise RuntimeError('Empty OCR result')
+                        ocr_result = self._normalize_ocr_result(raw_result)
                     except Exception as e:
-                        logger.error(f"In-process OCR failed: {e}")
-                        raw_result = None
-
-                # If still none, try one last time with external worker but allowing alternative interpreters
-                if raw_result is None:
-                    try:
-                        raw_result = self._external_paddle_ocr(image_path_to_use)
-                    except Exception:
-                        raw_result = None
-
-                try:
-                    if raw_result is None:
-                        raise RuntimeError('Empty OCR result')
-
-                    # If external worker returned structured entities (list of {'text','confidence'}) use directly
-                    if isinstance(raw_result, list) and all(isinstance(x, dict) and 'text' in x for x in raw_result):
-                        for r in raw_result:
-                            txt = str(r.get('text'))
-                            conf = float(r.get('confidence', 1.0)) if r.get('confidence') is not None else 1.0
-                            ocr_result.append({"text": txt.strip(), "confidence": conf})
-                    else:
-                        # Normalize several possible return shapes into list of (text, confidence)
-                        if isinstance(raw_result, dict) and 'text' in raw_result:
-                            txt = str(raw_result.get('text'))
-                            conf = float(raw_result.get('confidence', 1.0)) if raw_result.get('confidence') is not None else 1.0
-                            ocr_result.append({"text": txt, "confidence": conf})
-                        else:
-                            for line in raw_result:
-                                if isinstance(line, (list, tuple)):
-                                    for res in line:
-                                        if isinstance(res, (list, tuple)) and len(res) >= 2:
-                                            maybe_text = res[1]
-                                            if isinstance(maybe_text, (list, tuple)) and len(maybe_text) >= 1:
-                                                text_val = maybe_text[0]
-                                                confidence = maybe_text[1] if len(maybe_text) > 1 else 1.0
-                                            else:
-                                                text_val = maybe_text
-                                                confidence = 1.0
-                                        elif isinstance(res, dict) and 'text' in res:
-                                            text_val = res.get('text')
-                                            confidence = res.get('confidence', 1.0)
-                                        else:
-                                            text_val = str(res)
-                                            confidence = 1.0
-
-                                        ocr_result.append({"text": str(text_val).strip(), "confidence": float(confidence) if confidence is not None else 1.0})
-                                elif isinstance(line, dict) and 'text' in line:
-                                    ocr_result.append({"text": str(line.get('text')), "confidence": float(line.get('confidence', 1.0))})
-                                else:
-                                    ocr_result.append({"text": str(line), "confidence": 1.0})
-                except Exception as e:
-                    logger.error(f"OCR process_document failed: {e}")
+                        logger.error(f"OCR process_document failed: {e}")
 
         # Compose richer result
         custom_entities = None
@@ -269,20 +551,208 @@ class TurkishMedicalOCR:
 
         if (self.nlp or True) and joined_text:
             try:
-                if self.matcher and self.nlp:
-                    custom_entities = self._extract_custom_entities(joined_text)
-                classification = self._classify_document(joined_text, None)
-                medical_terms_found = self._extract_medical_terms(joined_text)
+                with stage('matcher'):
+                    if self.matcher and self.nlp:
+                        custom_entities = self._extract_custom_entities(joined_text)
+                    hits = self._scan_terms(joined_text)
+                    medical_terms_found = self._extract_medical_terms(joined_text, hits=hits)
+                with stage('classification'):
+                    classification = self._classify_document(joined_text, None, hits=hits)
             except Exception as e:
                 logger.warning(f"NLP processing failed: {e}")
 
-        return {
+        result = {
             "entities": ocr_result,
             "custom_entities": custom_entities,
             "classification": classification,
             "medical_terms": medical_terms_found,
             "processing_time": datetime.now().isoformat()
         }
+        if template_match is not None:
+            result["template"] = template_match.summary()
+            if template_match.accepted:
+                result["fields"] = template_match.fields
+        # Only cache successful OCR runs; an empty result may be a transient worker failure
+        if key and ocr_result:
+            cache.put(key, result)
+        return result
+
+    def _full_page_ocr(self, image, image_path, worker_input):
+        """OCR the whole prepared page: external worker first, in-process fallback. Returns the raw result or None."""
+        raw_result = None
+        if getattr(self, 'use_external_worker', False):
+            try:
+                raw_result = self._external_paddle_ocr(worker_input.path())
+            except Exception as e:
+                logger.warning(f"External paddle worker failed: {e}")
+                record_ocr_failure('external_worker')
+                raw_result = None
+            if raw_result is None:
+                record_ocr_fallback('in_process')
+
+        # If external worker didn't return results, try the in-process call as fallback
+        # (PaddleOCR accepts the decoded array directly)
+        if raw_result is None and self.ocr is not None:
+            try:
+                raw_result = self._safe_ocr_call(image if image is not None else image_path)
+            except Exception as e:
+                logger.error(f"In-process OCR failed: {e}")
+                record_ocr_failure('in_process')
+                raw_result = None
+
+        # If still none, try one last time with external worker but allowing alternative interpreters
+        if raw_result is None:
+            record_ocr_fallback('external_retry')
+            try:
+                raw_result = self._external_paddle_ocr(worker_input.path())
+            except Exception:
+                raw_result = None
+        return raw_result
+
+    def _template_ocr(self, template, image, worker_input):
+        """OCR only the template's field regions; returns a TemplateMatch, or None if unsupported here."""
+        height, width = image.shape[:2]
+        if not template.fits(width, height):
+            return template.evaluate({})
+        region_entities = None
+        if getattr(self, 'use_external_worker', False):
+            pool = get_worker_pool()
+            if pool is None:
+                # One process per region would cost more than it saves
+                return None
+            try:
+                raw = pool.run_regions(worker_input.path(), template.region_specs())
+                region_entities = {name: self._normalize_ocr_result(ents) for name, ents in raw.items()}
+            except WorkerError as e:
+                logger.warning(f"Region OCR in worker pool failed: {e}")
+                record_ocr_failure('worker_pool')
+        if region_entities is None:
+            if self.ocr is None:
+                return None
+            region_entities = {}
+            for region, crop in template.crops(image):
+                try:
+                    region_entities[region.name] = self._normalize_ocr_result(self._safe_ocr_call(crop))
+                except Exception as e:
+                    logger.debug(f"Region OCR failed for {region.name}: {e}")
+                    region_entities[region.name] = []
+        return template.evaluate(region_entities)
+
+    def _normalize_ocr_result(self, raw_result):
+        """Normalize the return shapes of the OCR engines into [{'text', 'confidence'}]."""
+        entities = []
+        if raw_result is None:
+            return entities
+        # If external worker returned structured entities (list of {'text','confidence'}) use directly
+        if isinstance(raw_result, list) and all(isinstance(x, dict) and 'text' in x for x in raw_result):
+            for r in raw_result:
+                txt = str(r.get('text'))
+                conf = float(r.get('confidence', 1.0)) if r.get('confidence') is not None else 1.0
+                entities.append({"text": txt.strip(), "confidence": conf})
+        else:
+            # Normalize several possible return shapes into list of (text, confidence)
+            if isinstance(raw_result, dict) and 'text' in raw_result:
+                txt = str(raw_result.get('text'))
+                conf = float(raw_result.get('confidence', 1.0)) if raw_result.get('confidence') is not None else 1.0
+                entities.append({"text": txt, "confidence": conf})
+            else:
+                for line in raw_result:
+                    if isinstance(line, (list, tuple)):
+                        for res in line:
+                            if isinstance(res, (list, tuple)) and len(res) >= 2:
+                                maybe_text = res[1]
+                                if isinstance(maybe_text, (list, tuple)) and len(maybe_text) >= 1:
+                                    text_val = maybe_text[0]
+                                    confidence = maybe_text[1] if len(maybe_text) > 1 else 1.0
+                                else:
+                                    text_val = maybe_text
+                                    confidence = 1.0
+                            elif isinstance(res, dict) and 'text' in res:
+                                text_val = res.get('text')
+                                confidence = res.get('confidence', 1.0)
+                            else:
+                                text_val = str(res)
+                                confidence = 1.0
+
+                            entities.append({"text": str(text_val).strip(), "confidence": float(confidence) if confidence is not None else 1.0})
+                    elif isinstance(line, dict) and 'text' in line:
+                        entities.append({"text": str(line.get('text')), "confidence": float(line.get('confidence', 1.0))})
+                    else:
+                        entities.append({"text": str(line), "confidence": 1.0})
+        return entities
+
+    def pipeline_signature(self):
+        """Identify the loaded models so cached results are keyed by model version."""
+        spacy_model = None
+        if self.nlp is not None:
+            try:
+                meta = self.nlp.meta
+                spacy_model = f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+            except Exception:
+                spacy_model = 'unknown'
+        return {
+            'version': PIPELINE_VERSION,
+            'ocr': 'paddleocr-tr' if self.paddleocr_available else None,
+            'spacy': spacy_model
+        }
+
+    def parse(self, text):
+        """Return the spaCy Doc for `text`, reusing a cached parse when available."""
+        return self.parse_many([text])[0]
+
+    def parse_many(self, texts):
+        """Parse several texts with one batched `nlp.pipe` call.
+
+        Texts already in the Doc cache (or repeated in `texts`) are parsed only
+        once. Batch size and process count come from NLP_PIPE_BATCH_SIZE and
+        NLP_PIPE_N_PROCESS.
+        """
+        if not self.nlp:
+            raise RuntimeError('spaCy model not loaded')
+        texts = [t or '' for t in texts]
+        docs = {}
+        with self._doc_cache_lock:
+            for t in texts:
+                if t in self._doc_cache:
+                    self._doc_cache.move_to_end(t)
+                    docs[t] = self._doc_cache[t]
+        missing = [t for t in dict.fromkeys(texts) if t not in docs]
+        if missing:
+            if len(missing) == 1:
+                parsed = [self.nlp(missing[0])]
+            else:
+                parsed = self.nlp.pipe(missing, batch_size=self.pipe_batch_size, n_process=self.pipe_n_process)
+            for t, doc in zip(missing, parsed):
+                docs[t] = doc
+            if self.doc_cache_size > 0:
+                with self._doc_cache_lock:
+                    for t in missing:
+                        self._doc_cache[t] = docs[t]
+                    while len(self._doc_cache) > self.doc_cache_size:
+                        self._doc_cache.popitem(last=False)
+        return [docs[t] for t in texts]
+
+    def hf_entities(self, text):
+        """Run the HF NER pipeline over the non-empty lines of `text` in batches.
+
+        OCR text is one field per line; batching lines keeps every input well
+        under the model's 512-token limit (long texts were silently truncated
+        when passed whole). Returns a flat list of grouped entities, each with
+        a 'line' index.
+        """
+        if not getattr(self, 'hf_ner', None):
+            return []
+        lines = [l.strip() for l in (text or '').splitlines() if l.strip()]
+        if not lines:
+            return []
+        outputs = self.hf_ner(lines, batch_size=self.hf_batch_size)
+        entities = []
+        for idx, ents in enumerate(outputs):
+            for ent in ents or []:
+                ent = dict(ent)
+                ent['line'] = idx
+                entities.append(ent)
+        return entities
 
     def calculate_similarity(self, image_path1=None, image_path2=None, text1=None, text2=None):
         """Calculate similarity between two images or two text inputs.
@@ -323,8 +793,7 @@ class TurkishMedicalOCR:
             # If spaCy is available, use vector similarity which is usually better
             if self.nlp:
                 try:
-                    doc1 = self.nlp(text1)
-                    doc2 = self.nlp(text2)
+                    doc1, doc2 = self.parse_many([text1, text2])
                     sim = doc1.similarity(doc2)
                     # spaCy similarity can sometimes be >1 or <0 in some versions; clamp
                     sim = max(0.0, min(float(sim), 1.0))
@@ -392,30 +861,14 @@ class TurkishMedicalOCR:
 
     def _levenshtein_ratio(self, a, b):
         # Return ratio in range 0..1
-        if a == b:
-            return 1.0
-        la = len(a)
-        lb = len(b)
-        if la == 0 or lb == 0:
-            return 0.0
-        # Initialize matrix
-        prev = list(range(lb + 1))
-        for i, ca in enumerate(a, 1):
-            curr = [i] + [0] * lb
-            for j, cb in enumerate(b, 1):
-                cost = 0 if ca == cb else 1
-                curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + cost)
-            prev = curr
-        dist = prev[-1]
-        maxlen = max(la, lb)
-        return max(0.0, 1.0 - (dist / maxlen))
+        return fuzzy.levenshtein_ratio(a, b)
 
     def _extract_custom_entities(self, text):
         """Extract custom medical entities using spaCy matcher."""
         if not self.nlp or not self.matcher:
             return []
         try:
-            doc = self.nlp(text)
+            doc = self.parse(text)
             matches = self.matcher(doc)
             custom_entities = []
             for match_id, start, end in matches:
@@ -433,37 +886,58 @@ class TurkishMedicalOCR:
             logger.warning(f"_extract_custom_entities error: {e}")
             return []
 
-    def _classify_document(self, text, doc=None):
+    def _term_automaton(self):
+        """Compiled matcher over medical terms and classification keywords (built once)."""
+        if self._automaton is None:
+            patterns = []
+            for category, terms in (self.medical_terms or {}).items():
+                for term in terms:
+                    patterns.append((term.lower(), ('term', category, term)))
+            for rank, (doc_type, _, keywords) in enumerate(DOCUMENT_TYPE_RULES):
+                for keyword in keywords:
+                    patterns.append((keyword.lower(), ('doc_type', rank, doc_type)))
+            self._automaton = TermAutomaton(patterns)
+        return self._automaton
+
+    def _scan_terms(self, text):
+        """Single pass over the lowercased text; returns (start, end, payload) hits."""
+        return self._term_automaton().find_all(text.lower())
+
+    def _classify_document(self, text, doc=None, hits=None):
         """Classify medical document type using simple heuristics."""
         try:
-            text_lower = text.lower()
-            if any(term in text_lower for term in ["sgk", "sosyal güvenlik", "cihaz raporu"]):
-                return {"type": "sgk_device_report", "confidence": 0.95}
-            elif any(term in text_lower for term in ["reçete", "prescription", "ilaç"]):
-                return {"type": "prescription", "confidence": 0.90}
-            elif any(term in text_lower for term in ["odyometri", "audiometry", "işitme testi"]):
-                return {"type": "audiometry_report", "confidence": 0.88}
-            elif any(term in text_lower for term in ["rapor", "muayene", "bulgular"]):
-                return {"type": "medical_report", "confidence": 0.75}
-            else:
-                return {"type": "other", "confidence": 0.50}
+            if hits is None:
+                hits = self._scan_terms(text)
+            ranks = [payload[1] for _, _, payload in hits if payload[0] == 'doc_type']
+            if ranks:
+                doc_type, confidence, _ = DOCUMENT_TYPE_RULES[min(ranks)]
+                return {"type": doc_type, "confidence": confidence}
+            return {"type": "other", "confidence": 0.50}
         except Exception as e:
             logger.warning(f"_classify_document error: {e}")
             return {"type": "unknown", "confidence": 0.0}
 
-    def _extract_medical_terms(self, text):
-        """Extract known medical terms from text heuristically."""
+    def _extract_medical_terms(self, text, hits=None):
+        """Extract known medical terms from text heuristically (first occurrence of each term)."""
         found_terms = []
         try:
-            text_lower = text.lower()
+            if hits is None:
+                hits = self._scan_terms(text)
+            first = {}
+            for start, end, payload in hits:
+                if payload[0] != 'term':
+                    continue
+                if payload not in first or start < first[payload][0]:
+                    first[payload] = (start, end)
             for category, terms in (self.medical_terms or {}).items():
                 for term in terms:
-                    if term.lower() in text_lower:
+                    span = first.get(('term', category, term))
+                    if span:
                         found_terms.append({
                             "term": term,
                             "category": category,
-                            "start": text_lower.find(term.lower()),
-                            "end": text_lower.find(term.lower()) + len(term)
+                            "start": span[0],
+                            "end": span[1]
                         })
         except Exception as e:
             logger.warning(f"_extract_medical_terms error: {e}")
@@ -613,7 +1087,7 @@ class TurkishMedicalOCR:
             # If HuggingFace NER is available, prefer it for Turkish NER (PERSON extraction)
             if getattr(self, 'hf_ner', None):
                 try:
-                    hf_ents = self.hf_ner(full_text)
+                    hf_ents = self.hf_entities(full_text)
                     # hf_ner with grouped_entities returns [{'entity_group':'PER','score':..., 'word':'...'}]
                     person_candidates = [e for e in hf_ents if e.get('entity_group') in ('PER', 'PERSON')]
                     if person_candidates:
@@ -624,7 +1098,7 @@ class TurkishMedicalOCR:
                 except Exception as e:
                     logger.warning(f"HF NER failed: {e}")
             if self.nlp:
-                doc = self.nlp(full_text)
+                doc = self.parse(full_text)
                 # Try common PERSON labels (depends on model - could be 'PER' or 'PERSON')
                 person_labels = set(['PER', 'PERSON', 'Person', 'PERSON_NAME'])
                 person_entities = [ent for ent in getattr(doc, 'ents', []) if ent.label_ in person_labels]
@@ -731,6 +1205,52 @@ class TurkishMedicalOCR:
 
         raise RuntimeError('No compatible OCR call found')
 
+    def _prepare_image(self, image_path=None, image_bytes=None, auto_crop=False, max_side=OCR_MAX_SIDE, preprocess=()):
+        """Decode the input once and apply auto-crop, downscaling and `preprocess` steps in memory.
+
+        Returns (array, transformed) where `transformed` tells whether the array
+        differs from the encoded input; array is None if decoding failed.
+        """
+        try:
+            import cv2
+            try:
+                from utils.document_scanner import auto_crop_mode, crop_document, decode_image
+            except ImportError:
+                from backend.utils.document_scanner import auto_crop_mode, crop_document, decode_image
+        except Exception as e:
+            logger.warning(f"Image helpers not available: {e}")
+            return None, False
+
+        with stage('decode'):
+            image = decode_image(image_bytes) if image_bytes else cv2.imread(image_path)
+        if image is None:
+            return None, False
+
+        transformed = False
+        mode = auto_crop_mode(auto_crop)
+        if mode:
+            with stage('auto_crop'):
+                # Warps straight to max_side, so the resize below is usually a no-op
+                cropped = crop_document(image, max_side=max_side, mode=mode)
+            if cropped is not None:
+                image = cropped
+                transformed = True
+
+        h, w = image.shape[:2]
+        if max(h, w) > max_side:
+            with stage('resize'):
+                scale = max_side / float(max(h, w))
+                image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            transformed = True
+
+        if preprocess:
+            from utils.image_preprocess import preprocess as preprocess_image
+            with stage('preprocess'):
+                # Runs at OCR resolution, after the resize, so its cost does not grow with the photo
+                image = preprocess_image(image, preprocess)
+            transformed = True
+        return image, transformed
+
     def _ensure_safe_image(self, image_path, max_side=4000):
         """Ensure the image is not larger than max_side on any axis. If it is,
         create a resized temporary copy and return that path. Otherwise return
@@ -765,28 +1285,35 @@ class TurkishMedicalOCR:
             return image_path
 
     def _external_paddle_ocr(self, image_path):
-        """Invoke an external system Python process to run PaddleOCR if local
-        invocation is unreliable. Returns a list of entity dicts or None."""
+        """Run PaddleOCR outside this process if local invocation is unreliable.
+
+        Uses the persistent worker pool (model loaded once per worker) and only
+        spawns a one-shot worker process per image when the pool is disabled
+        with OCR_WORKER_POOL_SIZE=0. Returns a list of entity dicts or None.
+        """
+        pool = get_worker_pool()
+        if pool is None:
+            return self._external_paddle_ocr_oneshot(image_path)
+        try:
+            return pool.run(image_path)
+        except WorkerError as e:
+            logger.warning(f"PaddleOCR worker pool failed: {e}")
+            return None
+
+    def _external_paddle_ocr_oneshot(self, image_path):
+        """Invoke a fresh Python process per image to run PaddleOCR.
+        Returns a list of entity dicts or None."""
         import subprocess
         import json
-        import shutil
         import os
-        import sys
 
-        # Prefer the current virtualenv's python executable first, then common locations
-        candidates = [
-            sys.executable,
-            '/opt/homebrew/opt/python@3.13/bin/python3.13',
-            '/usr/bin/python3',
-            '/usr/local/bin/python3',
-            shutil.which('python3') or ''
-        ]
         worker_script = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'paddle_worker.py'))
         # Try current interpreter first (safer in virtualenvs), then fall back to candidates.
         tried = []
-        for py in [c for c in candidates if c]:
+        for py in python_candidates():
             try:
                 tried.append(py)
+                record_ocr_worker_spawn('oneshot')
                 proc = subprocess.run([py, worker_script, image_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
                 if proc.returncode != 0:
                     # continue trying other candidates
@@ -803,6 +1330,7 @@ class TurkishMedicalOCR:
                 logger.debug(f"_external_paddle_ocr candidate {py} failed: {e}")
                 continue
         logger.warning(f"_external_paddle_ocr: no working python candidates tried: {tried}")
+        record_ocr_failure('oneshot')
         return None
 
 def get_nlp_service(init_if_missing=True):
@@ -812,9 +1340,30 @@ def get_nlp_service(init_if_missing=True):
     return _nlp_service
 
 
-def initialize_nlp_service():
+def initialize_nlp_service(components=None):
+    """Load the given model components (default: all) on the shared service."""
     svc = get_nlp_service(init_if_missing=True)
     if svc is None:
         svc = TurkishMedicalOCR()
     svc.initialize()
+    svc.prewarm(components)
     return svc
+
+
+def prewarm_components():
+    """Components listed in OCR_PREWARM (comma separated or 'all'); PREWARM_OCR=1 means all."""
+    raw = os.getenv('OCR_PREWARM', '').strip().lower()
+    if not raw and os.getenv('PREWARM_OCR', '0') == '1':
+        raw = 'all'
+    if raw in ('all', '1', 'true'):
+        return list(TurkishMedicalOCR.COMPONENTS)
+    return [c.strip() for c in raw.split(',') if c.strip()]
+
+
+def model_status():
+    """Per-component load state for health checks; never creates the service or loads a model."""
+    svc = get_nlp_service(init_if_missing=False)
+    if svc is None:
+        return {name: {'state': 'not_loaded', 'error': None, 'loadSeconds': None, 'memoryMb': None, 'loadedAt': None}
+                for name in TurkishMedicalOCR.COMPONENTS}
+    return svc.component_status()
@@ -0,0 +1,374 @@
+"""Supervised pool of persistent PaddleOCR worker processes.
+
+Each worker runs `paddle_worker.py --serve`, loads the PaddleOCR model once and
+then answers JSON-line requests over stdin/stdout. Running OCR out of process
+keeps native crashes away from the Flask process; keeping the process alive
+removes the per-image interpreter start and model load.
+
+The pool restarts workers that crash or stop responding, recycles each worker
+after a configurable number of jobs and pings idle workers from a background
+supervisor thread. Configuration (environment variables):
+
+    OCR_WORKER_POOL_SIZE         number of workers, 0 disables the pool (default 2)
+    OCR_WORKER_MAX_JOBS          recycle a worker after this many jobs, 0 = never (default 200)
+    OCR_WORKER_TIMEOUT           per-job timeout in seconds (default 120)
+    OCR_WORKER_STARTUP_TIMEOUT   model load timeout in seconds (default 180)
+    OCR_WORKER_HEALTH_INTERVAL   seconds between idle worker pings, 0 disables (default 30)
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from utils.env import env_int
+from utils.metrics import record_ocr_failure, record_ocr_worker_spawn, set_ocr_worker_pool
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'paddle_worker.py'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class WorkerError(RuntimeError):
+    """Raised when a worker cannot be started, crashes or times out."""
+
+
+def python_candidates():
+    """Interpreters to try for the worker: the current virtualenv first, then common locations."""
+    candidates = [
+        sys.executable,
+        '/opt/homebrew/opt/python@3.13/bin/python3.13',
+        '/usr/bin/python3',
+        '/usr/local/bin/python3',
+        shutil.which('python3') or ''
+    ]
+    unique = []
+    for c in candidates:
+        if c and c not in unique:
+            unique.append(c)
+    return unique
+
+
+class PaddleWorker:
+    """A single `paddle_worker.py --serve` process and its stdout reader."""
+
+    def __init__(self, cmd, startup_timeout=180):
+        self.cmd = cmd
+        self.jobs_done = 0
+        self.started_at = time.time()
+        self._messages = queue.Queue()
+        self._stderr_tail = collections.deque(maxlen=20)
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+        try:
+            ready = self._next_message(time.monotonic() + startup_timeout)
+        except WorkerError:
+            self.kill()
+            raise
+        if not ready.get('ready'):
+            self.kill()
+            raise WorkerError(f"worker failed to load model: {ready.get('error')}")
+
+    @property
+    def pid(self):
+        return self.proc.pid
+
+    def _read_stdout(self):
+        try:
+            for line in self.proc.stdout:
+                self._messages.put(line)
+        except Exception:
+            pass
+        finally:
+            # EOF sentinel: the worker exited or closed its stdout
+            self._messages.put(None)
+
+    def _drain_stderr(self):
+        # Paddle logs heavily to stderr; keep only a short tail for crash diagnostics
+        try:
+            for line in self.proc.stderr:
+                self._stderr_tail.append(line.rstrip())
+        except Exception:
+            pass
+
+    def stderr_tail(self):
+        return '\n'.join(self._stderr_tail)
+
+    def _next_message(self, deadline):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkerError('worker timed out')
+            try:
+                line = self._messages.get(timeout=remaining)
+            except queue.Empty:
+                raise WorkerError('worker timed out')
+            if line is None:
+                raise WorkerError(f'worker exited (code={self.proc.poll()})')
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                return json.loads(line)
+            except ValueError:
+                logger.debug('Ignoring non-JSON worker output: %s', line[:200])
+
+    def request(self, payload, timeout):
+        """Send one request and wait for the reply carrying the same id."""
+        req_id = uuid.uuid4().hex
+        try:
+            self.proc.stdin.write(json.dumps(dict(payload, id=req_id), ensure_ascii=False) + '\n')
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise WorkerError(f'worker stdin closed: {e}')
+        deadline = time.monotonic() + timeout
+        while True:
+            msg = self._next_message(deadline)
+            if msg.get('id') == req_id:
+                return msg
+
+    def is_alive(self):
+        return self.proc.poll() is None
+
+    def ping(self, timeout=10):
+        try:
+            return bool(self.request({'op': 'ping'}, timeout).get('pong'))
+        except WorkerError:
+            return False
+
+    def close(self, timeout=2):
+        """Ask the worker to exit by closing stdin; kill it if it does not."""
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=timeout)
+        except Exception:
+            self.kill()
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=2)
+        except Exception:
+            pass
+
+
+class PaddleWorkerPool:
+    """Fixed-size pool of PaddleWorker slots. Workers are spawned lazily on
+    first use, replaced when they crash or time out and recycled after
+    `max_jobs` jobs."""
+
+    def __init__(self, size=None, max_jobs=None, job_timeout=None, startup_timeout=None,
+                 health_interval=None, worker_cmd=None):
+        self.size = max(1, size if size is not None else env_int('OCR_WORKER_POOL_SIZE', 2))
+        self.max_jobs = max_jobs if max_jobs is not None else env_int('OCR_WORKER_MAX_JOBS', 200)
+        self.job_timeout = job_timeout if job_timeout is not None else env_int('OCR_WORKER_TIMEOUT', 120)
+        self.startup_timeout = startup_timeout if startup_timeout is not None else env_int('OCR_WORKER_STARTUP_TIMEOUT', 180)
+        self.health_interval = health_interval if health_interval is not None else env_int('OCR_WORKER_HEALTH_INTERVAL', 30)
+        self._worker_cmd = worker_cmd
+        self._slots = queue.Queue()
+        for _ in range(self.size):
+            self._slots.put(None)
+        self._stats_lock = threading.Lock()
+        self._stats = {'spawned': 0, 'restarted': 0, 'recycled': 0, 'failed': 0, 'jobs': 0}
+        self._closed = threading.Event()
+        self._supervisor = None
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _spawn(self):
+        if self._worker_cmd:
+            commands = [self._worker_cmd]
+        else:
+            commands = [[py, WORKER_SCRIPT, '--serve'] for py in python_candidates()]
+        last_error = None
+        for cmd in commands:
+            try:
+                worker = PaddleWorker(cmd, startup_timeout=self.startup_timeout)
+            except (OSError, WorkerError) as e:
+                logger.debug('PaddleOCR worker %s failed to start: %s', cmd[0], e)
+                last_error = e
+                continue
+            # Remember the interpreter that worked so restarts skip the failing ones
+            self._worker_cmd = cmd
+            self._count('spawned')
+            record_ocr_worker_spawn('pool')
+            logger.info('Started PaddleOCR worker pid=%s (%s)', worker.pid, cmd[0])
+            return worker
+        raise WorkerError(f'could not start PaddleOCR worker: {last_error}')
+
+    def _ensure_supervisor(self):
+        if self._supervisor is not None or self.health_interval <= 0:
+            return
+        with self._stats_lock:
+            if self._supervisor is None:
+                self._supervisor = threading.Thread(target=self._supervise, name='paddle-pool-supervisor', daemon=True)
+                self._supervisor.start()
+
+    def _supervise(self):
+        while not self._closed.wait(self.health_interval):
+            try:
+                self.health_check()
+            except Exception as e:
+                logger.warning('PaddleOCR pool health check failed: %s', e)
+
+    def health_check(self):
+        """Ping idle workers and replace any that died or stopped responding.
+
+        Busy workers are skipped; they are checked when they return to the pool.
+        Returns the number of workers that had to be replaced.
+        """
+        replaced = 0
+        for _ in range(self._slots.qsize()):
+            try:
+                worker = self._slots.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if worker is not None and not (worker.is_alive() and worker.ping(min(self.job_timeout, 10))):
+                    logger.warning('PaddleOCR worker pid=%s failed health check; restarting. stderr: %s',
+                                   worker.pid, worker.stderr_tail()[-400:])
+                    worker.kill()
+                    worker = None
+                    replaced += 1
+                    self._count('restarted')
+                    if not self._closed.is_set():
+                        try:
+                            worker = self._spawn()
+                        except WorkerError as e:
+                            logger.warning('PaddleOCR worker restart failed: %s', e)
+            finally:
+                self._slots.put(worker)
+        return replaced
+
+    def prewarm(self):
+        """Start every idle slot's worker now (model load included) instead of on its first job.
+
+        Returns the number of workers started; slots that are busy already have one.
+        """
+        started = 0
+        for _ in range(self.size):
+            try:
+                worker = self._slots.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if worker is None or not worker.is_alive():
+                    worker = self._spawn()
+                    started += 1
+            except WorkerError as e:
+                logger.warning('PaddleOCR worker prewarm failed: %s', e)
+                worker = None
+            finally:
+                self._slots.put(worker)
+        self._ensure_supervisor()
+        return started
+
+    def submit(self, payload):
+        """Run one request on an idle worker and return the raw reply dict."""
+        if self._closed.is_set():
+            raise WorkerError('worker pool is shut down')
+        self._ensure_supervisor()
+        try:
+            worker = self._slots.get(timeout=self.job_timeout)
+        except queue.Empty:
+            record_ocr_failure('worker_pool')
+            raise WorkerError('no idle PaddleOCR worker available')
+        self._report_occupancy()
+        try:
+            if worker is not None and not worker.is_alive():
+                logger.warning('PaddleOCR worker pid=%s exited (code=%s); restarting. stderr: %s',
+                               worker.pid, worker.proc.poll(), worker.stderr_tail()[-400:])
+                worker = None
+                self._count('restarted')
+            if worker is None:
+                worker = self._spawn()
+            reply = worker.request(payload, self.job_timeout)
+            worker.jobs_done += 1
+            self._count('jobs')
+            if self.max_jobs and worker.jobs_done >= self.max_jobs:
+                logger.info('Recycling PaddleOCR worker pid=%s after %s jobs', worker.pid, worker.jobs_done)
+                worker.close()
+                worker = None
+                self._count('recycled')
+            return reply
+        except WorkerError:
+            self._count('failed')
+            record_ocr_failure('worker_pool')
+            if worker is not None:
+                worker.kill()
+                worker = None
+            raise
+        finally:
+            self._slots.put(worker)
+            self._report_occupancy()
+
+    def _report_occupancy(self):
+        idle = self._slots.qsize()
+        set_ocr_worker_pool(self.size - idle, idle)
+
+    def run(self, image_path):
+        """OCR one image and return a list of {'text', 'confidence'} entities."""
+        reply = self.submit({'op': 'ocr', 'path': image_path})
+        if reply.get('error'):
+            raise WorkerError(reply['error'])
+        return reply.get('entities') or []
+
+    def run_regions(self, image_path, regions):
+        """OCR only the given regions ([{'name', 'box'}], fractional boxes) of one image.
+
+        Returns {region name: [{'text', 'confidence'}]}.
+        """
+        reply = self.submit({'op': 'ocr_regions', 'path': image_path, 'regions': regions})
+        if reply.get('error'):
+            raise WorkerError(reply['error'])
+        return reply.get('regions') or {}
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        idle = self._slots.qsize()
+        data.update({'size': self.size, 'idle': idle, 'busy': self.size - idle})
+        return data
+
+    def shutdown(self):
+        self._closed.set()
+        while True:
+            try:
+                worker = self._slots.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+
+
+def get_worker_pool(create=True):
+    """Return the process-wide worker pool, or None when disabled (OCR_WORKER_POOL_SIZE=0)."""
+    global _pool
+    if _pool is None and create and env_int('OCR_WORKER_POOL_SIZE', 2) > 0:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PaddleWorkerPool()
+                atexit.register(_pool.shutdown)
+    return _pool
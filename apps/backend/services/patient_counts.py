@@ -0,0 +1,147 @@
+"""Total counts for patient list pagination.
+
+Counting every matching row on each page request costs more than fetching
+the page once the table is large, so the total is computed in one of three
+modes:
+
+* exact     `count()` of the filtered query on every request.
+* cached    the exact count, remembered per filter signature for a short
+            TTL. Patient rows created, updated or deleted through the ORM in
+            this process clear the cache when their transaction commits;
+            writes from other processes show up after the TTL.
+* estimate  the table's row count from database statistics (SQLite
+            sqlite_stat1 after ANALYZE, PostgreSQL pg_class.reltuples, MySQL
+            information_schema). Only unfiltered lists can be estimated;
+            filtered lists, or a database without statistics, use 'cached'.
+
+Configuration (environment variables):
+
+    PATIENT_COUNT_MODE          exact, cached or estimate (default cached)
+    PATIENT_COUNT_CACHE_TTL     seconds a cached count is reused (default 30)
+    PATIENT_COUNT_CACHE_SIZE    filter signatures kept, least recently used dropped first (default 256)
+"""
+import collections
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from models.base import db
+from utils.env import env_int
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODES = ('exact', 'cached', 'estimate')
+
+# LRU of filter signature -> (total, computed at)
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+_hooks_installed = False
+_PENDING_KEY = 'patient_counts_stale'
+
+
+def count_mode(value=None):
+    """Normalize a requested count mode; None or '' selects PATIENT_COUNT_MODE. Raises ValueError if unknown."""
+    if not value:
+        value = os.getenv('PATIENT_COUNT_MODE', 'cached')
+        if value.strip().lower() not in COUNT_MODES:
+            return 'cached'
+    mode = value.strip().lower()
+    if mode not in COUNT_MODES:
+        raise ValueError(f"Unknown count mode: {value}. Use one of {', '.join(COUNT_MODES)}.")
+    return mode
+
+
+def estimate_rows(table):
+    """Row count of `table` from database statistics, or None when the database has none."""
+    bind = db.session.get_bind()
+    try:
+        if bind.dialect.name == 'sqlite':
+            stat = db.session.execute(text('SELECT stat FROM sqlite_stat1 WHERE tbl = :t LIMIT 1'),
+                                      {'t': table}).scalar()
+            return int(stat.split()[0]) if stat else None
+        if bind.dialect.name == 'postgresql':
+            rows = db.session.execute(text('SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:t AS regclass)'),
+                                      {'t': table}).scalar()
+            # -1 until the table was first vacuumed/analyzed
+            return int(rows) if rows is not None and rows >= 0 else None
+        if bind.dialect.name in ('mysql', 'mariadb'):
+            rows = db.session.execute(text('SELECT table_rows FROM information_schema.tables '
+                                           'WHERE table_schema = DATABASE() AND table_name = :t'), {'t': table}).scalar()
+            return int(rows) if rows is not None else None
+    except Exception as e:
+        # e.g. sqlite_stat1 does not exist before the first ANALYZE
+        logger.debug('No row estimate for %s: %s', table, e)
+        db.session.rollback()
+    return None
+
+
+def count_total(query, signature, mode=None):
+    """Total rows of `query` for pagination; returns (total, mode actually used).
+
+    `signature` identifies the filters applied to `query` (hashable; None or
+    an empty tuple for the unfiltered list).
+    """
+    mode = count_mode(mode)
+    if mode == 'estimate':
+        if not signature:
+            estimate = estimate_rows('patients')
+            if estimate is not None:
+                return estimate, 'estimate'
+        mode = 'cached'
+    if mode == 'cached':
+        _install_session_hooks()
+        ttl = env_int('PATIENT_COUNT_CACHE_TTL', 30)
+        now = time.monotonic()
+        with _cache_lock:
+            hit = _cache.get(signature)
+            if hit is not None:
+                if now - hit[1] < ttl:
+                    _cache.move_to_end(signature)
+                    return hit[0], 'cached'
+                del _cache[signature]
+        total = query.order_by(None).count()
+        size = max(1, env_int('PATIENT_COUNT_CACHE_SIZE', 256))
+        with _cache_lock:
+            _cache[signature] = (total, now)
+            _cache.move_to_end(signature)
+            while len(_cache) > size:
+                _cache.popitem(last=False)
+        return total, 'cached'
+    return query.order_by(None).count(), 'exact'
+
+
+def clear_count_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+# -- invalidation via SQLAlchemy session events --------------------------------
+
+def _after_flush(session, flush_context):
+    from models.patient import Patient
+    if any(isinstance(obj, Patient) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info[_PENDING_KEY] = True
+
+
+def _after_commit(session):
+    if session.info.pop(_PENDING_KEY, None):
+        clear_count_cache()
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _install_session_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _hooks_installed = True
@@ -0,0 +1,392 @@
+"""Streaming CSV import of patients with batched upserts.
+
+The upload is parsed as a stream, `PATIENT_IMPORT_CHUNK_ROWS` rows at a time.
+For each chunk the existing patients are fetched with one IN query on TC
+number and phone, the rows are sorted into inserts and updates in memory, and
+the chunk is written with two bulk statements (ORM bulk INSERT and bulk
+UPDATE by primary key) inside a savepoint, then committed. A chunk that still
+hits a constraint - e.g. another writer took a phone number in the meantime -
+is replayed row by row, so the error is reported against its row and the
+rest of the chunk is kept.
+
+An import is therefore not all-or-nothing: if a chunk fails outright (the
+database goes away, a disk fills up), the chunks before it stay committed.
+`PatientImport.committed_rows` is the number of leading CSV rows that are
+safely written; re-uploading the rows after it finishes the import.
+
+Rows are matched to existing patients by TC number; a new row whose phone
+already belongs to another patient is reported as an error. Bulk statements
+bypass ORM events, so the search index (services.patient_search), the identity
+index (services.patient_index) and cached list totals (services.patient_counts)
+are updated explicitly after every chunk.
+
+Large files can be imported as a background job on the OCR job queue
+(services.ocr_jobs, kind 'patient_import' in its own 'import' lane, so OCR
+jobs keep running meanwhile): the upload is kept in the job's storage dir, the total row count is taken first, and every chunk commits a
+checkpoint (rows done, created, updated, errors, seconds) together with its
+rows. A job re-queued after its process died resumes after the last
+checkpointed row; `import_progress()` turns the checkpoint into rows done,
+error count and an ETA for polling clients.
+
+Configuration (environment variables):
+
+    PATIENT_IMPORT_CHUNK_ROWS   rows parsed, looked up and written per chunk (default 1000)
+"""
+import csv
+import io
+import json
+import logging
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.base import db, now_utc
+from models.enums import PatientStatus
+from models.patient import Patient
+from utils.env import env_int
+
+logger = logging.getLogger(__name__)
+
+# CSV/API field -> column for fields an import may change on an existing patient
+UPDATABLE_FIELDS = {
+    'firstName': 'first_name', 'lastName': 'last_name', 'phone': 'phone', 'email': 'email',
+    'birthDate': 'birth_date', 'gender': 'gender', 'status': 'status', 'segment': 'segment', 'tags': 'tags',
+}
+REQUIRED_FIELDS = ('firstName', 'lastName', 'phone')
+
+
+def _cell(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def row_payload(row):
+    """API-style patient payload (camelCase keys) from a CSV row; accepts the common column aliases."""
+    payload = {
+        'tcNumber': _cell(row, 'tcNumber', 'tc_number', 'tc'),
+        'identityNumber': _cell(row, 'identityNumber', 'identity_number'),
+        'firstName': _cell(row, 'firstName', 'first_name', 'first'),
+        'lastName': _cell(row, 'lastName', 'last_name', 'last'),
+        'phone': _cell(row, 'phone', 'phone_number', 'tel'),
+        'email': _cell(row, 'email'),
+        'birthDate': _cell(row, 'birthDate', 'dob'),
+        'gender': _cell(row, 'gender'),
+        'status': _cell(row, 'status'),
+        'segment': _cell(row, 'segment'),
+    }
+    # Address fields support flat CSV columns
+    address = {}
+    for column, key in (('address_city', 'city'), ('address_district', 'district'), ('address_full', 'fullAddress')):
+        if _cell(row, column):
+            address[key] = _cell(row, column)
+    if address:
+        payload['address'] = address
+    # Tags may be provided as a comma separated (CSV-quoted) string
+    tags_value = _cell(row, 'tags')
+    if tags_value:
+        payload['tags'] = [t.strip() for t in next(csv.reader([tags_value])) if t.strip()]
+    return payload
+
+
+def _update_values(payload):
+    """Column values an existing patient takes from `payload` (fields left empty are not changed)."""
+    values = {}
+    for field, column in UPDATABLE_FIELDS.items():
+        value = payload.get(field)
+        if value is None:
+            continue
+        if field == 'tags':
+            value = json.dumps(value)
+        elif field == 'birthDate':
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                continue
+        elif field == 'status':
+            value = PatientStatus.from_legacy(value)
+        values[column] = value
+    return values
+
+
+def _insert_values(payload, now):
+    """Column values of a new patient: Patient.column_values plus the timestamps the ORM would fill in."""
+    values = Patient.column_values(payload)
+    values.update(custom_data=None, created_at=now, updated_at=now)
+    return values
+
+
+def iter_csv_chunks(stream, chunk_rows, skip_rows=0):
+    """Yield lists of (row number, row dict) from a binary CSV stream (UTF-8, optional BOM).
+
+    The first `skip_rows` rows are parsed but not yielded; row numbers still count them.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        chunk = []
+        for row_num, row in enumerate(csv.DictReader(text), start=1):
+            if row_num <= skip_rows:
+                continue
+            chunk.append((row_num, row))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        # Leave the underlying upload stream open for its owner
+        text.detach()
+
+
+def count_csv_rows(stream):
+    """Number of data rows in a binary CSV stream (quoted newlines are handled); rewinds the stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        rows = sum(1 for _ in csv.reader(text))
+    finally:
+        text.detach()
+    stream.seek(0)
+    # Blank lines are not returned by the reader; the header line is
+    return max(0, rows - 1)
+
+
+class PatientImport:
+    """Imports patient CSV rows chunk by chunk and keeps the running summary.
+
+    `checkpoint(summary)` is called after every chunk, inside the chunk's
+    transaction and just before it commits. `committed_rows` counts the CSV
+    rows whose chunk has committed.
+    """
+
+    def __init__(self, chunk_rows=None, checkpoint=None):
+        self.chunk_rows = max(1, chunk_rows or env_int('PATIENT_IMPORT_CHUNK_ROWS', 1000))
+        self.checkpoint = checkpoint
+        self.created = 0
+        self.updated = 0
+        self.rows = 0
+        self.errors = []
+        self.seconds = 0.0
+        self.committed_rows = 0
+
+    def resume(self, summary):
+        """Continue from an earlier summary(); run() then skips the rows it covers."""
+        self.created = summary.get('created') or 0
+        self.updated = summary.get('updated') or 0
+        self.rows = summary.get('rows') or 0
+        self.errors = list(summary.get('errors') or [])
+        self.seconds = summary.get('seconds') or 0.0
+        self.committed_rows = self.rows
+        return self
+
+    def run(self, stream):
+        """Import every row of a binary CSV stream not covered yet; returns summary()."""
+        for chunk in iter_csv_chunks(stream, self.chunk_rows, skip_rows=self.rows):
+            self.import_chunk(chunk)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'errors': sorted(self.errors, key=lambda e: e['row']),
+            'rows': self.rows,
+            'seconds': round(self.seconds, 3),
+            'rowsPerSecond': round(self.rows / self.seconds, 1) if self.seconds > 0 else None,
+        }
+
+    def import_chunk(self, chunk):
+        """Look up, write and commit one chunk of (row number, row dict)."""
+        started = time.perf_counter()
+        written = self._write(self._plan(chunk))
+        for _, kind, _, _ in written:
+            if kind == 'create':
+                self.created += 1
+            else:
+                self.updated += 1
+        self.rows += len(chunk)
+        self.seconds += time.perf_counter() - started
+        if self.checkpoint:
+            self.checkpoint(self.summary())
+        self._commit({patient_id for _, _, patient_id, _ in written})
+        self.committed_rows = self.rows
+
+    def _existing(self, payloads):
+        tcs = {p['tcNumber'] for p in payloads if p.get('tcNumber')}
+        phones = {p['phone'] for p in payloads if p.get('phone')}
+        by_tc, by_phone = {}, {}
+        clauses = []
+        if tcs:
+            clauses.append(Patient.tc_number.in_(tcs))
+        if phones:
+            clauses.append(Patient.phone.in_(phones))
+        if clauses:
+            rows = db.session.execute(sa.select(Patient.id, Patient.tc_number, Patient.phone).where(sa.or_(*clauses)))
+            for patient_id, tc, phone in rows:
+                if tc:
+                    by_tc[tc] = patient_id
+                by_phone[phone] = patient_id
+        return by_tc, by_phone
+
+    def _plan(self, chunk):
+        """Sort a chunk into [(row number, 'create' | 'update', patient id, values)] against one IN lookup."""
+        now = now_utc()
+        prepared = []
+        for row_num, row in chunk:
+            try:
+                prepared.append((row_num, row_payload(row)))
+            except Exception as e:
+                self.errors.append({'row': row_num, 'error': str(e)})
+        by_tc, by_phone = self._existing([p for _, p in prepared])
+
+        ops = []
+        for row_num, payload in prepared:
+            try:
+                tc, phone = payload.get('tcNumber'), payload.get('phone')
+                patient_id = by_tc.get(tc) if tc else None
+                if phone and by_phone.get(phone, patient_id) != patient_id:
+                    raise ValueError(f'Phone {phone} already belongs to patient {by_phone[phone]}')
+                if patient_id:
+                    values = _update_values(payload)
+                    values['updated_at'] = now
+                    ops.append((row_num, 'update', patient_id, values))
+                else:
+                    missing = [f for f in REQUIRED_FIELDS if not payload.get(f)]
+                    if missing:
+                        raise ValueError(f'Missing required fields: {",".join(missing)}')
+                    values = _insert_values(payload, now)
+                    patient_id = values['id']
+                    ops.append((row_num, 'create', patient_id, values))
+                    if tc:
+                        by_tc[tc] = patient_id
+                if phone:
+                    by_phone[phone] = patient_id
+            except Exception as e:
+                self.errors.append({'row': row_num, 'error': str(e)})
+        return ops
+
+    def _write(self, ops):
+        """Write ops in the current transaction; returns the ops written."""
+        if not ops:
+            return []
+        # One INSERT and one UPDATE per chunk; later rows for the same patient
+        # (a TC repeated in the file) are merged into its statement values
+        inserts, updates = {}, {}
+        for _, kind, patient_id, values in ops:
+            if kind == 'create':
+                inserts[patient_id] = dict(values)
+            elif patient_id in inserts:
+                inserts[patient_id].update(values)
+            else:
+                updates.setdefault(patient_id, {'id': patient_id}).update(values)
+        try:
+            with db.session.begin_nested():
+                if inserts:
+                    db.session.execute(sa.insert(Patient), list(inserts.values()))
+                if updates:
+                    db.session.execute(sa.update(Patient), list(updates.values()))
+            written = ops
+        except SQLAlchemyError as e:
+            logger.info('Bulk write of %d rows failed (%s); retrying row by row', len(ops), e.__class__.__name__)
+            written = self._write_rows(ops)
+        return written
+
+    def _write_rows(self, ops):
+        """Write ops one savepoint each so a failing row only costs itself; returns the ops written."""
+        written = []
+        failed = set()
+        for row_num, kind, patient_id, values in ops:
+            if patient_id in failed:
+                self.errors.append({'row': row_num, 'error': 'Patient from an earlier row of this file was not imported'})
+                continue
+            try:
+                with db.session.begin_nested():
+                    if kind == 'create':
+                        db.session.execute(sa.insert(Patient), [values])
+                    else:
+                        db.session.execute(sa.update(Patient), [dict(values, id=patient_id)])
+                written.append((row_num, kind, patient_id, values))
+            except SQLAlchemyError as e:
+                if kind == 'create':
+                    failed.add(patient_id)
+                self.errors.append({'row': row_num, 'error': str(getattr(e, 'orig', None) or e)})
+        return written
+
+    def _commit(self, patient_ids):
+        from services.patient_search import index_patient_ids
+        if patient_ids:
+            index_patient_ids(db.session.connection(), patient_ids)
+        db.session.commit()
+        if patient_ids:
+            _patients_changed(patient_ids)
+
+
+def run_import_job(payload):
+    """OCR job queue handler for kind 'patient_import': imports payload['path'], resuming from the last checkpoint."""
+    from models.ocr_job import OCRJob
+    from services.ocr_jobs import save_progress
+    job_id = payload['jobId']
+    job = db.session.get(OCRJob, job_id)
+    progress = (job.progress_json if job else None) or {}
+
+    with open(payload['path'], 'rb') as f:
+        total = progress.get('totalRows')
+        if total is None:
+            total = count_csv_rows(f)
+            save_progress(job_id, {'totalRows': total, 'rows': 0})
+            db.session.commit()
+        elif progress.get('rows'):
+            logger.info('Resuming patient import job %s after row %d of %d', job_id, progress['rows'], total)
+
+        importer = PatientImport(checkpoint=lambda summary: save_progress(job_id, dict(summary, totalRows=total)))
+        importer.resume(progress)
+        summary = importer.run(f)
+    return dict(summary, totalRows=total, fileName=payload.get('fileName'))
+
+
+def import_progress(job):
+    """Progress of a 'patient_import' job for polling clients: rows done, errors and an ETA."""
+    state = job.result_json if job.status == 'succeeded' else job.progress_json
+    state = state or {}
+    total = state.get('totalRows')
+    done = state.get('rows') or 0
+    rate = state.get('rowsPerSecond')
+    eta = None
+    if job.status == 'running' and total is not None and rate:
+        eta = round(max(0, total - done) / rate, 1)
+    elif job.status == 'succeeded':
+        eta = 0
+    return {
+        'id': job.id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'totalRows': total,
+        'rowsDone': done,
+        'percent': round(100.0 * done / total, 1) if total else (100.0 if job.status == 'succeeded' else 0.0),
+        'created': state.get('created') or 0,
+        'updated': state.get('updated') or 0,
+        'errorCount': len(state.get('errors') or []),
+        'errors': sorted(state.get('errors') or [], key=lambda e: e['row']),
+        'rowsPerSecond': rate,
+        'etaSeconds': eta,
+        'error': job.error,
+        'startedAt': job.started_at.isoformat() if job.started_at else None,
+        'finishedAt': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _patients_changed(patient_ids):
+    """Apply committed bulk writes to the in-process identity index and list totals."""
+    from services.patient_counts import clear_count_cache
+    from services.patient_index import get_patient_index
+    clear_count_cache()
+    index = get_patient_index()
+    if index is None:
+        return
+    rows = db.session.execute(sa.select(Patient.id, Patient.tc_number, Patient.first_name, Patient.last_name)
+                              .where(Patient.id.in_(patient_ids)))
+    for row in rows:
+        index.upsert(*row)
@@ -0,0 +1,383 @@
+"""In-memory patient identity index used to match OCR output to patients.
+
+Matching an uploaded SGK page against the patients table used to run a
+`LIKE '%digits%'` over `tc_number` and chained `replace()` calls over the
+name columns, i.e. a full table scan per page. This index keeps just the
+identity fields in memory:
+
+* TC digits: a suffix array (every suffix of 5+ digits, encoded as int64 and
+  sorted) so any digit substring - masked prefixes like `3390159*****`
+  included - is found with two binary searches.
+* Names: a trigram index over the Turkish-folded "first last" name, ranked
+  by Dice similarity.
+
+The index is built in a background thread at startup and kept current by
+SQLAlchemy session hooks (Patient rows created, updated or deleted through
+the ORM in this process are applied after commit). Writes made by other
+processes are picked up by a periodic `updated_at` catch-up (indexed by
+ix_patients_updated_at) that the same background thread runs after the
+build, so request threads never wait on it. Lookups return
+patient ids; callers load the rows from the database, so a patient deleted
+elsewhere simply drops out.
+
+Configuration (environment variables):
+
+    PATIENT_INDEX_ENABLED        0 disables the index; lookups fall back to SQL (default 1)
+    PATIENT_INDEX_SYNC_SECONDS   catch-up interval for writes from other processes (default 30)
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+import numpy as np
+
+from utils.env import env_int
+from utils.fuzzy import TURKISH_FOLD
+
+logger = logging.getLogger(__name__)
+
+MIN_TC_QUERY = 5
+TC_LENGTH = 11
+# Catch-up syncs re-read a small overlap so rows committed during the previous sync are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+_index = None
+_index_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def normalize_name(value):
+    """Fold Turkish characters to ASCII, lowercase and keep letters/spaces only."""
+    folded = (value or '').translate(TURKISH_FOLD).lower()
+    return ' '.join(''.join(c if c.isalpha() else ' ' for c in folded).split())
+
+
+def tc_digits(value):
+    return ''.join(c for c in str(value or '') if c.isdigit())[:TC_LENGTH]
+
+
+def is_valid_tc(tc):
+    """Turkish ID number (TCKN) checksum: 11 digits, no leading zero, two check digits."""
+    if len(tc) != TC_LENGTH or not tc.isdigit() or tc[0] == '0':
+        return False
+    d = [int(c) for c in tc]
+    if (sum(d[0:9:2]) * 7 - sum(d[1:8:2])) % 10 != d[9]:
+        return False
+    return sum(d[:10]) % 10 == d[10]
+
+
+def _trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _encode(digits):
+    return int(digits.ljust(TC_LENGTH, '0'))
+
+
+class PatientIdentityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self._reset()
+
+    def _reset(self):
+        self._ids = []          # slot -> patient id
+        self._slot_of = {}      # patient id -> slot
+        self._tc = []           # slot -> TC digits ('' when unknown or deleted)
+        self._name = []         # slot -> normalized full name
+        self._gram_count = []   # slot -> number of distinct trigrams in current name
+        # TC suffix array (bulk part) plus an unsorted delta for incremental updates
+        self._suffix_keys = np.empty(0, dtype=np.int64)
+        self._suffix_slots = np.empty(0, dtype=np.int32)
+        self._suffix_delta = []
+        self._grams = {}        # trigram -> array('i') of slots
+        self._stale = 0         # superseded postings since the last rebuild
+        self.synced_at = None
+
+    # -- building -----------------------------------------------------------
+
+    def build(self, rows):
+        """(Re)build from an iterable of (id, tc_number, first_name, last_name)."""
+        with self._lock:
+            self._reset()
+            keys = []
+            slots = []
+            for row in rows:
+                self._add(*row, postings=keys, posting_slots=slots)
+            self._suffix_keys = np.array(keys, dtype=np.int64)
+            self._suffix_slots = np.array(slots, dtype=np.int32)
+            order = np.argsort(self._suffix_keys, kind='stable')
+            self._suffix_keys = self._suffix_keys[order]
+            self._suffix_slots = self._suffix_slots[order]
+            self.ready = True
+        return self
+
+    def _add(self, patient_id, tc_number, first_name, last_name, postings=None, posting_slots=None):
+        slot = self._slot_of.get(patient_id)
+        if slot is None:
+            slot = len(self._ids)
+            self._slot_of[patient_id] = slot
+            self._ids.append(patient_id)
+            self._tc.append('')
+            self._name.append('')
+            self._gram_count.append(0)
+
+        tc = tc_digits(tc_number)
+        if tc and tc != self._tc[slot]:
+            for i in range(0, len(tc) - MIN_TC_QUERY + 1):
+                key = _encode(tc[i:])
+                if postings is not None:
+                    postings.append(key)
+                    posting_slots.append(slot)
+                else:
+                    self._suffix_delta.append((key, slot))
+        self._tc[slot] = tc
+
+        name = normalize_name(f'{first_name or ""} {last_name or ""}')
+        grams = _trigrams(name) if name else set()
+        if name != self._name[slot]:
+            self._stale += self._gram_count[slot]
+            for gram in grams:
+                self._grams.setdefault(gram, array('i')).append(slot)
+        self._name[slot] = name
+        self._gram_count[slot] = len(grams)
+        return slot
+
+    def upsert(self, patient_id, tc_number, first_name, last_name):
+        with self._lock:
+            self._add(patient_id, tc_number, first_name, last_name)
+            if len(self._suffix_delta) > 5000:
+                self._merge_delta()
+            if self._stale > max(10000, len(self._ids)):
+                self._compact_grams()
+
+    def remove(self, patient_id):
+        with self._lock:
+            slot = self._slot_of.get(patient_id)
+            if slot is not None:
+                # Postings stay until the next compaction; lookups verify current values
+                self._tc[slot] = ''
+                self._name[slot] = ''
+                self._stale += self._gram_count[slot]
+                self._gram_count[slot] = 0
+
+    def _merge_delta(self):
+        keys = np.array([k for k, _ in self._suffix_delta], dtype=np.int64)
+        slots = np.array([s for _, s in self._suffix_delta], dtype=np.int32)
+        all_keys = np.concatenate([self._suffix_keys, keys])
+        all_slots = np.concatenate([self._suffix_slots, slots])
+        order = np.argsort(all_keys, kind='stable')
+        self._suffix_keys = all_keys[order]
+        self._suffix_slots = all_slots[order]
+        self._suffix_delta = []
+
+    def _compact_grams(self):
+        grams = {}
+        for slot, name in enumerate(self._name):
+            if name:
+                for gram in _trigrams(name):
+                    grams.setdefault(gram, array('i')).append(slot)
+        self._grams = grams
+        self._stale = 0
+
+    # -- lookups ------------------------------------------------------------
+
+    def find_by_tc(self, partial, limit=10):
+        """Ids of patients whose TC contains the OCR'd digits.
+
+        A full 11-digit number that fails the TCKN checksum was misread, so
+        only its first 9 (non-check) digits are used. When several patients
+        match, those with an invalid stored TC are dropped if any valid one
+        remains.
+        """
+        digits = tc_digits(partial)
+        if len(digits) == TC_LENGTH and not is_valid_tc(digits):
+            digits = digits[:9]
+        if len(digits) < MIN_TC_QUERY:
+            return []
+        lo = _encode(digits)
+        hi = int(digits.ljust(TC_LENGTH, '9'))
+        with self._lock:
+            start = np.searchsorted(self._suffix_keys, lo, side='left')
+            end = np.searchsorted(self._suffix_keys, hi, side='right')
+            slots = set(self._suffix_slots[start:end].tolist())
+            slots.update(s for k, s in self._suffix_delta if lo <= k <= hi)
+            # Verify against current values: drops padded-key collisions and superseded TCs
+            matches = sorted(s for s in slots if digits in self._tc[s])
+            if len(matches) > 1:
+                valid = [s for s in matches if is_valid_tc(self._tc[s])]
+                if valid:
+                    matches = valid
+            return [self._ids[s] for s in matches[:limit]]
+
+    def find_by_name(self, name, limit=20, min_score=0.3):
+        """[(id, dice_score)] of patients whose folded name shares the most trigrams."""
+        query = normalize_name(name)
+        if not query:
+            return []
+        q_grams = _trigrams(query)
+        with self._lock:
+            postings = [np.frombuffer(self._grams[g], dtype=np.int32) for g in q_grams if g in self._grams]
+            if not postings:
+                return []
+            slots, counts = np.unique(np.concatenate(postings), return_counts=True)
+            # Over-fetch on raw overlap, then re-score exactly against current names
+            top = slots[np.argsort(-counts, kind='stable')[:limit * 5]].tolist()
+            scored = []
+            for slot in top:
+                c_name = self._name[slot]
+                if not c_name:
+                    continue
+                c_grams = _trigrams(c_name)
+                score = 2.0 * len(q_grams & c_grams) / (len(q_grams) + len(c_grams))
+                if score >= min_score:
+                    scored.append((self._ids[slot], score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'patients': sum(1 for n, t in zip(self._name, self._tc) if n or t),
+                'tc_suffixes': int(self._suffix_keys.size) + len(self._suffix_delta),
+                'trigrams': len(self._grams),
+                'synced_at': self.synced_at.isoformat() if self.synced_at else None
+            }
+
+
+def get_patient_index():
+    """Return the process-wide index, or None when disabled or not loaded yet."""
+    if os.getenv('PATIENT_INDEX_ENABLED', '1') == '0':
+        return None
+    if _index is None or not _index.ready:
+        return None
+    return _index
+
+
+def _patient_rows(query):
+    from models.patient import Patient
+    return query.with_entities(Patient.id, Patient.tc_number, Patient.first_name, Patient.last_name).yield_per(5000)
+
+
+def load_patient_index():
+    """Build the index from the database (requires an app context)."""
+    global _index
+    from models.base import now_utc
+    from models.patient import Patient
+    started = time.monotonic()
+    synced_at = now_utc()
+    index = PatientIdentityIndex().build(_patient_rows(Patient.query))
+    index.synced_at = synced_at
+    with _index_lock:
+        _index = index
+    logger.info('Patient identity index loaded: %s patients in %.1fs', len(index._ids), time.monotonic() - started)
+    return index
+
+
+def sync_patient_index():
+    """Apply patient writes made by other processes since the last sync (requires an app context).
+
+    Runs in the index's background thread; only the upserts take the index
+    lock, so lookups are never blocked by the query.
+    """
+    index = _index
+    if index is None or index.synced_at is None:
+        return 0
+    from models.base import now_utc
+    from models.patient import Patient
+    now = now_utc()
+    since = index.synced_at.replace(tzinfo=None)
+    rows = _patient_rows(Patient.query.filter(Patient.updated_at >= since - SYNC_OVERLAP)).all()
+    for row in rows:
+        index.upsert(*row)
+    index.synced_at = now
+    return len(rows)
+
+
+def start_patient_index(app):
+    """Install the session hooks, then build the index and run the catch-up syncs in a background thread."""
+    if os.getenv('PATIENT_INDEX_ENABLED', '1') == '0':
+        return None
+    _install_session_hooks()
+    interval = env_int('PATIENT_INDEX_SYNC_SECONDS', 30)
+
+    def _run():
+        from models.base import db
+        with app.app_context():
+            try:
+                load_patient_index()
+            except Exception as e:
+                logger.warning('Patient identity index failed to load: %s', e)
+            finally:
+                db.session.remove()
+        while interval > 0 and not _stop.wait(interval):
+            with app.app_context():
+                try:
+                    sync_patient_index()
+                except Exception as e:
+                    logger.warning('Patient index sync failed: %s', e)
+                finally:
+                    db.session.remove()
+
+    _stop.clear()
+    t = threading.Thread(target=_run, name='patient-index-loader', daemon=True)
+    t.start()
+    return t
+
+
+def stop_patient_index():
+    """Stop the background catch-up loop started by start_patient_index."""
+    _stop.set()
+
+
+# -- incremental maintenance via SQLAlchemy session events --------------------
+
+_hooks_installed = False
+_PENDING_KEY = 'patient_index_pending'
+
+
+def _after_flush(session, flush_context):
+    from models.patient import Patient
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Patient):
+            pending[obj.id] = (obj.tc_number, obj.first_name, obj.last_name)
+    for obj in session.deleted:
+        if isinstance(obj, Patient):
+            pending[obj.id] = None
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    index = _index
+    if not pending or index is None:
+        return
+    for patient_id, values in pending.items():
+        try:
+            if values is None:
+                index.remove(patient_id)
+            else:
+                index.upsert(patient_id, *values)
+        except Exception as e:
+            logger.warning('Patient index update failed for %s: %s', patient_id, e)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _install_session_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _hooks_installed = True
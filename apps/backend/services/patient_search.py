@@ -0,0 +1,275 @@
+"""Indexed patient search for the list, search and export endpoints.
+
+Searching used to OR five `ilike('%term%')` filters, a full table scan per
+keystroke (two with the separate count). Every patient now has a normalized
+search document - Turkish-folded, lowercase name plus TC number, phone
+digits and e-mail - indexed in the database:
+
+* SQLite: an FTS5 table `patients_fts(patient_id, name, contact)`; ranked
+  with bm25(), name matches weighted higher. Entries are keyed on the
+  patient id (an UNINDEXED column), never on the rowid of `patients`: that
+  table has a string primary key, so a table rebuild (batch_alter_table,
+  VACUUM) renumbers its rowids.
+* PostgreSQL: a `search_document` column on `patients` with a pg_trgm GIN
+  index; every term must occur in it, ranked with word_similarity().
+* Other databases (or PostgreSQL without pg_trgm) fall back to the ILIKE
+  scan.
+
+Every query term matches as a prefix ('ayş yıl' finds 'Ayşe Yılmaz'), and
+digit-only input such as '0532 123' is treated as one phone/TC number. The
+index is written by mapper events in the same transaction as the patient,
+so creates and updates through the ORM keep it current; bulk statements
+(services/patient_import.py) call `index_patient_ids()` for the rows they
+wrote. Rows written with raw SQL need `reindex_patients()`
+(scripts/reindex_search.py).
+
+The index and the search documents of existing patients are created by the
+20261016_add_patient_search_index migration; request paths never run DDL.
+Databases built with db.create_all() instead (the development bootstrap in
+app.py) get them from `create_search_index()`. Without the index, search
+uses the ILIKE scan. The readiness check is shared with the SGK document
+search (services/search_index.py).
+"""
+import logging
+import re
+
+import sqlalchemy as sa
+from sqlalchemy import event, inspect, text
+
+from models.base import db
+from models.patient import Patient
+from services.search_index import SearchIndex, column_exists, table_exists
+from utils.fuzzy import fold
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'patients_fts'
+MAX_QUERY_TERMS = 8
+# bm25() column weights: (name, contact); patient_id is not searched
+NAME_WEIGHT = 3.0
+CONTACT_WEIGHT = 1.0
+SEARCH_FIELDS = ('first_name', 'last_name', 'tc_number', 'phone', 'email')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_PHONE_QUERY_RE = re.compile(r'[\d\s()+\-.]+')
+
+
+def _digits(value):
+    return ''.join(c for c in str(value or '') if c.isdigit())
+
+
+def phone_variants(phone):
+    """Digits of a phone number as typed in full, nationally (without 0/90) and the 7-digit subscriber part."""
+    digits = _digits(phone)
+    if not digits:
+        return []
+    variants = [digits]
+    national = digits[2:] if digits.startswith('90') and len(digits) > 10 else digits.lstrip('0')
+    variants.append(national)
+    if len(national) > 7:
+        variants.append(national[-7:])
+    return list(dict.fromkeys(v for v in variants if v))
+
+
+def search_document(patient):
+    """(name, contact) text indexed for a patient."""
+    name = fold(f'{patient.first_name or ""} {patient.last_name or ""}')
+    contact = [fold(patient.tc_number), _digits(patient.tc_number)] + phone_variants(patient.phone)
+    contact.append(fold(patient.email))
+    return ' '.join(name.split()), ' '.join(dict.fromkeys(c for c in contact if c))
+
+
+def query_terms(query):
+    """Normalized terms of a search box input; digit-only input is one number."""
+    query = (query or '').strip()
+    if _PHONE_QUERY_RE.fullmatch(query) and _digits(query):
+        digits = _digits(query)
+        if digits.startswith('90') and len(digits) > 10:
+            digits = digits[2:]
+        return [digits.lstrip('0') or digits]
+    return _WORD_RE.findall(fold(query))[:MAX_QUERY_TERMS]
+
+
+class PatientSearchIndex(SearchIndex):
+    label = 'Patient'
+    backends = {'sqlite': 'fts5', 'postgresql': 'trgm'}
+
+    def exists(self, conn, kind):
+        if kind == 'fts5':
+            return table_exists(conn, FTS_TABLE)
+        return column_exists(conn, 'patients', 'search_document')
+
+    def build(self, conn, kind):
+        if kind == 'fts5':
+            conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(patient_id UNINDEXED, name, contact, "
+                                 f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+        else:
+            conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            conn.exec_driver_sql('ALTER TABLE patients ADD COLUMN search_document text')
+            conn.exec_driver_sql('CREATE INDEX ix_patients_search_document '
+                                 'ON patients USING GIN (search_document gin_trgm_ops)')
+        _reindex(conn, kind)
+
+
+INDEX = PatientSearchIndex()
+
+
+def ensure_search_index(bind=None):
+    """Search backend usable on this database: 'fts5', 'trgm', or 'like' when the index is missing."""
+    return INDEX.ensure(bind)
+
+
+def create_search_index(bind=None):
+    """Create the migration's index on a database built by db.create_all() (see SearchIndex.create)."""
+    return INDEX.create(bind)
+
+
+def _write_index(connection, patient, kind, replace=True):
+    name, contact = search_document(patient)
+    if kind == 'fts5':
+        if replace:
+            connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE patient_id = :id'), {'id': patient.id})
+        connection.execute(text(f'INSERT INTO {FTS_TABLE} (patient_id, name, contact) VALUES (:id, :name, :contact)'),
+                           {'id': patient.id, 'name': name, 'contact': contact})
+    elif kind == 'trgm':
+        connection.execute(text('UPDATE patients SET search_document = :doc WHERE id = :id'),
+                           {'doc': f'{name} {contact}', 'id': patient.id})
+
+
+def reindex_patients(bind=None, batch_size=1000):
+    """Rebuild the search documents of every patient; returns the number indexed.
+
+    Maintenance only (scripts/reindex_search.py), e.g. after raw SQL writes.
+    Raises RuntimeError when the migration has not created the index.
+    """
+    bind = bind if bind is not None else db.engine
+    kind = ensure_search_index(bind)
+    if kind == 'like':
+        raise RuntimeError('Patient search index does not exist; run the database migrations first')
+    with bind.begin() as conn:
+        return _reindex(conn, kind, batch_size)
+
+
+def index_patient_ids(connection, ids):
+    """Write the search documents of patients `ids` (rows written with bulk INSERT/UPDATE statements)."""
+    ids = list(ids)
+    if not ids:
+        return
+    kind = ensure_search_index(connection)
+    if kind == 'like':
+        return
+    stmt = text('SELECT id, first_name, last_name, tc_number, phone, email FROM patients WHERE id IN :ids'
+                ).bindparams(sa.bindparam('ids', expanding=True))
+    rows = connection.execute(stmt, {'ids': ids}).fetchall()
+    if not rows:
+        return
+    if kind == 'fts5':
+        # patient_id is not indexed: one DELETE (one scan) for the whole batch
+        connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE patient_id IN :ids'
+                                ).bindparams(sa.bindparam('ids', expanding=True)), {'ids': [row.id for row in rows]})
+        connection.execute(text(f'INSERT INTO {FTS_TABLE} (patient_id, name, contact) VALUES (:id, :name, :contact)'),
+                           [dict(zip(('id', 'name', 'contact'), (row.id,) + search_document(row))) for row in rows])
+    else:
+        connection.execute(text('UPDATE patients SET search_document = :doc WHERE id = :id'),
+                           [{'doc': ' '.join(search_document(row)), 'id': row.id} for row in rows])
+
+
+def _reindex(conn, kind, batch_size=1000):
+    fts = kind == 'fts5'
+    if fts:
+        conn.exec_driver_sql(f'DELETE FROM {FTS_TABLE}')
+    count = 0
+    last_id = ''
+    while True:
+        rows = conn.execute(text('SELECT id, first_name, last_name, tc_number, phone, email '
+                                 'FROM patients WHERE id > :last ORDER BY id LIMIT :n'),
+                            {'last': last_id, 'n': batch_size}).fetchall()
+        if not rows:
+            return count
+        if fts:
+            # The table was emptied above: one multi-row insert per batch
+            conn.execute(text(f'INSERT INTO {FTS_TABLE} (patient_id, name, contact) VALUES (:id, :name, :contact)'),
+                         [dict(zip(('id', 'name', 'contact'), (row.id,) + search_document(row))) for row in rows])
+        else:
+            for row in rows:
+                _write_index(conn, row, kind)
+        count += len(rows)
+        last_id = rows[-1].id
+
+
+@event.listens_for(Patient, 'after_insert')
+def _index_new_patient(mapper, connection, target):
+    # A new id has no entry to replace (and patient_id is not indexed, so looking costs a scan)
+    _index_patient(connection, target, replace=False)
+
+
+@event.listens_for(Patient, 'after_update')
+def _index_changed_patient(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS):
+        _index_patient(connection, target)
+
+
+def _index_patient(connection, target, replace=True):
+    try:
+        kind = ensure_search_index(connection)
+        if kind != 'like':
+            _write_index(connection, target, kind, replace)
+    except Exception as e:
+        # Search may lag behind; the patient itself is still saved
+        logger.warning('Failed to index patient %s for search: %s', target.id, e)
+
+
+@event.listens_for(Patient, 'before_delete')
+def _unindex_patient(mapper, connection, target):
+    try:
+        if ensure_search_index(connection) != 'fts5':
+            return
+        connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE patient_id = :id'), {'id': target.id})
+    except Exception as e:
+        logger.warning('Failed to remove patient %s from the search index: %s', target.id, e)
+
+
+def _like_matches(terms, search):
+    pattern = f'%{search}%'
+    clauses = [Patient.first_name.ilike(pattern), Patient.last_name.ilike(pattern),
+               Patient.tc_number.ilike(pattern), Patient.phone.ilike(pattern), Patient.email.ilike(pattern)]
+    # Digit input normalized away from what was typed (e.g. a leading 0) still finds the phone
+    if len(terms) == 1 and terms[0].isdigit() and terms[0] != search:
+        clauses.append(Patient.phone.ilike(f'%{terms[0]}%'))
+    return sa.select(Patient.id.label('id'), sa.literal(0.0).label('score')).where(sa.or_(*clauses))
+
+
+def match_subquery(search):
+    """Subquery of (id, score) for patients matching `search`, or None when it has no searchable terms."""
+    terms = query_terms(search)
+    if not terms:
+        return None
+    kind = ensure_search_index()
+    if kind == 'fts5':
+        q = ' '.join(f'"{t}"*' for t in terms)
+        stmt = text(f'SELECT patient_id AS id, -bm25({FTS_TABLE}, 0.0, {NAME_WEIGHT}, {CONTACT_WEIGHT}) AS score '
+                    f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q').bindparams(q=q)
+    elif kind == 'trgm':
+        params = {'q': ' '.join(terms)}
+        where = []
+        for i, t in enumerate(terms):
+            params[f't{i}'] = '%' + t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where.append(f'search_document LIKE :t{i}')
+        stmt = text(f"SELECT id, word_similarity(:q, search_document) AS score FROM patients "
+                    f"WHERE {' AND '.join(where)}").bindparams(**params)
+    else:
+        return _like_matches(terms, search.strip()).subquery('patient_matches')
+    return stmt.columns(id=sa.String, score=sa.Float).subquery('patient_matches')
+
+
+def filter_patients(query, search):
+    """Narrow a Patient `query` to patients matching `search`.
+
+    Returns (query, score) where `score` is the relevance column to order by
+    (higher is better); a search without any terms matches nothing.
+    """
+    matches = match_subquery(search)
+    if matches is None:
+        return query.filter(sa.false()), sa.literal(0.0)
+    return query.join(matches, matches.c.id == Patient.id), matches.c.score
@@ -0,0 +1,103 @@
+"""Readiness checks shared by the full-text search indexes.
+
+services/document_search.py and services/patient_search.py each keep their
+index in the database (FTS5 on SQLite, an indexed column on PostgreSQL) and
+fall back to a LIKE scan without it. A `SearchIndex` subclass names the
+backend per dialect and says how to tell that the migration created the
+index; `ensure()` answers which backend is usable, cached per database URL,
+so mapper events and request paths check once. Request paths never run DDL:
+`create()` is only for the db.create_all() bootstrap in app.py.
+"""
+import logging
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from models.base import db
+
+logger = logging.getLogger(__name__)
+
+
+def table_exists(conn, name):
+    """True when SQLite table (or virtual table) `name` exists."""
+    return conn.execute(text('SELECT 1 FROM sqlite_master WHERE name = :name'), {'name': name}).first() is not None
+
+
+def column_exists(conn, table, column):
+    """True when `table` has `column` (information_schema, PostgreSQL)."""
+    return conn.execute(text('SELECT 1 FROM information_schema.columns WHERE table_name = :table '
+                             'AND column_name = :column'), {'table': table, 'column': column}).first() is not None
+
+
+class SearchIndex:
+    """One search index: its backend per dialect and whether the migration created it.
+
+    Subclasses set `label` and `backends` (dialect name -> backend kind;
+    other dialects use 'like') and implement `exists()` and `build()`.
+    """
+    label = 'Search'
+    backends = {}
+
+    def __init__(self):
+        self._ready = {}  # database URL -> backend kind
+        self._lock = threading.Lock()
+
+    def exists(self, conn, kind):
+        """True when the migration's index for backend `kind` is present."""
+        raise NotImplementedError
+
+    def build(self, conn, kind):
+        """Create the migration's index for backend `kind` and index the existing rows."""
+        raise NotImplementedError
+
+    def backend_for(self, bind):
+        """Backend the database supports, for an Engine or Connection."""
+        return self.backends.get(bind.dialect.name, 'like')
+
+    def ensure(self, bind=None):
+        """Backend usable on this database, or 'like' when the index is missing.
+
+        Read-only and cached per database URL. `bind` is an Engine or, from
+        inside a flush, the session's Connection.
+        """
+        bind = bind if bind is not None else db.engine
+        key = str(bind.engine.url)
+        kind = self._ready.get(key)
+        if kind is None:
+            with self._lock:
+                kind = self._ready.get(key)
+                if kind is None:
+                    if isinstance(bind, Connection):
+                        kind = self._kind(bind)
+                    else:
+                        with bind.connect() as conn:
+                            kind = self._kind(conn)
+                    self._ready[key] = kind
+        return kind
+
+    def _kind(self, conn):
+        kind = self.backend_for(conn)
+        if kind != 'like' and not self.exists(conn, kind):
+            logger.warning('%s search index is missing (run the database migrations); using a LIKE scan', self.label)
+            return 'like'
+        return kind
+
+    def forget(self, bind):
+        """Drop the cached answer for `bind`'s database (after its schema changed)."""
+        self._ready.pop(str(bind.engine.url), None)
+
+    def create(self, bind=None):
+        """Create the index on a database built by db.create_all(); True when it was created.
+
+        Only for the create_all bootstrap in app.py, which builds tables
+        without running the migrations.
+        """
+        bind = bind if bind is not None else db.engine
+        with bind.begin() as conn:
+            kind = self.backend_for(conn)
+            if kind == 'like' or self.exists(conn, kind):
+                return False
+            self.build(conn, kind)
+        self.forget(bind)
+        return True
@@ -0,0 +1,27 @@
+import random
+
+from utils import fuzzy
+
+
+def test_bitparallel_matches_dp():
+    rng = random.Random(7)
+    alphabet = 'abcdeıişğ '
+    query = 'ayse yilmaz'
+    candidates = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20))) for _ in range(200)]
+    candidates += [query, 'ayse yilmas', 'ayşe']
+    assert fuzzy.score_many(query, candidates) == [fuzzy.levenshtein_ratio(query, c) for c in candidates]
+
+
+def test_name_scores_fold_turkish_and_ignore_token_order():
+    scores = fuzzy.name_scores('YILMAZ AYŞE', ['Ayşe Yılmaz', 'Ayse Yilmaz', 'Mehmet Demir'])
+    assert scores[0] == 1.0
+    assert scores[1] == 1.0
+    assert scores[2] < 0.5
+
+
+def test_rank_orders_by_score_with_key_and_threshold():
+    patients = [{'name': 'Mehmet Demir'}, {'name': 'Ahmet Yilmaz'}, {'name': 'Ahmet Yılmaz'}, {'name': 'Ahmed Yilmaz'}]
+    ranked = fuzzy.rank('ahmet yılmaz', patients, key=lambda p: p['name'], min_score=0.6)
+    assert [p['name'] for p, _ in ranked] == ['Ahmet Yilmaz', 'Ahmet Yılmaz', 'Ahmed Yilmaz']
+    assert ranked[0][1] == 1.0 and ranked[-1][1] < 1.0
+    assert fuzzy.rank('ahmet yılmaz', patients, key=lambda p: p['name'], limit=1)[0][0]['name'] == 'Ahmet Yilmaz'
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import pytest
+
+from scripts import benchmark_ocr
+from services.ocr_service import TurkishMedicalOCR, collect_stage_timings
+from utils.image_preprocess import parse_steps, preprocess, preprocess_steps, skew_angle
+
+
+def _page(angle=0.0):
+    page = np.full((1200, 850), 255, dtype=np.uint8)
+    for i in range(25):
+        cv2.putText(page, 'Odyometri bulgulari satir %d' % i, (60, 100 + i * 42), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    rotation = cv2.getRotationMatrix2D((425, 600), angle, 1.0)
+    return cv2.warpAffine(page, rotation, (850, 1200), borderValue=255)
+
+
+@pytest.mark.parametrize('angle', [-6.5, -1.0, 0.0, 4.0, 9.75])
+def test_skew_angle_finds_text_line_rotation(angle):
+    assert skew_angle(_page(angle)) == angle
+    straightened = preprocess(cv2.cvtColor(_page(angle), cv2.COLOR_GRAY2BGR), 'deskew')
+    assert skew_angle(cv2.cvtColor(straightened, cv2.COLOR_BGR2GRAY)) == 0.0
+
+
+def test_skew_angle_of_a_page_without_text_lines():
+    assert skew_angle(np.full((500, 400), 255, dtype=np.uint8)) == 0.0
+    noise = np.random.default_rng(1).integers(0, 256, (500, 400)).astype(np.uint8)
+    assert skew_angle(noise) == 0.0
+
+
+def test_binarize_evens_out_a_shadow():
+    page = cv2.cvtColor(_page(), cv2.COLOR_GRAY2BGR).astype(np.int16)
+    # darker and lower-contrast towards the right edge
+    page = np.clip(page * np.linspace(1.0, 0.45, page.shape[1])[None, :, None], 0, 255).astype(np.uint8)
+    out = preprocess(page, ['binarize', 'grayscale'])
+    assert out.shape == page.shape
+    assert set(np.unique(out)) <= {0, 255}
+    # the shadowed paper is white again, the text still black
+    assert out[20:80, -100:].mean() > 250
+    assert out[:, 60:700].min() == 0
+
+
+def test_steps_per_document_type(monkeypatch):
+    assert parse_steps('Binarize, deskew,') == ('deskew', 'binarize')
+    assert parse_steps('none') == ()
+    with pytest.raises(ValueError):
+        parse_steps('sharpen')
+    assert preprocess_steps('sgk_device_report') == ()
+    monkeypatch.setenv('OCR_PREPROCESS', 'deskew')
+    monkeypatch.setenv('OCR_PREPROCESS_SGK_DEVICE_REPORT', 'grayscale,denoise,binarize')
+    monkeypatch.setenv('OCR_PREPROCESS_PRESCRIPTION', 'none')
+    assert preprocess_steps('sgk_device_report') == ('grayscale', 'denoise', 'binarize')
+    assert preprocess_steps('prescription') == ()
+    assert preprocess_steps('medical') == ('deskew',)
+
+
+class RecordingPaddle:
+    def __init__(self):
+        self.images = []
+
+    def ocr(self, image):
+        self.images.append(image)
+        return [[[None, ('SGK Cihaz Raporu', 0.9)]]]
+
+
+def test_process_document_runs_the_configured_steps(monkeypatch):
+    monkeypatch.setenv('OCR_CACHE_ENABLED', '0')
+    monkeypatch.setenv('OCR_PREPROCESS_AUDIOMETRY_REPORT', 'grayscale,binarize')
+    data = cv2.imencode('.png', cv2.cvtColor(_page(3.0), cv2.COLOR_GRAY2BGR))[1].tobytes()
+    svc = TurkishMedicalOCR()
+    svc.ocr = RecordingPaddle()
+    svc.nlp = None
+    svc.use_external_worker = False
+
+    with collect_stage_timings() as timings:
+        svc.process_document(image_bytes=data, doc_type='audiometry_report')
+    assert 'preprocess' in timings
+    assert set(np.unique(svc.ocr.images[-1])) <= {0, 255}
+
+    with collect_stage_timings() as timings:
+        result = svc.process_document(image_bytes=data, doc_type='audiometry_report', preprocess='deskew')
+    assert result['entities'][0]['text'] == 'SGK Cihaz Raporu'
+    assert skew_angle(cv2.cvtColor(svc.ocr.images[-1], cv2.COLOR_BGR2GRAY)) == 0.0
+
+    with collect_stage_timings() as timings:
+        svc.process_document(image_bytes=data, doc_type='medical')
+    assert 'preprocess' not in timings
+
+
+def test_benchmark_quality_summary():
+    results = [{'entities': [{'text': 'a', 'confidence': 0.9}, {'text': 'b', 'confidence': 0.7}]}, {'entities': []}]
+    assert benchmark_ocr.quality(results) == {'lines_per_image': 1.0, 'mean_confidence': 0.8}
+    assert benchmark_ocr.quality([]) == {'lines_per_image': 0.0, 'mean_confidence': None}
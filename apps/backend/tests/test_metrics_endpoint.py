@@ -6,3 +6,37 @@ def test_metrics_endpoint_when_available(client):
     if resp.status_code == 200:
         assert resp.headers.get('Content-Type', '').startswith('text/plain')
         assert resp.get_data(as_text=True)
+
+
+def _sample(name, **labels):
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_ocr_stage_metrics_exported(client):
+    # Compares against the values before the call: the registry is process-wide
+    # and earlier tests may already have recorded OCR metrics
+    from uuid import uuid4
+    from utils import metrics
+    if not metrics.PROM_AVAILABLE:
+        return
+    from services.ocr_service import TurkishMedicalOCR
+    stages = ('classification', 'process_document')
+    before = {s: _sample('ocr_stage_latency_seconds_count', stage=s) for s in stages}
+    fallbacks = _sample('ocr_fallbacks_total', path='in_process')
+    in_flight = _sample('ocr_documents_in_flight')
+
+    svc = TurkishMedicalOCR()
+    svc.nlp = None
+    svc._load_medical_terms()
+    svc.process_document(text=f'SGK Cihaz Raporu\nişitme kaybı {uuid4().hex}')
+    metrics.record_ocr_fallback('in_process')
+
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    for s in stages:
+        assert f'ocr_stage_latency_seconds_count{{stage="{s}"}}' in body
+        assert _sample('ocr_stage_latency_seconds_count', stage=s) == before[s] + 1
+    assert _sample('ocr_fallbacks_total', path='in_process') == fallbacks + 1
+    assert _sample('ocr_documents_in_flight') == in_flight
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from services import ocr_batch
+
+
+def _fake_task(path):
+    # Module-level so the spawned pool children can unpickle it
+    if path == 'bad':
+        raise ValueError('unreadable scan')
+    if path == 'slow':
+        time.sleep(5)
+    if path.startswith('delay'):
+        time.sleep(0.3)
+    if path.startswith('metric'):
+        from utils.metrics import observe_ocr_stage, record_ocr_failure
+        observe_ocr_stage('pool_child_test', 0.1)
+        if path == 'metric-bad':
+            record_ocr_failure('pool_child_test')
+            raise ValueError('unreadable scan')
+    return {'path': path}
+
+
+@pytest.fixture
+def two_workers(monkeypatch):
+    monkeypatch.setenv('SGK_UPLOAD_WORKERS', '2')
+    ocr_batch._reset_pool()
+    yield
+    ocr_batch._reset_pool()
+
+
+def test_process_files_keeps_input_order_and_isolates_errors(two_workers):
+    outcomes = ocr_batch.process_files(['delay-a', 'b', 'bad', 'c'], task=_fake_task, timeout=30)
+    assert [o['path'] for o in (outcomes[0], outcomes[1], outcomes[3])] == ['delay-a', 'b', 'c']
+    assert isinstance(outcomes[2], ValueError)
+
+
+def test_process_files_times_out_single_file(two_workers):
+    outcomes = ocr_batch.process_files(['slow', 'a'], task=_fake_task, timeout=2)
+    assert isinstance(outcomes[0], ocr_batch.FileTimeoutError)
+    assert outcomes[1] == {'path': 'a'}
+
+
+def test_timed_out_pages_do_not_keep_pool_slots(two_workers):
+    # Both children are stuck on 'slow' pages: they are killed at the deadline
+    # and the queued pages finish on a fresh pool instead of timing out behind them
+    started = time.monotonic()
+    outcomes = ocr_batch.process_files(['slow', 'slow', 'a', 'b'], task=_fake_task, timeout=2)
+    assert all(isinstance(o, ocr_batch.FileTimeoutError) for o in outcomes[:2])
+    assert outcomes[2:] == [{'path': 'a'}, {'path': 'b'}]
+    assert time.monotonic() - started < 5
+
+
+def test_a_timeout_never_fails_another_uploads_pages(two_workers):
+    # Warm both children, then let one upload hold a child with a stuck page
+    assert ocr_batch.process_files(['a', 'b'], task=_fake_task, timeout=30) == [{'path': 'a'}, {'path': 'b'}]
+    stuck = {}
+    other = threading.Thread(target=lambda: stuck.update(
+        outcomes=ocr_batch.process_files(['slow', 'x'], task=_fake_task, timeout=2)))
+    other.start()
+    time.sleep(0.3)
+    # Eight 0.3 s pages share the remaining child, still running when the stuck page's child
+    # is killed; most wait longer than their 1 s budget, which only starts when a child picks them up
+    pages = [f'delay-{i}' for i in range(8)]
+    outcomes = ocr_batch.process_files(pages, task=_fake_task, timeout=1)
+    other.join()
+    assert outcomes == [{'path': p} for p in pages]
+    assert isinstance(stuck['outcomes'][0], ocr_batch.FileTimeoutError)
+    assert stuck['outcomes'][1] == {'path': 'x'}
+
+
+def test_inline_pages_have_a_time_budget(monkeypatch):
+    monkeypatch.setenv('SGK_UPLOAD_WORKERS', '0')
+    started = time.monotonic()
+    outcomes = ocr_batch.process_files(['slow', 'a'], task=_fake_task, timeout=1)
+    assert isinstance(outcomes[0], ocr_batch.FileTimeoutError)
+    assert outcomes[1] == {'path': 'a'}
+    assert time.monotonic() - started < 3
+
+
+def test_pool_size_defaults_to_two(monkeypatch):
+    monkeypatch.delenv('SGK_UPLOAD_WORKERS', raising=False)
+    assert ocr_batch.pool_size() == 2
+
+
+def test_process_files_runs_inline_without_pool(monkeypatch):
+    monkeypatch.setenv('SGK_UPLOAD_WORKERS', '0')
+    outcomes = ocr_batch.process_files(['a', 'bad'], task=_fake_task)
+    assert outcomes[0] == {'path': 'a'}
+    assert isinstance(outcomes[1], ValueError)
+
+
+def test_iter_process_files_yields_as_pages_finish(two_workers):
+    def pages():
+        yield 'delay-a'
+        yield ValueError('page could not be rendered')
+        yield 'b'
+
+    outcomes = list(ocr_batch.iter_process_files(pages(), task=_fake_task, timeout=30))
+    assert outcomes[0][0] == 1 and isinstance(outcomes[0][1], ValueError)
+    assert [idx for idx, _ in outcomes].index(2) < [idx for idx, _ in outcomes].index(0)
+    assert dict(outcomes)[0] == {'path': 'delay-a'}
+
+
+def test_metrics_recorded_in_children_reach_the_parent(two_workers):
+    from utils import metrics
+    if not metrics.PROM_AVAILABLE:
+        return
+    from prometheus_client import REGISTRY
+
+    def sample(name, labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    stages = sample('ocr_stage_latency_seconds_count', {'stage': 'pool_child_test'})
+    failures = sample('ocr_failures_total', {'stage': 'pool_child_test'})
+    outcomes = ocr_batch.process_files(['metric-a', 'metric-b', 'metric-bad'], task=_fake_task, timeout=30)
+    assert outcomes[:2] == [{'path': 'metric-a'}, {'path': 'metric-b'}]
+    assert isinstance(outcomes[2], ValueError)
+    assert sample('ocr_stage_latency_seconds_count', {'stage': 'pool_child_test'}) == stages + 3
+    assert sample('ocr_failures_total', {'stage': 'pool_child_test'}) == failures + 1
+
+
+def test_pages_in_children_show_in_the_parent_gauges(two_workers):
+    from utils import metrics
+    if not metrics.PROM_AVAILABLE:
+        return
+    from prometheus_client import REGISTRY
+
+    def sample(name, labels=None):
+        return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+    in_flight = sample('ocr_documents_in_flight')
+    busy = sample('ocr_worker_pool_workers', {'state': 'busy'})
+    worker = threading.Thread(
+        target=ocr_batch.process_files, args=([f'delay-{i}' for i in range(4)],),
+        kwargs={'task': _fake_task, 'timeout': 30})
+    worker.start()
+    peak_in_flight = peak_busy = 0.0
+    while worker.is_alive():
+        peak_in_flight = max(peak_in_flight, sample('ocr_documents_in_flight') - in_flight)
+        peak_busy = max(peak_busy, sample('ocr_worker_pool_workers', {'state': 'busy'}) - busy)
+        time.sleep(0.01)
+    worker.join()
+    assert peak_in_flight == 2
+    assert peak_busy == 2
+    assert sample('ocr_documents_in_flight') == in_flight
+    assert sample('ocr_worker_pool_workers', {'state': 'busy'}) == busy
+    assert sample('ocr_worker_pool_workers', {'state': 'idle'}) >= 2
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from scripts import benchmark_ocr
+from services.ocr_service import TurkishMedicalOCR, collect_stage_timings
+
+
+class FakePaddle:
+    def ocr(self, image):
+        return [[[None, ('SGK Cihaz Raporu', 0.99)], [None, ('işitme kaybı', 0.95)]]]
+
+
+def test_process_document_records_stage_timings():
+    img = np.zeros((1600, 2400, 3), dtype=np.uint8)
+    cv2.rectangle(img, (200, 100), (2200, 1500), (255, 255, 255), -1)
+    data = cv2.imencode('.png', img)[1].tobytes()
+
+    svc = TurkishMedicalOCR()
+    svc.ocr = FakePaddle()
+    svc.nlp = None
+    svc.use_external_worker = False
+    svc._load_medical_terms()
+    with collect_stage_timings() as timings:
+        result = svc.process_document(image_bytes=data, auto_crop=True)
+    assert result['classification']['type'] == 'sgk_device_report'
+    assert {'decode', 'auto_crop', 'ocr', 'matcher', 'classification', 'process_document'} <= set(timings)
+    # the crop is warped straight to the OCR size, so no separate resize pass
+    assert 'resize' not in timings
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_summary_percentiles_and_regression_check():
+    summary = benchmark_ocr.summarize({'ocr': [0.1, 0.2, 0.3, 0.4, 1.0], 'decode': [0.01]})
+    assert list(summary) == ['decode', 'ocr']
+    assert summary['ocr']['p50_ms'] == 300.0
+    assert summary['ocr']['p95_ms'] == 880.0
+
+    baseline = {'stages': {'ocr': {'p95_ms': 500.0}, 'decode': {'p95_ms': 1.0}}}
+    assert benchmark_ocr.compare(summary, baseline, 0.2) == [('ocr', 500.0, 880.0)]
+    assert benchmark_ocr.compare(summary, {'stages': {'ocr': {'p95_ms': 800.0}}}, 0.2) == []
@@ -0,0 +1,45 @@
+import os
+
+from services.ocr_cache import OCRResultCache, cache_key, file_sha256
+
+
+def test_memory_then_disk_hits(tmp_path):
+    cache = OCRResultCache(memory_items=1, disk_dir=str(tmp_path), disk_max_bytes=1024 * 1024)
+    cache.put('a' * 64, {'entities': [{'text': 'A'}]})
+    cache.put('b' * 64, {'entities': [{'text': 'B'}]})
+    # 'a' fell out of the one-item LRU but is still on disk
+    assert cache.get('b' * 64) == {'entities': [{'text': 'B'}]}
+    assert cache.get('a' * 64) == {'entities': [{'text': 'A'}]}
+    assert cache.get('c' * 64) is None
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (1, 1, 1)
+
+
+def test_returned_values_are_copies(tmp_path):
+    cache = OCRResultCache(memory_items=4, disk_dir=str(tmp_path), disk_max_bytes=0)
+    cache.put('k' * 64, {'entities': []})
+    cache.get('k' * 64)['patient_info'] = {'name': 'x'}
+    assert cache.get('k' * 64) == {'entities': []}
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = OCRResultCache(memory_items=0, disk_dir=str(tmp_path), disk_max_bytes=600)
+    payload = {'text': 'x' * 200}
+    for i, key in enumerate(('1' * 64, '2' * 64, '3' * 64)):
+        cache.put(key, payload)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    cache.put('4' * 64, payload)
+    assert cache.get('1' * 64) is None
+    assert cache.get('4' * 64) == payload
+    assert cache.stats()['evictions'] >= 1
+
+
+def test_key_depends_on_content_and_options(tmp_path):
+    img = tmp_path / 'scan.png'
+    img.write_bytes(b'same bytes')
+    copy = tmp_path / 'copy.png'
+    copy.write_bytes(b'same bytes')
+    digest = file_sha256(str(img))
+    assert digest == file_sha256(str(copy))
+    assert cache_key(digest, auto_crop=True) == cache_key(digest, auto_crop=True)
+    assert cache_key(digest, auto_crop=True) != cache_key(digest, auto_crop=False)
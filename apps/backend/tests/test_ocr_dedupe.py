@@ -0,0 +1,93 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from routes import sgk
+from services import ocr_dedupe
+from services.ocr_dedupe import DuplicateIndex, fingerprint
+
+
+def _report(name, tc):
+    page = np.full((1414, 1000, 3), 255, dtype=np.uint8)
+    cv2.rectangle(page, (40, 40), (960, 1370), (0, 0, 0), 2)
+    cv2.putText(page, 'SGK TIBBI MALZEME RAPORU', (80, 90), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (0, 0, 0), 3)
+    cv2.putText(page, 'Hasta Adi Soyadi: ' + name, (60, 210), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+    cv2.putText(page, 'TC: ' + tc, (600, 210), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+    for i in range(20):
+        cv2.putText(page, 'Odyometri bulgulari satir %d' % i, (60, 400 + i * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                    (0, 0, 0), 2)
+    return page
+
+
+def _photo(page, skew, brightness, seed):
+    """The page photographed on a dark table from a slightly different angle."""
+    h, w = page.shape[:2]
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    dst = np.float32([[200 + skew, 150], [1300, 200 + skew], [1350, 1800], [150, 1750 - skew]])
+    out = cv2.warpPerspective(page, cv2.getPerspectiveTransform(src, dst), (1600, 2000),
+                              dst=np.full((2000, 1600, 3), 40, dtype=np.uint8), borderMode=cv2.BORDER_TRANSPARENT)
+    noise = np.random.default_rng(seed).normal(0, 6, out.shape)
+    out = np.clip(out.astype(int) + brightness + noise, 0, 255).astype(np.uint8)
+    return cv2.imencode('.jpg', out)[1].tobytes()
+
+
+@pytest.fixture(scope='module')
+def scans():
+    first, second = _report('AYSE YILMAZ', '33901590066'), _report('MEHMET KAYA', '12345678901')
+    return {
+        'first': _photo(first, 0, 10, 1),
+        'first_again': _photo(first, 60, -20, 2),
+        'second': _photo(second, 30, 5, 3),
+    }
+
+
+def test_rescan_is_found_but_same_layout_for_another_patient_is_not(scans):
+    index = DuplicateIndex(max_items=8)
+    doc_id = index.add(fingerprint(scans['first']), 'sgk_upload', {'entities': ['a']}, 'first.jpg')
+    assert doc_id.startswith('ocrdoc_')
+
+    ref, result = index.find(fingerprint(scans['first_again']), 'sgk_upload')
+    assert ref['documentId'] == doc_id
+    assert ref['fileName'] == 'first.jpg'
+    assert ref['similarity'] >= ocr_dedupe.MIN_TILE_CORRELATION
+    assert result == {'entities': ['a'], 'documentId': doc_id}
+
+    # another patient's report on the same form hashes close but must not be reused
+    assert index.find(fingerprint(scans['second']), 'sgk_upload') is None
+    assert index.find(fingerprint(scans['first_again']), 'ocr_process') is None
+    assert fingerprint(b'not an image') is None
+
+
+def test_upload_reuses_result_for_duplicate_scans(client, monkeypatch, scans):
+    monkeypatch.setattr(ocr_dedupe, '_index', DuplicateIndex(max_items=8))
+    processed = []
+
+    def fake_process_files(sources):
+        for i, source in enumerate(sources):
+            processed.append(source)
+            yield i, {'entities': [{'text': 'page %d' % len(processed)}], 'patient_info': None}
+
+    monkeypatch.setattr(sgk, 'iter_process_files', fake_process_files)
+
+    def upload(*names):
+        files = [(io.BytesIO(scans[n]), n + '.jpg') for n in names]
+        res = client.post('/api/sgk/upload', data={'files': files}, content_type='multipart/form-data')
+        assert res.status_code == 200
+        return res.get_json()['files']
+
+    first, repeated, other = upload('first', 'first_again', 'second')
+    assert len(processed) == 2
+    assert 'duplicateOf' not in first['result']
+    assert repeated['result']['duplicateOf']['documentId'] == first['result']['documentId']
+    assert repeated['result']['entities'] == first['result']['entities']
+    assert 'duplicateOf' not in other['result']
+
+    (again,) = upload('first_again')
+    assert len(processed) == 2
+    assert again['result']['duplicateOf']['fileName'] == 'first.jpg'
+
+    monkeypatch.setenv('OCR_DEDUP_ENABLED', '0')
+    upload('first_again')
+    assert len(processed) == 3
@@ -0,0 +1,89 @@
+import os
+
+import cv2
+import numpy as np
+
+from services.ocr_service import TurkishMedicalOCR, _WorkerInput
+
+
+def _scan_bytes(width=1600, height=1000):
+    # White page on a dark background, like a photographed SGK report
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(img, (200, 100), (width - 200, height - 100), (255, 255, 255), -1)
+    ok, buf = cv2.imencode('.png', img)
+    assert ok
+    return buf.tobytes()
+
+
+def test_prepare_image_crops_and_resizes_in_memory():
+    svc = TurkishMedicalOCR()
+    image, transformed = svc._prepare_image(image_bytes=_scan_bytes(), auto_crop=True, max_side=600)
+    assert transformed
+    assert max(image.shape[:2]) <= 600
+    # the dark border was cropped away
+    assert image[5, 5].mean() > 200
+
+
+def test_worker_input_reuses_original_file_when_untouched(tmp_path):
+    src = tmp_path / 'scan.png'
+    src.write_bytes(_scan_bytes(400, 300))
+    svc = TurkishMedicalOCR()
+    image, transformed = svc._prepare_image(image_path=str(src), max_side=1200)
+    worker_input = _WorkerInput(image, transformed, image_path=str(src))
+    assert not transformed
+    assert worker_input.path() == str(src)
+    worker_input.cleanup()
+    assert src.exists()
+
+
+def test_worker_input_writes_one_temp_file_and_cleans_up():
+    svc = TurkishMedicalOCR()
+    data = _scan_bytes()
+    image, transformed = svc._prepare_image(image_bytes=data, max_side=800)
+    worker_input = _WorkerInput(image, transformed, image_bytes=data)
+    path = worker_input.path()
+    assert worker_input.path() == path
+    assert cv2.imread(path).shape[:2] == image.shape[:2]
+    worker_input.cleanup()
+    assert not os.path.exists(path)
+
+
+def _photo(width=4000, height=3000):
+    # Skewed white page on a dark table, like a 12 MP phone photo
+    img = np.full((height, width, 3), 40, dtype=np.uint8)
+    quad = np.array([[400, 300], [3600, 420], [3500, 2800], [350, 2700]], dtype=np.int32)
+    cv2.fillPoly(img, [quad], (250, 250, 250))
+    return img
+
+
+def test_crop_document_warps_straight_to_target_size():
+    from utils.document_scanner import crop_document
+    photo = _photo()
+    full = crop_document(photo)
+    for mode in ('fast', 'balanced', 'quality'):
+        cropped = crop_document(photo, max_side=1200, mode=mode)
+        assert max(cropped.shape[:2]) == 1200
+        # same page aspect ratio as the full-resolution warp
+        assert abs(cropped.shape[1] / cropped.shape[0] - full.shape[1] / full.shape[0]) < 0.02
+        assert cropped[10:-10, 10:-10].mean() > 200
+
+
+def test_auto_crop_modes(monkeypatch):
+    import pytest
+    from utils.document_scanner import auto_crop_mode
+    assert auto_crop_mode(False) is None
+    assert auto_crop_mode('off') is None
+    assert auto_crop_mode('fast') == 'fast'
+    assert auto_crop_mode(True) == 'balanced'
+    monkeypatch.setenv('OCR_AUTO_CROP_MODE', 'quality')
+    assert auto_crop_mode('1') == 'quality'
+    with pytest.raises(ValueError):
+        auto_crop_mode('sharpest')
+
+
+def test_prepare_image_accepts_auto_crop_mode():
+    svc = TurkishMedicalOCR()
+    data = cv2.imencode('.jpg', _photo())[1].tobytes()
+    image, transformed = svc._prepare_image(image_bytes=data, auto_crop='fast', max_side=1200)
+    assert transformed
+    assert max(image.shape[:2]) == 1200
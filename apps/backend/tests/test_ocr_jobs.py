@@ -0,0 +1,70 @@
+import threading
+import time
+
+from services import ocr_jobs
+
+
+def _fake_process(payload):
+    return {'echo': payload.get('text')}
+
+
+def _failing_process(payload):
+    raise ValueError('unreadable scan')
+
+
+def test_async_process_returns_job_and_result_can_be_polled(client, monkeypatch):
+    monkeypatch.setitem(ocr_jobs._handlers, 'process', _fake_process)
+    res = client.post('/process?async=1', json={'text': 'Hasta Adı Soyadı'})
+    assert res.status_code == 202
+    body = res.get_json()
+    assert res.headers['Location'] == f"/api/ocr/jobs/{body['jobId']}"
+
+    res = client.get(f"/api/ocr/jobs/{body['jobId']}?wait=20")
+    assert res.status_code == 200
+    job = res.get_json()['job']
+    assert job['status'] == 'succeeded'
+    assert job['result'] == {'echo': 'Hasta Adı Soyadı'}
+    assert job['attempts'] == 1
+
+
+def test_failed_job_reports_error(client, monkeypatch):
+    monkeypatch.setitem(ocr_jobs._handlers, 'process', _failing_process)
+    res = client.post('/process', json={'text': 'x', 'async': True})
+    job_id = res.get_json()['jobId']
+    job = client.get(f'/api/ocr/jobs/{job_id}?wait=20').get_json()['job']
+    assert job['status'] == 'failed'
+    assert 'unreadable scan' in job['error']
+
+
+def test_unknown_job_returns_404(client):
+    assert client.get('/api/ocr/jobs/ocrjob_missing').status_code == 404
+
+
+def test_ocr_jobs_are_not_held_up_by_a_running_import(client, monkeypatch):
+    release, started = threading.Event(), threading.Event()
+
+    def long_import(payload):
+        started.set()
+        release.wait(30)
+        return {'rows': 0}
+    monkeypatch.setitem(ocr_jobs._handlers, 'patient_import', long_import)
+    monkeypatch.setitem(ocr_jobs._handlers, 'process', _fake_process)
+    with client.application.app_context():
+        import_id = ocr_jobs.submit_job('patient_import', {}).id
+    try:
+        assert started.wait(10)
+        # a burst of OCR jobs while the import holds its consumer
+        latencies = []
+        for i in range(10):
+            submitted = time.monotonic()
+            job_id = client.post('/process?async=1', json={'text': f'tarama {i}'}).get_json()['jobId']
+            job = client.get(f'/api/ocr/jobs/{job_id}?wait=20').get_json()['job']
+            assert job['status'] == 'succeeded'
+            latencies.append(time.monotonic() - submitted)
+        assert max(latencies) < 5, latencies
+        with client.application.app_context():
+            assert ocr_jobs.wait_for_job(import_id, 0).status == 'running'
+    finally:
+        release.set()
+    with client.application.app_context():
+        assert ocr_jobs.wait_for_job(import_id, 20).status == 'succeeded'
@@ -0,0 +1,103 @@
+from services import ocr_service
+from services.ocr_service import TurkishMedicalOCR
+
+
+def _with_loader(svc, name, loader):
+    svc._components[name]._loader = loader
+    return svc
+
+
+def test_models_load_on_first_use_only():
+    svc = TurkishMedicalOCR()
+    calls = []
+
+    def load_spacy():
+        calls.append('spacy')
+        svc._nlp = 'nlp'
+        return True
+
+    _with_loader(svc, 'spacy', load_spacy)
+    svc.initialize()
+    assert svc.component_status()['spacy']['state'] == 'not_loaded'
+    assert calls == []
+
+    assert svc.nlp == 'nlp'
+    assert svc.nlp == 'nlp'
+    assert calls == ['spacy']
+    status = svc.component_status()
+    assert status['spacy']['state'] == 'ready'
+    assert status['spacy']['loadSeconds'] is not None
+    assert status['hf_ner']['state'] == 'not_loaded'
+
+
+def test_failed_load_is_reported_and_not_retried():
+    svc = TurkishMedicalOCR()
+    calls = []
+
+    def load_hf():
+        calls.append('hf_ner')
+        raise ImportError('No module named transformers')
+
+    _with_loader(svc, 'hf_ner', load_hf)
+    assert svc.hf_ner is None
+    assert svc.hf_entities('Ali Veli') == []
+    assert calls == ['hf_ner']
+    status = svc.component_status()['hf_ner']
+    assert status['state'] == 'failed'
+    assert 'transformers' in status['error']
+
+
+def test_prewarm_loads_selected_components(monkeypatch):
+    svc = TurkishMedicalOCR()
+    _with_loader(svc, 'spacy', lambda: True)
+    _with_loader(svc, 'hf_ner', lambda: True)
+    status = svc.prewarm(['hf_ner'])
+    assert status['hf_ner']['state'] == 'ready'
+    assert status['spacy']['state'] == 'not_loaded'
+
+    monkeypatch.setenv('OCR_PREWARM', 'spacy, hf_ner')
+    assert ocr_service.prewarm_components() == ['spacy', 'hf_ner']
+    monkeypatch.setenv('OCR_PREWARM', 'all')
+    assert ocr_service.prewarm_components() == list(TurkishMedicalOCR.COMPONENTS)
+
+
+def test_prewarm_starts_external_workers_instead_of_loading_in_process(monkeypatch):
+    class FakePool:
+        prewarmed = 0
+
+        def prewarm(self):
+            self.prewarmed += 1
+            return 2
+
+    def must_not_load():
+        raise AssertionError('prewarm loaded PaddleOCR in-process')
+
+    pool = FakePool()
+    monkeypatch.setattr(ocr_service, 'get_worker_pool', lambda: pool)
+    svc = _with_loader(TurkishMedicalOCR(), 'paddleocr', must_not_load)
+    svc.use_external_worker = True
+    status = svc.prewarm(['paddleocr'])
+    assert pool.prewarmed == 1
+    assert status['paddleocr']['state'] == 'not_loaded'
+
+    monkeypatch.setattr(ocr_service, 'get_worker_pool', lambda: None)
+    _with_loader(svc, 'paddleocr', lambda: True)
+    assert svc.prewarm(['paddleocr'])['paddleocr']['state'] == 'ready'
+
+
+def test_health_reports_state_without_loading(client, monkeypatch):
+    svc = TurkishMedicalOCR()
+
+    def must_not_load():
+        raise AssertionError('health check triggered a model load')
+
+    for name in TurkishMedicalOCR.COMPONENTS:
+        _with_loader(svc, name, must_not_load)
+    monkeypatch.setattr(ocr_service, '_nlp_service', svc)
+
+    for url in ('/health', '/api/health'):
+        body = client.get(url).get_json()
+        body = body.get('data', body)
+        assert body['models']['spacy']['state'] == 'not_loaded'
+        assert body['spacy_available'] is False
+    assert all(s['state'] == 'not_loaded' for s in svc.component_status().values())
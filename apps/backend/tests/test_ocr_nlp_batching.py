@@ -0,0 +1,59 @@
+from services.ocr_service import TurkishMedicalOCR
+
+
+class FakeNLP:
+    """Counts how texts reach the model: single calls vs. batched pipe()."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(('call', [text]))
+        return ('doc', text)
+
+    def pipe(self, texts, batch_size=None, n_process=None):
+        texts = list(texts)
+        self.calls.append(('pipe', texts))
+        return [('doc', t) for t in texts]
+
+
+def _service():
+    svc = TurkishMedicalOCR()
+    svc.nlp = FakeNLP()
+    return svc
+
+
+def test_parse_many_batches_and_deduplicates():
+    svc = _service()
+    docs = svc.parse_many(['a', 'b', 'a'])
+    assert docs == [('doc', 'a'), ('doc', 'b'), ('doc', 'a')]
+    assert svc.nlp.calls == [('pipe', ['a', 'b'])]
+
+
+def test_parsed_docs_are_cached():
+    svc = _service()
+    svc.parse('Hasta Adı Soyadı')
+    svc.parse_many(['Hasta Adı Soyadı', 'Ayşe Yılmaz'])
+    assert svc.nlp.calls == [('call', ['Hasta Adı Soyadı']), ('call', ['Ayşe Yılmaz'])]
+
+
+def test_doc_cache_is_bounded():
+    svc = _service()
+    svc.doc_cache_size = 2
+    svc.parse_many(['a', 'b', 'c'])
+    svc.parse('a')
+    assert svc.nlp.calls[-1] == ('call', ['a'])
+
+
+def test_hf_entities_runs_lines_in_one_batch():
+    svc = TurkishMedicalOCR()
+    seen = []
+
+    def fake_hf(lines, batch_size=None):
+        seen.append((list(lines), batch_size))
+        return [[{'entity_group': 'PER', 'word': l, 'score': 0.9}] if l.startswith('Ayşe') else [] for l in lines]
+
+    svc.hf_ner = fake_hf
+    ents = svc.hf_entities('SGK RAPORU\n\nAyşe Yılmaz\n')
+    assert seen == [(['SGK RAPORU', 'Ayşe Yılmaz'], svc.hf_batch_size)]
+    assert ents == [{'entity_group': 'PER', 'word': 'Ayşe Yılmaz', 'score': 0.9, 'line': 1}]
@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+import pytest
+
+from services.ocr_batch import extract_upload_patient_info
+from services.ocr_service import TurkishMedicalOCR
+from services.ocr_templates import parse_field
+
+
+class ScriptedPaddle:
+    """Returns queued OCR results in call order and records crop sizes."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def ocr(self, image):
+        self.calls.append(image.shape[:2])
+        text = self.replies.pop(0) if self.replies else ''
+        return [[[None, (line, 0.9)] for line in text.splitlines() if line]]
+
+
+def _page(width=1000, height=1414):
+    # A4 portrait page on a dark table
+    img = np.full((height + 300, width + 300, 3), 30, dtype=np.uint8)
+    cv2.rectangle(img, (150, 150), (150 + width, 150 + height), (255, 255, 255), -1)
+    return cv2.imencode('.png', img)[1].tobytes()
+
+
+@pytest.fixture(autouse=True)
+def _no_result_cache(monkeypatch):
+    monkeypatch.setenv('OCR_CACHE_ENABLED', '0')
+    monkeypatch.delenv('OCR_TEMPLATE_REGIONS', raising=False)
+
+
+def _service(replies):
+    svc = TurkishMedicalOCR()
+    svc.ocr = ScriptedPaddle(replies)
+    svc.nlp = None
+    svc.use_external_worker = False
+    svc._load_medical_terms()
+    return svc
+
+
+def test_parse_field_shapes():
+    assert parse_field('name', 'Hasta Adı Soyadı: AYŞE YILMAZ') == 'AYŞE YILMAZ'
+    assert parse_field('name', 'Hasta Adı') is None
+    assert parse_field('tc', 'T.C. Kimlik No: 3390159****') == '3390159****'
+    assert parse_field('tc', 'No: 12') is None
+    assert parse_field('date', 'Rapor Tarihi 5/3/2024') == '05.03.2024'
+
+
+def test_matching_page_is_read_from_regions_only():
+    svc = _service(['SGK Tıbbi Malzeme Raporu', 'Hasta Adı Soyadı\nAYŞE YILMAZ', '33901590066',
+                    '12.03.2024', 'Kulak arkası işitme cihazı'])
+    result = svc.process_document(image_bytes=_page(), auto_crop=True, doc_type='sgk_device_report')
+
+    assert result['template']['accepted'] is True
+    assert len(svc.ocr.calls) == 5
+    assert all(h < 400 for h, _ in svc.ocr.calls)
+    assert result['fields']['patient_name']['value'] == 'AYŞE YILMAZ'
+    assert result['fields']['tc_number']['value'] == '33901590066'
+    assert result['fields']['report_date']['value'] == '12.03.2024'
+    assert {'text': '33901590066', 'confidence': 0.9, 'region': 'tc_number'} in result['entities']
+    assert result['classification']['type'] == 'sgk_device_report'
+    assert extract_upload_patient_info(svc, result) == {'name': 'AYŞE YILMAZ', 'confidence': 0.9, 'source': 'template'}
+
+
+def test_low_template_confidence_falls_back_to_full_page():
+    svc = _service(['', 'illegible', '', '', '', 'Hasta Adı Soyadı\nALİ VELİ\nT.C. 10000000146'])
+    result = svc.process_document(image_bytes=_page(), auto_crop=True, doc_type='sgk_device_report')
+
+    assert result['template']['accepted'] is False
+    assert 'fields' not in result
+    assert len(svc.ocr.calls) == 6
+    assert [e['text'] for e in result['entities']] == ['Hasta Adı Soyadı', 'ALİ VELİ', 'T.C. 10000000146']
+
+
+def test_other_layouts_and_doc_types_skip_region_ocr():
+    # landscape page: aspect ratio does not fit the A4 portrait template
+    svc = _service(['Hasta Adı Soyadı\nALİ VELİ'])
+    result = svc.process_document(image_bytes=_page(1414, 1000), auto_crop=True, doc_type='sgk_device_report')
+    assert result['template']['accepted'] is False
+    assert len(svc.ocr.calls) == 1
+
+    svc = _service(['Reçete'])
+    result = svc.process_document(image_bytes=_page(), auto_crop=True)
+    assert 'template' not in result
+    assert len(svc.ocr.calls) == 1
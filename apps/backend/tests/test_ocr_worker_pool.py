@@ -0,0 +1,84 @@
+import sys
+import textwrap
+import pytest
+
+from services.ocr_worker_pool import PaddleWorkerPool, WorkerError
+
+# Minimal stand-in for `paddle_worker.py --serve` speaking the same JSON-line protocol.
+FAKE_WORKER = textwrap.dedent('''
+    import json, os, sys, time
+    print("loading model...")  # noise before the ready line must be ignored
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        req = json.loads(line)
+        if req.get("op") == "ping":
+            print(json.dumps({"id": req["id"], "pong": True}), flush=True)
+            continue
+        path = req.get("path")
+        if path == "crash":
+            os._exit(3)
+        if path == "hang":
+            time.sleep(30)
+        print(json.dumps({"id": req["id"], "entities": [{"text": str(os.getpid()), "confidence": 1.0}]}), flush=True)
+''')
+
+
+@pytest.fixture
+def worker_cmd(tmp_path):
+    script = tmp_path / 'fake_worker.py'
+    script.write_text(FAKE_WORKER)
+    return [sys.executable, str(script)]
+
+
+def _pid(entities):
+    return entities[0]['text']
+
+
+def test_worker_is_reused_and_recycled(worker_cmd):
+    pool = PaddleWorkerPool(size=1, max_jobs=2, job_timeout=5, startup_timeout=10, health_interval=0, worker_cmd=worker_cmd)
+    try:
+        first = _pid(pool.run('a.png'))
+        assert _pid(pool.run('b.png')) == first
+        # max_jobs reached: the next job runs on a fresh process
+        assert _pid(pool.run('c.png')) != first
+        stats = pool.stats()
+        assert stats['spawned'] == 2
+        assert stats['recycled'] == 1
+        assert stats['jobs'] == 3
+    finally:
+        pool.shutdown()
+
+
+def test_crashed_worker_is_restarted(worker_cmd):
+    pool = PaddleWorkerPool(size=1, max_jobs=0, job_timeout=5, startup_timeout=10, health_interval=0, worker_cmd=worker_cmd)
+    try:
+        first = _pid(pool.run('a.png'))
+        with pytest.raises(WorkerError):
+            pool.run('crash')
+        assert _pid(pool.run('b.png')) != first
+        assert pool.stats()['failed'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_hung_worker_times_out_and_health_check_keeps_pool_ready(worker_cmd):
+    pool = PaddleWorkerPool(size=1, max_jobs=0, job_timeout=1, startup_timeout=10, health_interval=0, worker_cmd=worker_cmd)
+    try:
+        with pytest.raises(WorkerError):
+            pool.run('hang')
+        pool.run('a.png')
+        assert pool.health_check() == 0
+        assert pool.stats()['idle'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_prewarm_starts_every_worker(worker_cmd):
+    pool = PaddleWorkerPool(size=2, max_jobs=0, job_timeout=5, startup_timeout=10, health_interval=0, worker_cmd=worker_cmd)
+    try:
+        assert pool.prewarm() == 2
+        assert pool.prewarm() == 0
+        pool.run('a.png')
+        assert pool.stats()['spawned'] == 2
+    finally:
+        pool.shutdown()
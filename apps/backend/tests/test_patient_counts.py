@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import text
+
+from models.base import db
+from models.patient import Patient
+from services import patient_counts
+
+
+def _pagination(client, **params):
+    res = client.get('/api/patients', query_string=params)
+    assert res.status_code == 200
+    return res.get_json()['pagination']
+
+
+def _add(pid, phone):
+    db.session.add(Patient.from_dict({'id': pid, 'firstName': 'Sayım', 'lastName': 'Testi', 'phone': phone}))
+    db.session.commit()
+
+
+def test_cached_total_is_invalidated_by_orm_writes(client):
+    patient_counts.clear_count_cache()
+    with client.application.app_context():
+        _add('pat_count_1', '05328880001')
+        before = _pagination(client, count='cached')
+        assert before['totalMode'] == 'cached'
+
+        # raw SQL bypasses the invalidation: the cached total is reused until the TTL
+        db.session.execute(text("INSERT INTO patients (id, first_name, last_name, phone) "
+                                "VALUES ('pat_count_raw', 'Ham', 'Kayit', '05328880002')"))
+        db.session.commit()
+        assert _pagination(client, count='cached')['total'] == before['total']
+        exact = _pagination(client, count='exact')
+        assert exact['totalMode'] == 'exact'
+        assert exact['total'] == before['total'] + 1
+
+        # an ORM write commits and clears the cache
+        _add('pat_count_2', '05328880003')
+        assert _pagination(client, count='cached')['total'] == before['total'] + 2
+
+        # filtered lists are cached per search
+        assert _pagination(client, count='cached', search='sayim testi')['total'] == 2
+        assert _pagination(client, count='cached', search='sayim zzz')['total'] == 0
+
+
+def test_estimate_uses_table_statistics(client, monkeypatch):
+    monkeypatch.setenv('PATIENT_COUNT_MODE', 'estimate')
+    with client.application.app_context():
+        _add('pat_count_3', '05328880004')
+        db.session.execute(text('ANALYZE patients'))
+        db.session.commit()
+        rows = db.session.query(Patient).count()
+    page = _pagination(client)
+    assert page['totalMode'] == 'estimate'
+    assert page['total'] == rows
+    # a filtered list cannot be estimated
+    assert _pagination(client, search='sayim')['totalMode'] == 'cached'
+
+
+def test_cursor_pages_are_not_counted_and_modes_are_validated(client):
+    first = _pagination(client, per_page=1)
+    assert first['nextCursor']
+    page = _pagination(client, per_page=1, cursor=first['nextCursor'])
+    assert 'total' not in page and 'totalMode' not in page
+    res = client.get('/api/patients?count=sometimes')
+    assert res.status_code == 400
+
+
+class _CountingQuery:
+    def __init__(self):
+        self.counts = 0
+
+    def order_by(self, *args):
+        return self
+
+    def count(self):
+        self.counts += 1
+        return 7
+
+
+def test_count_cache_is_bounded_and_drops_expired_entries(monkeypatch):
+    monkeypatch.setenv('PATIENT_COUNT_CACHE_SIZE', '2')
+    monkeypatch.setenv('PATIENT_COUNT_CACHE_TTL', '30')
+    patient_counts.clear_count_cache()
+    query = _CountingQuery()
+    for signature in ('a', 'b', 'a', 'c'):
+        assert patient_counts.count_total(query, (signature,), 'cached') == (7, 'cached')
+    # 'a' was used more recently than 'b', so 'b' was evicted
+    assert list(patient_counts._cache) == [('a',), ('c',)]
+    assert query.counts == 3
+
+    monkeypatch.setenv('PATIENT_COUNT_CACHE_TTL', '0')
+    patient_counts.count_total(query, ('a',), 'cached')
+    assert query.counts == 4 and len(patient_counts._cache) == 2
+
+    # an expired entry is dropped by the lookup itself, even when the recount fails
+    def failing_count():
+        raise RuntimeError('database gone')
+    query.count = failing_count
+    with pytest.raises(RuntimeError):
+        patient_counts.count_total(query, ('c',), 'cached')
+    assert list(patient_counts._cache) == [('a',)]
+    patient_counts.clear_count_cache()
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+from flask_jwt_extended import create_access_token
+
+from models.base import db
+from models.patient import Patient
+from models.user import ActivityLog, User
+from routes import patients as patients_routes
+
+
+def _admin_token(client):
+    username = os.getenv('ADMIN_USERNAME', 'admin')
+    with client.application.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            user = User(id='user_export_admin', username=username,
+                        email=os.getenv('ADMIN_EMAIL', 'admin@x-ear.com'), phone='+900000009')
+            user.set_password('testpass')
+            db.session.add(user)
+            db.session.commit()
+        return create_access_token(identity=user.id)
+
+
+def test_export_streams_rows_in_batches(client, monkeypatch):
+    monkeypatch.setattr(patients_routes, 'EXPORT_BATCH_SIZE', 3)
+    with client.application.app_context():
+        for i in range(8):
+            patient = Patient.from_dict({'id': f'pat_export_{i}', 'firstName': 'Dışa', 'lastName': f'Aktarım{i}',
+                                         'phone': f'0532777000{i}', 'birthDate': '1980-02-0%d' % (i + 1),
+                                         'tags': ['vip', 'sgk'] if i == 0 else None, 'status': 'ACTIVE'})
+            db.session.add(patient)
+        db.session.commit()
+
+    res = client.get('/api/patients/export', query_string={'q': 'disa aktarim'},
+                     headers={'Authorization': f'Bearer {_admin_token(client)}'})
+    assert res.status_code == 200
+    assert res.is_streamed
+    assert res.headers['Content-Type'] == 'text/csv; charset=utf-8'
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert sorted(r['id'] for r in rows) == [f'pat_export_{i}' for i in range(8)]
+    first = next(r for r in rows if r['id'] == 'pat_export_0')
+    assert first['birthDate'] == '1980-02-01T00:00:00'
+    assert first['status'] == 'ACTIVE'
+    assert json.loads(first['tags']) == ['vip', 'sgk']
+    assert datetime.fromisoformat(first['createdAt'])
+
+    with client.application.app_context():
+        query = db.session.query(*[c for _, c in patients_routes.EXPORT_COLUMNS]).filter(
+            Patient.id.like('pat_export_%'))
+        chunks = patients_routes._iter_export_csv(query)
+        received = []
+        try:
+            while True:
+                received.append(next(chunks))
+        except StopIteration as done:
+            count = done.value
+    # header, then ceil(8 / 3) row chunks
+    assert len(received) == 4
+    assert count == 8
+
+
+def test_export_is_audited_before_streaming_and_writes_birth_date(client):
+    # birthDate used to be filled from created_at; it is the patient's birth_date
+    with client.application.app_context():
+        db.session.add(Patient.from_dict({'id': 'pat_export_bd', 'firstName': 'Doğum', 'lastName': 'Tarihçi',
+                                          'phone': '05327770200', 'birthDate': '1975-06-15'}))
+        db.session.add(Patient.from_dict({'id': 'pat_export_nobd', 'firstName': 'Doğum', 'lastName': 'Tarihçi',
+                                          'phone': '05327770201'}))
+        db.session.commit()
+
+    res = client.get('/api/patients/export', query_string={'q': 'dogum tarihci'},
+                     headers={'Authorization': f'Bearer {_admin_token(client)}'}, buffered=False)
+    assert res.status_code == 200
+    with client.application.app_context():
+        logs = ActivityLog.query.filter(ActivityLog.entity_type == 'patient',
+                                        ActivityLog.details.like('%dogum tarihci%'))
+        # Written before any row was sent: a download aborted now is still on record
+        (audit,) = logs.filter(ActivityLog.action == 'export').all()
+        assert audit.details_json['filters']['q'] == 'dogum tarihci'
+        assert logs.filter(ActivityLog.action == 'export_completed').count() == 0
+
+    rows = {r['id']: r for r in csv.DictReader(io.StringIO(res.get_data(as_text=True)))}
+    assert rows['pat_export_bd']['birthDate'] == '1975-06-15T00:00:00'
+    assert rows['pat_export_bd']['birthDate'] != rows['pat_export_bd']['createdAt']
+    assert rows['pat_export_nobd']['birthDate'] == ''
+    with client.application.app_context():
+        (completed,) = ActivityLog.query.filter(ActivityLog.action == 'export_completed',
+                                                ActivityLog.details.like('%dogum tarihci%')).all()
+        assert completed.details_json['count'] == 2
@@ -0,0 +1,153 @@
+import io
+
+import pytest
+
+from models.base import db
+from models.enums import PatientStatus
+from models.ocr_job import OCRJob
+from models.patient import Patient
+from services import ocr_jobs
+from services.patient_import import PatientImport, count_csv_rows, run_import_job
+
+
+def _csv(*lines):
+    return io.BytesIO(('﻿' + '\n'.join(lines) + '\n').encode('utf-8'))
+
+
+def _upload(client, *lines):
+    res = client.post('/api/patients/bulk_upload', data={'file': (_csv(*lines), 'patients.csv')},
+                      content_type='multipart/form-data')
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def test_bulk_upload_inserts_updates_and_reports_rows(client):
+    with client.application.app_context():
+        db.session.add(Patient.from_dict({'id': 'pat_imp_old', 'tcNumber': '27100000001', 'firstName': 'Eski',
+                                          'lastName': 'Kayıt', 'phone': '05326660001'}))
+        db.session.commit()
+
+    body = _upload(client,
+                   'tc_number,first_name,last_name,phone,email,status,tags,birthDate',
+                   '27100000001,Yeni,Kayıt,05326660001,yeni@example.com,inactive,,1970-05-06',
+                   '27100000002,Aslı,Çınar,05326660002,,,"vip,sgk",',
+                   '27100000002,,,,asli@example.com,,,',
+                   ',Eksik,,05326660003,,,,',
+                   '27100000004,Başka,Hasta,05326660002,,,,',
+                   ',Telsiz,Hasta,05326660005,,,,')
+    assert body['success'] is True
+    assert (body['created'], body['updated'], body['rows']) == (2, 2, 6)
+    assert [e['row'] for e in body['errors']] == [4, 5]
+    assert 'lastName' in body['errors'][0]['error']
+    assert 'already belongs' in body['errors'][1]['error']
+    assert body['rowsPerSecond'] > 0
+
+    with client.application.app_context():
+        old = db.session.get(Patient, 'pat_imp_old')
+        assert (old.first_name, old.email, old.status) == ('Yeni', 'yeni@example.com', PatientStatus.INACTIVE)
+        assert old.birth_date.year == 1970
+        asli = Patient.query.filter_by(tc_number='27100000002').one()
+        assert (asli.email, asli.tags_json) == ('asli@example.com', ['vip', 'sgk'])
+        assert asli.created_at is not None
+
+    # written with bulk statements, yet searchable
+    res = client.get('/api/patients', query_string={'search': 'asli cinar'})
+    assert [p['tcNumber'] for p in res.get_json()['data']] == ['27100000002']
+
+
+def test_chunks_and_row_by_row_replay(client, monkeypatch):
+    importer = PatientImport(chunk_rows=2)
+    chunks = []
+    monkeypatch.setattr(importer, 'import_chunk', lambda chunk, f=importer.import_chunk: (chunks.append(len(chunk)), f(chunk)))
+    with client.application.app_context():
+        lines = ['firstName,lastName,phone'] + [f'Parça,Hasta{i},0532555010{i}' for i in range(5)]
+        summary = importer.run(_csv(*lines))
+        assert chunks == [2, 2, 1]
+        assert (summary['created'], summary['errors']) == (5, [])
+
+        # a phone taken between the lookup and the write fails only its own row
+        real_existing = PatientImport._existing
+        monkeypatch.setattr(PatientImport, '_existing', lambda self, payloads: ({}, {}))
+        summary = PatientImport().run(_csv('firstName,lastName,phone', 'Yarış,Bir,05325550100',
+                                           'Yarış,İki,05325550199', 'Yarış,Üç,05325550198'))
+        monkeypatch.setattr(PatientImport, '_existing', real_existing)
+        assert summary['created'] == 2
+        assert [e['row'] for e in summary['errors']] == [1]
+        assert Patient.query.filter_by(phone='05325550199').one().last_name == 'İki'
+
+
+def test_async_upload_reports_progress_until_done(client):
+    lines = ['firstName,lastName,phone,tags'] + [f'İş,Hasta{i},0532777010{i},"a,b"' for i in range(5)] + [',Eksik,,']
+    res = client.post('/api/patients/bulk_upload?async=1', data={'file': (_csv(*lines), 'big.csv')},
+                      content_type='multipart/form-data')
+    assert res.status_code == 202
+    job_id = res.get_json()['jobId']
+    assert res.headers['Location'] == f'/api/patients/bulk_upload/jobs/{job_id}'
+
+    job = client.get(f'/api/patients/bulk_upload/jobs/{job_id}?wait=20').get_json()['job']
+    assert job['status'] == 'succeeded'
+    assert (job['totalRows'], job['rowsDone'], job['percent'], job['etaSeconds']) == (6, 6, 100.0, 0)
+    assert (job['created'], job['errorCount'], job['errors'][0]['row']) == (5, 1, 6)
+    assert client.get('/api/patients/bulk_upload/jobs/ocrjob_missing').status_code == 404
+
+
+def test_interrupted_job_resumes_from_checkpoint(client, monkeypatch, tmp_path):
+    monkeypatch.setenv('PATIENT_IMPORT_CHUNK_ROWS', '2')
+    path = tmp_path / 'patients.csv'
+    path.write_bytes(_csv('firstName,lastName,phone', *[f'Devam,Hasta{i},0532888010{i}' for i in range(5)]).getvalue())
+    with path.open('rb') as f:
+        assert count_csv_rows(f) == 5 and f.tell() == 0
+
+    with client.application.app_context():
+        job = OCRJob(kind='patient_import', status='running', attempts=1)
+        db.session.add(job)
+        db.session.commit()
+        payload = {'jobId': job.id, 'path': str(path)}
+
+        # the process "dies" while writing the second chunk
+        real_chunk = PatientImport.import_chunk
+
+        def dying_chunk(self, chunk):
+            if chunk[0][0] > 2:
+                raise KeyboardInterrupt
+            return real_chunk(self, chunk)
+        monkeypatch.setattr(PatientImport, 'import_chunk', dying_chunk)
+        with pytest.raises(KeyboardInterrupt):
+            run_import_job(payload)
+        db.session.rollback()
+        checkpoint = db.session.get(OCRJob, job.id).progress_json
+        assert (checkpoint['rows'], checkpoint['created'], checkpoint['totalRows']) == (2, 2, 5)
+
+        monkeypatch.setattr(PatientImport, 'import_chunk', real_chunk)
+        seen = []
+        monkeypatch.setattr(ocr_jobs, 'save_progress', lambda job_id, p, f=ocr_jobs.save_progress: (seen.append(p['rows']), f(job_id, p)))
+        summary = run_import_job(payload)
+        assert seen == [4, 5]
+        assert (summary['rows'], summary['created'], summary['errors']) == (5, 5, [])
+        assert Patient.query.filter(Patient.first_name == 'Devam').count() == 5
+
+
+def test_failed_upload_reports_the_rows_that_stay_committed(client, monkeypatch):
+    monkeypatch.setenv('PATIENT_IMPORT_CHUNK_ROWS', '2')
+    real_write = PatientImport._write
+
+    def failing_write(self, ops):
+        if self.rows >= 2:
+            raise RuntimeError('disk full')
+        return real_write(self, ops)
+    monkeypatch.setattr(PatientImport, '_write', failing_write)
+    lines = ['firstName,lastName,phone'] + [f'Yarım,Hasta{i},0532666090{i}' for i in range(4)]
+    res = client.post('/api/patients/bulk_upload', data={'file': (_csv(*lines), 'patients.csv')},
+                      content_type='multipart/form-data')
+    assert res.status_code == 500
+    body = res.get_json()
+    assert (body['success'], body['error'], body['committedRows']) == (False, 'disk full', 2)
+    assert 'stay committed' in body['note']
+
+    with client.application.app_context():
+        imported = Patient.query.filter(Patient.first_name == 'Yarım').order_by(Patient.phone).all()
+        assert [p.phone for p in imported] == ['05326660900', '05326660901']
+        # the same defaults as a patient created through Patient.from_dict
+        expected = Patient.from_dict({'firstName': 'Yarım', 'lastName': 'Hasta0', 'phone': '05326660900'})
+        for column in ('status', 'segment', 'acquisition_type', 'priority_score', 'tags', 'sgk_info'):
+            assert getattr(imported[0], column) == getattr(expected, column), column
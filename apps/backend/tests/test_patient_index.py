@@ -0,0 +1,87 @@
+from services import patient_index
+from services.patient_index import PatientIdentityIndex, is_valid_tc, normalize_name
+
+VALID_TC = '10000000146'
+OTHER_VALID_TC = '33901590066'
+
+
+def test_tc_checksum():
+    assert is_valid_tc(VALID_TC)
+    assert is_valid_tc(OTHER_VALID_TC)
+    assert not is_valid_tc('10000000145')
+    assert not is_valid_tc('01234567890')
+
+
+def test_tc_substring_and_masked_prefix_lookup():
+    index = PatientIdentityIndex().build([
+        ('pat_a', VALID_TC, 'Ayşe', 'Yılmaz'),
+        ('pat_b', OTHER_VALID_TC, 'Mehmet', 'Öztürk'),
+    ])
+    assert index.find_by_tc('3390159*****') == ['pat_b']
+    assert index.find_by_tc('0000014') == ['pat_a']
+    assert index.find_by_tc(OTHER_VALID_TC) == ['pat_b']
+    # a misread check digit still finds the patient through the 9-digit base
+    assert index.find_by_tc('33901590067') == ['pat_b']
+    assert index.find_by_tc('1234') == []
+
+
+def test_incremental_updates_replace_old_values():
+    index = PatientIdentityIndex().build([('pat_a', VALID_TC, 'Ayşe', 'Yılmaz')])
+    index.upsert('pat_a', OTHER_VALID_TC, 'Ayşe', 'Kaya')
+    assert index.find_by_tc('0000014') == []
+    assert index.find_by_tc('3390159') == ['pat_a']
+    assert [pid for pid, _ in index.find_by_name('AYSE KAYA')] == ['pat_a']
+    assert index.find_by_name('Ayse Yilmaz', min_score=0.8) == []
+    index.remove('pat_a')
+    assert index.find_by_tc('3390159') == []
+
+
+def test_name_lookup_folds_turkish_characters():
+    index = PatientIdentityIndex().build([
+        ('pat_a', None, 'Şükrü', 'Çağlar'),
+        ('pat_b', None, 'Sukran', 'Cagan'),
+        ('pat_c', None, 'Ali', 'Veli'),
+    ])
+    assert normalize_name('ŞÜKRÜ  ÇAĞLAR') == 'sukru caglar'
+    ranked = index.find_by_name('Sukru Caglar')
+    assert ranked[0][0] == 'pat_a' and ranked[0][1] == 1.0
+    assert 'pat_c' not in [pid for pid, _ in ranked]
+
+
+def test_index_follows_committed_patient_writes(client):
+    from app import app
+    with app.app_context():
+        patient_index._install_session_hooks()
+        patient_index.load_patient_index()
+    res = client.post('/api/patients', json={
+        'firstName': 'Gülşen', 'lastName': 'İndeksoğlu', 'phone': '05550001122', 'tcNumber': '23456789060'
+    })
+    assert res.status_code in (200, 201)
+    patient_id = res.get_json()['data']['id']
+    index = patient_index._index
+    assert index.find_by_tc('2345678') == [patient_id]
+    assert index.find_by_name('Gulsen Indeksoglu')[0][0] == patient_id
+
+
+def test_catch_up_sync_applies_writes_from_other_processes(client):
+    from datetime import timedelta
+    from app import app
+    from models.base import db, now_utc
+    from models.patient import Patient
+    with app.app_context():
+        index = patient_index.load_patient_index()
+        index.synced_at = now_utc() - timedelta(minutes=1)
+        # A Core insert bypasses the session hooks, like a write from another process
+        db.session.execute(Patient.__table__.insert().values(
+            id='pat_idx_sync', first_name='Senkron', last_name='Yazılım', phone='05550001123',
+            updated_at=now_utc().replace(tzinfo=None)))
+        db.session.commit()
+        try:
+            assert index.find_by_name('Senkron Yazilim') == []
+            assert patient_index.get_patient_index() is index
+            assert index.find_by_name('Senkron Yazilim') == []  # lookups never sync
+            assert patient_index.sync_patient_index() >= 1
+            assert index.find_by_name('Senkron Yazilim')[0][0] == 'pat_idx_sync'
+        finally:
+            Patient.query.filter_by(id='pat_idx_sync').delete()
+            db.session.commit()
@@ -0,0 +1,170 @@
+import io
+
+from sqlalchemy import text
+
+from models.base import db
+from models.patient import Patient
+from services.patient_search import query_terms, reindex_patients, search_document
+
+
+def _add(pid, first, last, phone, tc=None, email=None):
+    patient = Patient.from_dict({'id': pid, 'firstName': first, 'lastName': last, 'phone': phone,
+                                 'tcNumber': tc, 'email': email})
+    db.session.add(patient)
+    db.session.commit()
+
+
+def _ids(client, search, **params):
+    res = client.get('/api/patients', query_string=dict(params, search=search))
+    assert res.status_code == 200
+    body = res.get_json()
+    return [p['id'] for p in body['data']], body['pagination']
+
+
+def test_search_terms_and_documents():
+    assert query_terms('  Ayşe  YILDIZ ') == ['ayse', 'yildiz']
+    assert query_terms('0 (532) 111-22 33') == ['5321112233']
+    assert query_terms('+90 532 111 22 33') == ['5321112233']
+    patient = Patient(first_name='Şükrü', last_name='Işık', phone='+90 532 111 22 33',
+                      tc_number='10000000146', email='Sukru@Example.com')
+    assert search_document(patient) == ('sukru isik', '10000000146 905321112233 5321112233 1112233 sukru@example.com')
+
+
+def test_list_search_is_prefix_aware_ranked_and_counted(client):
+    with client.application.app_context():
+        _add('pat_srch_1', 'Zümrüt', 'Quokkaoğlu', '05329990001', tc='27000000001')
+        _add('pat_srch_2', 'Quokka', 'Zümrütçü', '05329990002', email='quokka@example.com')
+        _add('pat_srch_3', 'Ali', 'Veli', '05329990003', email='zumrut.quokka@example.com')
+
+    ids, page = _ids(client, 'zümrüt quokka')
+    # name matches outrank the patient who only matches by e-mail
+    assert ids[-1] == 'pat_srch_3'
+    assert set(ids) == {'pat_srch_1', 'pat_srch_2', 'pat_srch_3'}
+    assert page['total'] == 3
+    assert page['nextCursor'] is None
+
+    assert _ids(client, 'ZUMR QUOKKAO')[0] == ['pat_srch_1']
+    assert _ids(client, '0532 999 00 02')[0] == ['pat_srch_2']
+    assert _ids(client, '9990003')[0] == ['pat_srch_3']
+    assert _ids(client, '2700000')[0] == ['pat_srch_1']
+
+    first, page = _ids(client, 'quokka', per_page=2)
+    assert len(first) == 2 and page['hasNext'] and page['total'] == 3
+    second, page = _ids(client, 'quokka', per_page=2, page=2)
+    assert len(second) == 1 and not page['hasNext']
+    assert set(first + second) == {'pat_srch_1', 'pat_srch_2', 'pat_srch_3'}
+
+    res = client.get('/api/patients/search', query_string={'q': 'zümrüt quokka', 'per_page': 2})
+    assert res.get_json()['meta']['total'] == 3
+    assert len(res.get_json()['data']) == 2
+
+
+def test_index_follows_updates_deletes_and_bulk_upload(client):
+    with client.application.app_context():
+        _add('pat_srch_upd', 'Nilüfer', 'Wombatlı', '05329990010')
+        patient = db.session.get(Patient, 'pat_srch_upd')
+        patient.last_name = 'Kangurlu'
+        db.session.commit()
+    assert _ids(client, 'wombatli')[0] == []
+    assert _ids(client, 'nilufer kangur')[0] == ['pat_srch_upd']
+
+    assert client.delete('/api/patients/pat_srch_upd').status_code == 200
+    assert _ids(client, 'kangurlu')[0] == []
+
+    csv_bytes = 'tcNumber,firstName,lastName,phone\n27000000099,Çiğdem,Pangolinoğlu,05329990020\n'.encode('utf-8')
+    res = client.post('/api/patients/bulk_upload', data={'file': (io.BytesIO(csv_bytes), 'p.csv')},
+                      content_type='multipart/form-data')
+    assert res.get_json()['created'] == 1
+    ids, _ = _ids(client, 'cigdem pangolin')
+    assert len(ids) == 1
+
+
+def test_reindex_picks_up_rows_written_with_sql(client):
+    with client.application.app_context():
+        db.session.execute(text("INSERT INTO patients (id, first_name, last_name, phone) "
+                                "VALUES ('pat_srch_raw', 'Ömer', 'Tapiroğlu', '05329990030')"))
+        db.session.commit()
+        assert reindex_patients() >= 1
+    assert _ids(client, 'omer tapir')[0] == ['pat_srch_raw']
+
+
+def test_migration_creates_and_backfills_the_index(tmp_path):
+    import importlib.util
+    import os
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from sqlalchemy import create_engine
+    from services import patient_search
+
+    path = os.path.join(os.path.dirname(__file__), '..', 'alembic', 'versions',
+                        '20261016_add_patient_search_index.py')
+    spec = importlib.util.spec_from_file_location('patient_search_migration', path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    try:
+        Patient.__table__.create(engine)
+        with engine.begin() as conn:
+            conn.execute(Patient.__table__.insert().values(
+                id='pat_srch_mig', first_name='Şükrü', last_name='Çağlar', phone='+90 532 999 0040',
+                tc_number='10000000146'))
+        # Before the migration: nothing is created at runtime
+        assert patient_search.ensure_search_index(engine) == 'like'
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'patients_fts'")).first() is None
+        patient_search.INDEX.forget(engine)
+
+        with engine.begin() as conn, Operations.context(MigrationContext.configure(conn)):
+            migration.upgrade()
+        assert patient_search.ensure_search_index(engine) == 'fts5'
+        with engine.connect() as conn:
+            row = conn.execute(text('SELECT name, contact FROM patients_fts')).one()
+            assert tuple(row) == search_document(Patient(first_name='Şükrü', last_name='Çağlar',
+                                                         phone='+90 532 999 0040', tc_number='10000000146'))
+        with engine.connect() as conn:
+            assert conn.execute(text('SELECT patient_id FROM patients_fts')).scalar() == 'pat_srch_mig'
+        with engine.begin() as conn, Operations.context(MigrationContext.configure(conn)):
+            migration.downgrade()
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'patients_fts'")).first() is None
+    finally:
+        patient_search.INDEX.forget(engine)
+        engine.dispose()
+
+
+def test_search_survives_a_patients_table_rebuild(tmp_path, monkeypatch):
+    import sqlalchemy as sa
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from sqlalchemy import create_engine
+    from services import patient_search
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'rebuild.db'}")
+    try:
+        Patient.__table__.create(engine)
+        patient_search.create_search_index(engine)
+        with engine.begin() as conn:
+            for pid, first, phone in (('pat_rb_a', 'Ahmet', '05329990051'), ('pat_rb_b', 'Bülent', '05329990052'),
+                                      ('pat_rb_c', 'Cemile', '05329990053')):
+                conn.execute(Patient.__table__.insert().values(id=pid, first_name=first, last_name='Yeniden',
+                                                               phone=phone))
+            patient_search.index_patient_ids(conn, ['pat_rb_a', 'pat_rb_b', 'pat_rb_c'])
+            conn.execute(text("DELETE FROM patients WHERE id = 'pat_rb_a'"))
+            conn.execute(text("DELETE FROM patients_fts WHERE patient_id = 'pat_rb_a'"))
+        # What any later batch_alter_table('patients') does on SQLite: copy into a new table (new rowids)
+        with engine.begin() as conn, Operations.context(MigrationContext.configure(conn)) as op:
+            with op.batch_alter_table('patients', recreate='always') as batch:
+                batch.add_column(sa.Column('rebuild_marker', sa.String(10)))
+
+        monkeypatch.setattr(patient_search, 'ensure_search_index', lambda bind=None: 'fts5')
+        patients = Patient.__table__
+        for query, expected in (('cemile', ['pat_rb_c']), ('bulent', ['pat_rb_b']), ('yeniden', ['pat_rb_b', 'pat_rb_c'])):
+            matches = patient_search.match_subquery(query)
+            with engine.connect() as conn:
+                found = conn.execute(sa.select(patients.c.id).join(matches, matches.c.id == patients.c.id)
+                                     .order_by(patients.c.id)).scalars().all()
+            assert found == expected, query
+    finally:
+        patient_search.INDEX.forget(engine)
+        engine.dispose()
@@ -0,0 +1,139 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from models.appointment import Appointment
+from models.base import db
+from models.device import Device
+from models.inventory import Inventory
+from models.patient import Patient
+from models.sales import Sale
+from models import serializers
+from scripts import benchmark_serialization
+from utils.json_provider import OrjsonProvider, orjson
+from utils.serialization import decode_json
+
+MODELS = [(Patient, serializers.PATIENT), (Device, serializers.DEVICE), (Sale, serializers.SALE),
+          (Inventory, serializers.INVENTORY), (Appointment, serializers.APPOINTMENT)]
+
+
+def _sparse_rows():
+    """Rows with the optional fields left empty, for the None / default branches."""
+    return [Patient(id='pat_ser_sparse', first_name='Boş', last_name='Alan', phone='05324440901', tags=None),
+            Device(id='dev_ser_sparse', price=Decimal('0')),
+            Sale(id='sale_ser_sparse', patient_id='pat_ser_sparse', sale_date=datetime(2026, 1, 1)),
+            Inventory(id='item_ser_sparse', name='Pil', brand='Rayovac', category='pil'),
+            Appointment(id='apt_ser_sparse', patient_id='pat_ser_sparse', date=datetime(2026, 1, 5), time='09:00')]
+
+
+def test_plans_match_to_dict(client):
+    with client.application.app_context():
+        rows = [obj for objs in benchmark_serialization.make_rows(3).values() for obj in objs]
+        for obj in rows:
+            obj.id = obj.id.replace('_0', '_ser_', 1)
+        rows += _sparse_rows()
+        ids = {model: [obj.id for obj in rows if isinstance(obj, model)] for model, _ in MODELS}
+        db.session.add_all(rows)
+        db.session.commit()
+        try:
+            for model, plan in MODELS:
+                # expired after the commit: the attribute-access fallback
+                loaded = [db.session.get(model, i) for i in ids[model]]
+                db.session.expire_all()
+                assert plan.many(loaded) == [obj.to_dict() for obj in loaded], model.__name__
+                # freshly loaded: the direct path
+                db.session.expunge_all()
+                loaded = model.query.filter(model.id.in_(ids[model])).all()
+                assert all(obj.__dict__.keys() >= set(plan.columns) for obj in loaded)
+                assert plan.many(loaded) == [obj.to_dict() for obj in loaded], model.__name__
+        finally:
+            db.session.rollback()
+            for model, _ in reversed(MODELS):
+                model.query.filter(model.id.like('%_ser_%')).delete(synchronize_session=False)
+            db.session.commit()
+
+
+def test_json_columns_are_cached_but_never_shared():
+    assert decode_json('not json', []) == []
+    assert decode_json(None, {}) == {}
+    default = []
+    assert decode_json(None, default) == [] and decode_json(None, default) is not default
+    # cached, but every call gets its own objects
+    first = decode_json('["vip"]', [])
+    assert first == ['vip'] and first is not decode_json('["vip"]', [])
+    first.append('sgk')
+    assert decode_json('["vip"]', []) == ['vip']
+    nested = decode_json('{"notes": {"x": 1}}', {})
+    nested['notes']['x'] = 2
+    assert decode_json('{"notes": {"x": 1}}', {}) == {'notes': {'x': 1}}
+    assert decode_json('"text"', None) == 'text'
+
+
+def test_list_endpoint_uses_plan(client):
+    res = client.get('/api/inventory?per_page=5')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['success'] is True and 'requestId' in body
+
+
+@pytest.mark.skipif(orjson is None, reason='orjson not installed')
+def test_orjson_provider_matches_flask_output(client):
+    app = client.application
+    assert isinstance(app.json, OrjsonProvider)
+    value = {'b': datetime(2026, 1, 2, 3, 4, 5), 'a': Decimal('1.50'), 'name': 'Işıl Öztürk', 'n': None}
+    stdlib = json.loads(super(OrjsonProvider, app.json).dumps(value))
+    assert json.loads(app.json.dumps(value)) == stdlib
+    assert app.json.dumps(value).startswith('{"a":"1.50","b":"Fri, 02 Jan 2026 03:04:05 GMT"')
+    assert 'Işıl' in app.json.dumps(value)
+    # beyond orjson's 64-bit integers: handed to the standard library
+    assert app.json.loads(app.json.dumps({'big': 2 ** 70})) == {'big': 2 ** 70}
+    assert app.json.loads(b'{"x": [1, 2]}') == {'x': [1, 2]}
+
+
+def test_benchmark_reports_every_endpoint():
+    report = benchmark_serialization.run(rows=3, repeat=1)
+    assert set(report) == {'patients', 'devices', 'sales', 'inventory', 'appointments'}
+    assert all(entry['serializer_fast_json_ms']['total'] > 0 for entry in report.values())
+
+
+def test_sparse_fieldsets_narrow_select_and_payload(client):
+    from sqlalchemy import event
+    with client.application.app_context():
+        db.session.add(Patient(id='pat_ser_fields', first_name='Seçil', last_name='Alan', phone='05324440902',
+                               address_full='Uzun adres metni', custom_data='{"notes": "x"}'))
+        db.session.add(Sale(id='sale_ser_fields', patient_id='pat_ser_fields', sale_date=datetime(2026, 2, 1),
+                            final_amount=Decimal('100.00')))
+        db.session.commit()
+        engine = db.engine
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        res = client.get('/api/patients', query_string={'fields': 'firstName, phone', 'per_page': 200})
+        assert res.status_code == 200
+        assert {tuple(sorted(p)) for p in res.get_json()['data']} == {('firstName', 'id', 'phone')}
+        select = next(s for s in statements if 'FROM patients' in s and 'first_name' in s)
+        assert 'address_full' not in select and 'custom_data' not in select
+
+        sales = client.get('/api/sales', query_string={'fields': 'finalAmount,patient'}).get_json()['data']
+        sale = next(s for s in sales if s['id'] == 'sale_ser_fields')
+        assert sale == {'id': 'sale_ser_fields', 'finalAmount': 100.0,
+                        'patient': {'id': 'pat_ser_fields', 'first_name': 'Seçil', 'last_name': 'Alan'}}
+        sales = client.get('/api/sales', query_string={'fields': 'finalAmount'}).get_json()['data']
+        assert all(set(s) == {'id', 'finalAmount'} for s in sales)
+
+        for url in ('/api/devices', '/api/inventory'):
+            assert all(set(row) == {'id', 'brand'}
+                       for row in client.get(url, query_string={'fields': 'brand'}).get_json()['data'])
+            res = client.get(url, query_string={'fields': 'brand,custom_data'})
+            assert res.status_code == 400 and 'custom_data' in res.get_json()['error']
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+        with client.application.app_context():
+            Sale.query.filter_by(id='sale_ser_fields').delete()
+            Patient.query.filter_by(id='pat_ser_fields').delete()
+            db.session.commit()
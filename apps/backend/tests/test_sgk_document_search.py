@@ -0,0 +1,146 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from models import SGKDocument, db
+from routes import sgk
+
+
+def _add(**fields):
+    doc = SGKDocument.from_dict(fields)
+    db.session.add(doc)
+    db.session.commit()
+    return doc.id
+
+
+def _search(client, query, **params):
+    res = client.get('/api/sgk/documents/search', query_string=dict(params, q=query))
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def test_search_ranks_folds_turkish_and_snippets(client):
+    with client.application.app_context():
+        once = _add(filename='a.png', documentType='sgk_device_report', patientId='pat_fts_1',
+                    ocrText='TIBBI MALZEME RAPORU\nSağ kulak İŞİTME CİHAZI zerkovsky uygundur')
+        twice = _add(filename='b.png', documentType='sgk_device_report',
+                     ocrText='Odyometri: zerkovsky işitme kaybı\nişitme cihazı önerilir')
+        _add(filename='c.png', documentType='prescription', ocrText='Reçete zerkovsky ilaç')
+
+    body = _search(client, 'isitme zerkovsky')
+    assert body['meta']['total'] == 2
+    assert [d['id'] for d in body['documents']] == [twice, once]
+    assert body['documents'][1]['snippet'].startswith('TIBBI MALZEME')
+    assert '<mark>İŞİTME</mark>' in body['documents'][1]['snippet']
+
+    # the last term matches as a prefix, filters narrow the results
+    assert [d['id'] for d in _search(client, 'zerkovsky odyo')['documents']] == [twice]
+    assert [d['id'] for d in _search(client, 'zerkovsky', patientId='pat_fts_1')['documents']] == [once]
+    assert _search(client, 'zerkovsky', documentType='prescription')['meta']['total'] == 1
+    assert _search(client, 'zerkovsky', per_page=1, page=2)['documents'][0]['id'] in (once, twice)
+    assert client.get('/api/sgk/documents/search').status_code == 400
+
+
+def test_index_follows_updates_and_deletes(client):
+    with client.application.app_context():
+        doc_id = _add(filename='d.png', ocrText='quixotic timpanometri')
+        doc = db.session.get(SGKDocument, doc_id)
+        doc.ocr_text = 'quixotic odyogram'
+        db.session.commit()
+    assert _search(client, 'quixotic timpanometri')['meta']['total'] == 0
+    assert _search(client, 'quixotic odyogram')['meta']['total'] == 1
+
+    assert client.delete(f'/api/sgk/documents/{doc_id}').status_code == 200
+    assert _search(client, 'quixotic')['meta']['total'] == 0
+
+
+def test_uploaded_pages_are_stored_and_searchable(client, monkeypatch):
+    monkeypatch.setenv('OCR_DEDUP_ENABLED', '0')
+
+    def fake_iter_process_files(sources):
+        for i, _ in enumerate(sources):
+            yield i, {'entities': [{'text': 'Hasta Adı Soyadı', 'confidence': 0.9},
+                                   {'text': 'Vellichor kulak arkası cihaz', 'confidence': 0.8}],
+                      'classification': {'type': 'sgk_device_report'}, 'patient_info': None}
+
+    monkeypatch.setattr(sgk, 'iter_process_files', fake_iter_process_files)
+    png = cv2.imencode('.png', np.full((40, 30, 3), 255, dtype=np.uint8))[1].tobytes()
+    res = client.post('/api/sgk/upload', data={'files': [(io.BytesIO(png), 'rapor.png')]},
+                      content_type='multipart/form-data')
+    doc_id = res.get_json()['files'][0]['result']['sgkDocumentId']
+
+    (hit,) = _search(client, 'vellichor arkasi')['documents']
+    assert hit['id'] == doc_id
+    assert hit['documentType'] == 'sgk_device_report'
+    assert hit['ocrConfidence'] == 0.85
+    assert hit['regionOnly'] is False
+    doc = client.get(f'/api/sgk/documents/{doc_id}?includeText=1').get_json()['document']
+    assert doc['ocrText'] == 'Hasta Adı Soyadı\nVellichor kulak arkası cihaz'
+
+
+def test_index_is_created_by_the_migration_only(client):
+    from sqlalchemy import create_engine, text
+    from services import document_search
+    # A database the migrations never ran on: no DDL at runtime, search falls back to LIKE
+    engine = create_engine('sqlite://')
+    try:
+        assert document_search.ensure_search_index(engine) == 'like'
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM sqlite_master")).scalar() == 0
+        with pytest.raises(RuntimeError):
+            document_search.reindex_documents(engine)
+    finally:
+        document_search.INDEX.forget(engine)
+        engine.dispose()
+
+    with client.application.app_context():
+        doc_id = _add(filename='e.png', ocrText='sesquipedalian odyogram')
+        db.session.execute(text(f'DELETE FROM {document_search.FTS_TABLE}'))
+        db.session.commit()
+        assert _search(client, 'sesquipedalian')['meta']['total'] == 0
+        assert document_search.reindex_documents() >= 1
+    assert [d['id'] for d in _search(client, 'sesquipedalian')['documents']] == [doc_id]
+
+
+def test_search_survives_a_documents_table_rebuild(client):
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    with client.application.app_context():
+        first = _add(filename='f.png', ocrText='palimpsest alfa')
+        second = _add(filename='g.png', ocrText='palimpsest beta')
+        third = _add(filename='h.png', ocrText='palimpsest gama')
+        db.session.delete(db.session.get(SGKDocument, first))
+        db.session.commit()
+        db.session.remove()
+        # What any later batch_alter_table('sgk_documents') does on SQLite: copy into a new table (new rowids)
+        with db.engine.begin() as conn, Operations.context(MigrationContext.configure(conn)) as op:
+            with op.batch_alter_table('sgk_documents', recreate='always'):
+                pass
+
+    assert sorted(d['id'] for d in _search(client, 'palimpsest')['documents']) == sorted([second, third])
+    (hit,) = _search(client, 'palimpsest beta')['documents']
+    assert hit['id'] == second and '<mark>beta</mark>' in hit['snippet']
+
+
+def test_template_pages_are_flagged_region_only(client, monkeypatch):
+    monkeypatch.setenv('OCR_DEDUP_ENABLED', '0')
+
+    def fake_iter_process_files(sources):
+        for i, _ in enumerate(sources):
+            yield i, {'entities': [{'text': 'TIBBI MALZEME RAPORU', 'confidence': 0.9},
+                                   {'text': 'Susurrus Kulaklı', 'confidence': 0.9}],
+                      'classification': {'type': 'sgk_device_report'}, 'patient_info': None,
+                      'template': {'name': 'sgk_device_report', 'confidence': 0.9, 'accepted': True},
+                      'fields': {'patient_name': {'value': 'Susurrus Kulaklı'}}}
+
+    monkeypatch.setattr(sgk, 'iter_process_files', fake_iter_process_files)
+    png = cv2.imencode('.png', np.full((40, 30, 3), 255, dtype=np.uint8))[1].tobytes()
+    res = client.post('/api/sgk/upload', data={'files': [(io.BytesIO(png), 'sablon.png')]},
+                      content_type='multipart/form-data')
+    doc_id = res.get_json()['files'][0]['result']['sgkDocumentId']
+
+    body = _search(client, 'susurrus')
+    assert [d['id'] for d in body['documents']] == [doc_id]
+    assert body['documents'][0]['regionOnly'] is True and body['meta']['regionOnly'] == 1
@@ -0,0 +1,69 @@
+import io
+import json
+import pickle
+
+import cv2
+import numpy as np
+import pytest
+
+from routes import sgk
+from services.ocr_batch import PdfPage
+from utils import pdf_pages
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    monkeypatch.setenv('OCR_DEDUP_ENABLED', '0')
+    processed = []
+
+    def fake_iter_process_files(sources):
+        sources = list(sources)
+        processed.extend(sources)
+        # finish in reverse order to show results are not held back
+        for i in reversed(range(len(sources))):
+            yield i, {'entities': [{'text': 'page %d' % (i + 1)}], 'patient_info': None}
+
+    monkeypatch.setattr(sgk, 'iter_process_files', fake_iter_process_files)
+    return processed
+
+
+def _png():
+    return cv2.imencode('.png', np.full((40, 30, 3), 255, dtype=np.uint8))[1].tobytes()
+
+
+def test_stream_returns_each_page_as_it_finishes(client, fake_ocr):
+    files = [(io.BytesIO(_png()), 'a.png'), (io.BytesIO(b'text'), 'notes.txt'), (io.BytesIO(_png()), 'b.png')]
+    res = client.post('/api/sgk/upload?stream=1', data={'files': files}, content_type='multipart/form-data')
+    assert res.status_code == 200
+    assert res.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert [(line.get('index'), line.get('fileName'), line.get('status')) for line in lines[:3]] == [
+        (1, 'notes.txt', 'error'), (2, 'b.png', 'processed'), (0, 'a.png', 'processed')]
+    assert lines[-1]['done'] is True and lines[-1]['count'] == 3
+
+
+def test_pdf_pages_are_rasterized_for_ocr(client, fake_ocr):
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for text in ('Hasta Adi Soyadi', 'Rapor'):
+        doc.new_page(width=595, height=842).insert_text((72, 72), text)
+    files = [(io.BytesIO(doc.tobytes()), 'rapor.pdf')]
+
+    res = client.post('/api/sgk/upload', data={'files': files}, content_type='multipart/form-data')
+    entries = res.get_json()['files']
+    assert [(e['page'], e['pageCount'], e['status']) for e in entries] == [(1, 2, 'processed'), (2, 2, 'processed')]
+    # Rendering is left to the pool tasks: the request thread only hands over (pdf, page number)
+    assert all(isinstance(source, PdfPage) for source in fake_ocr)
+    assert [source.page_no for source in fake_ocr] == [0, 1]
+    copied = pickle.loads(pickle.dumps(fake_ocr[1]))
+    page = cv2.imdecode(np.frombuffer(copied.render(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert max(page.shape[:2]) == pytest.approx(1200, abs=2)
+
+
+def test_pdf_without_pymupdf_is_reported_per_file(client, fake_ocr, monkeypatch):
+    monkeypatch.setattr(pdf_pages, 'PDF_AVAILABLE', False)
+    files = [(io.BytesIO(b'%PDF-1.4\n%%EOF'), 'scan.bin'), (io.BytesIO(_png()), 'a.png')]
+    res = client.post('/api/sgk/upload', data={'files': files}, content_type='multipart/form-data')
+    pdf, image = res.get_json()['files']
+    assert pdf['status'] == 'error' and 'PyMuPDF' in pdf['error']
+    assert image['status'] == 'processed'
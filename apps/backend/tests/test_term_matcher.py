@@ -0,0 +1,30 @@
+from services.ocr_service import TurkishMedicalOCR
+from utils.term_matcher import TermAutomaton
+
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = TermAutomaton([(p, p) for p in ('he', 'she', 'his', 'hers')])
+    assert automaton.find_all('ushers') == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+
+
+def test_medical_terms_match_naive_scan():
+    svc = TurkishMedicalOCR()
+    svc._load_medical_terms()
+    text = 'SGK Cihaz Raporu\nSensörinöral işitme kaybı, sağ kulak. Önerilen: RIC işitme cihazı. Odyometri yapıldı; işitme kaybı bilateral.'
+    lower = text.lower()
+    expected = []
+    for category, terms in svc.medical_terms.items():
+        for term in terms:
+            pos = lower.find(term.lower())
+            if pos >= 0:
+                expected.append({"term": term, "category": category, "start": pos, "end": pos + len(term)})
+    assert svc._extract_medical_terms(text) == expected
+    assert {'term': 'işitme kaybı', 'category': 'hearing_conditions', 'start': lower.find('işitme kaybı'),
+            'end': lower.find('işitme kaybı') + len('işitme kaybı')} in expected
+
+
+def test_classification_keeps_rule_priority():
+    svc = TurkishMedicalOCR()
+    assert svc._classify_document('Muayene bulguları; odyometri sonucu')['type'] == 'audiometry_report'
+    assert svc._classify_document('reçete ... SGK provizyon')['type'] == 'sgk_device_report'
+    assert svc._classify_document('boş sayfa') == {"type": "other", "confidence": 0.50}
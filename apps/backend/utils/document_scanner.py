@@ -1,8 +1,16 @@
 """
 Simple document scanner / cropper adapted from common OpenCV techniques
-(compatible with OpenCV-Document-Scanner approach). This module exposes a
-single `auto_crop_image(input_path)` function that returns the path to a
-temporary cropped image (same format as input) or None on failure.
+(compatible with OpenCV-Document-Scanner approach). This module exposes
+`crop_document(image)`, which crops an in-memory BGR array, `decode_image(data)`
+for uploaded bytes, and the file-based `auto_crop_image(input_path)` wrapper
+that returns the path to a temporary cropped image (same format as input) or
+None on failure.
+
+Edges and contours are found on a small copy of the photo; the detected quad
+is scaled back up and the perspective warp is applied once, straight to the
+requested output size (`max_side`), so a 12 MP phone photo is never warped
+at full resolution. `AUTO_CROP_MODES` trades detection resolution and
+interpolation quality for speed ('fast', 'balanced', 'quality').
 
 The implementation uses OpenCV (already required by the project) and does
 not require the external repository to be added; it is a lightweight
@@ -13,6 +21,52 @@ import numpy as np
 import os
 import tempfile
 
+# detect_height: contour detection resolution; detect_interpolation: used for the
+# detection copy; interpolation: warp filter; supersample: warp at N x the output
+# size and area-downscale (less aliasing on small text)
+AUTO_CROP_MODES = {
+    'fast': {'detect_height': 320, 'detect_interpolation': cv2.INTER_NEAREST,
+             'interpolation': cv2.INTER_LINEAR, 'supersample': 1},
+    'balanced': {'detect_height': 500, 'detect_interpolation': cv2.INTER_LINEAR,
+                 'interpolation': cv2.INTER_LINEAR, 'supersample': 1},
+    'quality': {'detect_height': 800, 'detect_interpolation': cv2.INTER_AREA,
+                'interpolation': cv2.INTER_LINEAR, 'supersample': 2},
+}
+
+
+def auto_crop_mode(value):
+    """Normalize an `auto_crop` option to a key of AUTO_CROP_MODES, or None when cropping is off.
+
+    True selects OCR_AUTO_CROP_MODE (default 'balanced'); strings name a mode.
+    """
+    if value is None or value is False:
+        return None
+    if isinstance(value, str):
+        mode = value.strip().lower()
+        if mode in ('', '0', 'false', 'no', 'off'):
+            return None
+        if mode not in ('1', 'true', 'yes', 'on'):
+            if mode not in AUTO_CROP_MODES:
+                raise ValueError(f"Unknown auto_crop mode: {value}")
+            return mode
+    mode = os.getenv('OCR_AUTO_CROP_MODE', 'balanced').strip().lower()
+    return mode if mode in AUTO_CROP_MODES else 'balanced'
+
+
+def _fit(width, height, max_side):
+    """Scale factor that brings (width, height) within max_side (never upscales)."""
+    if not max_side or max(width, height) <= max_side:
+        return 1.0
+    return max_side / float(max(width, height))
+
+
+def _downscale(image, max_side):
+    scale = _fit(image.shape[1], image.shape[0], max_side)
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                      interpolation=cv2.INTER_AREA)
+
 
 def _order_points(pts):
     # Order points as top-left, top-right, bottom-right, bottom-left
@@ -28,7 +82,8 @@ def _order_points(pts):
     return rect
 
 
-def four_point_transform(image, pts):
+def four_point_transform(image, pts, max_side=None, interpolation=cv2.INTER_LINEAR):
+    """Warp the quad `pts` to a rectangle, at most `max_side` pixels on its longer side."""
     rect = _order_points(pts)
     (tl, tr, br, bl) = rect
 
@@ -42,6 +97,11 @@ def four_point_transform(image, pts):
     heightB = np.linalg.norm(tl - bl)
     maxHeight = max(int(heightA), int(heightB))
 
+    # Warp straight to the output size instead of warping full-size and resizing after
+    scale = _fit(maxWidth, maxHeight, max_side)
+    maxWidth = max(1, int(maxWidth * scale))
+    maxHeight = max(1, int(maxHeight * scale))
+
     dst = np.array([
         [0, 0],
         [maxWidth - 1, 0],
@@ -49,29 +109,46 @@ def four_point_transform(image, pts):
         [0, maxHeight - 1]], dtype="float32")
 
     M = cv2.getPerspectiveTransform(rect, dst)
-    warped = cv2.warpPerspective(image, M, (maxWidth, maxHeight))
+    warped = cv2.warpPerspective(image, M, (maxWidth, maxHeight), flags=interpolation)
 
     return warped
 
 
-def auto_crop_image(input_path):
+def decode_image(data):
+    """Decode encoded image bytes (e.g. an uploaded file) into a BGR array, or None."""
     try:
-        if not os.path.exists(input_path):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        if buf.size == 0:
             return None
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    except Exception:
+        return None
+
+
+def crop_document(image, max_side=None, mode='balanced'):
+    """Return the document region of a BGR array, or None if none was found.
 
-        image = cv2.imread(input_path)
+    Detection runs on a small copy (height set by `mode`, see AUTO_CROP_MODES);
+    the crop (perspective-corrected when a 4-point contour is found) is taken
+    from the full-resolution input and returned at most `max_side` pixels on
+    its longer side.
+    """
+    try:
         if image is None:
             return None
+        preset = AUTO_CROP_MODES.get(mode) or AUTO_CROP_MODES['balanced']
 
-        orig = image.copy()
-        ratio = image.shape[0] / 500.0
-        image = cv2.resize(image, (int(image.shape[1] / ratio), 500))
+        orig = image
+        detect_height = min(preset['detect_height'], image.shape[0])
+        ratio = image.shape[0] / float(detect_height)
+        image = cv2.resize(image, (max(1, int(image.shape[1] / ratio)), detect_height),
+                           interpolation=preset['detect_interpolation'])
 
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         gray = cv2.GaussianBlur(gray, (5, 5), 0)
         edged = cv2.Canny(gray, 75, 200)
 
-        cnts, _ = cv2.findContours(edged.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        cnts, _ = cv2.findContours(edged, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
         cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:10]
 
         screenCnt = None
@@ -88,10 +165,31 @@ def auto_crop_image(input_path):
                 return None
             x, y, w, h = cv2.boundingRect(cnts[0])
             cropped = orig[int(y * ratio):int((y + h) * ratio), int(x * ratio):int((x + w) * ratio)]
+            if cropped.size:
+                cropped = _downscale(cropped, max_side)
         else:
             pts = screenCnt.reshape(4, 2) * ratio
-            warped = four_point_transform(orig, pts)
-            cropped = warped
+            warp_side = max_side * preset['supersample'] if max_side else None
+            cropped = four_point_transform(orig, pts, max_side=warp_side, interpolation=preset['interpolation'])
+            if preset['supersample'] > 1:
+                cropped = _downscale(cropped, max_side)
+
+        if cropped is None or cropped.size == 0:
+            return None
+        return cropped
+
+    except Exception:
+        return None
+
+
+def auto_crop_image(input_path):
+    try:
+        if not os.path.exists(input_path):
+            return None
+
+        cropped = crop_document(cv2.imread(input_path))
+        if cropped is None:
+            return None
 
         # Save to temp file (preserve extension)
         base, ext = os.path.splitext(os.path.basename(input_path))
@@ -0,0 +1,10 @@
+"""Typed access to configuration environment variables."""
+import os
+
+
+def env_int(name, default):
+    """int value of environment variable `name`; `default` when unset or not an integer."""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,151 @@
+"""
+Fuzzy matching helpers for Turkish person names.
+
+`fold` / `normalize` fold Turkish characters with a precompiled translate
+table (no per-call unicodedata work). `score_many` compares one query against a
+batch of candidates in a single call: for queries up to 63 characters it
+runs Myers' bit-parallel edit distance vectorized over all candidates with
+NumPy; longer queries (or missing NumPy) use a pure-Python DP. Scores are
+normalized Levenshtein ratios in 0..1 (`1 - distance / max(len)`), the same
+scale `TurkishMedicalOCR._levenshtein_ratio` has always returned.
+"""
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:  # pragma: no cover - numpy ships with opencv
+    np = None
+    NUMPY_AVAILABLE = False
+
+TURKISH_FOLD = str.maketrans({
+    'ç': 'c', 'Ç': 'c', 'ğ': 'g', 'Ğ': 'g', 'ı': 'i', 'I': 'i', 'İ': 'i',
+    'ö': 'o', 'Ö': 'o', 'ş': 's', 'Ş': 's', 'ü': 'u', 'Ü': 'u',
+    'â': 'a', 'Â': 'a', 'î': 'i', 'Î': 'i', 'û': 'u', 'Û': 'u'
+})
+
+# Myers' algorithm keeps the query in one machine word
+_MAX_BITPARALLEL = 63
+
+
+def fold(text):
+    """Fold Turkish characters to ASCII and lowercase; keeps every character, so offsets match the input."""
+    return (text or '').translate(TURKISH_FOLD).lower()
+
+
+def normalize(text):
+    """Fold Turkish characters to ASCII, lowercase and keep letters/digits/spaces only."""
+    folded = fold(text)
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in folded).split())
+
+
+def levenshtein(a, b):
+    """Plain two-row DP edit distance."""
+    if a == b:
+        return 0
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        curr = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + cost)
+        prev = curr
+    return prev[-1]
+
+
+def levenshtein_ratio(a, b):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return max(0.0, 1.0 - levenshtein(a, b) / float(max(len(a), len(b))))
+
+
+def _distances_bitparallel(query, candidates):
+    """Edit distance of `query` to every candidate (Myers/Hyyrö, vectorized over candidates)."""
+    m = len(query)
+    n = len(candidates)
+    alphabet = {}
+    for ch in query:
+        alphabet.setdefault(ch, len(alphabet) + 1)
+    # Peq[k]: bitmask of query positions holding alphabet symbol k (0 = not in query)
+    peq = np.zeros(len(alphabet) + 1, dtype=np.uint64)
+    for pos, ch in enumerate(query):
+        peq[alphabet[ch]] |= np.uint64(1 << pos)
+
+    lengths = np.fromiter((len(c) for c in candidates), dtype=np.int64, count=n)
+    width = int(lengths.max()) if n else 0
+    codes = np.zeros((n, width), dtype=np.int64)
+    for row, cand in enumerate(candidates):
+        if cand:
+            codes[row, :len(cand)] = [alphabet.get(ch, 0) for ch in cand]
+
+    one = np.uint64(1)
+    high = np.uint64(1 << (m - 1))
+    pv = np.full(n, (1 << m) - 1, dtype=np.uint64)
+    mv = np.zeros(n, dtype=np.uint64)
+    score = np.full(n, m, dtype=np.int64)
+    for j in range(width):
+        active = lengths > j
+        eq = peq[codes[:, j]]
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        score = np.where(active & ((ph & high) != 0), score + 1, score)
+        score = np.where(active & ((mh & high) != 0), score - 1, score)
+        ph = (ph << one) | one
+        mh = mh << one
+        new_pv = mh | ~(xv | ph)
+        new_mv = ph & xv
+        pv = np.where(active, new_pv, pv)
+        mv = np.where(active, new_mv, mv)
+    return score, lengths
+
+
+def score_many(query, candidates):
+    """Normalized Levenshtein ratio of `query` against each candidate (already normalized)."""
+    candidates = list(candidates)
+    if not candidates:
+        return []
+    if not query:
+        return [1.0 if not c else 0.0 for c in candidates]
+    if NUMPY_AVAILABLE and len(query) <= _MAX_BITPARALLEL:
+        dist, lengths = _distances_bitparallel(query, candidates)
+        longest = np.maximum(lengths, len(query)).astype(np.float64)
+        ratios = np.clip(1.0 - dist / longest, 0.0, 1.0)
+        ratios[lengths == 0] = 0.0
+        return ratios.tolist()
+    return [levenshtein_ratio(query, c) for c in candidates]
+
+
+def name_scores(query, candidates):
+    """Score a person name against candidate names.
+
+    Both sides are normalized; each score is the better of the plain ratio
+    and the ratio with tokens sorted, so "YILMAZ AYŞE" matches "Ayşe Yılmaz".
+    """
+    q = normalize(query)
+    cands = [normalize(c) for c in candidates]
+    plain = score_many(q, cands)
+    q_sorted = ' '.join(sorted(q.split()))
+    if q_sorted == q and all(' '.join(sorted(c.split())) == c for c in cands):
+        return plain
+    swapped = score_many(q_sorted, [' '.join(sorted(c.split())) for c in cands])
+    return [max(a, b) for a, b in zip(plain, swapped)]
+
+
+def rank(query, candidates, key=None, limit=None, min_score=0.0):
+    """Rank candidates by name similarity to `query`.
+
+    `key` extracts the name from each candidate (default: the candidate
+    itself). Returns [(candidate, score)] sorted by descending score.
+    """
+    candidates = list(candidates)
+    names = [key(c) if key else c for c in candidates]
+    scores = name_scores(query, names)
+    ranked = [(c, s) for c, s in zip(candidates, scores) if s >= min_score]
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked[:limit] if limit else ranked
@@ -0,0 +1,142 @@
+"""
+Image clean-up applied to a decoded page before OCR.
+
+Phone photos of SGK reports are often slightly rotated, unevenly lit and
+noisy; the recognizer is both slower and less accurate on them. This module
+exposes `preprocess(image, steps)`, which runs a selection of cheap OpenCV /
+NumPy steps on an in-memory BGR array:
+
+    grayscale   drop colour (the other steps work on the gray page anyway)
+    denoise     3x3 median filter against sensor noise and JPEG speckle
+    deskew      rotate by the dominant text-line angle (projection profile)
+    binarize    adaptive (local mean) threshold against shadows and low contrast
+
+Steps always run in the order above, whatever order they are given in. The
+result is a 3-channel array again, which is what PaddleOCR expects.
+
+The steps used for a document type come from `preprocess_steps(doc_type)`:
+
+    OCR_PREPROCESS                 steps for every document type (default: none)
+    OCR_PREPROCESS_<DOC_TYPE>      steps for one type, e.g.
+                                   OCR_PREPROCESS_SGK_DEVICE_REPORT=deskew,binarize
+
+'none' (or an empty value) disables preprocessing; scripts/benchmark_ocr.py
+--preprocess measures a selection against the current configuration.
+"""
+import os
+
+import cv2
+import numpy as np
+
+PREPROCESS_STEPS = ('grayscale', 'denoise', 'deskew', 'binarize')
+
+# Deskew searches +-MAX_SKEW degrees (to SKEW_STEP precision) on a copy whose
+# longer side is SKEW_DETECT_SIDE; smaller angles than MIN_SKEW are not worth a rotation.
+MAX_SKEW = 10.0
+SKEW_STEP = 0.25
+MIN_SKEW = 0.3
+SKEW_DETECT_SIDE = 600
+
+
+def parse_steps(value):
+    """Normalize a comma-separated string or a list of step names into a tuple in PREPROCESS_STEPS order.
+
+    Raises ValueError for an unknown step.
+    """
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = value.split(',')
+    names = {str(v).strip().lower() for v in value} - {'', 'none', '0', 'off'}
+    unknown = names - set(PREPROCESS_STEPS)
+    if unknown:
+        raise ValueError(f"Unknown preprocess step: {', '.join(sorted(unknown))}")
+    return tuple(step for step in PREPROCESS_STEPS if step in names)
+
+
+def preprocess_steps(doc_type=None):
+    """Steps configured for `doc_type` (OCR_PREPROCESS_<TYPE>, else OCR_PREPROCESS); invalid values disable them."""
+    value = os.getenv('OCR_PREPROCESS_' + doc_type.upper()) if doc_type else None
+    if value is None:
+        value = os.getenv('OCR_PREPROCESS', '')
+    try:
+        return parse_steps(value)
+    except ValueError:
+        return ()
+
+
+def _gray(image):
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def skew_angle(gray):
+    """Dominant text-line angle of a gray page in degrees (counter-clockwise positive), 0.0 if undetermined.
+
+    Every candidate rotation projects the ink pixels onto the vertical axis;
+    text lines line up - and the row histogram is sharpest - at the page's
+    skew. Each pass scores all its candidates at once: whole degrees
+    first, then SKEW_STEP steps around the best of them.
+    """
+    scale = min(1.0, SKEW_DETECT_SIDE / float(max(gray.shape[:2])))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ys, xs = np.nonzero(ink)
+    if ys.size < 100:
+        return 0.0
+    if ys.size > 20000:
+        # An even sample keeps the histogram shape and bounds the work
+        pick = np.random.default_rng(0).choice(ys.size, 20000, replace=False)
+        ys, xs = ys[pick], xs[pick]
+
+    xs = xs.astype(np.float32) - gray.shape[1] / 2.0
+    ys = ys.astype(np.float32) - gray.shape[0] / 2.0
+    coarse = _best_angle(xs, ys, np.arange(-MAX_SKEW, MAX_SKEW + 0.5, 1.0))
+    if coarse is None:
+        return 0.0
+    return _best_angle(xs, ys, np.arange(coarse - 1.0, coarse + 1.0 + SKEW_STEP / 2, SKEW_STEP)) or 0.0
+
+
+def _best_angle(xs, ys, angles):
+    theta = np.deg2rad(angles).astype(np.float32)[:, None]
+    # Row of every ink pixel after rotating the page by each candidate angle
+    rows = np.rint(ys[None, :] * np.cos(theta) + xs[None, :] * np.sin(theta)).astype(np.int32)
+    offset = int(np.abs(rows).max()) + 1
+    bins = 2 * offset
+    rows += offset + np.arange(len(angles), dtype=np.int32)[:, None] * bins
+    hist = np.bincount(rows.ravel(), minlength=len(angles) * bins).reshape(len(angles), bins).astype(np.float64)
+    score = (hist ** 2).sum(axis=1)
+    # A page without line structure scores alike at every angle
+    if score.max() <= score.min() * 1.02:
+        return None
+    return float(angles[int(score.argmax())])
+
+
+def deskew(gray):
+    angle = skew_angle(gray)
+    if abs(angle) < MIN_SKEW:
+        return gray
+    h, w = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), -angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def binarize(gray):
+    # Window of roughly two text lines at OCR resolution, odd as OpenCV requires
+    block = max(15, (max(gray.shape[:2]) // 40) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, block, 15)
+
+
+def preprocess(image, steps):
+    """Apply `steps` (see PREPROCESS_STEPS) to a BGR array; returns a new BGR array, or `image` when steps is empty."""
+    steps = parse_steps(steps)
+    if not steps or image is None:
+        return image
+    gray = _gray(image)
+    if 'denoise' in steps:
+        gray = cv2.medianBlur(gray, 3)
+    if 'deskew' in steps:
+        gray = deskew(gray)
+    if 'binarize' in steps:
+        gray = binarize(gray)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
@@ -1,8 +1,18 @@
 """Prometheus metrics utilities for X-Ear Flask app
 
 Provides guarded helpers to register histograms/counters and expose the /metrics endpoint.
+
+Process pool children (services/ocr_batch.py) have their own registry that
+is never scraped: they run each task under capture_metrics(), return the
+buffered OCR counter/histogram updates with the result, and the parent
+applies them with replay_metrics() so they show up on this process's /metrics.
+Gauges are not shipped back (a child's absolute value means nothing in the
+parent); the parent tracks the pages it has handed to children in
+ocr_documents_in_flight and reports its children as worker pool slots.
 """
 from typing import Optional
+import contextlib
+import threading
 import time
 import logging
 from flask import request
@@ -10,7 +20,7 @@ from flask import request
 logger = logging.getLogger(__name__)
 
 try:
-    from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
     PROM_AVAILABLE = True
 except Exception:
     PROM_AVAILABLE = False
@@ -19,6 +29,158 @@ except Exception:
 REQUEST_COUNT: Optional[Counter] = None
 REQUEST_LATENCY: Optional[Histogram] = None
 
+# OCR pipeline metrics are registered at import time so they also work in
+# OCR worker processes that never create a Flask app.
+OCR_CACHE_LOOKUPS: Optional[Counter] = None
+OCR_STAGE_LATENCY: Optional[Histogram] = None
+OCR_WORKER_SPAWNS: Optional[Counter] = None
+OCR_FALLBACKS: Optional[Counter] = None
+OCR_FAILURES: Optional[Counter] = None
+OCR_IN_FLIGHT: Optional[Gauge] = None
+OCR_JOBS: Optional[Gauge] = None
+OCR_WORKER_POOL: Optional[Gauge] = None
+if PROM_AVAILABLE:
+    OCR_CACHE_LOOKUPS = Counter('ocr_cache_lookups_total', 'OCR result cache lookups', ['result'])
+    # stage: dedupe, pdf_render, decode, auto_crop, resize, ocr, matcher, classification, patient_match, process_document
+    OCR_STAGE_LATENCY = Histogram('ocr_stage_latency_seconds', 'OCR pipeline stage latency', ['stage'],
+                                  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+    # kind: pool (persistent worker) or oneshot (one process per image)
+    OCR_WORKER_SPAWNS = Counter('ocr_worker_spawns_total', 'PaddleOCR worker processes started', ['kind'])
+    # path: in_process (external worker gave nothing) or external_retry (last attempt)
+    OCR_FALLBACKS = Counter('ocr_fallbacks_total', 'OCR engine fallbacks taken', ['path'])
+    # stage: worker_pool, oneshot, external_worker, in_process, empty_result, job
+    OCR_FAILURES = Counter('ocr_failures_total', 'OCR failures', ['stage'])
+    OCR_IN_FLIGHT = Gauge('ocr_documents_in_flight', 'process_document calls currently running')
+    # status: queued (whole queue) or running (in this process)
+    OCR_JOBS = Gauge('ocr_jobs', 'Asynchronous OCR jobs', ['status'])
+    # state: busy or idle; summed over the process's pools (see set_ocr_worker_pool)
+    OCR_WORKER_POOL = Gauge('ocr_worker_pool_workers', 'PaddleOCR worker pool slots', ['state'])
+
+
+# Per-thread buffer of metric updates (see capture_metrics)
+_capture = threading.local()
+# Pool name -> (busy, idle) slots reported into OCR_WORKER_POOL
+_pool_slots = {}
+_pool_slots_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def capture_metrics():
+    """Buffer the OCR counter/histogram updates made in this thread instead of recording them.
+
+    Yields the list of buffered (kind, args) events; pass it to replay_metrics()
+    in the process that serves /metrics. Gauges describe the current process
+    and are recorded as usual (see the module docstring).
+    """
+    previous = getattr(_capture, 'events', None)
+    events = []
+    _capture.events = events
+    try:
+        yield events
+    finally:
+        _capture.events = previous
+
+
+def _captured(kind, *args):
+    events = getattr(_capture, 'events', None)
+    if events is None:
+        return False
+    events.append((kind, args))
+    return True
+
+
+def replay_metrics(events):
+    """Record events buffered by capture_metrics() (typically in a pool child) in this process."""
+    for kind, args in events or ():
+        recorder = _RECORDERS.get(kind)
+        if recorder is not None:
+            recorder(*args)
+
+
+def record_ocr_cache(result):
+    """Count an OCR cache lookup: 'memory_hit', 'disk_hit', 'miss' or 'duplicate_hit' (near-duplicate scan)."""
+    if _captured('cache', result):
+        return
+    if OCR_CACHE_LOOKUPS is None:
+        return
+    try:
+        OCR_CACHE_LOOKUPS.labels(result).inc()
+    except Exception:
+        logger.debug('Failed to record OCR cache metric')
+
+
+def observe_ocr_stage(stage, seconds):
+    if _captured('stage', stage, seconds):
+        return
+    if OCR_STAGE_LATENCY is None:
+        return
+    try:
+        OCR_STAGE_LATENCY.labels(stage).observe(seconds)
+    except Exception:
+        logger.debug('Failed to record OCR stage metric')
+
+
+def _inc(counter, label):
+    if counter is None:
+        return
+    try:
+        counter.labels(label).inc()
+    except Exception:
+        logger.debug('Failed to record OCR counter metric')
+
+
+def record_ocr_worker_spawn(kind):
+    if not _captured('worker_spawn', kind):
+        _inc(OCR_WORKER_SPAWNS, kind)
+
+
+def record_ocr_fallback(path):
+    if not _captured('fallback', path):
+        _inc(OCR_FALLBACKS, path)
+
+
+def record_ocr_failure(stage):
+    if not _captured('failure', stage):
+        _inc(OCR_FAILURES, stage)
+
+
+_RECORDERS = {
+    'cache': record_ocr_cache,
+    'stage': observe_ocr_stage,
+    'worker_spawn': record_ocr_worker_spawn,
+    'fallback': record_ocr_fallback,
+    'failure': record_ocr_failure,
+}
+
+
+def track_ocr_in_flight(delta):
+    if OCR_IN_FLIGHT is not None:
+        OCR_IN_FLIGHT.inc(delta)
+
+
+def track_ocr_jobs_running(delta):
+    if OCR_JOBS is not None:
+        OCR_JOBS.labels('running').inc(delta)
+
+
+def set_ocr_jobs_queued(count):
+    if OCR_JOBS is not None:
+        OCR_JOBS.labels('queued').set(count)
+
+
+def set_ocr_worker_pool(busy, idle, pool='paddle'):
+    """Report one pool's busy/idle slots; the gauge shows the sum over this process's pools.
+
+    Pools: 'paddle' (services/ocr_worker_pool.py) and 'sgk_upload' (the SGK
+    upload children of services/ocr_batch.py, one PaddleOCR worker each).
+    """
+    if OCR_WORKER_POOL is None:
+        return
+    with _pool_slots_lock:
+        _pool_slots[pool] = (busy, idle)
+        OCR_WORKER_POOL.labels('busy').set(sum(b for b, _ in _pool_slots.values()))
+        OCR_WORKER_POOL.labels('idle').set(sum(i for _, i in _pool_slots.values()))
+
 
 def init_metrics(app):
     global REQUEST_COUNT, REQUEST_LATENCY
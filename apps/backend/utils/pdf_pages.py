@@ -0,0 +1,69 @@
+"""Rasterize PDF pages for OCR (optional PyMuPDF dependency).
+
+Pages are rendered straight to the resolution the OCR pipeline works at
+(longest side = OCR max side), so a rendered page needs no further resize:
+for an A4 page that is roughly 100 DPI instead of the 300 DPI a desktop
+converter would produce. Pages are rendered one at a time on request, so
+callers can hand the first pages to OCR while later ones are still waiting.
+
+Configuration (environment variables):
+
+    SGK_PDF_MAX_PAGES   pages accepted per PDF (default 50)
+    SGK_PDF_MAX_DPI     upper bound on the rendering resolution (default 300)
+"""
+import os
+
+from utils.env import env_int
+
+try:
+    import fitz  # PyMuPDF
+    PDF_AVAILABLE = True
+except Exception:
+    fitz = None
+    PDF_AVAILABLE = False
+
+PDF_MAGIC = b'%PDF-'
+
+
+class PdfError(ValueError):
+    """The PDF cannot be rasterized (PyMuPDF missing, unreadable, encrypted or too long)."""
+
+
+def is_pdf(filename, head=None):
+    """True for a .pdf file name or data starting with the PDF signature."""
+    if head is not None and bytes(head[:len(PDF_MAGIC)]) == PDF_MAGIC:
+        return True
+    return os.path.splitext((filename or '').lower())[1] == '.pdf'
+
+
+def open_pdf(source):
+    """Open a PDF from bytes or a path; raises PdfError when it cannot be rasterized."""
+    if not PDF_AVAILABLE:
+        raise PdfError('PDF support is not installed (PyMuPDF)')
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            doc = fitz.open(stream=bytes(source), filetype='pdf')
+        else:
+            doc = fitz.open(source)
+    except Exception as e:
+        raise PdfError(f'Unreadable PDF: {e}')
+    if doc.needs_pass:
+        doc.close()
+        raise PdfError('PDF is password protected')
+    max_pages = max(1, env_int('SGK_PDF_MAX_PAGES', 50))
+    if doc.page_count > max_pages:
+        count = doc.page_count
+        doc.close()
+        raise PdfError(f'PDF has {count} pages. Max allowed is {max_pages}.')
+    return doc
+
+
+def render_page(doc, page_no, max_side):
+    """PNG bytes of page `page_no` rendered with its longer side at `max_side` pixels."""
+    page = doc.load_page(page_no)
+    longest = max(page.rect.width, page.rect.height) or 1.0
+    # PDF units are points (1/72 inch)
+    zoom = min(max_side / float(longest), env_int('SGK_PDF_MAX_DPI', 300) / 72.0)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+    return pix.tobytes('png')
+
@@ -4,11 +4,12 @@ Ensures responses have the shape:
   { success: boolean, data?: any, error?: any, requestId: string, timestamp: string }
 
 Register this by calling `register_response_envelope(app)` from app initialization.
+Payloads are parsed and re-serialized with the app's JSON provider (`app.json`),
+so a faster provider (utils/json_provider.py) speeds this pass up as well.
 """
 from flask import request, g, jsonify
 from datetime import datetime
 import uuid
-import json
 
 
 def register_response_envelope(app):
@@ -28,7 +29,7 @@ def register_response_envelope(app):
                 # Attempt to parse existing JSON
                 raw = response.get_data(as_text=True) or ''
                 try:
-                    payload = json.loads(raw)
+                    payload = app.json.loads(raw)
                 except Exception:
                     payload = None
 
@@ -48,7 +49,7 @@ def register_response_envelope(app):
                         payload = corrected_payload
                         # Also update raw text to the corrected payload to avoid
                         # re-parsing differences later
-                        raw = json.dumps(payload)
+                        raw = app.json.dumps(payload)
                     except Exception:
                         # If repair fails, continue to normal processing
                         pass
@@ -74,7 +75,7 @@ def register_response_envelope(app):
                                 'requestId': payload.get('requestId') or inner.get('requestId') or g.get('request_id'),
                                 'timestamp': payload.get('timestamp') or inner.get('timestamp') or datetime.utcnow().isoformat() + 'Z'
                             }
-                            response.set_data(json.dumps(flattened))
+                            response.set_data(app.json.dumps(flattened))
                             response.headers['Content-Type'] = 'application/json'
                             response.headers['X-Request-ID'] = flattened['requestId']
                             return response
@@ -93,7 +94,7 @@ def register_response_envelope(app):
                             payload['requestId'] = g.get('request_id')
                         if 'timestamp' not in payload:
                             payload['timestamp'] = datetime.utcnow().isoformat() + 'Z'
-                        response.set_data(json.dumps(payload))
+                        response.set_data(app.json.dumps(payload))
                         response.headers['Content-Type'] = 'application/json'
                         response.headers['X-Request-ID'] = g.get('request_id')
                         return response
@@ -115,7 +116,7 @@ def register_response_envelope(app):
                     # For error responses, place the payload (or status text) under 'error'
                     envelope['error'] = payload if payload is not None else response.status
 
-                response.set_data(json.dumps(envelope))
+                response.set_data(app.json.dumps(envelope))
                 response.headers['Content-Type'] = 'application/json'
                 response.headers['X-Request-ID'] = g.get('request_id')
                 return response
@@ -0,0 +1,265 @@
+"""
+Fast serialization of model rows for list endpoints.
+
+`Model.to_dict()` re-does the same work for every row of a page: attribute
+access through SQLAlchemy's instrumentation, small lambdas, `json.loads` of
+JSON text columns, enum and date conversion. A `Serializer` compiles a
+model's field plan once into a single Python function that reads the row's
+loaded state directly and builds the response dict in one expression:
+
+    PATIENT = Serializer({
+        'id': attr('id'),
+        'birthDate': iso('birth_date'),
+        'tags': json_column('tags', {}),
+        ...
+    })
+    rows = PATIENT.many(query.all())
+
+Rows whose plan columns are not all loaded (expired after a commit, deferred
+by load_only) fall back to normal attribute access, so lazy loads still
+happen as they would in to_dict(); `Serializer.load_only(Model)` is the
+loader option that selects exactly the plan's columns.
+
+Sparse fieldsets: `serializer.only(parse_fields(request.args.get('fields')))`
+is the plan trimmed to the requested response keys ('id' is always kept),
+so `?fields=id,firstName,phone` both narrows the SELECT (through its
+load_only) and skips the other fields' conversions.
+
+JSON text columns are decoded through an LRU cache keyed by the raw text -
+most rows share a handful of values ('[]', the default SGK info). Only
+values a shallow copy makes private are cached (scalars, and lists/dicts of
+scalars, copied on every lookup); nested values are decoded afresh. Every
+row therefore gets its own objects and callers may change them.
+
+The plans for the list endpoints live in models/serializers.py; each plan
+must produce the same output as its model's to_dict().
+"""
+import json
+from functools import lru_cache
+
+from sqlalchemy.orm import load_only
+
+JSON_CACHE_SIZE = 1024
+# Distinct ?fields= selections compiled per serializer before the cache starts over
+MAX_FIELD_SUBSETS = 64
+
+
+class _Field:
+    __slots__ = ('kind', 'columns', 'arg')
+
+    def __init__(self, kind, columns, arg=None):
+        self.kind = kind
+        self.columns = columns
+        self.arg = arg
+
+
+def attr(column):
+    """The column value as is."""
+    return _Field('attr', (column,))
+
+
+def either(column, fallback):
+    """`column or fallback`."""
+    return _Field('either', (column, fallback))
+
+
+def iso(column):
+    """ISO 8601 text of a date/datetime column (other values as str, None stays None)."""
+    return _Field('iso', (column,))
+
+
+def date_iso(column):
+    """ISO date (YYYY-MM-DD) of a datetime column."""
+    return _Field('date_iso', (column,))
+
+
+def enum(column):
+    """`.value` of an Enum column, None when empty."""
+    return _Field('enum', (column,))
+
+
+def money(column, default=None):
+    """float() of a Numeric column, `default` when empty or zero (as the to_dict() methods do)."""
+    return _Field('money', (column,), default)
+
+
+def json_column(column, default):
+    """Decoded JSON text column; (a copy of) `default` when empty or invalid."""
+    return _Field('json', (column,), default)
+
+
+def nested(fields):
+    """A nested dict built from its own field plan."""
+    columns = tuple(c for f in fields.values() for c in f.columns)
+    return _Field('nested', columns, fields)
+
+
+def computed(fn, *columns):
+    """`fn(row)` for anything else; `row` maps column name -> value for the declared columns."""
+    return _Field('computed', columns, fn)
+
+
+def _iso(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _date_iso(value):
+    if value is None:
+        return None
+    if hasattr(value, 'date'):
+        return value.date().isoformat()
+    return str(value)
+
+
+def _enum(value):
+    return getattr(value, 'value', value) if value else None
+
+
+def _money(value, default):
+    return float(value) if value else default
+
+
+_SCALARS = (str, int, float, bool, type(None))
+# Cached in place of values a shallow copy cannot make private
+_NESTED = object()
+
+
+def _private(value):
+    """`value` itself if immutable, else a shallow copy (lists and dicts)."""
+    return value.copy() if isinstance(value, (list, dict)) else value
+
+
+@lru_cache(maxsize=JSON_CACHE_SIZE)
+def _decode(raw):
+    value = json.loads(raw)
+    items = value.values() if isinstance(value, dict) else value if isinstance(value, list) else (value,)
+    return value if all(isinstance(item, _SCALARS) for item in items) else _NESTED
+
+
+def decode_json(raw, default):
+    """Cached json.loads of a JSON text column value; `default` when empty or invalid.
+
+    The result is never shared with another call: cached lists and dicts are
+    copied and nested values are decoded afresh.
+    """
+    if not raw:
+        return _private(default)
+    if not isinstance(raw, str):
+        # Already decoded (a native JSON column type)
+        return raw
+    try:
+        value = _decode(raw)
+    except ValueError:
+        return _private(default)
+    return json.loads(raw) if value is _NESTED else _private(value)
+
+
+class _Attributes:
+    """Mapping view of a row through normal attribute access (triggers lazy loads)."""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __getitem__(self, column):
+        return getattr(self.obj, column)
+
+
+def parse_fields(value):
+    """`?fields=` value ('id,firstName' or a list) -> list of response keys; None when absent or empty."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    keys = [k.strip() for k in value if k and k.strip()]
+    return list(dict.fromkeys(keys)) or None
+
+
+class Serializer:
+    """A field plan compiled into one function: `{response key: field}` -> `serializer(row) -> dict`."""
+
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self.columns = tuple(dict.fromkeys(c for f in self.fields.values() for c in f.columns))
+        self._fn = _compile(self.fields, frozenset(self.columns))
+        self._subsets = {}
+
+    def __call__(self, obj):
+        return self._fn(obj)
+
+    def many(self, objs):
+        fn = self._fn
+        return [fn(obj) for obj in objs]
+
+    def load_only(self, model):
+        """Loader option selecting just the columns this plan reads from `model` (plus its primary key)."""
+        return load_only(*[getattr(model, column) for column in self.columns])
+
+    def only(self, keys):
+        """This plan trimmed to the response `keys` (plan order, 'id' always kept); None or empty returns self.
+
+        Raises ValueError naming unknown keys.
+        """
+        if not keys:
+            return self
+        wanted = set(keys)
+        unknown = wanted - self.fields.keys()
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}. "
+                             f"Available: {', '.join(self.fields)}")
+        wanted.add('id')
+        key = frozenset(wanted & self.fields.keys())
+        subset = self._subsets.get(key)
+        if subset is None:
+            if len(self._subsets) >= MAX_FIELD_SUBSETS:
+                self._subsets.clear()
+            subset = Serializer({k: f for k, f in self.fields.items() if k in key})
+            self._subsets[key] = subset
+        return subset
+
+
+def _compile(fields, columns):
+    namespace = {
+        '_columns': columns, '_Attributes': _Attributes, '_iso': _iso, '_date_iso': _date_iso,
+        '_enum': _enum, '_money': _money, '_json': decode_json,
+    }
+
+    def constant(value):
+        name = f'_k{len(namespace)}'
+        namespace[name] = value
+        return name
+
+    def expression(field):
+        col = [f'row[{c!r}]' for c in field.columns]
+        if field.kind == 'attr':
+            return col[0]
+        if field.kind == 'either':
+            return f'({col[0]} or {col[1]})'
+        if field.kind in ('iso', 'date_iso', 'enum'):
+            return f'_{field.kind}({col[0]})'
+        if field.kind == 'money':
+            return f'_money({col[0]}, {constant(field.arg)})'
+        if field.kind == 'json':
+            return f'_json({col[0]}, {constant(field.arg)})'
+        if field.kind == 'nested':
+            return dict_expression(field.arg)
+        if field.kind == 'computed':
+            return f'{constant(field.arg)}(row)'
+        raise ValueError(f'Unknown field kind: {field.kind}')
+
+    def dict_expression(plan):
+        return '{' + ', '.join(f'{key!r}: {expression(field)}' for key, field in plan.items()) + '}'
+
+    source = (
+        'def serialize(obj):\n'
+        '    row = obj.__dict__\n'
+        '    if not row.keys() >= _columns:\n'
+        '        row = _Attributes(obj)\n'
+        f'    return {dict_expression(fields)}\n'
+    )
+    exec(compile(source, '<serializer>', 'exec'), namespace)
+    return namespace['serialize']
@@ -0,0 +1,77 @@
+"""
+Aho-Corasick multi-pattern matcher used for medical term extraction and
+document classification.
+
+The automaton is compiled once from (pattern, payload) pairs and then finds
+every occurrence of every pattern in a single pass over the text, so the cost
+no longer grows with the number of terms. Matching is plain substring
+matching on the text as given (callers lowercase both sides), which keeps the
+behaviour of the previous `str.find` based loops.
+"""
+from collections import deque
+
+
+class TermAutomaton:
+    def __init__(self, patterns=()):
+        # Node 0 is the root. Each node: goto transitions, failure link, own
+        # outputs and outputs merged along failure links (filled by compile).
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [[]]
+        self._out = [[]]
+        self._compiled = False
+        self.size = 0
+        for pattern, payload in patterns:
+            self.add(pattern, payload)
+        self.compile()
+
+    def add(self, pattern, payload=None):
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._own[node].append((len(pattern), payload if payload is not None else pattern))
+        self.size += 1
+        self._compiled = False
+
+    def compile(self):
+        """Build failure links (breadth-first) and merge outputs along them."""
+        self._out = [list(own) for own in self._own]
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._compiled = True
+
+    def iter_matches(self, text):
+        """Yield (start, end, payload) for every pattern occurrence, in order of end offset."""
+        if not self._compiled:
+            self.compile()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for idx, ch in enumerate(text or ''):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                yield idx + 1 - length, idx + 1, payload
+
+    def find_all(self, text):
+        return list(self.iter_matches(text))